@@ -0,0 +1,176 @@
+# alerts.py
+""" Price alerts indexed by symbol and threshold.
+
+Every symbol keeps two sorted threshold lists (with a parallel list of alert ids): alerts waiting
+for the price to rise to a level and alerts waiting for it to fall to one. Any pending "above" alert has a
+threshold over the last price seen (otherwise it would already have fired), so when a new price
+arrives the alerts to fire are exactly a prefix of the above list, and likewise a suffix of the
+below list. A tick therefore costs one binary search per list plus the alerts that actually fire,
+no matter how many alerts are waiting.
+"""
+import bisect
+import time
+
+ABOVE = "above"
+BELOW = "below"
+MAX_ALERTS_PER_USER = 25
+
+
+class Alert:
+    __slots__ = ("id", "symbol", "direction", "threshold", "userId", "channelId", "created")
+
+    def __init__(self, id, symbol, direction, threshold, userId, channelId, created=None):
+        self.id = id
+        self.symbol = symbol
+        self.direction = direction
+        self.threshold = threshold
+        self.userId = userId
+        self.channelId = channelId
+        self.created = created or time.time()
+
+    def toDict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def fromDict(cls, data):
+        return cls(**data)
+
+
+class SymbolAlerts:
+    """ the two sorted threshold lists of one symbol, plain floats so bisect compares fast """
+    __slots__ = ("above", "aboveIds", "below", "belowIds", "lastPrice")
+
+    def __init__(self):
+        self.above = []
+        self.aboveIds = []
+        self.below = []
+        self.belowIds = []
+        self.lastPrice = None
+
+    def __len__(self):
+        return len(self.aboveIds) + len(self.belowIds)
+
+    def lists(self, direction):
+        return (self.above, self.aboveIds) if direction == ABOVE else (self.below, self.belowIds)
+
+
+class AlertEngine:
+    """ all alerts, fired by feeding it prices """
+
+    def __init__(self):
+        self.alerts = {}
+        self.bySymbol = {}
+        self.nextId = 1
+        self.userCounts = {}
+        # symbols whose alerts changed since the last save
+        self.dirty = set()
+
+    def __len__(self):
+        return len(self.alerts)
+
+    def symbols(self):
+        return [symbol for symbol, entry in self.bySymbol.items() if len(entry)]
+
+    def userAlerts(self, userId):
+        return sorted((alert for alert in self.alerts.values() if alert.userId == userId), key=lambda alert: alert.id)
+
+    def insert(self, alert):
+        entry = self.bySymbol.setdefault(alert.symbol, SymbolAlerts())
+        levels, ids = entry.lists(alert.direction)
+        position = bisect.bisect_right(levels, alert.threshold)
+        levels.insert(position, alert.threshold)
+        ids.insert(position, alert.id)
+        self.alerts[alert.id] = alert
+        self.userCounts[alert.userId] = self.userCounts.get(alert.userId, 0) + 1
+        self.nextId = max(self.nextId, alert.id + 1)
+        self.dirty.add(alert.symbol)
+
+    def add(self, symbol, direction, threshold, userId, channelId):
+        """ create an alert, raises ValueError for a bad direction or a user over the limit """
+        if direction not in (ABOVE, BELOW):
+            raise ValueError("direction must be above or below")
+        if self.userCounts.get(userId, 0) >= MAX_ALERTS_PER_USER:
+            raise ValueError(f"you already have {MAX_ALERTS_PER_USER} alerts")
+        alert = Alert(self.nextId, symbol.upper(), direction, float(threshold), userId, channelId)
+        self.insert(alert)
+        return alert
+
+    def forget(self, alert):
+        """ drop an alert from the id and per user bookkeeping """
+        del self.alerts[alert.id]
+        self.userCounts[alert.userId] -= 1
+        if not self.userCounts[alert.userId]:
+            del self.userCounts[alert.userId]
+        return alert
+
+    def remove(self, alertId):
+        alert = self.alerts.get(alertId)
+        if alert is None:
+            return None
+        self.forget(alert)
+        entry = self.bySymbol[alert.symbol]
+        levels, ids = entry.lists(alert.direction)
+        position = bisect.bisect_left(levels, alert.threshold)
+        while position < len(levels) and levels[position] == alert.threshold:
+            if ids[position] == alert.id:
+                del levels[position]
+                del ids[position]
+                break
+            position += 1
+        if not len(entry):
+            del self.bySymbol[alert.symbol]
+        self.dirty.add(alert.symbol)
+        return alert
+
+    def evaluate(self, symbol, price):
+        """ fire and remove the alerts of one symbol crossed by price """
+        entry = self.bySymbol.get(symbol)
+        if entry is None or price is None:
+            return []
+        entry.lastPrice = price
+        fired = []
+        # above alerts at or under the price are a prefix of the ascending list
+        if entry.above and entry.above[0] <= price:
+            cut = bisect.bisect_right(entry.above, price)
+            fired.extend(self.forget(self.alerts[alertId]) for alertId in entry.aboveIds[:cut])
+            del entry.above[:cut]
+            del entry.aboveIds[:cut]
+        # below alerts at or over the price are a suffix
+        if entry.below and entry.below[-1] >= price:
+            cut = bisect.bisect_left(entry.below, price)
+            fired.extend(self.forget(self.alerts[alertId]) for alertId in entry.belowIds[cut:])
+            del entry.below[cut:]
+            del entry.belowIds[cut:]
+        if fired:
+            self.dirty.add(symbol)
+            if not len(entry):
+                del self.bySymbol[symbol]
+        return fired
+
+    def tick(self, prices):
+        """ evaluate a {symbol: price} batch, returns every fired alert """
+        fired = []
+        bySymbol = self.bySymbol
+        for symbol, price in prices.items():
+            if symbol in bySymbol:
+                fired.extend(self.evaluate(symbol, price))
+        return fired
+
+    def symbolState(self, symbol):
+        """ serializable alerts of one symbol, what gets persisted per symbol """
+        entry = self.bySymbol.get(symbol)
+        if entry is None:
+            return []
+        return [self.alerts[alertId].toDict() for alertId in entry.aboveIds + entry.belowIds]
+
+    def takeDirty(self):
+        dirty = self.dirty
+        self.dirty = set()
+        return dirty
+
+    def load(self, states):
+        """ restore from an iterable of symbolState() lists """
+        for state in states:
+            for data in state:
+                self.insert(Alert.fromDict(data))
+        self.dirty.clear()
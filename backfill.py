@@ -0,0 +1,314 @@
+# backfill.py
+""" $SYMBOL mentions counted from channel history, per channel, day and symbol.
+
+A backfill walks the history of every channel of a server the bot can read, a page of 100
+messages per request, several channels at once. Every request waits on one shared
+AdaptivePacer: it starts at a modest rate, creeps up while pages come back quickly and halves on
+a 429, or on a page that took far longer than usual (discord.py sleeping out a rate limit it ran
+into), so the walk goes about as fast as Discord lets it.
+
+Counts are kept in a small SQLite table keyed by (channel, day, symbol). The messages counted
+in a channel always form one unbroken range of message ids: a walk goes back from the oldest
+message counted to the start of the window, then forward from the newest to now, and each
+page's counts are committed together with the moved end of the range. An interrupted walk
+resumes where it stopped and a longer backfill later only adds what is missing, so no message
+is counted twice. A backfill is a row in the runs table; unfinished runs are picked up again
+when the bot restarts.
+"""
+import asyncio
+import collections
+import datetime
+import sqlite3
+import threading
+import time
+
+import discord
+
+import ratelimit
+
+PAGE = 100
+# channels walked at once
+CHANNELS = 4
+# history requests per second across all channels, the pacer moves between the bounds
+RATE = 2.0
+MIN_RATE = 0.2
+MAX_RATE = 10.0
+STEP = 0.25
+# a page this many times slower than usual (and at least SLOW_PAGE seconds) was held up by a rate limit
+SLOW_FACTOR = 4.0
+SLOW_PAGE = 1.0
+RETRIES = 5
+DAY = 24 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mentions (
+    channel INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (channel, day, symbol)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS mentions_day ON mentions (day, symbol);
+CREATE TABLE IF NOT EXISTS channels (
+    channel INTEGER PRIMARY KEY,
+    guild INTEGER NOT NULL,
+    oldest INTEGER,
+    newest INTEGER,
+    reached REAL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    guild INTEGER NOT NULL,
+    channel INTEGER,
+    since REAL NOT NULL,
+    started REAL NOT NULL,
+    finished REAL,
+    pages INTEGER NOT NULL DEFAULT 0,
+    messages INTEGER NOT NULL DEFAULT 0,
+    mentions INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def dayNumber(when):
+    """ days since the epoch (UTC) of a timestamp """
+    return int(when // DAY)
+
+
+class MentionStore:
+    """ mention counts, each channel's counted range and the backfill runs in SQLite, one connection per thread
+
+    channels.oldest and channels.newest are the ids of the oldest and newest message counted,
+    channels.reached is the earliest time the walk back has reached the start of the history.
+    """
+
+    def __init__(self, path="mentions.db", timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+        with self.connection() as db:
+            db.executescript(SCHEMA)
+
+    def connection(self):
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return db
+
+    def startRun(self, guild, channel, since):
+        """ the guild's unfinished run, now going back to since, or a new one; returns the run id """
+        with self.connection() as db:
+            run = db.execute("SELECT id FROM runs WHERE guild = ? AND finished IS NULL ORDER BY id DESC LIMIT 1",
+                             (guild,)).fetchone()
+            if run:
+                db.execute("UPDATE runs SET since = ?, channel = ? WHERE id = ?", (since, channel, run["id"]))
+                return run["id"]
+            return db.execute("INSERT INTO runs (guild, channel, since, started) VALUES (?, ?, ?, ?)",
+                              (guild, channel, since, time.time())).lastrowid
+
+    def run(self, runId):
+        return self.connection().execute("SELECT * FROM runs WHERE id = ?", (runId,)).fetchone()
+
+    def unfinishedRuns(self):
+        return self.connection().execute("SELECT * FROM runs WHERE finished IS NULL ORDER BY id").fetchall()
+
+    def finishRun(self, runId):
+        with self.connection() as db:
+            db.execute("UPDATE runs SET finished = ? WHERE id = ?", (time.time(), runId))
+
+    def channelRange(self, channel):
+        """ (oldest, newest, reached) of the channel, all None before anything was counted """
+        row = self.connection().execute("SELECT oldest, newest, reached FROM channels WHERE channel = ?", (channel,)).fetchone()
+        return tuple(row) if row else (None, None, None)
+
+    def savePage(self, runId, guild, channel, counts, messages, oldest, newest, reached):
+        """ add a page's {(day, symbol): count} and move the channel's range, in one transaction """
+        with self.connection() as db:
+            db.executemany("INSERT INTO mentions VALUES (?, ?, ?, ?)"
+                           " ON CONFLICT (channel, day, symbol) DO UPDATE SET count = count + excluded.count",
+                           [(channel, day, symbol, count) for (day, symbol), count in counts.items()])
+            db.execute("INSERT OR REPLACE INTO channels VALUES (?, ?, ?, ?, ?)", (channel, guild, oldest, newest, reached))
+            db.execute("UPDATE runs SET pages = pages + 1, messages = messages + ?, mentions = mentions + ? WHERE id = ?",
+                       (messages, sum(counts.values()), runId))
+
+    def top(self, guild, sinceDay, limit=10):
+        """ (symbol, mentions) of the guild's most mentioned symbols from sinceDay on """
+        return self.connection().execute(
+            "SELECT symbol, SUM(count) AS mentions FROM mentions JOIN channels USING (channel)"
+            " WHERE guild = ? AND day >= ? GROUP BY symbol ORDER BY mentions DESC LIMIT ?",
+            (guild, sinceDay, limit)).fetchall()
+
+    def daily(self, guild, symbol, sinceDay):
+        """ (day, mentions) of one symbol in the guild from sinceDay on """
+        return self.connection().execute(
+            "SELECT day, SUM(count) AS mentions FROM mentions JOIN channels USING (channel)"
+            " WHERE guild = ? AND symbol = ? AND day >= ? GROUP BY day ORDER BY day",
+            (guild, symbol.upper(), sinceDay)).fetchall()
+
+    def close(self):
+        db = getattr(self.local, "db", None)
+        if db is not None:
+            db.close()
+            self.local.db = None
+
+
+class AdaptivePacer:
+    """ history requests per second shared by every channel walk, additive increase and multiplicative decrease """
+
+    def __init__(self, rate=RATE, minRate=MIN_RATE, maxRate=MAX_RATE, step=STEP):
+        self.minRate = minRate
+        self.maxRate = maxRate
+        self.step = step
+        self.bucket = ratelimit.TokenBucket(rate, burst=1)
+        # moving average of how long a page takes
+        self.typical = None
+        self.throttled = 0
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def setRate(self, rate):
+        with self.bucket.lock:
+            self.bucket.refill(time.monotonic())
+            self.bucket.rate = min(self.maxRate, max(self.minRate, rate))
+
+    async def wait(self):
+        await self.bucket.wait()
+
+    def done(self, seconds):
+        """ a page came back after seconds """
+        if self.typical is not None and seconds > max(SLOW_PAGE, SLOW_FACTOR * self.typical):
+            self.backOff()
+            return
+        self.typical = seconds if self.typical is None else 0.8 * self.typical + 0.2 * seconds
+        self.setRate(self.rate + self.step)
+
+    def backOff(self, retryAfter=0.0):
+        """ halve the rate, and with retryAfter let nothing through for that long """
+        self.throttled += 1
+        self.setRate(self.rate / 2)
+        if retryAfter:
+            with self.bucket.lock:
+                self.bucket.tokens = min(self.bucket.tokens, -retryAfter * self.bucket.rate)
+
+
+class Progress:
+    """ a running backfill's counters for !backfill status """
+
+    def __init__(self, runId, channels, since):
+        self.runId = runId
+        self.channels = channels
+        self.since = since
+        self.started = time.time()
+        self.done = 0
+        self.failed = 0
+        self.pages = 0
+        self.messages = 0
+        self.mentions = 0
+
+
+async def fetchPage(channel, pacer, **kwargs):
+    """ one history request, paced and retried on 429s and server errors """
+    for attempt in range(RETRIES):
+        await pacer.wait()
+        started = time.monotonic()
+        try:
+            page = [message async for message in channel.history(limit=PAGE, **kwargs)]
+        except discord.HTTPException as e:
+            if e.status != 429 and e.status < 500:
+                raise
+            retryAfter = 0.0
+            try:
+                retryAfter = float(e.response.headers.get("Retry-After", 0))
+            except Exception:
+                pass
+            pacer.backOff(retryAfter or 2.0 ** attempt)
+            if attempt == RETRIES - 1:
+                raise
+            continue
+        pacer.done(time.monotonic() - started)
+        return page
+
+
+def countPage(page, extract):
+    """ {(day, symbol): mentions} of a page, a symbol counts once per message; bots' messages are skipped """
+    counts = collections.Counter()
+    for message in page:
+        # most messages have no $ at all, skip the regex for them
+        if message.author.bot or "$" not in message.content:
+            continue
+        day = dayNumber(message.created_at.timestamp())
+        for symbol in extract(message.content):
+            counts[(day, symbol)] += 1
+    return counts
+
+
+async def walkChannel(store, runId, guild, channel, since, extract, pacer, progress, onCounts=None):
+    """ count a channel's mentions back to since and forward to now, resuming from its saved range """
+    loop = asyncio.get_running_loop()
+    oldest, newest, reached = await loop.run_in_executor(None, store.channelRange, channel.id)
+    sinceTime = datetime.datetime.fromtimestamp(since, datetime.timezone.utc)
+
+    async def save(page, counts):
+        await loop.run_in_executor(None, store.savePage, runId, guild, channel.id, counts, len(page), oldest, newest, reached)
+        progress.pages += 1
+        progress.messages += len(page)
+        progress.mentions += sum(counts.values())
+        if onCounts is not None and counts:
+            onCounts(counts)
+
+    # back from the oldest message counted, newest first
+    while reached is None or reached > since:
+        page = await fetchPage(channel, pacer, before=discord.Object(id=oldest) if oldest else None,
+                               after=sinceTime, oldest_first=False)
+        if page:
+            oldest = page[-1].id
+            newest = newest or page[0].id
+        if len(page) < PAGE:
+            reached = since
+        await save(page, countPage(page, extract))
+
+    # forward from the newest, catching up with what was said during the walk
+    while True:
+        page = await fetchPage(channel, pacer, after=discord.Object(id=newest) if newest else sinceTime, oldest_first=True)
+        if not page:
+            break
+        newest = page[-1].id
+        oldest = oldest or page[0].id
+        await save(page, countPage(page, extract))
+        if len(page) < PAGE:
+            break
+
+
+async def runBackfill(store, runId, guild, channels, since, extract, pacer=None, progress=None,
+                      concurrency=CHANNELS, onCounts=None, log=print):
+    """ walk channels CHANNELS at a time and finish the run; a channel that fails is logged and
+    left for the next run, cancelling leaves the run to be resumed """
+    pacer = pacer or AdaptivePacer()
+    progress = progress or Progress(runId, len(channels), since)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def walk(channel):
+        async with semaphore:
+            try:
+                await walkChannel(store, runId, guild, channel, since, extract, pacer, progress, onCounts)
+                progress.done += 1
+            except asyncio.CancelledError:
+                raise
+            except discord.Forbidden:
+                # lost access since the walk started, nothing to resume there
+                progress.done += 1
+                log(f"Backfill {runId}: no access to the history of #{channel.name}")
+            except Exception as e:
+                progress.failed += 1
+                log(f"Backfill {runId}: #{channel.name} failed: {e}")
+
+    await asyncio.gather(*(walk(channel) for channel in channels))
+    if not progress.failed:
+        await asyncio.get_running_loop().run_in_executor(None, store.finishRun, runId)
+    return progress
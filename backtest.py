@@ -0,0 +1,96 @@
+# backtest.py
+""" Replay the !chart buy/sell calls over a long daily history and score them.
+
+The calls come from charting.buySellSignals, the same rules the chart message uses, so the
+backtest scores exactly what users are shown. Each call is scored by the close some bars later
+(a sell is right when the price fell), and a long-only strategy that buys on Buy and goes flat
+on Sell is compared with buy and hold. Everything is vectorized over the bars; runBacktest()
+is meant to run in a worker process.
+"""
+import json
+import time
+
+import numpy as np
+
+import charting
+
+# forward return horizons in bars (trading days for daily bars)
+HORIZONS = (5, 20, 60)
+
+
+def maxDrawdown(equity):
+    """ largest peak to trough fall of an equity curve, as a positive fraction """
+    if not len(equity):
+        return 0.0
+    return float(np.max(1 - equity / np.maximum.accumulate(equity)))
+
+
+def scoreSignals(closes, signals, horizons=HORIZONS):
+    """ hit rate and average signed forward return of the calls per horizon """
+    bars = np.array([index for index, direction in signals], dtype=np.int64)
+    directions = np.array([direction for index, direction in signals], dtype=float)
+    scores = {}
+    for horizon in horizons:
+        scored = bars + horizon < len(closes)
+        if not scored.any():
+            scores[horizon] = {"count": 0, "hitRate": None, "averageReturn": None, "buyReturn": None, "sellReturn": None}
+            continue
+        entry = bars[scored]
+        forward = closes[entry + horizon] / closes[entry] - 1
+        # a sell call is right when the price went down
+        signed = directions[scored] * forward
+        buys = directions[scored] == charting.BUY
+        scores[horizon] = {"count": int(scored.sum()),
+                           "hitRate": float(np.mean(signed > 0)),
+                           "averageReturn": float(np.mean(signed)),
+                           "buyReturn": float(np.mean(forward[buys])) if buys.any() else None,
+                           "sellReturn": float(np.mean(forward[~buys])) if (~buys).any() else None}
+    return scores
+
+
+def strategyCurve(closes, signals):
+    """ (strategy, buy and hold) equity curves: long from the close of a Buy call to the close of the next Sell """
+    calls = np.zeros(len(closes), dtype=np.int8)
+    for index, direction in signals:
+        calls[index] = direction
+    last, lastDirection = charting.lastEvents(calls)
+    # a position taken at a close earns from the next bar on
+    held = (lastDirection[:-1] == charting.BUY).astype(float)
+    returns = closes[1:] / closes[:-1] - 1
+    strategy = np.concatenate(([1.0], np.cumprod(1 + held * returns)))
+    buyHold = closes / closes[0]
+    return strategy, buyHold, float(held.mean()) if len(held) else 0.0
+
+
+def backtestFrame(df, horizons=HORIZONS):
+    """ score the chart calls over every bar of df """
+    values = charting.chartIndicators(df)
+    signals = charting.buySellSignals(*(values[name] for name in charting.MARKER_NAMES))
+    # null bars keep the previous close so returns span them
+    closes = df['Close'].ffill().bfill().to_numpy(dtype=float)
+    strategy, buyHold, exposure = strategyCurve(closes, signals)
+    return {"bars": len(df),
+            "first": df.index[0].strftime("%Y-%m-%d"),
+            "last": df.index[-1].strftime("%Y-%m-%d"),
+            "buys": sum(1 for index, direction in signals if direction == charting.BUY),
+            "sells": sum(1 for index, direction in signals if direction == charting.SELL),
+            "horizons": scoreSignals(closes, signals, horizons),
+            "strategyReturn": float(strategy[-1] - 1),
+            "strategyDrawdown": maxDrawdown(strategy),
+            "exposure": exposure,
+            "buyHoldReturn": float(buyHold[-1] - 1),
+            "buyHoldDrawdown": maxDrawdown(buyHold)}
+
+
+def runBacktest(chartBytes):
+    """ worker entry point: raw get-chart json in, result dict out (None when there are too few bars) """
+    started = time.perf_counter()
+    chartData = json.loads(chartBytes)
+    if not chartData["chart"]["result"]:
+        return None
+    df = charting.chartFrame(chartData)
+    if len(df) < max(HORIZONS) + charting.STOCHASTIC_PERIODS[0]:
+        return None
+    result = backtestFrame(df)
+    result["seconds"] = time.perf_counter() - started
+    return result
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# benchmarks/bench_alerts.py
+""" Per-tick cost of the alert engine with 100k alerts, against a linear scan over every alert.
+
+    python benchmarks/bench_alerts.py --alerts 100000 --symbols 3000 --ticks 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import alerts  # noqa: E402
+
+
+def naiveTick(pending, prices):
+    """ what the engine replaces: test every alert against its symbol's price """
+    fired = []
+    keep = []
+    for alert in pending:
+        price = prices.get(alert.symbol)
+        if price is not None and ((alert.direction == alerts.ABOVE and price >= alert.threshold) or
+                                  (alert.direction == alerts.BELOW and price <= alert.threshold)):
+            fired.append(alert)
+        else:
+            keep.append(alert)
+    pending[:] = keep
+    return fired
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--alerts", type=int, default=100000)
+    parser.add_argument("--symbols", type=int, default=3000)
+    parser.add_argument("--ticks", type=int, default=50)
+    parser.add_argument("--volatility", type=float, default=0.005, help="per tick price move standard deviation")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    symbols = [f"S{i:04d}" for i in range(args.symbols)]
+    prices = {symbol: rnd.uniform(5, 500) for symbol in symbols}
+    # alerts are set away from the current price in both directions, most never fire
+    alerts.MAX_ALERTS_PER_USER = args.alerts
+    engine = alerts.AlertEngine()
+    started = time.perf_counter()
+    for i in range(args.alerts):
+        symbol = rnd.choice(symbols)
+        direction = rnd.choice((alerts.ABOVE, alerts.BELOW))
+        distance = abs(rnd.gauss(0, 0.05))
+        threshold = prices[symbol] * (1 + distance if direction == alerts.ABOVE else 1 - distance)
+        engine.add(symbol, direction, threshold, i % 5000, 1)
+    buildSeconds = time.perf_counter() - started
+    pending = list(engine.alerts.values())
+
+    engineTimes = []
+    naiveTimes = []
+    fired = 0
+    for _ in range(args.ticks):
+        for symbol in symbols:
+            prices[symbol] *= 1 + rnd.gauss(0, args.volatility)
+        started = time.perf_counter()
+        firedNow = engine.tick(prices)
+        engineTimes.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        naiveFired = naiveTick(pending, prices)
+        naiveTimes.append(time.perf_counter() - started)
+        assert len(firedNow) == len(naiveFired), (len(firedNow), len(naiveFired))
+        fired += len(firedNow)
+
+    print(f"{args.alerts} alerts over {args.symbols} symbols, built in {buildSeconds * 1000:.0f} ms")
+    print(f"{args.ticks} ticks, {fired} alerts fired, {len(engine)} still pending")
+    print(f"engine per tick: median {statistics.median(engineTimes) * 1000:.2f} ms, max {max(engineTimes) * 1000:.2f} ms"
+          f" ({statistics.median(engineTimes) / args.symbols * 1e6:.2f} us per symbol)")
+    print(f"linear scan per tick: median {statistics.median(naiveTimes) * 1000:.2f} ms, max {max(naiveTimes) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
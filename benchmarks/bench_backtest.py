@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# benchmarks/bench_backtest.py
+""" Vectorized buy/sell call state machine against the per-bar loop it replaced, and full backtest time.
+
+    python benchmarks/bench_backtest.py --symbols AAPL TSLA GME MSFT --bars 100000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+import backtest  # noqa: E402
+import charting  # noqa: E402
+import fakeupstream  # noqa: E402
+from bench_chart_render import syntheticFrame  # noqa: E402
+
+
+def loopSignals(macdSigBuy, macdSigSell, stochSigBuy, stochSigSell, movavgSigBuy, movavgSigSell):
+    """ the per-bar loop generateChartBuySellMessage used before """
+    Sell = -1
+    Buy = 1
+    macdState = None
+    stochState = None
+    maState = None
+    lastSignal = None
+    signals = []
+    for index in range(len(macdSigBuy)):
+        if not np.isnan(macdSigBuy[index]):
+            macdState = Buy
+        elif not np.isnan(macdSigSell[index]):
+            macdState = Sell
+        if not np.isnan(stochSigBuy[index]):
+            stochState = Buy
+        elif not np.isnan(stochSigSell[index]):
+            stochState = Sell
+        if not np.isnan(movavgSigBuy[index]):
+            maState = Buy
+        elif not np.isnan(movavgSigSell[index]):
+            maState = Sell
+        if macdState == Buy and stochState == Buy and maState == Buy and lastSignal != Buy:
+            signals.append((index, Buy))
+            macdState = None
+            stochState = None
+            lastSignal = Buy
+        elif macdState == Sell and stochState == Sell and maState == Sell and lastSignal != Sell:
+            signals.append((index, Sell))
+            macdState = None
+            stochState = None
+            lastSignal = Sell
+    return signals
+
+
+def compareSignals(label, df):
+    values = charting.chartIndicators(df)
+    markers = [values[name] for name in charting.MARKER_NAMES]
+    started = time.perf_counter()
+    vectorized = charting.buySellSignals(*markers)
+    vectorizedSeconds = time.perf_counter() - started
+    started = time.perf_counter()
+    looped = loopSignals(*markers)
+    loopSeconds = time.perf_counter() - started
+    assert vectorized == looped, f"{label}: calls differ"
+    print(f"ok  {label}: {len(df)} bars, {len(vectorized)} calls, state machine {vectorizedSeconds * 1000:.2f} ms"
+          f" vs loop {loopSeconds * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symbols", nargs="+", default=["AAPL", "TSLA", "GME", "MSFT"])
+    parser.add_argument("--bars", type=int, default=100000, help="size of the synthetic series")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    for symbol in args.symbols:
+        for intervalIn, rangeIn in (("1d", "3mo"), ("5m", "1mo"), ("1d", "max")):
+            data = fakeupstream.buildChart(symbol, intervalIn, rangeIn, nullBarRate=0.01)
+            compareSignals(f"{symbol} {intervalIn} {rangeIn}", charting.chartFrame(data))
+    compareSignals("synthetic", syntheticFrame(args.bars))
+
+    # the whole worker job: decode, frame, indicators, calls and scores
+    payload = json.dumps(fakeupstream.buildChart(args.symbols[0], "1d", "max")).encode()
+    backtest.runBacktest(payload)
+    times = []
+    for _ in range(5):
+        started = time.perf_counter()
+        result = backtest.runBacktest(payload)
+        times.append(time.perf_counter() - started)
+    print(f"runBacktest {args.symbols[0]} 1d max: {result['bars']} bars ({result['first']} to {result['last']}),"
+          f" {result['buys']} buys / {result['sells']} sells, median {sorted(times)[2] * 1000:.0f} ms")
+    for horizon, score in result["horizons"].items():
+        print(f"  {horizon:>3} bars: hit rate {score['hitRate']:.0%}, average {score['averageReturn']:+.2%} over {score['count']} calls")
+    print(f"  strategy {result['strategyReturn']:+.0%} (max drawdown {result['strategyDrawdown']:.0%}, {result['exposure']:.0%} invested),"
+          f" buy and hold {result['buyHoldReturn']:+.0%} (max drawdown {result['buyHoldDrawdown']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
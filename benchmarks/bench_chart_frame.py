@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# benchmarks/bench_chart_frame.py
+""" Chart ingest time: get-chart json to the OHLCV frame, per bar string round trip versus numpy.
+
+The old path formatted every epoch with datetime.fromtimestamp/strftime in the server's local
+timezone and parsed the strings back with pd.to_datetime; chartFrame() now converts the whole
+timestamp array at once in the exchange timezone. Synthetic 1 minute bars (with null bars) from
+fakeupstream over ranges of several months; both frames are checked to hold the same values.
+
+    python benchmarks/bench_chart_frame.py --ranges 5d 1mo 3mo 6mo
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import charting  # noqa: E402
+import fakeupstream  # noqa: E402
+
+
+def legacyFrame(chartData):
+    """ the frame as chartFrame built it before, strings and all """
+    result = chartData["chart"]["result"][0]
+    quote = result["indicators"]["quote"][0]
+    inputdata = {}
+    inputdata["DateTime"] = [datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") for ts in result["timestamp"]]
+    inputdata["Open"] = quote["open"]
+    inputdata["Close"] = quote["close"]
+    inputdata["Volume"] = quote["volume"]
+    inputdata["High"] = quote["high"]
+    inputdata["Low"] = quote["low"]
+    adjclose = result["indicators"].get("adjclose")
+    inputdata["Adj Close"] = adjclose[0]["adjclose"] if adjclose else quote["close"]
+    df = pd.DataFrame(inputdata)
+    for column in ("Open", "High", "Low", "Close", "Adj Close", "Volume"):
+        df[column] = pd.to_numeric(df[column], errors="coerce").astype(float)
+    df['Datetime'] = pd.to_datetime(inputdata["DateTime"], format='%Y-%m-%d %H:%M:%S')
+    return df.set_index(pd.DatetimeIndex(df['Datetime']))
+
+
+def timeIt(function, chartData, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        frame = function(chartData)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--interval", default="1m")
+    parser.add_argument("--ranges", nargs="+", default=["5d", "1mo", "3mo", "6mo"])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'range':>6} {'bars':>8} {'nulls':>6} {'old ms':>9} {'new ms':>9} {'speedup':>8}  first bar (exchange time)")
+    for rangeIn in args.ranges:
+        # decoded like the bot does, json parsing is the same for both paths
+        chartData = json.loads(json.dumps(fakeupstream.buildChart("BENCH", args.interval, rangeIn)))
+        old, oldFrame = timeIt(legacyFrame, chartData, args.repeat)
+        new, newFrame = timeIt(charting.chartFrame, chartData, args.repeat)
+        columns = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+        assert np.array_equal(oldFrame[columns].to_numpy(), newFrame[columns].to_numpy(), equal_nan=True)
+        assert len(oldFrame.index) == len(newFrame.index)
+        nulls = int(newFrame["Close"].isna().sum())
+        print(f"{rangeIn:>6} {len(newFrame):>8} {nulls:>6} {old * 1000:>9.1f} {new * 1000:>9.1f} {old / new:>7.1f}x  {newFrame.index[0]}")
+
+
+if __name__ == "__main__":
+    main()
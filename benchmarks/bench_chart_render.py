@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# benchmarks/bench_chart_render.py
+""" Chart render time against bar count, with and without downsampling.
+
+    python benchmarks/bench_chart_render.py --bars 250 1000 5000 20000 50000 --full-limit 5000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import charting  # noqa: E402
+
+
+def syntheticFrame(bars, seed=7):
+    """ random walk OHLCV with one minute bars """
+    rnd = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rnd.normal(0, 0.002, bars)))
+    opens = np.concatenate(([100.0], closes[:-1]))
+    spread = np.abs(rnd.normal(0, 0.001, bars))
+    frame = pd.DataFrame({"Open": opens, "High": np.maximum(opens, closes) * (1 + spread),
+                          "Low": np.minimum(opens, closes) * (1 - spread), "Close": closes,
+                          "Volume": rnd.integers(1e4, 1e6, bars).astype(float)},
+                         index=pd.date_range("2024-01-02 09:30", periods=bars, freq="min"))
+    return frame
+
+
+def timeRender(frame, folder, repeat, dpi, maxBars):
+    times = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        charting.renderChart(frame.copy(), "BENCH", os.path.join(folder, f"bench_{i}.png"), intraday=True, dpi=dpi, maxBars=maxBars)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bars", type=int, nargs="+", default=[250, 1000, 5000, 20000, 50000])
+    parser.add_argument("--full-limit", type=int, default=5000, help="largest bar count also rendered without downsampling")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--dpi", type=int, default=charting.DPI)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    limit = charting.maxPlotBars(args.dpi)
+    print(f"downsampling above {limit} bars at {args.dpi} dpi")
+    print(f"{'bars':>8} {'downsampled':>12} {'full':>10}")
+    with tempfile.TemporaryDirectory() as folder:
+        # first render pays for font caches and the like
+        timeRender(syntheticFrame(100), folder, 1, args.dpi, None)
+        for bars in args.bars:
+            frame = syntheticFrame(bars)
+            downsampled = timeRender(frame, folder, args.repeat, args.dpi, None)
+            full = timeRender(frame, folder, args.repeat, args.dpi, len(frame)) if bars <= args.full_limit else None
+            print(f"{bars:>8} {downsampled * 1000:>10.0f}ms {full * 1000 if full else float('nan'):>8.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# benchmarks/bench_chart_template.py
+""" Per chart wall time of the reusable figure template against a new mpf.plot figure per chart.
+
+    python benchmarks/bench_chart_template.py --charts 10 --bars 66 250 1000 5000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import charting  # noqa: E402
+import charttemplate  # noqa: E402
+from bench_chart_render import syntheticFrame  # noqa: E402
+
+
+def timeCharts(frames, folder, engine, dpi):
+    times = []
+    for i, frame in enumerate(frames):
+        started = time.perf_counter()
+        charting.renderChart(frame.copy(), f"BENCH {i}", os.path.join(folder, f"{engine}_{i}.png"), dpi=dpi, engine=engine)
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bars", type=int, nargs="+", default=[66, 250, 1000, 5000])
+    parser.add_argument("--charts", type=int, default=10, help="charts rendered per bar count and engine")
+    parser.add_argument("--dpi", type=int, nargs="+", default=[charting.DPI, 100])
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    with tempfile.TemporaryDirectory() as folder:
+        started = time.perf_counter()
+        charttemplate.template()
+        print(f"template built once per worker in {(time.perf_counter() - started) * 1000:.0f} ms")
+        # both paths pay for font and style caches on their first chart, keep that out of the medians
+        timeCharts([syntheticFrame(100)], folder, "mplfinance", 100)
+        timeCharts([syntheticFrame(100)], folder, "template", 100)
+        print(f"{'dpi':>4} {'bars':>6} {'mpf.plot':>10} {'template':>10} {'saved':>7}")
+        for dpi in args.dpi:
+            for bars in args.bars:
+                # a different series per chart, like different symbols
+                frames = [syntheticFrame(bars, seed) for seed in range(args.charts)]
+                mplfinance = statistics.median(timeCharts(frames, folder, "mplfinance", dpi))
+                template = statistics.median(timeCharts(frames, folder, "template", dpi))
+                print(f"{dpi:>4} {bars:>6} {mplfinance * 1000:>8.0f}ms {template * 1000:>8.0f}ms {1 - template / mplfinance:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# benchmarks/bench_leaderboard.py
+""" !top lookups on the sorted leaderboard indexes against sorting every symbol per query.
+
+    python benchmarks/bench_leaderboard.py --symbols 8000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import leaderboard  # noqa: E402
+
+SECTORS = ["Technology", "Health Care", "Finance", "Energy", "Consumer Discretionary", "Industrials", "Utilities", ""]
+BANDS = ["nano", "micro", "small", "mid", "large", "mega"]
+
+
+def syntheticBoard(count, seed=5):
+    rnd = random.Random(seed)
+    rows = [(f"S{index:05d}", rnd.choice(SECTORS), rnd.choice(BANDS)) for index in range(count)]
+    board = leaderboard.Leaderboard(rows)
+    for symbol, sector, band in rows:
+        metrics = {name: rnd.uniform(-0.3, 0.5) if name in leaderboard.PERCENT_METRICS else rnd.uniform(-20, 80)
+                   for name in leaderboard.METRICS if rnd.random() > 0.1}
+        board.update(symbol, metrics, time.time())
+    return board, rnd
+
+
+def naiveTop(board, name, k, ascending, sectors, band):
+    """ what a per-query scan over every row does """
+    column = board.columns[name]
+    entries = [(column[row], row) for row in range(len(board))
+               if board.ranked(name, column[row]) and (not sectors or board.sectors[row] in sectors)
+               and (band is None or board.bands[row] == band)]
+    entries.sort(reverse=not ascending)
+    return [(board.symbols[row], value) for value, row in entries[:k]]
+
+
+def timePerCall(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symbols", type=int, default=8000)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    board, rnd = syntheticBoard(args.symbols)
+    print(f"built {args.symbols} symbols in {(time.perf_counter() - started) * 1000:.0f} ms")
+    queries = [("roic", 10, None, None, None), ("peg", 10, True, ["Energy"], None), ("pe", 20, True, None, "large"),
+               ("roe", 10, False, ["Technology", "Health Care"], "mid")]
+    for name, k, ascending, sectors, band in queries:
+        order = leaderboard.METRICS[name][1] if ascending is None else ascending
+        expected = naiveTop(board, name, k, order, sectors, band)
+        assert board.top(name, k, ascending, sectors, band) == expected, f"{name} ranking differs"
+        indexed = timePerCall(lambda: board.top(name, k, ascending, sectors, band), args.repeat)
+        naive = timePerCall(lambda: naiveTop(board, name, k, order, sectors, band), max(1, args.repeat // 100))
+        print(f"!top {name:<5} k={k:<3} sectors={sectors} band={band}: {indexed * 1e6:8.1f} us indexed, {naive * 1e6:9.0f} us scanning")
+
+    symbols = board.symbols
+    update = lambda: board.update(rnd.choice(symbols), {name: rnd.uniform(-20, 80) for name in leaderboard.METRICS}, time.time())
+    print(f"refreshing one symbol (all {len(leaderboard.METRICS)} metrics): {timePerCall(update, args.repeat) * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
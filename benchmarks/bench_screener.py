@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# benchmarks/bench_screener.py
+""" !screen latency over a screener sized universe, checked against a row by row evaluation.
+
+    python benchmarks/bench_screener.py --rows 8000 [--csv nasdaq_screener.csv]
+"""
+import argparse
+import operator
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import screener  # noqa: E402
+import symboltable  # noqa: E402
+
+SECTORS = ["Technology", "Health Care", "Finance", "Energy", "Consumer Discretionary", "Industrials",
+           "Utilities", "Real Estate", "Basic Materials", "Telecommunications", ""]
+COUNTRIES = ["United States", "United States", "United States", "China", "Canada", "Israel", "United Kingdom", ""]
+QUERIES = ["sector=Technology mcap>10B volume>1M sort=-pctchange limit=20",
+           "country=\"United States\" price<=20 pctchange>5 sort=-volume",
+           "sector=health,energy band=small,micro ipo>=2015",
+           "mcap>=200B sort=pctchange limit=10",
+           "industry!=banks volume>500k change<0 sort=change",
+           "sort=-mcap limit=50"]
+COMPARE = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le, "=": operator.eq, "!=": operator.ne}
+
+
+def syntheticCsv(path, rows, seed=11):
+    """ a nasdaq screener style csv with rows random listings """
+    rnd = random.Random(seed)
+    seen = set()
+    with open(path, "w") as csvFile:
+        csvFile.write("Symbol,Name,Last Sale,Net Change,% Change,Market Cap,Country,IPO Year,Volume,Sector,Industry\n")
+        while len(seen) < rows:
+            symbol = "".join(rnd.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(rnd.randint(1, 5)))
+            if symbol in seen:
+                continue
+            seen.add(symbol)
+            price = round(10 ** rnd.uniform(-1, 3), 2)
+            change = round(price * rnd.gauss(0, 0.03), 2)
+            sector = rnd.choice(SECTORS)
+            industry = rnd.choice(["Banks", "Semiconductors", "Software", "Biotechnology", "Oil & Gas", "REITs", ""])
+            ipo = rnd.choice(["", str(rnd.randint(1980, 2024))])
+            csvFile.write(f"{symbol},{symbol} Inc,${price},{change},{change / price * 100:.3f}%,"
+                          f"{10 ** rnd.uniform(6, 12.5):.2f},\"{rnd.choice(COUNTRIES)}\",{ipo},{int(10 ** rnd.uniform(3, 8))},"
+                          f"\"{sector}\",\"{industry}\"\n")
+
+
+def rowValue(table, row, name):
+    column = screener.FIELDS[name][0]
+    return table.columns[column][row]
+
+
+def slowScreen(screen, table, query):
+    """ the same query one row at a time in python """
+    conditions, sortField, descending, limit = screen.parse(query)
+    matched = []
+    for row in range(len(table)):
+        keep = True
+        for name, op, value in conditions:
+            if screener.FIELDS[name][1]:
+                codes = {code for part in value.split(",") for code in screen.matchCodes(name, part)}
+                hit = rowValue(table, row, name) in codes
+                keep = hit if op == "=" else not hit
+            else:
+                keep = COMPARE[op](rowValue(table, row, name), value)
+            if not keep:
+                break
+        if keep:
+            matched.append(row)
+    if sortField is None:
+        sortField, descending = "mcap", True
+    matched.sort(key=lambda row: rowValue(table, row, sortField), reverse=descending)
+    return matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=8000)
+    parser.add_argument("--csv", help="screen a real screener csv instead of a synthetic one")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        csvPath = args.csv or os.path.join(folder, "screener.csv")
+        if not args.csv:
+            syntheticCsv(csvPath, args.rows)
+        table = symboltable.load(csvPath, os.path.join(folder, "screener.symtab"))
+        started = time.perf_counter()
+        screen = screener.Screener(table)
+        print(f"{len(table)} rows, indexes built in {(time.perf_counter() - started) * 1000:.1f} ms")
+        for query in QUERIES:
+            rows, total = screen.screen(query)
+            expected = slowScreen(screen, table, query)
+            assert total == len(expected), f"{query}: {total} matches, expected {len(expected)}"
+            sortField = screen.parse(query)[1] or "mcap"
+            assert [rowValue(table, row, sortField) for row in rows] == [rowValue(table, row, sortField) for row in expected[:len(rows)]], query
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                screen.screen(query)
+            indexed = (time.perf_counter() - started) / args.repeat
+            started = time.perf_counter()
+            slowScreen(screen, table, query)
+            slow = time.perf_counter() - started
+            print(f"{indexed * 1e6:7.0f} us ({slow * 1000:5.0f} ms row by row)  {total:>5} matches  {query}")
+        del screen
+        table.close()
+
+
+if __name__ == "__main__":
+    main()
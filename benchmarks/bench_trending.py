@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# benchmarks/bench_trending.py
+""" Trending tracker accuracy and memory under a flood of junk tickers.
+
+A few hundred real symbols are mentioned with a zipf-like popularity while junk tickers (each
+typed once or twice) make up most of the stream. The top 10 from the sketch is compared with
+exact counts, and the tracker's memory is reported as the number of distinct tickers grows.
+
+    python benchmarks/bench_trending.py --mentions 200000 --junk 0.7
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+import collections
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import trending  # noqa: E402
+
+
+def trackerBytes(tracker):
+    """ counter arrays plus candidate tables, the part that could grow """
+    total = 0
+    for counter in tracker.guilds.values():
+        for bucket in counter.buckets:
+            total += bucket.sketch.counts.itemsize * len(bucket.sketch.counts)
+            total += sys.getsizeof(bucket.candidates) + sum(sys.getsizeof(symbol) for symbol in bucket.candidates)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mentions", type=int, default=200000)
+    parser.add_argument("--junk", type=float, default=0.7, help="share of mentions that are junk tickers")
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    real = [f"R{index:03d}" for index in range(args.symbols)]
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(args.symbols)]
+    tracker = trending.TrendingTracker()
+    exact = collections.Counter()
+    distinct = set()
+    start = 1_700_000_000 // trending.BUCKET_SECONDS * trending.BUCKET_SECONDS
+    started = time.perf_counter()
+    for index in range(args.mentions):
+        if rnd.random() < args.junk:
+            symbol = "".join(rnd.choice(string.ascii_uppercase) for _ in range(rnd.randint(3, 6)))
+        else:
+            symbol = rnd.choices(real, weights)[0]
+        # spread the stream over three hours so the window sums buckets
+        now = start + index * 3 * trending.BUCKET_SECONDS / args.mentions
+        tracker.add(rnd.randint(1, 4), [symbol], now)
+        exact[symbol] += 1
+        distinct.add(symbol)
+        if index + 1 in (args.mentions // 10, args.mentions // 2, args.mentions):
+            print(f"{index + 1:>8} mentions, {len(distinct):>7} distinct tickers, tracker {trackerBytes(tracker) / 1024:7.0f} KB")
+    elapsed = time.perf_counter() - started
+    print(f"{args.mentions / elapsed:,.0f} mentions/s ({elapsed / args.mentions * 1e6:.1f} us each, counted per guild and overall)")
+
+    top = tracker.top(None, 10, 3, now)
+    truth = exact.most_common(10)
+    print(f"{'sketch':>18}  {'exact':>18}")
+    for (symbol, estimate), (trueSymbol, count) in zip(top, truth):
+        print(f"{symbol:>8} {estimate:>9}  {trueSymbol:>8} {count:>9}   overestimate {estimate - exact[symbol]}")
+    recall = len({symbol for symbol, _ in top} & {symbol for symbol, _ in truth}) / len(truth)
+    print(f"top 10 recall {recall:.0%}")
+    # how far off the estimates are further down, where they matter less
+    window = tracker.guilds[""].window(3, now)
+    for first, last in ((0, 10), (10, 50), (50, 200), (200, args.symbols)):
+        over = [(sum(bucket.sketch.estimate(symbol) for bucket in window) - exact[symbol], exact[symbol])
+                for symbol in real[first:last] if exact[symbol]]
+        if over:
+            worst, count = max(over)
+            print(f"ranks {first + 1}-{last}: worst overestimate {worst} on a true {count},"
+                  f" mean {sum(error for error, _ in over) / len(over):.1f}")
+
+
+if __name__ == "__main__":
+    main()
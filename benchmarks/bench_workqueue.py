@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# benchmarks/bench_workqueue.py
+""" Lookup wait times for quiet channels while one channel is raided, FIFO versus the fair queue.
+
+The raided channel posts --raid messages of 1-3 symbols from a small pump list within the first
+seconds; --quiet other channels each post one single symbol message every second. Workers take
+--latency seconds per symbol (the upstream fetch). With a plain FIFO every quiet lookup waits
+behind the whole raid; with workqueue.FairQueue it waits about one turn.
+
+    python benchmarks/bench_workqueue.py --raid 500 --quiet 5 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import workqueue  # noqa: E402
+
+PUMP = ["GME", "AMC", "BBBY", "KOSS", "NOK", "BB", "EXPR", "NAKD"]
+QUIET = ["AAPL", "MSFT", "SPY", "TSLA", "NVDA", "AMD", "QQQ", "META"]
+
+
+class FifoQueue:
+    """ what on_message amounted to before: every lookup in arrival order, nothing refused or merged """
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.waits = []
+        self.served = 0
+        self.collapsed = 0
+        self.shed = 0
+
+    def put(self, flow, user, symbols, payload=None):
+        self.queue.put_nowait(workqueue.Job(flow, user, symbols, payload))
+        return workqueue.QUEUED
+
+    async def get(self):
+        job = await self.queue.get()
+        job.wait = time.monotonic() - job.queued
+        return job
+
+    def done(self, job):
+        self.served += 1
+
+
+async def simulate(queue, args):
+    rnd = random.Random(7)
+    waits = {"raid": [], "quiet": []}
+    symbolsLookedUp = 0
+
+    async def worker():
+        nonlocal symbolsLookedUp
+        while True:
+            job = await queue.get()
+            waits["raid" if job.flow == "raid" else "quiet"].append(job.wait)
+            await asyncio.sleep(args.latency * len(job.symbols))
+            symbolsLookedUp += len(job.symbols)
+            queue.done(job)
+
+    async def raid():
+        for i in range(args.raid):
+            queue.put("raid", f"raider{rnd.randrange(50)}", rnd.sample(PUMP, rnd.randint(1, 3)))
+            await asyncio.sleep(args.raidSeconds / args.raid)
+
+    async def quiet(channel):
+        for second in range(args.seconds):
+            queue.put(f"quiet{channel}", f"user{channel}", [rnd.choice(QUIET)])
+            await asyncio.sleep(1)
+
+    workers = [asyncio.create_task(worker()) for _ in range(args.workers)]
+    started = time.monotonic()
+    await asyncio.gather(raid(), *(quiet(channel) for channel in range(args.quiet)))
+    # let whatever is still queued drain, bounded so the fifo run doesn't take forever
+    while (len(queue) if hasattr(queue, "size") else queue.queue.qsize()) and time.monotonic() - started < args.seconds * 3:
+        await asyncio.sleep(0.1)
+    for task in workers:
+        task.cancel()
+    return waits, symbolsLookedUp
+
+
+def report(name, queue, waits, symbols):
+    def percentile(values, fraction):
+        if not values:
+            return float("nan")
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    print(f"{name:>6}: quiet p50 {percentile(waits['quiet'], 0.5):6.2f}s p95 {percentile(waits['quiet'], 0.95):6.2f}s"
+          f" | raid p50 {percentile(waits['raid'], 0.5):6.2f}s | {queue.served} served, {queue.collapsed} collapsed,"
+          f" {queue.shed} shed, {symbols} symbols fetched")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--raid", type=int, default=500, help="messages in the raided channel")
+    parser.add_argument("--raid-seconds", dest="raidSeconds", type=float, default=5.0)
+    parser.add_argument("--quiet", type=int, default=5, help="other channels, one lookup a second each")
+    parser.add_argument("--seconds", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per symbol looked up")
+    args = parser.parse_args()
+
+    fifo = FifoQueue()
+    waits, symbols = asyncio.run(simulate(fifo, args))
+    report("fifo", fifo, waits, symbols)
+
+    async def fairRun():
+        # the semaphore inside belongs to the running loop
+        fair = workqueue.FairQueue()
+        return fair, await simulate(fair, args)
+    fair, (waits, symbols) = asyncio.run(fairRun())
+    report("fair", fair, waits, symbols)
+    stats = fair.stats()
+    print(f"fair queue peaked at {stats['maxDepth']} lookups")
+
+
+if __name__ == "__main__":
+    main()
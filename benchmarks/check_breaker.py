@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# benchmarks/check_breaker.py
+""" Check the circuit breaker's state transitions (breaker.py) and Deadline.timeout (deadline.py).
+
+Both run on a fake clock, so the checks take no time. Every check prints ok or raises
+AssertionError on the first difference.
+
+    python benchmarks/check_breaker.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import breaker  # noqa: E402
+import deadline as deadlines  # noqa: E402
+
+
+class FakeClock:
+    """ stands in for the time module of breaker.py and deadline.py """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+clock = FakeClock()
+breaker.time = clock
+deadlines.time = clock
+
+
+def newBreaker(**kwargs):
+    return breaker.CircuitBreaker("check", log=lambda line: None, **kwargs)
+
+
+def expectOpen(circuit, label):
+    try:
+        circuit.before()
+    except breaker.BreakerOpen:
+        return
+    raise AssertionError(f"{label}: the call was let through")
+
+
+def expectState(circuit, state, label):
+    if circuit.state != state:
+        raise AssertionError(f"{label}: {circuit.state}, expected {state}")
+
+
+def tripped(**kwargs):
+    """ a breaker opened by MIN_CALLS failures """
+    circuit = newBreaker(**kwargs)
+    for _ in range(breaker.MIN_CALLS):
+        circuit.record(False, 0.1, circuit.before())
+    expectState(circuit, breaker.OPEN, "after MIN_CALLS failures")
+    return circuit
+
+
+def checkOpensOnFailures():
+    circuit = newBreaker()
+    for _ in range(breaker.MIN_CALLS - 1):
+        circuit.record(False, 0.1, circuit.before())
+    expectState(circuit, breaker.CLOSED, "fewer failures than MIN_CALLS")
+    circuit.record(False, 0.1, circuit.before())
+    expectState(circuit, breaker.OPEN, "MIN_CALLS failures")
+    expectOpen(circuit, "open breaker")
+    if circuit.rejected != 1:
+        raise AssertionError(f"rejected {circuit.rejected}, expected 1")
+
+    # half the calls failing is the threshold, fewer keeps it closed
+    circuit = newBreaker()
+    for index in range(10):
+        circuit.record(index % 3 != 0, 0.1, circuit.before())
+    expectState(circuit, breaker.CLOSED, "a third of the calls failing")
+
+
+def checkOpensOnSlowCalls():
+    circuit = newBreaker()
+    for _ in range(breaker.MIN_CALLS):
+        circuit.record(True, breaker.SLOW_CALL + 1, circuit.before())
+    expectState(circuit, breaker.OPEN, "MIN_CALLS slow successes")
+
+
+def checkOldCallsAgeOut():
+    circuit = newBreaker()
+    for _ in range(breaker.MIN_CALLS - 1):
+        circuit.record(False, 0.1, circuit.before())
+    clock.advance(breaker.HORIZON + 1)
+    circuit.record(False, 0.1, circuit.before())
+    expectState(circuit, breaker.CLOSED, "failures older than HORIZON")
+
+
+def checkProbe():
+    circuit = tripped()
+    clock.advance(breaker.OPEN_SECONDS - 1)
+    expectOpen(circuit, "before OPEN_SECONDS")
+    clock.advance(1)
+    probe = circuit.before()
+    expectState(circuit, breaker.HALF_OPEN, "after OPEN_SECONDS")
+    expectOpen(circuit, "second call while the probe is out")
+    if circuit.retryAfter() != 1.0:
+        raise AssertionError(f"retryAfter {circuit.retryAfter()} while the probe is out")
+    circuit.record(True, 0.1, probe)
+    expectState(circuit, breaker.CLOSED, "fast probe success")
+    if circuit.rates(clock.monotonic())[2]:
+        raise AssertionError("the window kept the calls from before the breaker opened")
+
+    circuit = tripped()
+    clock.advance(breaker.OPEN_SECONDS)
+    circuit.record(False, 0.1, circuit.before())
+    expectState(circuit, breaker.OPEN, "failed probe")
+    expectOpen(circuit, "reopened breaker")
+
+    circuit = tripped()
+    clock.advance(breaker.OPEN_SECONDS)
+    circuit.record(True, breaker.SLOW_CALL + 1, circuit.before())
+    expectState(circuit, breaker.OPEN, "slow probe")
+
+
+def checkRelease():
+    circuit = tripped()
+    clock.advance(breaker.OPEN_SECONDS)
+    circuit.release(circuit.before())
+    expectState(circuit, breaker.HALF_OPEN, "released probe")
+    probe = circuit.before()
+    circuit.record(True, 0.1, probe)
+    expectState(circuit, breaker.CLOSED, "probe after a released one")
+
+
+def checkStaleOutcomes():
+    circuit = newBreaker()
+    straggler = circuit.before()
+    releasedStraggler = circuit.before()
+    for _ in range(breaker.MIN_CALLS):
+        circuit.record(False, 0.1, circuit.before())
+    clock.advance(breaker.OPEN_SECONDS)
+    probe = circuit.before()
+    # calls let through while the breaker was closed finish while the probe is out
+    circuit.record(True, 0.1, straggler)
+    expectState(circuit, breaker.HALF_OPEN, "success let through while closed")
+    circuit.release(releasedStraggler)
+    expectOpen(circuit, "probe slot after a stale release")
+    circuit.record(False, 0.1, probe)
+    expectState(circuit, breaker.OPEN, "the probe's failure")
+
+    # a probe that answers after the breaker moved on decides nothing either
+    clock.advance(breaker.OPEN_SECONDS)
+    probe = circuit.before()
+    circuit.record(True, 0.1, probe)
+    circuit.record(False, 0.1, probe)
+    expectState(circuit, breaker.CLOSED, "a probe's second outcome")
+
+
+def checkTimeout():
+    stats = deadlines.StageStats()
+    deadline = deadlines.Deadline("lookup", 10.0, stats)
+    if deadline.timeout(4.0) != 4.0:
+        raise AssertionError(f"timeout {deadline.timeout(4.0)} with 10s left, expected the 4s cap")
+    clock.advance(7.5)
+    if deadline.timeout(4.0) != 2.5:
+        raise AssertionError(f"timeout {deadline.timeout(4.0)} with 2.5s left, expected 2.5")
+    clock.advance(2.3)
+    if deadline.timeout(4.0) != deadlines.MIN_TIMEOUT:
+        raise AssertionError(f"timeout {deadline.timeout(4.0)} with 0.2s left, expected MIN_TIMEOUT")
+    clock.advance(0.2)
+    try:
+        deadline.timeout(4.0, "chart fetch")
+    except deadlines.DeadlineExceeded as e:
+        if e.stage != "chart fetch":
+            raise AssertionError(f"DeadlineExceeded for {e.stage}, expected chart fetch")
+    else:
+        raise AssertionError("an expired deadline gave a timeout")
+    if stats.cancelled[("lookup", "chart fetch")] != 1:
+        raise AssertionError("the expired fetch was not counted as cancelled")
+    if deadlines.Deadline("background", float("inf")).timeout(4.0) != 4.0:
+        raise AssertionError("an endless budget didn't give the cap")
+
+
+def main():
+    for check in (checkOpensOnFailures, checkOpensOnSlowCalls, checkOldCallsAgeOut, checkProbe, checkRelease,
+                  checkStaleOutcomes, checkTimeout):
+        check()
+        print(f"ok  {check.__name__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# benchmarks/check_indicators.py
+""" Check the streaming indicators (indicators.py) against the batch functions in charting.py.
+
+For every series the streaming state is run over all bars, seeded from the batch results part way
+(charting.indicatorState) and streamed over the rest, saved and restored through JSON along the
+way, and compared bar by bar with the batch values. A saved state advanced by
+charting.updateIndicatorState must end on the batch values of the last closed bar. EMA based values (MACD, RSI) must match exactly; rolling means may
+differ in the last bits because pandas keeps running sums.
+
+    python benchmarks/check_indicators.py
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+import charting  # noqa: E402
+import fakeupstream  # noqa: E402
+import indicators  # noqa: E402
+
+NAMES = ("ma", "macd", "signal", "histogram", "stochasticK", "stochasticD", "rsi")
+EXACT = ("macd", "signal", "histogram", "rsi")
+
+
+def batchValues(df):
+    closeData = df['Close']
+    macd, signal, histogram = charting.calcMACD(closeData, *charting.MACD_PERIODS)
+    stochasticKLine, stochasticDLine = charting.calcStochastics(df.copy(), *charting.STOCHASTIC_PERIODS)
+    return {"ma": closeData.rolling(charting.MA_PERIOD).mean(), "macd": macd, "signal": signal, "histogram": histogram,
+            "stochasticK": stochasticKLine, "stochasticD": stochasticDLine, "rsi": charting.calcRSI(closeData)}
+
+
+def compare(name, streamed, batch, label):
+    streamed = np.asarray(streamed, dtype=float)
+    batch = np.asarray(batch, dtype=float)
+    if name in EXACT:
+        same = np.array_equal(streamed, batch, equal_nan=True)
+    else:
+        same = np.array_equal(np.isnan(streamed), np.isnan(batch)) and np.allclose(streamed, batch, rtol=1e-9, atol=1e-9, equal_nan=True)
+    if not same:
+        bad = np.flatnonzero(~np.isclose(streamed, batch, rtol=1e-9, atol=1e-9, equal_nan=True))
+        raise AssertionError(f"{label} {name}: {len(bad)} bars differ, first at {bad[0]}: {streamed[bad[0]]} vs {batch[bad[0]]}")
+
+
+def streamValues(state, df, timestamps, start):
+    """ stream bars start.. through state, saving and restoring it every 500 bars """
+    values = {name: [] for name in NAMES}
+    highs, lows, closes = (df[column].to_numpy(dtype=float).tolist() for column in ("High", "Low", "Close"))
+    for index in range(start, len(df)):
+        if index % 500 == 0:
+            state = indicators.IndicatorSet.fromDict(json.loads(json.dumps(state.toDict())))
+        for name, value in state.update(timestamps[index], highs[index], lows[index], closes[index]).items():
+            values[name].append(value)
+    return values
+
+
+def checkSeries(symbol, intervalIn, rangeIn, nullBarRate):
+    data = fakeupstream.buildChart(symbol, intervalIn, rangeIn, nullBarRate)
+    timestamps = data["chart"]["result"][0]["timestamp"]
+    df = charting.chartFrame(data)
+    batch = batchValues(df)
+    label = f"{symbol} {intervalIn} {rangeIn} ({len(df)} bars, {nullBarRate:.0%} null)"
+
+    started = time.perf_counter()
+    streamed = streamValues(indicators.IndicatorSet(), df, timestamps, 0)
+    perBar = (time.perf_counter() - started) / len(df)
+    for name in NAMES:
+        compare(name, streamed[name], batch[name], label + " from the first bar")
+
+    # seed from the batch results part way through and stream the rest
+    for split in (1, 20, len(df) // 2, len(df) - 1):
+        state = charting.indicatorState(df.iloc[:split], timestamps)
+        streamed = streamValues(state, df, timestamps, split)
+        for name in NAMES:
+            compare(name, streamed[name], batch[name].iloc[split:], label + f" seeded at bar {split}")
+
+    # a saved state advanced by the bars it has not seen; the last bar is still forming at its own open
+    saved = json.loads(json.dumps(charting.indicatorState(df.iloc[:len(df) // 2], timestamps).toDict()))
+    for now, last in ((timestamps[-1] + 10 ** 9, len(df) - 1), (timestamps[-1], len(df) - 2)):
+        values = charting.updateIndicatorState(saved, df, timestamps, now).values()
+        for name in NAMES:
+            compare(name, [values[name]], batch[name].iloc[last:last + 1], label + f" updated to bar {last}")
+    return label, perBar
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symbols", nargs="+", default=["AAPL", "TSLA", "GME"])
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+    for symbol in args.symbols:
+        for intervalIn, rangeIn in (("1d", "3mo"), ("5m", "1mo"), ("1d", "max")):
+            for nullBarRate in (0.0, 0.02):
+                label, perBar = checkSeries(symbol, intervalIn, rangeIn, nullBarRate)
+                print(f"ok  {label}, {perBar * 1e6:.1f} us per streamed bar")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,68 @@
 #!/usr/bin/env python3
 # bot.py
 import os
-import discord
-from discord.ext import commands, tasks
-import http.client
+import sys
+if __name__ == "__main__":
+    # run as a script, restart as main.py before any setup: the worker processes run the main script
+    # again, and main.py only imports this module when it is the one being run
+    os.execv(sys.executable, [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")] + sys.argv[1:])
+import time
+startupClock = time.perf_counter()
+startupPhases = []
+
+def startupPhase(name):
+    """ record how long the startup phase that just finished took """
+    global startupClock
+    now = time.perf_counter()
+    startupPhases.append((name, now - startupClock))
+    startupClock = now
+
+import shutil
 import re
 import json
-from typing import List,Dict
 import math
 from sys import exit
-import schedule
-import time
 import datetime
-import pandas as pd
-import mplfinance as mpf
-import random
-import numpy as np
+import gc
 import configparser
+import asyncio
+import threading
+import concurrent.futures
+startupPhase("import standard library")
+import discord
+from discord.ext import commands, tasks
+startupPhase("import discord")
+import schedule
+startupPhase("import schedule")
+import symboltable
+import watch as watchboards
+import alerts
+import cache
+import ratelimit
+import scanner
+import leaderboard
+import trending
+import warmer
+import workqueue
+import recentreplies
+import deadline as deadlines
+import tracing
+import profiling
+import workerpool
+import backfill
+import core
+# the data and render core, shared with the stockbot.py command line
+from core import (cacheGet, cacheGetMany, cachePut, cachedSummary, refreshSummary, FUNDAMENTALSMAXAGE,
+                  upstreamBreakers, upstreamGet, revalidate, staleNote, QUOTEBATCHSIZE, fetchQuoteResults,
+                  tickFromQuote, priceFromQuote, refreshQuotes, DOLLAR_REGEX, find_symbols, rej_list, price_reply,
+                  fetchMovers, moverSymbols, get_movers, fetchChartData, CHARTRANGEDAYS, CHARTDEFAULTRANGE,
+                  parseChartArgs, cachedChart, chartsFolder)
+
+# pandas, numpy and mplfinance (with matplotlib) are most of the import time, the charting module
+# that needs them is loaded by loadChartStack() on the first !chart or in the background once connected
+charting = None
+backtester = None
+screener = None
 
 testing = True
 
@@ -26,8 +72,30 @@ help_text = """
     ! is the prefix for all bot commands.
     !movers
     !printrejected
-    !chart
-    !random
+    !startup
+    !upstream
+    !deadlines
+    !workers
+    !profile <command|price_reply|buildChart> [calls]   (admin)
+    !memory start|snapshot|stop   (admin)
+    !lag   (admin)
+    !backfill [days]|status|stop   (admin)
+    !backfill top [days]
+    !warm
+    !queue
+    !watch <symbols>
+    !unwatch
+    !alert $<symbol> above|below <price>
+    !alert list
+    !alert remove <id>
+    !chart $<symbol> [1m|5m|15m|1h|1d|1wk|1mo...] [1d|5d|1mo|3mo|1y|5y|max...]
+    !backtest $<symbol> [1y|2y|5y|10y|max]
+    !signals [buy|sell] [overbought|oversold] [sector:<name>] [nano|micro|small|mid|large|mega]
+    !signals status
+    !top <roic|roa|roe|pe|fpe|peg|pb|ps|evebitda> [asc|desc] [sector:<name>] [nano...mega] [count]
+    !rand [sector] [nano|micro|small|mid|large|mega]
+    !trending [1h|3h|6h|12h|24h]
+    !screen sector=Technology mcap>10B volume>1M sort=-pctchange limit=20
     !help
     !whalealert get
     !whalealert set <value>
@@ -42,7 +110,42 @@ help_text = """
 WHALEALERTLIMIT = 100000000
 WHALEALERTAPIKEY = None
 WHALEALERTCHANNEL = None
-configParser = configparser.RawConfigParser()   
+# seconds between the batched quote polls that drive watch boards and price alerts
+POLLINTERVAL = 15
+# symbols per minute whose fundamentals the !top leaderboard refreshes once they expire from the cache,
+# 0 turns the refresh off, and the get-summary calls it may make per market day
+FUNDAMENTALSBATCH = 20
+FUNDAMENTALSDAILY = 2000
+# nightly !signals scan of the whole stock list, results in their own sqlite file
+SIGNALSPATH = "signals.db"
+SCANTIME = "01:30"
+SCANRATE = 5.0
+# $SYMBOL mentions per channel, day and symbol counted from channel history by !backfill
+MENTIONSPATH = "mentions.db"
+# upstream calls the cache warmer may spend per market day, symbols it warms before the open and how early
+WARMQUOTA = 300
+WARMTOP = 25
+WARMCHARTS = 10
+WARMLEAD = 20
+# $SYMBOL lookups run on a fixed pool of workers behind a bounded queue that is fair across channels
+LOOKUPWORKERS = 4
+LOOKUPQUEUESIZE = 200
+# processes the lookups and charts run in, 0 runs them on this process's executor threads
+WORKERPROCESSES = 0
+# a symbol asked again in a channel within this many seconds is answered from the reply already there,
+# with a link to it ("link") or by editing it with fresh data ("edit")
+REPLYWINDOW = 30
+REPLYREUSE = "link"
+# latency budget in seconds per command, from the message arriving to the reply being sent
+COMMANDBUDGETS = {"lookup": 8.0, "chart": 20.0, "movers": 8.0, "rand": 8.0, "background": 30.0}
+# share of messages whose trace is written to TRACEPATH, traces slower than TRACESLOW seconds always are
+TRACEPATH = "traces.jsonl"
+TRACESAMPLE = 0.05
+TRACESLOW = 5.0
+# discord user ids allowed to use the profiling commands besides the bot's owner, and where their output goes
+ADMINUSERS = set()
+PROFILEFOLDER = "profiles"
+configParser = configparser.RawConfigParser(inline_comment_prefixes=("#",))   
 try:
     configFilePath = r'stockbot.cfg'
     configParser.read(configFilePath)
@@ -51,26 +154,69 @@ try:
     else:
         print("Could not open/read token file.")
         exit()
-    if configParser.has_option('rapid-api', 'key'):
-        RAPIDAPIKEY = configParser.get('rapid-api', 'key')
-    else:
+    if not configParser.has_option('rapid-api', 'key'):
         print("Could not open/read Raid API key file.")
         exit()
+    # rapid api key, stand-in upstream, upstream timeout and cache settings
+    core.readConfig(configParser)
     if configParser.has_option('whale-alert', 'key'):
         WHALEALERTAPIKEY = configParser.get('whale-alert', 'key')
     if configParser.has_option('whale-alert', 'channel'):
         WHALEALERTCHANNEL = configParser.get('whale-alert', 'channel')
     if configParser.has_option('whale-alert', 'limit'):
         WHALEALERTLIMIT = int(configParser.get('whale-alert', 'limit'))
+    if configParser.has_option('watch', 'interval'):
+        POLLINTERVAL = max(5, int(configParser.get('watch', 'interval')))
+    if configParser.has_option('leaderboard', 'batch'):
+        FUNDAMENTALSBATCH = max(0, int(configParser.get('leaderboard', 'batch')))
+    if configParser.has_option('leaderboard', 'daily'):
+        FUNDAMENTALSDAILY = max(0, int(configParser.get('leaderboard', 'daily')))
+    if configParser.has_option('scan', 'path'):
+        SIGNALSPATH = configParser.get('scan', 'path')
+    if configParser.has_option('backfill', 'path'):
+        MENTIONSPATH = configParser.get('backfill', 'path')
+    if configParser.has_option('scan', 'time'):
+        SCANTIME = configParser.get('scan', 'time')
+    if configParser.has_option('scan', 'rate'):
+        SCANRATE = float(configParser.get('scan', 'rate'))
+    if configParser.has_option('warm', 'quota'):
+        WARMQUOTA = int(configParser.get('warm', 'quota'))
+    if configParser.has_option('warm', 'top'):
+        WARMTOP = int(configParser.get('warm', 'top'))
+    if configParser.has_option('warm', 'charts'):
+        WARMCHARTS = int(configParser.get('warm', 'charts'))
+    if configParser.has_option('warm', 'lead'):
+        WARMLEAD = int(configParser.get('warm', 'lead'))
+    if configParser.has_option('queue', 'workers'):
+        LOOKUPWORKERS = max(1, int(configParser.get('queue', 'workers')))
+    if configParser.has_option('queue', 'size'):
+        LOOKUPQUEUESIZE = int(configParser.get('queue', 'size'))
+    if configParser.has_option('workers', 'processes'):
+        WORKERPROCESSES = max(0, int(configParser.get('workers', 'processes')))
+    if configParser.has_option('replies', 'window'):
+        REPLYWINDOW = int(configParser.get('replies', 'window'))
+    if configParser.has_option('replies', 'reuse'):
+        REPLYREUSE = configParser.get('replies', 'reuse').strip().lower()
+    for command in COMMANDBUDGETS:
+        if configParser.has_option('deadlines', command):
+            COMMANDBUDGETS[command] = float(configParser.get('deadlines', command))
+    if configParser.has_option('tracing', 'path'):
+        TRACEPATH = configParser.get('tracing', 'path').strip()
+    if configParser.has_option('tracing', 'sample'):
+        TRACESAMPLE = float(configParser.get('tracing', 'sample'))
+    if configParser.has_option('tracing', 'slow'):
+        TRACESLOW = float(configParser.get('tracing', 'slow'))
+    if configParser.has_option('admin', 'users'):
+        ADMINUSERS = {int(user) for user in configParser.get('admin', 'users').replace(",", " ").split()}
+    if configParser.has_option('profiling', 'folder'):
+        PROFILEFOLDER = configParser.get('profiling', 'folder')
 except OSError:
     print("Could not open/read Whale alert API key file. Whale Alert functionality disable.")
+startupPhase("read config")
 
-
-# headers used for all rapid api yahoo finance connection requests
-headers = {
-    'x-rapidapi-key': RAPIDAPIKEY,
-    'x-rapidapi-host': "apidojo-yahoo-finance-v1.p.rapidapi.com"
-}
+# quotes, fundamentals, chart metadata and checkpoints live in a cache shared by restarts and sibling processes
+core.openCache()
+startupPhase("open cache")
 
 waHeaders = {
     'x-wa-api-key': WHALEALERTAPIKEY,
@@ -78,811 +224,88 @@ waHeaders = {
 }
 
 # create folders for stored images
-chartsFolder = r'charts' 
-if not os.path.exists(chartsFolder):
-    os.makedirs(chartsFolder)
+core.makeChartsFolder()
 
 imagesFolder = r'images' 
 if not os.path.exists(imagesFolder):
     os.makedirs(imagesFolder)
+startupPhase("create folders")
 
 # Load list of stock symbols used for !rand command
 # file generated here : https://www.nasdaq.com/market-activity/stocks/screener
 stockListFileName = 'nasdaq_screener.csv'
+
 try:
-    stocks = pd.read_csv('nasdaq_screener.csv', index_col=0)
-    stockListLen = len(stocks.index)
+    # compact symbol table, parsed from the csv once and memory mapped from its .symtab cache after that
+    stocks = symboltable.load(stockListFileName)
+    stockListLen = len(stocks)
 except:
+    stocks = None
     stockListLen = 0
     print("Could not open/read stock list csv file.")
+# metric columns for !top over the same symbols, filled from the cache in the background once connected
+fundamentalsBoard = leaderboard.Leaderboard(scanner.tableRows(stocks) if stockListLen else [])
+core.hooks["summary"].append(lambda symbol, jsonData: fundamentalsBoard.update(symbol, leaderboard.summaryMetrics(jsonData), time.time()))
+startupPhase("load stock list")
 
-def fetchSymbolData(symbol):
-    """ make a stock symbol query request to yahoo finance and return entire contents of message returned """
-    conn = http.client.HTTPSConnection("apidojo-yahoo-finance-v1.p.rapidapi.com")
-    url = f"/stock/v2/get-summary?symbol={symbol}&region=US"
-    message = None
-    try:
-        conn.request("GET", url, headers=headers)
-        res = conn.getresponse()
-    except:
-        message = f"An error occured trying to retrive information for ${symbol}. Could not get a response from the remote server."
-        return None
-  
-    if(res.code == 200):
-        return message,res.read()
-    else:
-        message = f"An error occured trying to retrive information for ${symbol}. Error code:{res.code}. Reason:{res.reason}"
-        return message,None
-
-def find_symbols(text: str) -> List[str]:
-    """ find all potential stock symbols starting with $ as a list."""
-    SYMBOL_REGEX = "[$]([a-zA-Z0-9.=-]{1,9})"
-    return list(set(re.findall(SYMBOL_REGEX, text)))
-
-def Do_Fund_Reply(jsonData: dict):
-    """ formulate a reply specifically for an Mutual Fund quote type """
-    return Do_ETF_Reply(jsonData)
-
-#return ROIC for ticker as long as there is a date
-def roic_per_year(jsonData):
-    income_statement = jsonData["incomeStatementHistory"]["incomeStatementHistory"]
-    balance_sheet = jsonData["balanceSheetHistory"]["balanceSheetStatements"]
-
-    financial_data = {}
-    roic_per_year = []
-
-    for item in income_statement:
-        date = item["endDate"]["fmt"]
-        if not date:
-            continue
-        ebit = item["ebit"]["raw"]
-        effective_tax_rate = item["incomeTaxExpense"]["raw"] / item["incomeBeforeTax"]["raw"]
-        no_pat = ebit * (1 - effective_tax_rate)
-        financial_data[date] = {"no_pat": no_pat}
-
-    for item in balance_sheet:
-        date = item["endDate"]["fmt"]
-        if not date:
-            continue
-        invested_capital = (item["totalLiab"]["raw"] + item["totalStockholderEquity"]["raw"]) - item["totalCurrentLiabilities"]["raw"]
-        financial_data[date].update({"invested_capital": invested_capital})
-
-    for date, values in financial_data.items():
-            roic_percent = (values["no_pat"] / values["invested_capital"])
-            roic_per_year.append(roic_percent)
-    
-    return roic_per_year
-
-#calc last 3 year avg ROIC
-def avg_roic(roic_list):
-    if len(roic_list) >= 3:
-        last_3_years_roic = roic_list[-3:]
-        avg_roic_3_years = sum(last_3_years_roic) / len(last_3_years_roic)
-        return avg_roic_3_years
-    else:
-        print("Not enough data to calculate 3-year average ROIC.")
-
-def Do_Equity_Reply(jsonData):
-    """ formulate a reply specifically for an equity quote type """
-    try:
-        quoteType = jsonData["quoteType"]["quoteType"]
-        symbol = jsonData["quoteType"]["symbol"]
-        marketState = jsonData["price"]["marketState"]
-        price = jsonData["price"]["regularMarketPrice"]["fmt"]
-        currency = jsonData["price"]["currency"]
-        currencySymbol = jsonData["price"]["currencySymbol"]
-        exchange = jsonData["price"]["exchangeName"]
-        quoteSourceName = jsonData["price"]["quoteSourceName"]
-        try:
-            shortName = jsonData["quoteType"]["shortName"]
-        except:
-            shortName = symbol
-        try:
-            longName = jsonData["quoteType"]["longName"]
-        except:
-            longName = shortName
-        print("Equity Reply: ",longName, price)
-        try:
-            preMarketPrice = jsonData["price"]["preMarketPrice"]["fmt"]
-            preMarketChangeRaw = jsonData["price"]["preMarketChange"]["raw"]
-            preMarketChange = jsonData["price"]["preMarketChange"]["fmt"]
-            preMarketChangePct = jsonData["price"]["preMarketChangePercent"]["fmt"]
-            preMarketGain = False
-            if preMarketChangeRaw >= 0:
-                preMarketChange = "+" + preMarketChange
-                preMarketChangePct = "+" + preMarketChangePct
-                preMarketGain = True
-        except:
-            preMarketPrice = price
-            preMarketChange = "N/A"
-            preMarketChangePct = "N/A"
-        try:
-            postMarketPrice = jsonData["price"]["postMarketPrice"]["fmt"]
-            postMarketChangeRaw = jsonData["price"]["postMarketChange"]["raw"]
-            postMarketChange = jsonData["price"]["postMarketChange"]["fmt"]
-            postMarketChangePct = jsonData["price"]["postMarketChangePercent"]["fmt"]
-            postMarketGain = False
-            if postMarketChangeRaw >= 0:
-                postMarketChange = "+" + postMarketChange
-                postMarketChangePct = "+" + postMarketChangePct
-                postMarketGain = True
-
-        except:
-            postMarketPrice = price
-            postMarketChange = "N/A"
-            postMarketChangePct = "N/A"
-        try:
-            industry = jsonData["summaryProfile"]["industry"]
-            sector = jsonData["summaryProfile"]["sector"]
-        except:
-            industry = "N/A"
-            sector = "N/A"
-        try:
-            regularMarketDayLow = jsonData["price"]["regularMarketDayLow"]["fmt"]
-            regularMarketDayHigh = jsonData["price"]["regularMarketDayHigh"]["fmt"]
-            regMktDayRng = str(regularMarketDayLow) + \
-                                " - " + str(regularMarketDayHigh)
-            regularMarketDayChange = jsonData["price"]["regularMarketChange"]["fmt"]
-            regularMarketDayChangeRaw = jsonData["price"]["regularMarketChange"]["raw"]
-            regularMarketDayChangePct = jsonData["price"]["regularMarketChangePercent"]["fmt"]
-            regularMarketDayChangePctRaw = jsonData["price"]["regularMarketChangePercent"]["raw"]
-            regularMarketDayGain = False
-            if regularMarketDayChangeRaw >= 0:
-                regularMarketDayChange = "+" + regularMarketDayChange
-                regularMarketDayChangePct = "+" + regularMarketDayChangePct
-                regularMarketDayGain = True
-        except:
-            regMktDayRng = "N/A"
-            regularMarketDayChange = "N/A"
-            regularMarketDayChangePct = "N/A"
-
-        try:
-            fiftyTwoWeekLow = jsonData["summaryDetail"]["fiftyTwoWeekLow"]["fmt"]
-            fiftyTwoWeekHigh = jsonData["summaryDetail"]["fiftyTwoWeekHigh"]["fmt"]
-            fiftyTwoWeekRange = str(
-                fiftyTwoWeekLow) + " - " + str(fiftyTwoWeekHigh)
-        except:
-            fiftyTwoWeekRange = "N/A"
-        try:
-            twoHundredDayAvg = jsonData["summaryDetail"]["twoHundredDayAverage"]["fmt"]
-            fiftyDayAvg = jsonData["summaryDetail"]["fiftyDayAverage"]["fmt"]
-        except:
-            twoHundredDayAvg = "N/A"
-            fiftyDayAvg = "N/A"
-        try:
-            enterpriseToEbitda = jsonData["defaultKeyStatistics"]["enterpriseToEbitda"]["fmt"]
-        except:
-            enterpriseToEbitda = "N/A"
-        try:
-            marketCap = jsonData["price"]["marketCap"]["fmt"]
-        except:
-            marketCap = "N/A"
-        try:
-            trailingPERaw = jsonData["summaryDetail"]["trailingPE"]["raw"]
-            trailingPEFmt = jsonData["summaryDetail"]["trailingPE"]["fmt"]
-            if 0 <= trailingPERaw <= 15:
-                peColor = ':green_circle:'
-            elif trailingPERaw < 0 or trailingPERaw > 50:
-                peColor = ':red_circle:'
-            else:
-                peColor = ':yellow_circle:'
-            trailingPE = trailingPEFmt + peColor
-        except:
-            trailingPE = "N/A"
-        #adding FwdPE
-        try:
-            FwdPERaw = jsonData["defaultKeyStatistics"]["forwardPE"]['raw']
-            FwdPEFmt = jsonData["defaultKeyStatistics"]["forwardPE"]['fmt']
-            if 0 <= FwdPERaw <= 15:
-                peColor = ':green_circle:'
-            elif FwdPERaw < 0 or FwdPERaw > 50:
-                peColor = ':red_circle:'
-            else:
-                peColor = ':yellow_circle:'
-            FwdPE = FwdPEFmt + peColor
-        except:
-            FwdPE = "N/A"
-        try:
-            pegRatioRaw = jsonData["defaultKeyStatistics"]["pegRatio"]["raw"]
-            pegRatioFmt = jsonData["defaultKeyStatistics"]["pegRatio"]["fmt"]
-            if 0 <= pegRatioRaw <= 1:
-                pegColor = ':green_circle:'
-            elif pegRatioRaw < 0 or pegRatioRaw > 2:
-                    pegColor = ':red_circle:'
-            else:
-                pegColor = ':yellow_circle:'
-            pegRatio = pegRatioFmt + pegColor
-        except:
-            pegRatio = "N/A"
-        try:
-            priceToBookRaw = jsonData["defaultKeyStatistics"]["priceToBook"]["raw"]
-            priceToBookFmt = jsonData["defaultKeyStatistics"]["priceToBook"]["fmt"]
-            if 0 <= priceToBookRaw <= 2:
-                priceToBookColor = ':green_circle:'
-            elif priceToBookRaw < 0 or priceToBookRaw > 5:
-                priceToBookColor = ':red_circle:'
-            else:
-                priceToBookColor = ':yellow_circle:'
-            priceToBook = priceToBookFmt + priceToBookColor
-        except:
-            priceToBook = "N/A"
-        try:
-            priceToSalesRaw = jsonData["summaryDetail"]["priceToSalesTrailing12Months"]["raw"]
-            priceToSalesFmt = jsonData["summaryDetail"]["priceToSalesTrailing12Months"]["fmt"]
-            if 0 <= priceToSalesRaw <= 2:
-                priceToSalesColor = ':green_circle:'
-            elif priceToSalesRaw < 0 or priceToSalesRaw > 10:
-                priceToSalesColor = ':red_circle:'
-            else:
-                priceToSalesColor = ':yellow_circle:'
-            priceToSales = priceToSalesFmt + priceToSalesColor
-        except:
-            priceToSales = "N/A"
-        try:
-            dividendRate = jsonData["summaryDetail"]["dividendRate"]["fmt"]
-            dividendYield = jsonData["summaryDetail"]["dividendYield"]["fmt"]
-        except:
-            dividendRate = "N/A"
-            dividendYield = "N/A"
-        try:
-            beta = jsonData["summaryDetail"]["beta"]["fmt"]
-        except:
-            beta = "N/A"
-
-        insiderPurchases = "N/A"
-        try:
-            buyInfoShares = jsonData["netSharePurchaseActivity"]["buyInfoShares"]["fmt"]
-        except:
-            buyInfoShares = "N/A"
-        try:
-            buyInfoCount = jsonData["netSharePurchaseActivity"]["buyInfoCount"]["fmt"]
-        except:
-            buyInfoCount = "N/A"
-        try:
-            sellInfoShares = jsonData["netSharePurchaseActivity"]["sellInfoShares"]["fmt"]
-        except:
-            sellInfoShares = "N/A"
-        try:
-            sellInfoCount = jsonData["netSharePurchaseActivity"]["sellInfoCount"]["fmt"]
-        except:
-            sellInfoCount = "N/A"
-        try:
-            insiderPercentHeld = jsonData["majorHoldersBreakdown"]["insidersPercentHeld"]["fmt"]
-        except:
-            insiderPercentHeld = "N/A"
-        try:
-            institutionPercentHeld = jsonData["majorHoldersBreakdown"]["institutionsPercentHeld"]["fmt"]
-        except:
-            institutionPercentHeld = "N/A"
-        try:
-            shortPercentOfFloat = jsonData["defaultKeyStatistics"]["shortPercentOfFloat"]["fmt"]
-        except:
-            shortPercentOfFloat = "N/A"
+chartStackLock = threading.Lock()
 
-        try:
-            returnOnAssetsFmt = jsonData["financialData"]["returnOnAssets"]["fmt"]
-            returnOnAssetsRaw = jsonData["financialData"]["returnOnAssets"]["raw"]
-            if returnOnAssetsRaw >= 0.15:
-                returnOnAssetsColor = ':green_circle:'
-            elif returnOnAssetsRaw < 0:
-                returnOnAssetsColor = ':red_circle:'
-            else:
-                returnOnAssetsColor = ':yellow_circle:'
-            returnOnAssets = returnOnAssetsFmt + returnOnAssetsColor
-        except:
-            returnOnAssets = "N/A"
-        try:
-            returnOnEquityFmt = jsonData["financialData"]["returnOnEquity"]["fmt"]
-            returnOnEquityRaw = jsonData["financialData"]["returnOnEquity"]["raw"]
-            if returnOnEquityRaw >= 0.30:
-                returnOnEquityColor = ':green_circle:'
-            elif returnOnEquityRaw < 0:
-                returnOnEquityColor = ':red_circle:'
-            else:
-                returnOnEquityColor = ':yellow_circle:'
-            returnOnEquity = returnOnEquityFmt + returnOnEquityColor
-        except:
-            returnOnEquity = "N/A"
-        
-        #adding 3 yr Avg ROIC
-        try:
-            returnOnInvestedCapital_by_year = roic_per_year(jsonData)
-            avg_roic = avg_roic(returnOnInvestedCapital_by_year)
-            if avg_roic >= 0.10:
-                returnOnInvestedCapitalColor = ':green_circle:'
-            elif avg_roic < 0:
-                returnOnInvestedCapitalColor = ':red_circle:'
-            else:
-                returnOnInvestedCapitalColor = ':yellow_circle:'
-            avg_roic_str = "{:.2%}".format(avg_roic) + returnOnInvestedCapitalColor
-        except:
-            avg_roic_str = "N/A"
-            
-        try:
-            revenueGrowthFmt = jsonData["financialData"]["revenueGrowth"]["fmt"]
-            revenueGrowthRaw = jsonData["financialData"]["revenueGrowth"]["raw"]   
-            revenueGrowth = revenueGrowthFmt
-        except:
-            revenueGrowth = "N/A"
-        
-        try:
-            freeCashFlowFmt = jsonData["financialData"]["freeCashflow"]["fmt"]
-            freeCashFlowRaw = jsonData["financialData"]["freeCashflow"]["raw"]
-            freeCashFlow = freeCashFlowFmt
-        except:
-            freeCashFlow = "N/A"
-
-        insiderPurchases = (f"Purchases: {buyInfoShares} shares in {buyInfoCount} transactions.\r\n" +
-                            f"Sales: {sellInfoShares} shares in {sellInfoCount} transactions.")
-                        
-        insiderSymbol = symbol.replace('-','')
-        insiderHolding = (f"% Held by Insiders: {insiderPercentHeld}.\r\n" +
-                            f"% Held by Institutions: {institutionPercentHeld}.\r\n" +
-                            f"Short % of Float: {shortPercentOfFloat}.\r\n"
-                            f"http://www.openinsider.com/{insiderSymbol}")
-
-        emojiIndicator = ""
-        try:
-            if regularMarketDayChangePctRaw > 0.05:
-                emojiIndicator = ":rocket:"
-            if regularMarketDayChangePctRaw > 0.25:
-                emojiIndicator += ":full_moon:"
-            if regularMarketDayChangePctRaw < -0.05:
-                emojiIndicator = ":skull:"
-            if regularMarketDayChangePctRaw < -0.25:
-                emojiIndicator += ":skull:"
-        except:
-            emojiIndicator = ""
-
-        description = f"**{currencySymbol}{price}** ({regularMarketDayChange},{regularMarketDayChangePct}) {emojiIndicator}"
-        if marketState == "POST":
-            description += f"\n*Post-market: {currencySymbol}{postMarketPrice} ({postMarketChange},{postMarketChangePct})*"
-        elif marketState == "PRE":
-            description += f"\n*Pre-market: {currencySymbol}{preMarketPrice} ({preMarketChange},{preMarketChangePct})*"
-        description += f"\nExchange: {exchange}\nCurrency: {currency}\nQuote Source: {quoteSourceName}"
-
-        message = discord.Embed(title=str(longName).upper() + f" ({symbol})", url=f"https://finance.yahoo.com/quote/{symbol}",
-                                description=description,
-                                color=0xFF5733)
-        message.add_field(name="Quote Type",
-                            value=quoteType, inline=True)
-        if industry != "N/A":
-            message.add_field(name="Industry", value=industry, inline=True)
-        if sector != "N/A":
-            message.add_field(name="Sector", value=sector, inline=True)
-        if marketCap != "N/A":
-            message.add_field(name="Market Cap", value=marketCap, inline=True)
-        if regMktDayRng != "N/A":
-            message.add_field(name="Regular Market Day Range", value=regMktDayRng, inline=True)
-        if fiftyTwoWeekRange != "N/A":
-            message.add_field(name="Last 52 Week Range", value=fiftyTwoWeekRange, inline=True)
-        if trailingPE != "N/A":
-            message.add_field(name="PE Ratio (ttm)", value=trailingPE, inline=True)
-        #add FwdPEfield
-        if FwdPE != "N/A":
-            message.add_field(name="PE Ratio (Fwd)", value=FwdPE, inline=True)
-        if pegRatio != "N/A":
-            message.add_field(name="PEG Ratio", value=pegRatio, inline=True)
-        if priceToBook != "N/A":
-            message.add_field(name="Price to Book", value=priceToBook, inline=True)
-        if priceToSales != "N/A":
-            message.add_field(name="Price to Sales", value=priceToSales, inline=True)
-        if enterpriseToEbitda != "N/A":
-            message.add_field(name="EV/EBITDA", value=enterpriseToEbitda, inline=True)
-        if returnOnAssets != "N/A":
-            message.add_field(name="Return on Assets (ttm)", value=returnOnAssets, inline=True)
-        if returnOnEquity != "N/A":
-            message.add_field(name="Return on Equity (ttm)", value=returnOnEquity, inline=True)
-        if avg_roic_str != "N/A":
-            message.add_field(name="Return on Invested Captial (3 YR AVG.)", value=avg_roic_str, inline=True)
-        if revenueGrowth != "N/A":
-            message.add_field(name="Quarterly Revenue Growth (yoy)", value=revenueGrowth, inline=True)
-        if freeCashFlow != "N/A":
-            message.add_field(name="Levered Free Cash Flow (ttm)", value=f"{currencySymbol}{freeCashFlow}", inline=True)
-        if beta != "N/A":
-            message.add_field(name="beta", value=beta, inline=True)
-        if twoHundredDayAvg != "N/A":
-            message.add_field(name="200 Day Avg.", value=f"{currencySymbol}{twoHundredDayAvg}", inline=True)
-        if fiftyDayAvg != "N/A":
-            message.add_field(name="50 Day Avg.", value=f"{currencySymbol}{fiftyDayAvg}", inline=True)
-
-        if quoteType != "CURRENCY" and quoteType != "CRYPTOCURRENCY":
-            rateAndYield = str(dividendRate) + \
-                                " (" + str(dividendYield) + ")"
-            message.add_field(name="Dividend Rate and Yield",
-                                value=rateAndYield, inline=True)
-
-            message.add_field(name="Share Statistics",
-                                value=insiderHolding, inline=False)
-            linkSymbol = symbol.replace('-','.')
-            message.add_field(name="ROIC.AI Summary and Financials.",
-                                value=f"https://roic.ai/company/{linkSymbol}", inline=False)
-    except:
-        message = f"Could not find information for ${symbol}. Perhaps it is not an EQUITY or maybe I'm parsing the data poorly...."
-    
-    return message
-
-def Do_ETF_Reply(jsonData: dict):
-    """ formulate a reply specifically for an ETF quote type """
-    try:
-        quoteType = jsonData["quoteType"]["quoteType"]
-        symbol = jsonData["quoteType"]["symbol"]
-        marketState = jsonData["price"]["marketState"]
-        price = jsonData["price"]["regularMarketPrice"]["fmt"]
-        currency = jsonData["price"]["currency"]
-        currencySymbol = jsonData["price"]["currencySymbol"]
-        exchange = jsonData["price"]["exchangeName"]
-        quoteSourceName = jsonData["price"]["quoteSourceName"]
-
-        try:
-            shortName = jsonData["quoteType"]["shortName"]
-        except:
-            shortName = symbol
-        try:
-            longName = jsonData["quoteType"]["longName"]
-        except:
-            longName = shortName
-        print("ETF Reply: ",longName, price)
-        try:
-            preMarketPrice = jsonData["price"]["preMarketPrice"]["fmt"]
-            preMarketChangeRaw = jsonData["price"]["preMarketChange"]["raw"]
-            preMarketChange = jsonData["price"]["preMarketChange"]["fmt"]
-            preMarketChangePct = jsonData["price"]["preMarketChangePercent"]["fmt"]
-            preMarketGain = False
-            if preMarketChangeRaw >= 0:
-                preMarketChange = "+" + preMarketChange
-                preMarketChangePct = "+" + preMarketChangePct
-                preMarketGain = True
-        except:
-            preMarketPrice = price
-            preMarketChange = "N/A"
-            preMarketChangePct = "N/A"
-        try:
-            postMarketPrice = jsonData["price"]["postMarketPrice"]["fmt"]
-            postMarketChangeRaw = jsonData["price"]["postMarketChange"]["raw"]
-            postMarketChange = jsonData["price"]["postMarketChange"]["fmt"]
-            postMarketChangePct = jsonData["price"]["postMarketChangePercent"]["fmt"]
-            postMarketGain = False
-            if postMarketChangeRaw >= 0:
-                postMarketChange = "+" + postMarketChange
-                postMarketChangePct = "+" + postMarketChangePct
-                postMarketGain = True
-        except:
-            postMarketPrice = price
-            postMarketChange = "N/A"
-            postMarketChangePct = "N/A"
-
-        try:
-            regularMarketDayLow = jsonData["price"]["regularMarketDayLow"]["fmt"]
-            regularMarketDayHigh = jsonData["price"]["regularMarketDayHigh"]["fmt"]
-            regMktDayRng = str(regularMarketDayLow) + \
-                                " - " + str(regularMarketDayHigh)
-            regularMarketDayChange = jsonData["price"]["regularMarketChange"]["fmt"]
-            regularMarketDayChangeRaw = jsonData["price"]["regularMarketChange"]["raw"]
-            regularMarketDayChangePct = jsonData["price"]["regularMarketChangePercent"]["fmt"]
-            regularMarketDayChangePctRaw = jsonData["price"]["regularMarketChangePercent"]["raw"]
-            regularMarketDayGain = False
-            if regularMarketDayChangeRaw >= 0:
-                regularMarketDayChange = "+" + regularMarketDayChange
-                regularMarketDayChangePct = "+" + regularMarketDayChangePct
-                regularMarketDayGain = True
-        except:
-            regMktDayRng = "N/A"
-            regularMarketDayChange = "N/A"
-            regularMarketDayChangePct = "N/A"
-
-        try:
-            fiftyTwoWeekLow = jsonData["summaryDetail"]["fiftyTwoWeekLow"]["fmt"]
-            fiftyTwoWeekHigh = jsonData["summaryDetail"]["fiftyTwoWeekHigh"]["fmt"]
-            fiftyTwoWeekRange = str(
-                fiftyTwoWeekLow) + " - " + str(fiftyTwoWeekHigh)
-        except:
-            fiftyTwoWeekRange = "N/A"
-        try:
-            twoHundredDayAvg = jsonData["summaryDetail"]["twoHundredDayAverage"]["fmt"]
-            fiftyDayAvg = jsonData["summaryDetail"]["fiftyDayAverage"]["fmt"]
-        except:
-            twoHundredDayAvg = "N/A"
-            fiftyDayAvg = "N/A"
-
-        try:
-            marketCap = jsonData["price"]["marketCap"]["fmt"]
-        except:
-            marketCap = "N/A"
-
-        try:
-            beta = jsonData["defaultKeyStatistics"]["beta3Year"]["fmt"]
-        except:
-            beta = "N/A"
-        try:
-            fundInceptionDate = jsonData["defaultKeyStatistics"]["fundInceptionDate"]["fmt"]
-        except:
-            fundInceptionDate = "N/A"
-        try:
-            fundFamily = jsonData["fundProfile"]["family"]
-        except:
-            fundFamily = "N/A"
-        try:
-            totalAssets = jsonData["defaultKeyStatistics"]["totalAssets"]["fmt"]
-        except:
-            totalAssets = "N/A"
-        try:
-            fundYield = jsonData["summaryDetail"]["yield"]["fmt"]
-        except:
-            fundYield = "N/A"
-        try:
-            ytdReturn = "N/A"
-            if jsonData["fundPerformance"]["trailingReturns"]["ytd"]["raw"]:
-                ytdReturn = jsonData["fundPerformance"]["trailingReturns"]["ytd"]["fmt"]
-        except:
-            ytdReturn = "N/A"
-        try:
-            oneYearAverageReturn = "N/A"
-            if jsonData["fundPerformance"]["trailingReturns"]["oneYear"]["raw"]:
-                oneYearAverageReturn = jsonData["fundPerformance"]["trailingReturns"]["oneYear"]["fmt"]
-        except:
-            oneYearAverageReturn = "N/A"
-        try:
-            threeYearAverageReturn = "N/A"
-            if jsonData["fundPerformance"]["trailingReturns"]["threeYear"]["raw"]:
-                threeYearAverageReturn = jsonData["fundPerformance"]["trailingReturns"]["threeYear"]["fmt"]
-        except:
-            threeYearAverageReturn = "N/A"
-        try:
-            fiveYearAverageReturn = "N/A"
-            if jsonData["fundPerformance"]["trailingReturns"]["fiveYear"]["raw"]:
-                fiveYearAverageReturn = jsonData["fundPerformance"]["trailingReturns"]["fiveYear"]["fmt"]
-        except:
-            fiveYearAverageReturn = "N/A"
-        try:
-            tenYearAverageReturn = "N/A"
-            if jsonData["fundPerformance"]["trailingReturns"]["tenYear"]["raw"]:
-                tenYearAverageReturn = jsonData["fundPerformance"]["trailingReturns"]["tenYear"]["fmt"]
-        except:
-            tenYearAverageReturn = "N/A"
-        try:
-            styleBox = jsonData["fundProfile"]["styleBoxUrl"]
-        except:
-            styleBox = ""
-        try:
-            expenses = jsonData["fundProfile"]["feesExpensesInvestment"]["annualReportExpenseRatio"]["fmt"]
-        except:
-            expenses = "N/A"
-
-        compositionString = "N/A" 
-        try:
-            stockPosition = jsonData["topHoldings"]["stockPosition"]["fmt"]
-            if jsonData["topHoldings"]["stockPosition"]["raw"]:
-                compositionString = "Stocks: " + stockPosition
-        except:
-            stockPosition = "N/A"
-        try:
-            bondPosition = jsonData["topHoldings"]["bondPosition"]["fmt"]
-            if jsonData["topHoldings"]["bondPosition"]["raw"]:
-                compositionString += "\r\nBonds: " + bondPosition
-        except:
-            bondPosition = "N/A"
-
-        try:
-            preferredPosition = jsonData["topHoldings"]["preferredPosition"]["fmt"]
-            if jsonData["topHoldings"]["preferredPosition"]["raw"]:
-                compositionString += "\r\nPreferred: " + preferredPosition
-        except:
-            preferredPosition = "N/A"
-        try:
-            convertiblePosition = jsonData["topHoldings"]["convertiblePosition"]["fmt"]
-            if jsonData["topHoldings"]["convertiblePosition"]["raw"]:
-                compositionString += "\r\nConvertible: " + convertiblePosition
-        except:
-            convertiblePosition = "N/A"
-        try:
-            cashPosition = jsonData["topHoldings"]["cashPosition"]["fmt"]
-            if jsonData["topHoldings"]["cashPosition"]["raw"]:
-                compositionString += "\r\nCash: " + cashPosition
-        except:
-            cashPosition = "N/A"
-        try:
-            otherPosition = jsonData["topHoldings"]["otherPosition"]["fmt"]
-            if jsonData["topHoldings"]["otherPosition"]["raw"]:
-                compositionString += "\r\nOther: " + otherPosition
-        except:
-            otherPosition = "N/A"
-
-            
-        try:
-            sectorWeightings = jsonData["topHoldings"]["sectorWeightings"]
-            sectorWeightingsString = ""
-            for sector in sectorWeightings:
-                keys = sector.keys()
-                for key in keys:
-                    if sector[key]["raw"] == 0:
-                        continue
-                    else:
-                        sectorWeightingsString += key + ": " + sector[key]["fmt"] + "\r\n"
-            if sectorWeightingsString == "":
-                sectorWeightingsString = "N/A"
-        except:
-            sectorWeightingsString = "N/A"
-        try:
-            topHoldingTotalPct = 0
-            topHoldings = jsonData["topHoldings"]["holdings"]
-            topHoldingsString = ""
-            for holding in topHoldings:
-                symbolString = ""
-                if holding["symbol"]:
-                    symbolString = " (" + holding["symbol"] + ")"
-                topHoldingsString += holding["holdingName"] + symbolString + ": " + holding["holdingPercent"]["fmt"] + "\r\n"
-                topHoldingTotalPct += holding["holdingPercent"]["raw"]
-        except: 
-            topHoldingsString = "N/A"
-            topHoldingTotalPct = "N/A"
-
-        print(longName, price)
-        emojiIndicator = ""
-        try:
-            if regularMarketDayChangePctRaw > 0.05:
-                emojiIndicator = ":rocket:"
-            if regularMarketDayChangePctRaw > 0.25:
-                emojiIndicator += ":full_moon:"
-            if regularMarketDayChangePctRaw < -0.05:
-                emojiIndicator = ":skull:"
-            if regularMarketDayChangePctRaw < -0.25:
-                emojiIndicator += ":skull:"
-        except:
-            emojiIndicator = ""
-
-        description = f"**{currencySymbol}{price}** ({regularMarketDayChange},{regularMarketDayChangePct}) {emojiIndicator}"
-        if marketState == "POST":
-            description += f"\n*Post-market: {currencySymbol}{postMarketPrice} ({postMarketChange},{postMarketChangePct})*"
-        elif marketState == "PRE":
-            description += f"\n*Pre-market: {currencySymbol}{preMarketPrice} ({preMarketChange},{preMarketChangePct})*"
-        description += f"\nExchange: {exchange}\nCurrency: {currency}\nQuote Source: {quoteSourceName}"
-        message = discord.Embed(title=str(longName).upper() + f" ({symbol})", url=f"https://finance.yahoo.com/quote/{symbol}",
-                                description=description,
-                                color=0xFF5733)
-        message.add_field(name="Quote Type",
-                            value=quoteType, inline=True)
-        message.add_field(name="Fund Family",
-                            value=fundFamily, inline=True)
-        message.add_field(name="Market Cap",
-                            value=marketCap, inline=True)
-        message.add_field(name="Total Assets",
-                            value=totalAssets, inline=True)
-        message.add_field(name="Regular Market Day Range",
-                            value=regMktDayRng, inline=True)
-        message.add_field(name="Last 52 Week Range",
-                            value=fiftyTwoWeekRange, inline=True)
-        if twoHundredDayAvg != "N/A":
-            message.add_field(name="200 Day Avg.", value=f"{currencySymbol}{twoHundredDayAvg}", inline=True)
-        if fiftyDayAvg != "N/A":
-            message.add_field(name="50 Day Avg.", value=f"{currencySymbol}{fiftyDayAvg}", inline=True)
-        message.add_field(name="beta", value=beta, inline=True)
-
-        message.add_field(name="Fund Inception Date", value=fundInceptionDate, inline=True)
-        
-        message.add_field(name="Yield", value=fundYield, inline=True)
-        
-        message.add_field(name="Expense Ratio", value=expenses, inline=True)
-
-        message.add_field(name="Performance", value="ytd: " + ytdReturn + "\r\n1yr: " + oneYearAverageReturn + "\r\n3yr: " + threeYearAverageReturn 
-                                                   + "\r\n5yr: " + fiveYearAverageReturn+ "\r\n10yr: " + tenYearAverageReturn, inline=True)
-
-        message.add_field(name="Composition ", value=compositionString, inline=True)
-
-        message.add_field(name="Sector Weightings", value=sectorWeightingsString, inline=True)
-        if topHoldingsString != "N/A":
-            message.add_field(name="Top Holdings" + " ({:.2%})".format(topHoldingTotalPct), value=topHoldingsString, inline=True)
-        else:
-            message.add_field(name="Top Holdings", value="Unavailable", inline=True)
-
-
-        message.set_image(url = styleBox)
-        
-        morningstarSymbol = symbol.replace('-','.')
-        message.add_field(name="MorningStar ETF Performance",
-                            value=f"https://www.morningstar.com/etfs/arcx/{morningstarSymbol}/performance", inline=False)
-    except:
-        message = f"Could not find information for ${symbol}. Perhaps it is not an EQUITY or maybe I'm parsing the data poorly...."
-    
-    return message
-
-def Do_Fund_Reply(jsonData: dict):
-    """ formulate a reply specifically for an Mutual Fund quote type """
-    return Do_ETF_Reply(jsonData)
-
-rej_list = []
-
-def price_reply(symbols: list) -> Dict[str, str]:
-    """ for all symbols in provided list query yahoo finance, parse the data and send an embed reponse or an error message in case of failure """
-    dataMessages = {}
-    for symbol in symbols:
-        # throw away anything that just has numerics like $1000
-        DOLLAR_REGEX = r"^[1-9]\d*(?:\.[a-zA-Z\d]+)?[kmbtKMBT]?"
-        match = re.findall(DOLLAR_REGEX, symbol)
-        if match:  # if match is found, then symbol is a reject
-            if symbol not in rej_list:
-                rej_list.append(symbol)
-            if len(rej_list) > 10: # if rej_list is bigger than 10 removes index 0
-                rej_list.pop(0)
-            print(f'Throwing out ${symbol}. Detected as dollar amount and not a stock ticker.')
-            continue
-        message,data = fetchSymbolData(symbol)
-        if (data is None) or (not len(data)):
-            if (not message) or (message == ""):
-                message = f"Could not find information for ${symbol}."
-            dataMessages[symbol] = message
-        else:
-            jsonData = json.loads(data.decode())
-            
-            theType = type(jsonData)
-
-            message = {}
-            try:
-                quoteType = jsonData["quoteType"]["quoteType"]
-                if quoteType == "EQUITY":
-                    message = Do_Equity_Reply(jsonData)
-                elif quoteType == "ETF":
-                    message = Do_ETF_Reply(jsonData)
-                elif quoteType == "MUTUALFUND":
-                    message = Do_Fund_Reply(jsonData)
-                elif quoteType == "CRYPTOCURRENCY":
-                    message = Do_Equity_Reply(jsonData)
-                elif quoteType == "CURRENCY":
-                    message = Do_Equity_Reply(jsonData)
-                else:
-                    message = Do_Equity_Reply(jsonData)
-            except:
-                message = f"Could not find quote type for ${symbol}."
-
-            dataMessages[symbol] = message
-
-    return dataMessages
-
-def get_movers():
-    """ make market movers request to yahoo finance and rturns the result data"""
-    message = {}
-    conn = http.client.HTTPSConnection("apidojo-yahoo-finance-v1.p.rapidapi.com")
-    url = f"/market/v2/get-movers?region=US&lang=en-US&start=0&count=25"
-    try:
-        conn.request("GET", url, headers=headers)
-        res = conn.getresponse()
-    except:
-        message = f"An error occured trying to retrive market movers data. Could not connect to the remote server."
-        return message
-
-    data = res.read()
-    jsonData = json.loads(data.decode())
-    try:
-        results = jsonData["finance"]["result"]
-    except:
-        message = f"An error occured trying to retrive market movers data."
-        return message
-    
-    message=discord.Embed(title="Market Movers")
-    for mover in results:
-        try:
-            title = mover["title"]
-            if "gainers" in title.lower():
-                title = title + ":chart_with_upwards_trend::rocket:"
-            elif "losers" in title.lower():
-                title = title + ":chart_with_downwards_trend: "
-            description = mover["description"]
-            quotes = mover["quotes"]
-            symbolList = ""
-            for quote in quotes:
-                symbol = quote["symbol"]
-                symbolList += f"{symbol}, " 
-            
-            message.add_field(name=title, value=symbolList, inline=False)
-
-        except:
-            continue
-
-    return message
+def loadChartStack():
+    """ import the data science and charting libraries the first time they are needed """
+    global charting, backtester, screener
+    if charting is not None:
+        return
+    with chartStackLock:
+        if charting is not None:
+            return
+        started = time.perf_counter()
+        import backtest as backtestModule
+        import screener as screenerModule
+        backtester = backtestModule
+        screener = screenerModule
+        charting = core.loadCharting()
+        startupPhases.append(("load chart stack", time.perf_counter() - started))
+        print(f"Chart stack loaded in {time.perf_counter() - started:.2f}s")
+
+def startupReport():
+    """ summary of where startup time went, by phase """
+    lines = [f"{name}: {seconds * 1000:.0f} ms" for name, seconds in startupPhases]
+    total = sum(seconds for name, seconds in startupPhases if name != "load chart stack")
+    lines.append(f"total until ready: {total * 1000:.0f} ms")
+    return "\n".join(lines)
+
+stageStats = deadlines.StageStats()
+# admin profiling: cProfile of the next calls of a command or function, memory diffs and event loop lag
+profiler = core.profiler
+profiler.folder = PROFILEFOLDER
+memoryTracker = profiling.MemoryTracker(PROFILEFOLDER)
+loopWatchdog = profiling.LoopWatchdog()
+
+def commandDeadline(command):
+    """ a fresh latency budget for command, its stages are counted in stageStats """
+    return deadlines.Deadline(command, COMMANDBUDGETS[command], stageStats)
+
+# with worker processes this one only talks to discord, lookups and charts are worked out elsewhere.
+# charts come back through the cache, an in-memory one is private to each process
+if WORKERPROCESSES > 0 and isinstance(core.cacheBackend, cache.MemoryCache):
+    print(f"WARNING: [workers] processes = {WORKERPROCESSES} needs a shared cache, the in-memory one can't hand charts"
+          " back from a worker. Running lookups and charts in this process, set [cache] backend to sqlite or redis.")
+    WORKERPROCESSES = 0
+workerPool = workerpool.WorkerPool(WORKERPROCESSES, configFilePath, chartsFolder) if WORKERPROCESSES > 0 else None
+if workerPool is not None:
+    # the workers throw out $1000 and the like, they come back as events and !printrejected lists them here
+    core.hooks["reject"].append(core.rememberRejected)
+
+async def lookupReplies(symbols, deadline=None):
+    """ price_reply off the event loop, in a worker process when there are some """
+    if workerPool is not None:
+        return await workerPool.lookup(symbols, deadline or core.noDeadline())
+    return await asyncio.get_running_loop().run_in_executor(None, tracing.bind(price_reply), symbols, deadline)
 
 intents = discord.Intents.all()
 client = discord.Client(intents=intents)
 bot = commands.Bot(command_prefix="!",intents=intents, description=help_text,)
+startupPhase("create bot")
 
 # setup uthe daily get movers query with the schedule
 doGetMoversUpdate = False
@@ -897,7 +320,26 @@ schedule.every().day.at("17:00").do(get_movers_schedule)
 @bot.event
 async def on_ready():
     print(f'{bot.user} has connected to Discord!')
+    if not any(name == "connect to discord" for name, seconds in startupPhases):
+        startupPhase("connect to discord")
+        print("Startup timing:\n" + startupReport())
+        # warm the chart libraries off the event loop so the first !chart doesn't pay for the imports
+        asyncio.get_running_loop().run_in_executor(None, loadChartStack)
     scheduleTask.start()
+    if not quotePollTask.is_running():
+        quotePollTask.start()
+    sendQueue.start()
+    startLookupWorkers()
+    loopWatchdog.start()
+    if not warmTask.is_running():
+        warmTask.start()
+    if len(fundamentalsBoard) and not fundamentalsTask.is_running():
+        fundamentalsTask.start()
+    if signalStore.unfinishedRun() is not None and startSignalScan():
+        print("Resuming the interrupted signal scan.")
+    resumeBackfills()
+
+tracer = tracing.Tracer(TRACEPATH, TRACESAMPLE, TRACESLOW)
 
 @bot.event
 async def on_message(message):
@@ -909,10 +351,24 @@ async def on_message(message):
     if (testing == False) and (message.channel.name == "testing"):
         return
 
+    # a queued lookup's trace goes with it and is finished by the worker that answers it
+    trace = tracer.start("message", channel=message.channel.id, user=message.author.id, message=message.id)
+    handedOff = False
+    try:
+        with trace.activate():
+            handedOff = await routeMessage(message, trace)
+    finally:
+        if not handedOff:
+            trace.finish()
+
+async def routeMessage(message, trace):
+    """ answer a message, returns True when it was queued as a lookup that now owns the trace """
     ctx = await bot.get_context(message)
     if message.content.startswith("!"):
+        trace.name = "command"
+        trace.attrs["command"] = ctx.command.name if ctx.command else None
         await bot.process_commands(message)
-        return
+        return False
 
     if "doge" in message.content.lower():
         file_path = os.path.join(imagesFolder, "dogecoin.png")
@@ -929,17 +385,131 @@ async def on_message(message):
         await ctx.reply(":rocket:")
 
     if "$" in message.content:
-        symbols = find_symbols(message.content)
+        with tracing.span("find_symbols"):
+            symbols = find_symbols(message.content)
         if symbols:
-            for reply in price_reply(symbols).items():
-                if isinstance(reply[1],str):
-                    await ctx.send(reply[1])
-                else:
-                    embed = reply[1]
-                    embed.set_footer(text="Info requested by: {}".format(ctx.author.display_name))
-                    await ctx.send(embed = embed)
-                #await message.channel.send(reply[1])
-            return
+            trace.name = "lookup"
+            mentionTracker.add(message.guild.id if message.guild else "dm",
+                               {symbol.upper() for symbol in symbols if not re.findall(DOLLAR_REGEX, symbol)})
+            # the budget starts now, time spent waiting in the queue counts against it
+            queued = lookupQueue.put(message.channel.id, message.author.id, [symbol.upper() for symbol in symbols],
+                                     (ctx, commandDeadline("lookup"), trace))
+            trace.attrs["queue"] = queued
+            if queued == workqueue.FULL:
+                await shedLookup(ctx)
+            return queued == workqueue.QUEUED
+    return False
+
+lookupQueue = workqueue.FairQueue(maxSize=LOOKUPQUEUESIZE)
+lookupWorkers = []
+# channels told the bot is busy, and when, so a flood doesn't get one notice per message
+SHEDNOTICESECONDS = 60
+shedNotices = {}
+
+async def shedLookup(ctx):
+    """ tell a channel its lookup was dropped, at most once a minute """
+    now = time.time()
+    if now - shedNotices.get(ctx.channel.id, 0) < SHEDNOTICESECONDS:
+        return
+    shedNotices[ctx.channel.id] = now
+    await ctx.send("Too many lookups queued right now, ask again in a minute.")
+
+recentReplies = recentreplies.RecentReplies(window=REPLYWINDOW)
+# an edited reply is rebuilt at most this often however many times it is asked for again
+REPLYREFRESHSECONDS = 10
+
+async def refreshReply(reply, symbol):
+    """ edit a recent reply in place with what the cache holds now and everyone who asked for it, a
+    repeated ask neither goes upstream nor counts as another lookup """
+    now = time.time()
+    if now - reply.refreshed < REPLYREFRESHSECONDS:
+        return
+    reply.refreshed = now
+    embed = await asyncio.get_running_loop().run_in_executor(None, core.cachedReply, symbol)
+    if isinstance(embed, discord.Embed):
+        embed.set_footer(text="Info requested by: {}".format(", ".join(reply.requesters)))
+        with tracing.span("discord edit"):
+            await reply.message.edit(embed=embed)
+
+async def answerFromRecent(ctx, symbols):
+    """ answer symbols this channel got a reply for moments ago from that reply, returns the other symbols """
+    remaining = []
+    links = []
+    for symbol in symbols:
+        reply = recentReplies.get(ctx.channel.id, symbol)
+        if reply is None:
+            remaining.append(symbol)
+            continue
+        recentReplies.reuse(reply, ctx.author.display_name)
+        if REPLYREUSE == "edit":
+            try:
+                await refreshReply(reply, symbol)
+            except Exception as e:
+                print(f"Could not refresh the ${symbol} reply: {e}")
+        else:
+            links.append(f"${symbol} {reply.message.jump_url}")
+    if links:
+        with tracing.span("discord send"):
+            await ctx.send("Answered just above: " + " · ".join(links))
+    elif len(remaining) < len(symbols):
+        try:
+            await ctx.message.add_reaction("🔄")
+        except:
+            pass
+    return remaining
+
+async def lookupWorker():
+    """ answer queued $SYMBOL lookups one at a time, the fetches run off the event loop """
+    while True:
+        job = await lookupQueue.get()
+        ctx, deadline, trace = job.payload
+        try:
+            with trace.activate():
+                trace.record("queue", job.wait, symbols=len(job.symbols))
+                # an expired lookup is counted over budget by check() as it is cancelled
+                stageStats.record("lookup", "queue", job.wait, False)
+                deadline.check("queue")
+                symbols = await answerFromRecent(ctx, job.symbols)
+                # the span includes the wait for a free executor thread, the gap before its first child
+                with tracing.span("price_reply", symbols=len(symbols)):
+                    replies = await lookupReplies(symbols, deadline) if symbols else {}
+                with deadline.stage("send"):
+                    for reply in replies.items():
+                        with tracing.span("discord send", symbol=reply[0]):
+                            if isinstance(reply[1],str):
+                                await ctx.send(reply[1])
+                            else:
+                                embed = reply[1]
+                                embed.set_footer(text="Info requested by: {}".format(ctx.author.display_name))
+                                sent = await ctx.send(embed = embed)
+                                recentReplies.put(ctx.channel.id, reply[0], sent, ctx.author.display_name)
+        except deadlines.DeadlineExceeded:
+            # waited in the queue past its budget, whoever asked has likely moved on
+            print(f"Lookup of {', '.join(job.symbols)} dropped after {deadline.elapsed():.1f}s in the queue")
+            trace.attrs["cancelled"] = "queue"
+        except Exception as e:
+            print(f"Lookup of {', '.join(job.symbols)} failed: {e}")
+        finally:
+            lookupQueue.done(job)
+            trace.finish(symbols=job.symbols)
+
+def startLookupWorkers():
+    lookupWorkers[:] = [worker for worker in lookupWorkers if not worker.done()]
+    while len(lookupWorkers) < LOOKUPWORKERS:
+        lookupWorkers.append(asyncio.get_running_loop().create_task(lookupWorker()))
+
+@bot.command(name="queue")
+async def queueCommand(ctx):
+    """Show the $SYMBOL lookup queue: depth, wait times and shed load."""
+    stats = lookupQueue.stats()
+    def seconds(value):
+        return f"{value:.2f}s" if value is not None else "n/a"
+    await ctx.send(f"Lookup queue: {stats['depth']} waiting in {stats['flows']} channels (max {stats['maxDepth']}),"
+                   f" {len(lookupWorkers)} workers\n"
+                   f"Wait p50 {seconds(stats['waitP50'])}, p95 {seconds(stats['waitP95'])} over the last"
+                   f" {len(lookupQueue.waits)} lookups\n"
+                   f"{stats['served']} served, {stats['collapsed']} collapsed into a pending lookup, {stats['shed']} shed,"
+                   f" {recentReplies.reused} answered from a recent reply")
 
 def CleanUpSavedCharts():
     """delete all saved charts and files """
@@ -952,14 +522,180 @@ def CleanUpSavedCharts():
                 shutil.rmtree(file_path)
         except Exception as e:
             print('Failed to delete %s. Reason: %s' % (file_path, e))    
+    try:
+        core.cacheBackend.deletePrefix("chartmeta:")
+    except Exception as e:
+        print(f"Failed to clear chart metadata from the cache. Reason: {e}")
 
 @bot.command()
 async def movers(ctx):
     """Provides a list of the days top 25 gainers, losers and most active."""
-    message = get_movers()
-    await ctx.send(embed = message)
+    deadline = commandDeadline("movers")
+    with deadline.stage("fetch"):
+        results, message = await asyncio.get_running_loop().run_in_executor(None, tracing.bind(fetchMovers), deadline)
+    if results is not None:
+        with deadline.stage("parse"):
+            message = get_movers(results)
+    with deadline.stage("send"), tracing.span("discord send"):
+        if isinstance(message, str):
+            await ctx.send(message)
+        else:
+            await ctx.send(embed = message)
     return
 
+@bot.command()
+async def startup(ctx):
+    """Show how long the bot took to start, by phase."""
+    await ctx.send("Startup timing:\n" + startupReport())
+
+@bot.command()
+async def upstream(ctx):
+    """Show the circuit breaker state and recent error rate and latency of each upstream api."""
+    lines = []
+    for circuit in upstreamBreakers.values():
+        stats = circuit.stats()
+        since = datetime.datetime.fromtimestamp(stats["since"]).strftime("%H:%M:%S")
+        latency = f"{stats['p50'] * 1000:.0f} ms" if stats["p50"] is not None else "n/a"
+        lines.append(f"{stats['name']}: {stats['state']} since {since}, {stats['calls']} recent calls,"
+                     f" {stats['failureRate']:.0%} failed, median {latency}, opened {stats['opened']}x,"
+                     f" {stats['rejected']} calls refused")
+    if workerPool is not None:
+        # lookups and charts call upstream from the workers, each has its own breakers
+        workerLines = workerPool.breakerLines()
+        lines.append("In the worker processes, as of each one's last job:")
+        lines.extend(workerLines or ["no jobs run yet"])
+    await ctx.send("Upstream circuits:\n" + "\n".join(lines))
+
+@bot.command(name="deadlines")
+async def deadlinesCommand(ctx):
+    """Show how long each stage of the lookup, chart, movers and rand commands takes and how often it ran over budget."""
+    lines = stageStats.lines()
+    budgets = ", ".join(f"{command} {budget:.0f}s" for command, budget in COMMANDBUDGETS.items())
+    await ctx.send(f"Budgets: {budgets}\n" + ("\n".join(lines) if lines else "Nothing timed yet."))
+
+@bot.command(name="workers")
+async def workersCommand(ctx):
+    """Show the worker processes lookups and charts run in, with how long their jobs take."""
+    if workerPool is None:
+        await ctx.send("Lookups and charts run in this process, there are no worker processes.")
+        return
+    await ctx.send("\n".join(workerPool.lines()))
+
+# functions that can be profiled besides the commands, they run on executor threads (in the worker
+# processes when there are some, where this process's profiler can't see them)
+PROFILEFUNCTIONS = ("price_reply", "buildChart")
+PROFILEMAXCALLS = 50
+
+async def isAdmin(ctx):
+    """ whether the author may use the admin commands, tells them when not """
+    if ctx.author.id in ADMINUSERS or await bot.is_owner(ctx.author):
+        return True
+    await ctx.send("That command is for bot admins only.")
+    return False
+
+def codeBlock(lines):
+    """ lines as a discord code block, cut to fit in one message """
+    text = "\n".join(lines)
+    if len(text) > 1900:
+        text = text[:1900].rsplit("\n", 1)[0] + "\n..."
+    return f"```\n{text}\n```"
+
+@bot.before_invoke
+async def profileCommandStart(ctx):
+    ctx.profileHandle = profiler.begin(ctx.command.name)
+
+@bot.after_invoke
+async def profileCommandEnd(ctx):
+    profiler.end(getattr(ctx, "profileHandle", None))
+
+@bot.command()
+async def profile(ctx, target: str = "status", calls: str = "5"):
+    """Admin: cProfile the next calls of a command or of price_reply/buildChart: !profile <target> [calls], !profile stop <target>, !profile status."""
+    if not await isAdmin(ctx):
+        return
+    if target == "status":
+        armed, finished = profiler.status()
+        await ctx.send(codeBlock(["armed:"] + (armed or ["nothing"]) + ["saved:"] + (finished or ["nothing"])))
+        return
+    if target == "stop":
+        await ctx.send("Stopped." if profiler.disarm(calls) else "That isn't being profiled.")
+        return
+    if target not in PROFILEFUNCTIONS and bot.get_command(target) is None:
+        await ctx.send(f"Unknown target {target}, use a command name or one of {', '.join(PROFILEFUNCTIONS)}.")
+        return
+    if target in PROFILEFUNCTIONS and workerPool is not None:
+        await ctx.send(f"{target} runs in the worker processes, this process would see none of its calls."
+                       " Profile a command, or set [workers] processes = 0 to profile it.")
+        return
+    try:
+        count = max(1, min(int(calls), PROFILEMAXCALLS))
+    except ValueError:
+        await ctx.send("The number of calls to profile must be a whole number.")
+        return
+    loop = asyncio.get_running_loop()
+    channel = ctx.channel
+
+    def done(session):
+        # called on the thread of the last profiled call
+        text = codeBlock(profiler.summary(session) + [f"saved to {session.path}.prof"])
+        loop.call_soon_threadsafe(sendQueue.put, lambda: channel.send(text))
+    profiler.arm(target, count, done)
+    await ctx.send(f"Profiling the next {count} calls of {target}, the top functions will be posted here.")
+
+def countFigures():
+    """ live matplotlib figures, the chart renderers keep one per thread and anything more is a leak """
+    if "matplotlib.figure" not in sys.modules:
+        return 0
+    figureClass = sys.modules["matplotlib.figure"].Figure
+    return sum(1 for item in gc.get_objects() if isinstance(item, figureClass))
+
+memoryTracker.watch("rej_list", lambda: len(rej_list))
+memoryTracker.watch("memory cache entries", lambda: len(getattr(core.cacheBackend, "entries", ())))
+memoryTracker.watch("recent replies", lambda: sum(len(replies) for replies in recentReplies.channels.values()))
+memoryTracker.watch("popular symbols", lambda: len(symbolPopularity))
+memoryTracker.watch("trending guilds", lambda: len(mentionTracker.guilds))
+memoryTracker.watch("price alerts", lambda: len(alertEngine))
+memoryTracker.watch("matplotlib figures", countFigures)
+
+@bot.command()
+async def memory(ctx, action: str = "snapshot"):
+    """Admin: tracemalloc memory growth: !memory start, !memory snapshot (diff since the last one), !memory stop."""
+    if not await isAdmin(ctx):
+        return
+    loop = asyncio.get_running_loop()
+    if action == "start":
+        await loop.run_in_executor(None, memoryTracker.start)
+        await ctx.send("Tracing allocations, `!memory snapshot` shows what grew since now.")
+    elif action == "stop":
+        memoryTracker.stop()
+        await ctx.send("Stopped tracing allocations.")
+    elif not memoryTracker.tracing():
+        await ctx.send("Allocations aren't being traced, start with `!memory start`.")
+    else:
+        # snapshots of a large heap take a while, keep them off the event loop
+        lines, path = await loop.run_in_executor(None, memoryTracker.snapshot)
+        await ctx.send(codeBlock(lines + ([f"full diff in {path}"] if path else [])))
+
+@bot.command()
+async def lag(ctx):
+    """Admin: event loop lag over the last 10 minutes and the worst stalls."""
+    if not await isAdmin(ctx):
+        return
+    stats = loopWatchdog.stats()
+    if stats is None:
+        await ctx.send("No lag samples yet.")
+        return
+    lines = [f"{stats['samples']} samples: p50 {stats['p50'] * 1000:.1f} ms, p95 {stats['p95'] * 1000:.1f} ms,"
+             f" p99 {stats['p99'] * 1000:.1f} ms, max {stats['max'] * 1000:.0f} ms,"
+             f" {stats['stalls']} stalls over {loopWatchdog.stall * 1000:.0f} ms"]
+    for when, seconds in loopWatchdog.worstStalls():
+        lines.append(f"{datetime.datetime.fromtimestamp(when).strftime('%H:%M:%S')} {seconds * 1000:.0f} ms")
+    try:
+        lines.append(f"saved to {loopWatchdog.save(PROFILEFOLDER)}")
+    except OSError as e:
+        print(f"Could not save the lag report: {e}")
+    await ctx.send(codeBlock(lines))
+
 @bot.command()
 async def printrejected(ctx):
     """Provides a list of the last 10 rejected tickers."""
@@ -977,20 +713,27 @@ async def scheduleTask():
     schedule.run_pending()
     whaleAlertReply = False
     global doGetMoversUpdate
+    loop = asyncio.get_running_loop()
     if doGetMoversUpdate is True:
         doGetMoversUpdate = False
-        movers = get_movers()
+        # upstream calls and file clean up block, keep them off the event loop
+        results, error = await loop.run_in_executor(None, fetchMovers, commandDeadline("background"))
+        movers = get_movers(results) if results is not None else error
+        # people look up the movers right after the post, get them warm
+        startWarmBurst(moverSymbols(results))
         if messages == None:
             messages = []
         messages.append(movers)
-        CleanUpSavedCharts()
+        await loop.run_in_executor(None, CleanUpSavedCharts)
     else:
         whaleAlertReply = True
         startTime = scheduleTask.prevEndTime
         endTime = int(time.time())
         scheduleTask.prevEndTime = endTime
+        cachePut("checkpoint:whale_prev_end", endTime, ttl=None)
         if WHALEALERTAPIKEY and WHALEALERTLIMIT >= 500000:
-            transactions = getWhaleAlertTransactions(startTime,endTime,WHALEALERTLIMIT)
+            transactions = await loop.run_in_executor(None, getWhaleAlertTransactions, startTime, endTime,
+                                                      WHALEALERTLIMIT, commandDeadline("background"))
             if transactions:
                 messages = DoWhaleAlertReply(transactions)
     
@@ -1027,417 +770,877 @@ async def scheduleTask():
 
 scheduleTask.prevEndTime = int(time.time())
 
-def fetchChartData(symbol,intervalIn,rangeIn):
-    """ makes yahoo finance chart query for provided symbol interval and range """
-    conn = http.client.HTTPSConnection("apidojo-yahoo-finance-v1.p.rapidapi.com")
-    url = f"/stock/v2/get-chart?interval={intervalIn}&symbol={symbol}&range={rangeIn}&region=US"
+def warmStart():
+    """ pick up the checkpoints a previous run or a sibling process left in the cache """
+    savedRejects = cacheGet("checkpoint:rej_list")
+    if savedRejects:
+        rej_list[:] = savedRejects[-10:]
+    savedEndTime = cacheGet("checkpoint:whale_prev_end")
+    if savedEndTime:
+        # whale alert only serves the last hour of transactions
+        scheduleTask.prevEndTime = max(int(savedEndTime), int(time.time()) - 3600)
     try:
-        conn.request("GET", url, headers=headers)
-        res = conn.getresponse()
-    except:
-        message = f"An error occured trying to retrive chart information for ${symbol}. Could not get a response from the remote server."
-        return None
-  
-    if(res.code == 200):
-        return res.read()
-    else:
-        return None
+        counts = {namespace: len(core.cacheBackend.keys(namespace + ":")) for namespace in ("quote", "fundamentals", "chartmeta")}
+        print("Warm start from cache: " + ", ".join(f"{count} {namespace}" for namespace, count in counts.items())
+              + f", {len(rej_list)} rejected tickers.")
+    except Exception as e:
+        print(f"Could not read the cache for a warm start: {e}")
 
+warmStart()
+startupPhase("warm start from cache")
 
-def parseTimestamp(inputdata):
-    """ Convert epoch timestamt into 2021-05-07 04:48:00 format """
-    timestamplist = []
-    timestamplist.extend(inputdata["chart"]["result"][0]["timestamp"])
-  
-    calendertime = []
-    
-    for ts in timestamplist:
-        dt = datetime.datetime.fromtimestamp(ts)
-        calendertime.append(dt.strftime("%Y-%m-%d %H:%M:%S"))
-    
-    return calendertime
-
-def macdBuySellMarkers(histogram):
-    sigBuy = []
-    sigSell = []
-    previous = None
-    for date, value in histogram.iteritems():
-        if previous == None:
-            previous = value
-            sigBuy.append(np.nan)
-            sigSell.append(np.nan)
-        else:
-            if previous < 0 and value > 0:
-                sigBuy.append(value*0.99)
-                sigSell.append(np.nan)
-            elif previous > 0 and value < 0:
-                sigSell.append(value*1.01)
-                sigBuy.append(np.nan)
-            else:
-                sigBuy.append(np.nan)
-                sigSell.append(np.nan)
-        previous = value
-    return sigBuy,sigSell
-
-def movavgBuySellMarkers(priceline,ma):
-    sigBuy = []
-    sigSell = []
-    previousma = None
-    previousPrice = None
-    for date, value in ma.iteritems():
-        if previousma == None:
-            previousma = value
-            previousPrice = priceline[date]
-            sigBuy.append(np.nan)
-            sigSell.append(np.nan)
-        else:
-            price = priceline[date]
-
-            if previousPrice <= previousma and price > value:
-                sigBuy.append(ma[date]*.99)
-                sigSell.append(np.nan)
-            elif previousPrice >= previousma and price < value:
-                sigSell.append(ma[date]*1.01)
-                sigBuy.append(np.nan)
-            else:
-                sigBuy.append(np.nan)
-                sigSell.append(np.nan)
-        previousma = value
-        previousPrice = priceline[date]
-    return sigBuy,sigSell
-
-def calcStochastics(df,period,kavg,davg):
-    kLine = []
-    lPeriod = []
-    hPeriod = []
-    for date,value in df['Close'].iteritems():
-        if len(lPeriod) < period:
-            lPeriod.append(df['Low'][date])
-            hPeriod.append(df['High'][date])
-        if len(lPeriod) == period:
-            lPeriod.append(df['Low'][date])
-            hPeriod.append(df['High'][date])
-            kValue = 100 * ( (value - min(lPeriod)) / (max(hPeriod) - min(lPeriod)) )
-            kLine.append(kValue)
-            lPeriod.pop(0)
-            hPeriod.pop(0)
-        elif len(lPeriod) < period:
-            kLine.append(np.nan)
-    
-    df['KLine'] = kLine
-    stochasticKLine = df['KLine'].rolling(kavg).mean()
-    stochasticDLine = stochasticKLine.rolling(davg).mean()
-    return stochasticKLine,stochasticDLine
-
-def calcStochasticDLine(df):
-    dLine = []
-    l3 = []
-    h3 = []
-    for date,value in df['Close'].iteritems():
-        if len(l3) < 3:
-            l3.append(df['Low'][date])
-            h3.append(df['High'][date])
-        if len(l3) == 3:
-            l3.append(df['Low'][date])
-            h3.append(df['High'][date])
-            kValue = 100 * ( (value - min(l3)) / (max(h3) - min(l3)) )
-            dLine.append(kValue)
-            l3.pop(0)
-            h3.pop(0)
-        elif len(l3) < 3:
-            dLine.append(np.nan)
-    return dLine
-
-def stochBuySellMarkers(stochasticKLine,stochasticDLine):
-    stochSigBuy = []
-    stochSigSell = []
-    kPrev = None
-    dPrev = None
-    for date,kval in stochasticKLine.iteritems():
-        dval = stochasticDLine[date]
-        if kPrev is None:
-            kPrev = kval
-            dPrev = dval
-            stochSigBuy.append(np.nan)
-            stochSigSell.append(np.nan)
-        else:
-            if (kval > dval) and (kPrev <= dPrev):
-                stochSigBuy.append(stochasticKLine[date]-5)
-                stochSigSell.append(np.nan)
-            elif (kval < dval) and (kPrev >= dPrev):
-                stochSigSell.append(stochasticKLine[date]+5)
-                stochSigBuy.append(np.nan)
-            else:
-                stochSigBuy.append(np.nan)
-                stochSigSell.append(np.nan) 
-        
-        kPrev = kval
-        dPrev = dval
-
-    return stochSigBuy,stochSigSell
-
-def calcMACD(closeData,fastMAPeriod,slowMAPeriod,signalPeriod):
-    expFast = closeData.ewm(span=fastMAPeriod, adjust=False).mean()
-    expSlow = closeData.ewm(span=slowMAPeriod, adjust=False).mean()
-    macd = expFast - expSlow
-    signal = macd.ewm(span=signalPeriod, adjust=False).mean()
-    histogram = macd - signal
-    return macd,signal,histogram
-
-def calcRSI(closeData):
-    delta = closeData.diff()
-    up = delta.clip(lower=0)
-    down = -1*delta.clip(upper=0)
-    ema_up = up.ewm(com=13, adjust=False).mean()
-    ema_down = down.ewm(com=13, adjust=False).mean()
-    rs = ema_up/ema_down
-    rsi = (100 - (100/(1 + rs)))
-    rsi.iloc[:12] = np.nan
-    return rsi
-
-def generateChartBuySellMessage(priceData,macdSigBuy,macdSigSell,stochSigBuy,stochSigSell,movavgSigBuy,movavgSigSell,rsi,stochasticLine,chartMsgPath):
-    retMsg = ""
-    Sell = -1
-    Buy = 1
-    macdState = None
-    stochState = None
-    maState = None
-    lastSignal = None
-    buySellSignal = []
-    index = 0
-    for date,value in priceData.iteritems():
-        val =  macdSigBuy[index]
-        if not np.isnan(macdSigBuy[index]):
-            macdState = Buy
-        elif not np.isnan(macdSigSell[index]):
-            macdState = Sell
-        if not np.isnan(stochSigBuy[index]):
-            stochState = Buy
-        elif not np.isnan(stochSigSell[index]):
-            stochState = Sell
-        if not np.isnan(movavgSigBuy[index]):
-            maState = Buy
-        elif not np.isnan(movavgSigSell[index]):
-            maState = Sell
-        if macdState == Buy and stochState == Buy and maState == Buy and lastSignal != Buy:
-            buySellSignal.append((":green_circle::chart_with_upwards_trend:Buy",date,value))
-            macdState = None
-            stochState = None
-            lastSignal = None
-            lastSignal = Buy
-        elif macdState == Sell and stochState == Sell and maState == Sell and lastSignal != Sell:
-            buySellSignal.append((":red_circle::chart_with_downwards_trend:Sell",date,value))
-            macdState = None
-            stochState = None
-            lastSignal = None
-            lastSignal = Sell
-        index += 1
-                
-
-    for buySellstring,date,value in buySellSignal:
-        overBoughtSoldStr = ""
-        rsiStr = ""
-        stochStr = ""
-        rsiVal = rsi[date]
-        stochasticVal = stochasticLine[date]
-        if rsiVal >= 70 or stochasticVal >= 80:
-            if rsiVal >= 70:
-                rsiStr = "*rsi*"
-            if stochasticVal >= 80:
-                if len(rsiStr):
-                    stochStr = " *+ stoch*"
-                else:
-                    stochStr = "*stoch*"
-            overBoughtSoldStr = rsiStr + stochStr + " *overbought*"
-        elif rsiVal <= 30 or stochasticVal <= 20:
-            if rsiVal <= 30:
-                    rsiStr = "*rsi*"
-            if stochasticVal <= 20:
-                if len(rsiStr):
-                    stochStr = " *+ stoch*"
-                else:
-                    stochStr = "*stoch*"
-            overBoughtSoldStr = rsiStr + stochStr + " *oversold*"
-        date = date.strftime("%m-%d")
-        price = "${:.2f}".format(value)
-        retMsg += f"{buySellstring} on {date} @ {price} {overBoughtSoldStr}\n"
-    try:
-        F=open(chartMsgPath,"w")
-        F.write(retMsg)
-        F.close()
-    except:
-        pass
-    return retMsg
+def buildChart(symbol, intervalIn, rangeIn, deadline=None):
+    """ core.buildChart, in testing mode the default chart comes from chart.dat """
+    return core.buildChart(symbol, intervalIn, rangeIn, deadline, canned=testing is True)
+
+async def renderChart(symbol, intervalIn, rangeIn, deadline):
+    """ buildChart off the event loop, in a worker process when there are some """
+    if workerPool is not None:
+        return await workerPool.chart(symbol, intervalIn, rangeIn, deadline, canned=testing is True)
+    return await asyncio.get_running_loop().run_in_executor(None, tracing.bind(buildChart), symbol, intervalIn, rangeIn, deadline)
 
 @bot.command()
-async def chart(ctx, sym: str):
-    """Generate 3 month chart for request stock."""
+async def chart(ctx, sym: str, intervalIn: str = "1d", rangeIn: str = None):
+    """Generate a chart for the requested stock: !chart $SYMBOL [interval] [range], 1d bars over 3mo by default."""
     async with ctx.typing():
         try:
             symbol = find_symbols(sym)[0]
         except:
             message = f"Could not find a valid symbol to look up."
             return
-        print("Chart: ",symbol)
-        chartName = str(symbol).lower() +".png"
-        chartImgPath = chartsFolder + '/' + chartName
-        chartMsgName = str(symbol).lower() +".txt"
-        chartMsgPath = chartsFolder + '/' + chartMsgName
-        if os.path.isfile(chartImgPath) and os.path.isfile(chartMsgPath):
-            try:
-                F=open(chartMsgPath,"r")
-                chartMsg = F.read()
-                F.close()
-            except:
-                chartMsg = "" 
-            await ctx.send(file=discord.File(chartImgPath))
-            await ctx.send(chartMsg)
+        intervalIn, rangeIn, error = parseChartArgs(intervalIn, rangeIn)
+        if error:
+            await ctx.send(error)
             return
-        else:
-            chartData = None
-            if testing is True:
-                try:
-                    F=open("chart.dat","rb")
-                    chartData = F.read()
-                    F.close()
-                except:
-                   chartData = None 
-            #build the chart and save it
-            if chartData is None:
-                chartData = fetchChartData(symbol,"1d","3mo")
-                if testing is True:
-                    F=open("chart.dat","wb")
-                    F.write(chartData)
-                    F.close()
+        print("Chart: ",symbol,intervalIn,rangeIn)
+        symbolPopularity.add(symbol)
+        chartMeta = cachedChart(symbol, intervalIn, rangeIn)
+        warmStats.record("chart", symbol, chartMeta is not None)
+        deadline = commandDeadline("chart")
+        if chartMeta is None:
+            # fetching and drawing both block, keep them off the event loop
             try:
-                if not len(chartData):
-                    message = f"Could not find chart information for ${symbol}."
-                    await ctx.send(message)
+                chartMeta, error = await renderChart(symbol, intervalIn, rangeIn, deadline)
+            except Exception as e:
+                print(f"Chart of {symbol} failed: {e}")
+                chartMeta, error = None, f"Something went wrong charting ${symbol}, try again."
+            if error:
+                # an older chart of the same range beats an error, refreshed in the background
+                chartMeta = cachedChart(symbol, intervalIn, rangeIn, stale=True)
+                if chartMeta is None:
+                    await ctx.send(error)
                     return
-            except:
-                message = f"Something went wrong retrieving chart data for ${symbol}."
-                await ctx.send(message)
-                return
-            
+                revalidate(f"chart:{symbol.upper()}:{intervalIn}:{rangeIn}", "chart", buildChart, symbol, intervalIn, rangeIn)
+                await ctx.send(":warning: " + staleNote(chartMeta["rendered"]))
+        with deadline.stage("send"):
+            with tracing.span("discord send", file=True):
+                await ctx.send(file=discord.File(chartMeta["image"]))
+            if chartMeta["message"]:
+                with tracing.span("discord send"):
+                    await ctx.send(chartMeta["message"])
+    return
+
+# $SYMBOL mentions per guild in fixed memory for !trending, the busiest symbols are kept warm
+mentionTracker = trending.TrendingTracker()
+TRENDINGWARMQUOTES = 5
+TRENDINGWARMCHARTS = 3
+TRENDINGMINMENTIONS = 3
+
+@bot.command(name="trending")
+async def trendingCommand(ctx, window: str = "1h"):
+    """Most mentioned $SYMBOLS in this server: !trending [1h|3h|6h|12h|24h]"""
+    window = window.lower()
+    if window not in trending.WINDOWS:
+        await ctx.send(f"Unknown window {window}, use one of {', '.join(trending.WINDOWS)}.")
+        return
+    guildId = ctx.guild.id if ctx.guild else "dm"
+    ranked = mentionTracker.top(guildId, 10, trending.WINDOWS[window])
+    if not ranked:
+        await ctx.send(f"Nobody mentioned a $SYMBOL here in the last {window}.")
+        return
+    lines = [f"{place}. **${symbol}** {count} mention{'s' if count != 1 else ''}" for place, (symbol, count) in enumerate(ranked, 1)]
+    message = discord.Embed(title=f"Trending in the last {window}", description="\n".join(lines), color=0xFF5733)
+    message.set_footer(text="Mention counts are estimates in fixed memory: never low, near exact for busy symbols,"
+                            " a rarely mentioned one can read well high.")
+    await ctx.send(embed=message)
+
+def trendingSymbols(count):
+    """ the most mentioned symbols over every guild in the last hour that look like real tickers """
+    ranked = mentionTracker.top(None, count * 3, 1)
+    return [symbol for symbol, mentions in ranked
+            if mentions >= TRENDINGMINMENTIONS and (not stockListLen or symbol in stocks)][:count]
+
+# request popularity, a daily upstream budget for warming and warm/cold counts of interactive requests
+symbolPopularity = warmer.Popularity()
+symbolPopularity.load(cacheGet("checkpoint:popularity") or {})
+warmQuota = warmer.WarmQuota(WARMQUOTA)
+warmStats = warmer.WarmStats()
+
+def countLookup(symbol, cached):
+    """ every symbol looked up counts towards its popularity and the warm hit rate """
+    symbolPopularity.add(symbol)
+    warmStats.record("quote", symbol, cached)
+core.hooks["lookup"].append(countLookup)
+# symbols prefetched for the current burst (the open, the movers post) whose quotes are kept fresh through it
+WARMBURSTMINUTES = 30
+warmBurstSymbols = []
+warmBurstUntil = 0
+preOpenWarmDay = None
+
+def warmSummary(symbol):
+    """ prefetch a get-summary response into the cache, charged to the warming quota """
+    if cachedSummary(symbol) is not None or not warmQuota.take():
+        return False
+    if refreshSummary(symbol) is None:
+        return False
+    warmStats.prefetched("quote", symbol)
+    return True
+
+def warmChart(symbol):
+    """ pre-render the default chart, charged to the warming quota """
+    intervalIn, rangeIn = "1d", CHARTDEFAULTRANGE["1d"]
+    if cachedChart(symbol, intervalIn, rangeIn) is not None or not warmQuota.take():
+        return False
+    chartMeta, error = buildChart(symbol, intervalIn, rangeIn)
+    if chartMeta is not None:
+        warmStats.prefetched("chart", symbol)
+    return chartMeta is not None
+
+def refreshWarmQuotes(symbols):
+    """ bring the quote half of cached summaries up to date with batched get-quotes, one call per QUOTEBATCHSIZE symbols """
+    cached = cacheGetMany([f"quote:{symbol}" for symbol in symbols])
+    stale = [symbol for symbol in symbols if f"quote:{symbol}" in cached]
+    for start in range(0, len(stale), QUOTEBATCHSIZE):
+        if not warmQuota.take():
+            return
+        for result in fetchQuoteResults(stale[start:start + QUOTEBATCHSIZE]):
             try:
-                chartData = json.loads(chartData.decode())
+                symbol = result["symbol"].upper()
+                quote = cached[f"quote:{symbol}"]
+                quote["price"] = priceFromQuote(quote["price"], result)
             except:
-                message = f"Could not decode json chart data for ${symbol}."
-                await ctx.send(message)
-                return
+                continue
+            cachePut(f"quote:{symbol}", quote)
+            cachePut(f"tick:{symbol}", tickFromQuote(result))
+            warmStats.prefetched("quote", symbol)
+
+def warmSummaries(symbols):
+    """ keep get-summary responses of symbols warm: a stale quote next to fresh fundamentals only needs
+    the batched quote refresh, the rest are fetched whole """
+    symbols = [symbol.upper() for symbol in symbols]
+    missing = [symbol for symbol in symbols if cachedSummary(symbol) is None]
+    fundamentals = cacheGetMany([f"fundamentals:{symbol}" for symbol in missing], FUNDAMENTALSMAXAGE)
+    refresh = [symbol for symbol in missing if f"fundamentals:{symbol}" in fundamentals]
+    refreshWarmQuotes(refresh)
+    return len(refresh) + sum(warmSummary(symbol) for symbol in missing if symbol not in refresh)
+
+def startWarmBurst(symbols):
+    """ prefetch symbols on the next warm cycle and keep their quotes fresh for the next WARMBURSTMINUTES """
+    global warmBurstUntil
+    for symbol in symbols:
+        if symbol.upper() not in warmBurstSymbols:
+            warmBurstSymbols.append(symbol.upper())
+    warmBurstUntil = time.time() + WARMBURSTMINUTES * 60
+
+def preOpenWarm():
+    """ prefetch quotes and fundamentals of the most popular symbols and today's movers, and pre-render charts """
+    popular = [symbol for symbol, score in symbolPopularity.top(WARMTOP)]
+    results, error = fetchMovers()
+    if error:
+        print(f"Pre-open warm: {error}")
+    symbols = list(dict.fromkeys(popular + moverSymbols(results)))
+    started = time.perf_counter()
+    quotes = warmSummaries(symbols)
+    charts = sum(warmChart(symbol) for symbol in popular[:WARMCHARTS])
+    print(f"Pre-open warm: {quotes} summaries and {charts} charts for {len(symbols)} symbols in"
+          f" {time.perf_counter() - started:.1f}s, {warmQuota.remaining()} calls of the quota left")
+    warmBurstSymbols[:] = symbols
+
+def warmTrending():
+    """ keep quotes and default charts of trending symbols cached so the next ask is answered warm """
+    warmSummaries(trendingSymbols(TRENDINGWARMQUOTES))
+    for symbol in trendingSymbols(TRENDINGWARMCHARTS):
+        warmChart(symbol)
+
+def warmCycle():
+    """ once a minute: the pre-open prefetch, fresh quotes through a burst, and trending symbols """
+    global preOpenWarmDay, warmBurstUntil
+    minutes = warmer.minutesToOpen()
+    today = warmer.marketNow().date()
+    if minutes is not None and 0 < minutes <= WARMLEAD and preOpenWarmDay != today:
+        preOpenWarmDay = today
+        preOpenWarm()
+        # the open is the burst, quotes stay fresh until WARMBURSTMINUTES after it
+        warmBurstUntil = time.time() + (minutes + WARMBURSTMINUTES) * 60
+    if warmBurstSymbols and time.time() < warmBurstUntil:
+        warmSummaries(warmBurstSymbols)
+    elif warmBurstSymbols:
+        warmBurstSymbols.clear()
+    warmTrending()
+    cachePut("checkpoint:popularity", symbolPopularity.toDict(), ttl=None)
+
+@tasks.loop(minutes=1)
+async def warmTask():
+    await asyncio.get_running_loop().run_in_executor(None, warmCycle)
+
+@bot.command()
+async def warm(ctx):
+    """Show how many quote and chart requests were answered from the cache versus upstream."""
+    lines = warmStats.lines() or ["No quote or chart requests yet."]
+    since = datetime.datetime.fromtimestamp(warmStats.since).strftime("%Y-%m-%d %H:%M")
+    lines.append(f"Warming quota: {warmQuota.remaining()} of {warmQuota.daily} upstream calls left today.")
+    if len(fundamentalsBoard):
+        lines.append(f"Leaderboard quota: {fundamentalsQuota.remaining()} of {fundamentalsQuota.daily} upstream calls left today."
+                     if FUNDAMENTALSBATCH else "Leaderboard refresh is off.")
+    popular = ", ".join(f"${symbol}" for symbol, score in symbolPopularity.top(10))
+    if popular:
+        lines.append(f"Most requested: {popular}")
+    await ctx.send(f"Cache warmth since {since}:\n" + "\n".join(lines))
+
+# !backfill walks channel history into mentionStore, one run per guild at a time, all runs share the pacer
+mentionStore = backfill.MentionStore(MENTIONSPATH)
+backfillPacer = backfill.AdaptivePacer()
+backfillRuns = {}
+BACKFILLMAXDAYS = 365
+
+def backfillSymbols(content):
+    """ the symbols a message mentions, as an inline lookup would see them """
+    return {symbol.upper() for symbol in find_symbols(content) if not re.findall(DOLLAR_REGEX, symbol)}
+
+def seedPopularity(counts):
+    """ backfilled mentions count towards popularity, decayed by how many days ago they were made """
+    now = time.time()
+    for (day, symbol), count in counts.items():
+        age = max(0.0, now - (day + 0.5) * backfill.DAY)
+        symbolPopularity.add(symbol, count * math.exp(-symbolPopularity.decay * age))
+
+def readableChannels(guild):
+    return [channel for channel in guild.text_channels
+            if channel.permissions_for(guild.me).read_messages and channel.permissions_for(guild.me).read_message_history]
+
+def startBackfill(guild, runId, since, reportChannel=None):
+    """ walk the guild's channels in the background, the summary goes to reportChannel """
+    channels = readableChannels(guild)
+    progress = backfill.Progress(runId, len(channels), since)
+
+    async def run():
+        try:
+            await backfill.runBackfill(mentionStore, runId, guild.id, channels, since, backfillSymbols,
+                                       backfillPacer, progress, onCounts=seedPopularity)
+        except asyncio.CancelledError:
+            print(f"Backfill {runId} of {guild.name} stopped, it resumes with the next !backfill or restart.")
+            raise
+        finally:
+            backfillRuns.pop(guild.id, None)
+        seconds = time.time() - progress.started
+        print(f"Backfill {runId} of {guild.name}: {progress.messages} messages, {progress.mentions} mentions in {seconds:.0f}s")
+        if reportChannel is not None:
+            failed = f", {progress.failed} channels failed and are retried by the next !backfill" if progress.failed else ""
+            await reportChannel.send(f"Backfill done: {progress.messages} messages in {progress.done} channels,"
+                                     f" {progress.mentions} $SYMBOL mentions, {seconds:.0f}s{failed}.")
+    backfillRuns[guild.id] = (asyncio.get_running_loop().create_task(run()), progress)
+
+def resumeBackfills():
+    """ restart the backfills a shutdown interrupted """
+    for run in mentionStore.unfinishedRuns():
+        guild = bot.get_guild(run["guild"])
+        if guild is not None and guild.id not in backfillRuns:
+            print(f"Resuming backfill {run['id']} of {guild.name}.")
+            startBackfill(guild, run["id"], run["since"], guild.get_channel(run["channel"]) if run["channel"] else None)
+
+def backfillStatus(guild):
+    running = backfillRuns.get(guild.id)
+    if running is None:
+        return "No backfill running here."
+    progress = running[1]
+    since = datetime.datetime.fromtimestamp(progress.since).strftime("%Y-%m-%d")
+    return (f"Backfill since {since}: {progress.done + progress.failed}/{progress.channels} channels,"
+            f" {progress.pages} pages, {progress.messages} messages, {progress.mentions} mentions,"
+            f" {backfillPacer.rate:.1f} requests/s ({backfillPacer.throttled} slowdowns).")
+
+@bot.command(name="backfill")
+async def backfillCommand(ctx, action: str = "7", days: str = "7"):
+    """Count $SYMBOL mentions in this server's channel history: !backfill [days] | status | stop (admin), !backfill top [days]."""
+    if ctx.guild is None:
+        await ctx.send("Backfill works on a server's channels, not in DMs.")
+        return
+    if action == "top":
+        try:
+            days = max(1, min(int(days), BACKFILLMAXDAYS))
+        except ValueError:
+            await ctx.send("The number of days must be a whole number.")
+            return
+        sinceDay = backfill.dayNumber(time.time()) - days + 1
+        rows = await asyncio.get_running_loop().run_in_executor(None, mentionStore.top, ctx.guild.id, sinceDay)
+        if not rows:
+            await ctx.send(f"No mentions counted for the last {days} days, run !backfill first.")
+            return
+        lines = [f"{place}. **${row['symbol']}** {row['mentions']} mention{'s' if row['mentions'] != 1 else ''}"
+                 for place, row in enumerate(rows, 1)]
+        await ctx.send(embed=discord.Embed(title=f"Most mentioned in the last {days} days", description="\n".join(lines), color=0xFF5733))
+        return
+    if not await isAdmin(ctx):
+        return
+    if action == "status":
+        await ctx.send(backfillStatus(ctx.guild))
+        return
+    if action == "stop":
+        running = backfillRuns.get(ctx.guild.id)
+        if running is None:
+            await ctx.send("No backfill running here.")
+            return
+        running[0].cancel()
+        await ctx.send("Backfill stopped, !backfill picks it up where it stopped.")
+        return
+    try:
+        days = max(1, min(int(action), BACKFILLMAXDAYS))
+    except ValueError:
+        await ctx.send("Use !backfill [days], !backfill status, !backfill stop or !backfill top [days].")
+        return
+    if ctx.guild.id in backfillRuns:
+        await ctx.send(backfillStatus(ctx.guild))
+        return
+    since = time.time() - days * backfill.DAY
+    runId = await asyncio.get_running_loop().run_in_executor(None, mentionStore.startRun, ctx.guild.id, ctx.channel.id, since)
+    startBackfill(ctx.guild, runId, since, ctx.channel)
+    await ctx.send(f"Counting $SYMBOL mentions over the last {days} days in {backfillRuns[ctx.guild.id][1].channels} channels,"
+                   " !backfill status shows how far it got.")
+
+COMPUTEWORKERS = 2
+BACKTESTMAXAGE = 24 * 60 * 60
+computePool = None
+computePoolLock = threading.Lock()
+
+def computeExecutor():
+    """ process pool for !backtest and the signal scan, the indicator math is cpu bound and would hold the gil for the event loop """
+    global computePool
+    with computePoolLock:
+        if computePool is None:
+            loadChartStack()
+            # not forked from this threaded process, the jobs only need their own module (see workerpool and main.py)
+            computePool = concurrent.futures.ProcessPoolExecutor(max_workers=COMPUTEWORKERS, mp_context=workerpool.context())
+        return computePool
+
+def resetComputeExecutor():
+    """ drop a pool whose worker died, the next job starts a fresh one """
+    global computePool
+    with computePoolLock:
+        computePool = None
+
+def backtestEmbed(symbol, rangeIn, result):
+    """ discord embed for a backtest result """
+    description = (f"{result['bars']} daily bars from {result['first']} to {result['last']}, "
+                   f"{result['buys']} buy and {result['sells']} sell calls.")
+    message = discord.Embed(title=f"{symbol.upper()} {rangeIn} backtest", url=f"https://finance.yahoo.com/quote/{symbol}",
+                            description=description, color=0xFF5733)
+    for horizon, score in result["horizons"].items():
+        if not score["count"]:
+            continue
+        value = f"Hit rate: {score['hitRate']:.0%}\nAvg return: {score['averageReturn']:+.2%}"
+        if score["buyReturn"] is not None:
+            value += f"\nAfter buys: {score['buyReturn']:+.2%}"
+        if score["sellReturn"] is not None:
+            value += f"\nAfter sells: {score['sellReturn']:+.2%}"
+        message.add_field(name=f"{horizon} days", value=value, inline=True)
+    message.add_field(name="Long on buy, flat on sell",
+                      value=f"Return: {result['strategyReturn']:+.1%}\nMax drawdown: {result['strategyDrawdown']:.1%}\nInvested: {result['exposure']:.0%}",
+                      inline=True)
+    message.add_field(name="Buy and hold",
+                      value=f"Return: {result['buyHoldReturn']:+.1%}\nMax drawdown: {result['buyHoldDrawdown']:.1%}",
+                      inline=True)
+    message.set_footer(text=f"Calls as in !chart, scored by the close n trading days later. Computed in {result['seconds'] * 1000:.0f} ms.")
+    return message
+
+@bot.command()
+async def backtest(ctx, sym: str, rangeIn: str = "max"):
+    """Score the !chart buy/sell calls over daily history: !backtest $SYMBOL [range], max by default."""
+    try:
+        symbol = find_symbols(sym)[0]
+    except:
+        await ctx.send("Could not find a valid symbol to look up.")
+        return
+    rangeIn = rangeIn.lower()
+    if rangeIn not in CHARTRANGEDAYS:
+        await ctx.send(f"Unknown range {rangeIn}, use one of {', '.join(CHARTRANGEDAYS)}.")
+        return
+    print("Backtest: ", symbol, rangeIn)
+    resultKey = f"backtest:{symbol.upper()}:{rangeIn}"
+    result = cacheGet(resultKey, BACKTESTMAXAGE)
+    if result:
+        await ctx.send(embed=backtestEmbed(symbol, rangeIn, result))
+        return
+    async with ctx.typing():
+        loop = asyncio.get_running_loop()
+        chartData = await loop.run_in_executor(None, fetchChartData, symbol, "1d", rangeIn)
+        if not chartData:
+            await ctx.send(f"Could not find chart information for ${symbol}.")
+            return
+        try:
+            executor = await loop.run_in_executor(None, computeExecutor)
+            result = await loop.run_in_executor(executor, backtester.runBacktest, chartData)
+        except concurrent.futures.process.BrokenProcessPool:
+            resetComputeExecutor()
+            await ctx.send(f"Something went wrong backtesting ${symbol}, try again.")
+            return
+        except:
+            await ctx.send(f"Failed to backtest ${symbol}.")
+            return
+        if result is None:
+            await ctx.send(f"Not enough daily history for ${symbol} to backtest over {rangeIn}.")
+            return
+        # json keys are strings, store it the way it will be read back
+        result["horizons"] = {str(horizon): score for horizon, score in result["horizons"].items()}
+        cachePut(resultKey, result, ttl=BACKTESTMAXAGE)
+        await ctx.send(embed=backtestEmbed(symbol, rangeIn, result))
+
+signalStore = scanner.SignalStore(SIGNALSPATH)
+scanThread = None
+
+def runSignalScan():
+    """ scan the whole stock list with the default !chart settings, resuming an interrupted scan """
+    try:
+        universe = scanner.tableRows(stocks)
+        rangeIn = CHARTDEFAULTRANGE["1d"]
+        scanner.runScan(signalStore, universe, lambda symbol: fetchChartData(symbol, "1d", rangeIn, wait=True), computeExecutor(), rate=SCANRATE)
+    except concurrent.futures.process.BrokenProcessPool:
+        resetComputeExecutor()
+        print("Signal scan stopped, a worker process died. It resumes on the next start.")
+    except Exception as e:
+        print(f"Signal scan failed: {e}")
+
+def startSignalScan():
+    """ run the scan on a background thread unless one is running, True when one was started """
+    global scanThread
+    if not stockListLen or (scanThread is not None and scanThread.is_alive()):
+        return False
+    scanThread = threading.Thread(target=runSignalScan, name="signal-scan", daemon=True)
+    scanThread.start()
+    return True
+
+schedule.every().day.at(SCANTIME).do(startSignalScan)
+
+SIGNALNAMES = {"buy": 1, "sell": -1}
+
+def signalLine(row):
+    """ one !signals result line """
+    line = f"**${row['symbol']}** ${row['close']:.2f}"
+    if row["direction"]:
+        call = "Buy" if row["direction"] == 1 else "Sell"
+        days = "today" if row["age"] == 0 else f"{row['age']}d ago"
+        line += f" · {call} {days} ({row['callDate'][5:]} @ ${row['callPrice']:.2f})"
+    if row["state"]:
+        line += f" · *{row['state']}*"
+    if row["rsi"] is not None:
+        line += f" · rsi {row['rsi']:.0f}"
+    if row["sector"]:
+        line += f" · {row['sector']}"
+    return line
 
-            inputdata = {}
-            if not chartData["chart"]["result"]:
-                message = f"Could not find chart information for ${symbol}."
-                await ctx.send(message)
+@bot.command()
+async def signals(ctx, *filters):
+    """Stocks with a recent chart call or overbought/oversold, from the nightly scan: !signals buy sector:tech large"""
+    if filters and filters[0].lower() == "status":
+        run = signalStore.lastRun()
+        if run is None:
+            await ctx.send("No signal scan has run yet.")
+            return
+        started = datetime.datetime.fromtimestamp(run["started"]).strftime("%y-%m-%d %H:%M")
+        rate = run["scanned"] / run["seconds"] if run["seconds"] else 0
+        progress = "finished" if run["finished"] else ("running" if scanThread is not None and scanThread.is_alive() else "interrupted")
+        await ctx.send(f"Signal scan started {started} {progress}: {run['scanned']}/{run['symbols']} symbols, "
+                       f"{run['failed']} failed, {rate:.1f} symbols/s.")
+        return
+    direction = None
+    state = None
+    sectors = None
+    band = None
+    for word in filters:
+        lowered = word.lower()
+        if lowered in SIGNALNAMES:
+            direction = SIGNALNAMES[lowered]
+        elif lowered in ("overbought", "oversold"):
+            state = lowered
+        elif lowered.startswith("sector:"):
+            codes = stocks.matchSectors(word[len("sector:"):]) if stockListLen else set()
+            if not codes:
+                await ctx.send(f"No sector matches {word[len('sector:'):]}.")
                 return
+            sectors = [stocks.sectors[code] for code in codes]
+        elif symboltable.SymbolTable.matchBand(lowered) is not None:
+            band = symboltable.BANDS[symboltable.SymbolTable.matchBand(lowered)]
+        else:
+            await ctx.send(f"Unknown filter {word}, use buy, sell, overbought, oversold, sector:<name> or a market cap band.")
+            return
+    if direction is None and state is None:
+        await ctx.send("Ask for buy, sell, overbought or oversold, e.g. !signals buy sector:tech")
+        return
+    rows, total = await asyncio.get_running_loop().run_in_executor(None, lambda: signalStore.query(direction, state, sectors, band))
+    if not rows:
+        await ctx.send("Nothing in the last signal scan matches that.")
+        return
+    run = signalStore.lastRun()
+    lines = []
+    length = 0
+    for row in rows:
+        line = signalLine(row)
+        if length + len(line) > 4000:
+            break
+        lines.append(line)
+        length += len(line) + 1
+    title = " ".join(word for word in filters)
+    message = discord.Embed(title=f"Signals: {title}", description="\n".join(lines), color=0xFF5733)
+    scanned = datetime.datetime.fromtimestamp(run["started"]).strftime("%y-%m-%d %H:%M") if run else "never"
+    message.set_footer(text=f"{len(lines)} of {total} matches, scan of {scanned}. Calls from the last {scanner.RECENT_BARS} bars.")
+    await ctx.send(embed=message)
+
+def loadLeaderboard():
+    """ fill the leaderboard from fundamentals already in the cache, stale ones are refreshed first """
+    started = time.perf_counter()
+    loaded = 0
+    for start in range(0, len(fundamentalsBoard), 500):
+        keys = [f"fundamentals:{symbol}" for symbol in fundamentalsBoard.symbols[start:start + 500]]
+        for key, (stored, data) in cacheGetMany(keys, stamped=True).items():
+            loaded += fundamentalsBoard.update(key[len("fundamentals:"):], leaderboard.summaryMetrics(data), stored)
+    print(f"Leaderboard loaded {loaded} symbols from the cache in {time.perf_counter() - started:.2f}s")
+
+# upstream calls the leaderboard refresh may spend per market day, apart from the warming quota
+fundamentalsQuota = warmer.WarmQuota(FUNDAMENTALSDAILY)
+
+def refreshLeaderboard():
+    """ refresh the symbols whose fundamentals expired, from the cache when a sibling already did, else the
+    api while today's quota lasts """
+    if not FUNDAMENTALSBATCH:
+        return
+    now = time.time()
+    symbols = fundamentalsBoard.stale(FUNDAMENTALSMAXAGE, now, FUNDAMENTALSBATCH)
+    if not symbols:
+        return
+    cached = cacheGetMany([f"fundamentals:{symbol}" for symbol in symbols], FUNDAMENTALSMAXAGE, stamped=True)
+    for symbol in symbols:
+        if f"fundamentals:{symbol}" in cached:
+            stored, data = cached[f"fundamentals:{symbol}"]
+            fundamentalsBoard.update(symbol, leaderboard.summaryMetrics(data), stored)
+            continue
+        if not fundamentalsQuota.take():
+            # spent for today, the rest waits for tomorrow's quota
+            return
+        # caching the summary updates the leaderboard too
+        if refreshSummary(symbol) is not None:
+            continue
+        # keep the old values and try again after another FUNDAMENTALSMAXAGE
+        fundamentalsBoard.touch(symbol, now)
 
-            try:
-                regularMarketPrice = chartData["chart"]["result"][0]["meta"]["regularMarketPrice"]  
-                regularMarketTime = chartData["chart"]["result"][0]["meta"]["regularMarketTime"]
-                regularMarketTime = datetime.datetime.fromtimestamp(regularMarketTime)
-                regularMarketTime = regularMarketTime.strftime("%y-%m-%d %H:%M:%S")
-                inputdata["DateTime"] = parseTimestamp(chartData)
-                inputdata["Open"] = chartData["chart"]["result"][0]["indicators"]["quote"][0]["open"]
-                inputdata["Close"] = chartData["chart"]["result"][0]["indicators"]["quote"][0]["close"]
-                inputdata["Volume"] = chartData["chart"]["result"][0]["indicators"]["quote"][0]["volume"]
-                inputdata["High"] = chartData["chart"]["result"][0]["indicators"]["quote"][0]["high"]
-                inputdata["Low"] = chartData["chart"]["result"][0]["indicators"]["quote"][0]["low"]
-                inputdata["Adj Close"] = chartData["chart"]["result"][0]["indicators"]["adjclose"][0]["adjclose"]
-
-                df = pd.DataFrame(inputdata)
-                df['Datetime'] = pd.to_datetime(inputdata["DateTime"], format='%Y-%m-%d %H:%M:%S')
-                df = df.set_index(pd.DatetimeIndex(df['Datetime']))
-                closeData = df['Close']
-                # 10 day moving average for price chart
-                ma = closeData.rolling(10).mean()
-                #generate MACD chart data
-                macd,signal,histogram = calcMACD(closeData,8,17,9)
-                macdSigBuy,macdSigSell = macdBuySellMarkers(histogram)
-                movavgSigBuy,movavgSigSell = movavgBuySellMarkers(closeData,ma)    
-                # generate stochastics chart data            
-                stochasticKLine,stochasticDLine = calcStochastics(df,14,3,3)
-                stochSigBuy,stochSigSell = stochBuySellMarkers(stochasticKLine,stochasticDLine)
-                stochasticOverboughtLine = [80] * len(stochasticKLine)
-                stochasticUnderboughtLine = [20] * len(stochasticKLine)
-                # generate RSI chart
-                rsi = calcRSI(closeData)
-                rsiOverboughtLine = [70] * len(rsi)
-                rsiUnderboughtLine = [30] * len(rsi)
-                chartBuySellMessage = generateChartBuySellMessage(ma,macdSigBuy,macdSigSell,stochSigBuy,stochSigSell,movavgSigBuy,movavgSigSell,rsi,stochasticKLine,chartMsgPath)
-                addPlots = [mpf.make_addplot(histogram,type='bar',width=0.7,panel=1,color='dimgray',alpha=1,secondary_y=False,ylabel='MACD'),
-                            mpf.make_addplot(macd,panel=1,color='fuchsia',secondary_y=True,width=0.5),
-                            mpf.make_addplot(signal,panel=1,color='b',secondary_y=True,width=0.5),
-                            mpf.make_addplot(macdSigBuy,panel=1,color='g',type='scatter',markersize=50,marker='^'),
-                            mpf.make_addplot(macdSigSell,panel=1,color='r',type='scatter',markersize=50,marker='v'),
-                            mpf.make_addplot(ma,panel=0,color='c',width=0.5),
-                            mpf.make_addplot(closeData,panel=0,color='black',width=0.2),
-                            mpf.make_addplot(movavgSigBuy,panel=0,color='g',type='scatter',markersize=50,marker='^'),
-                            mpf.make_addplot(movavgSigSell,panel=0,color='r',type='scatter',markersize=50,marker='v'),
-                            mpf.make_addplot(stochasticKLine,panel=2,color='black',width=0.5,ylabel='Stoch'),
-                            mpf.make_addplot(stochasticDLine,panel=2,color='red',width=0.5,secondary_y=False),
-                            mpf.make_addplot(stochasticOverboughtLine,panel=2,secondary_y=False,color='grey',width=0.4),
-                            mpf.make_addplot(stochasticUnderboughtLine,panel=2,secondary_y=False,color='grey',width=0.4),
-                            mpf.make_addplot(stochSigBuy,panel=2,color='g',type='scatter',markersize=50,marker='^',secondary_y=False),
-                            mpf.make_addplot(stochSigSell,panel=2,color='r',type='scatter',markersize=50,marker='v',secondary_y=False),
-                            mpf.make_addplot(rsi,panel=3,color='red',width=0.5,secondary_y=False,ylabel='RSI'),
-                            mpf.make_addplot(rsiOverboughtLine,panel=3,secondary_y=False,color='grey',width=0.4),
-                            mpf.make_addplot(rsiUnderboughtLine,panel=3,secondary_y=False,color='grey',width=0.4),
-                ]
-            
-                mpf.plot(
-                    df,
-                    type="candle",
-                    addplot=addPlots,
-                    title=f"{symbol.upper()} (${regularMarketPrice} @ {regularMarketTime})",
-                    volume=True,
-                    volume_panel=4,
-                    panel_ratios=(4,2,2,2,1),
-                    style="default",
-                    figscale=1.1,
-                    figratio=(8,5),
-                    savefig=dict(fname=chartImgPath, dpi=400, bbox_inches="tight")
-                )
-                await ctx.send(file=discord.File(chartImgPath))
-                await ctx.send(chartBuySellMessage)
+@tasks.loop(minutes=1)
+async def fundamentalsTask():
+    """ keep the !top leaderboard current a batch of expired symbols at a time """
+    loop = asyncio.get_running_loop()
+    if not fundamentalsTask.loaded:
+        fundamentalsTask.loaded = True
+        await loop.run_in_executor(None, loadLeaderboard)
+    await loop.run_in_executor(None, refreshLeaderboard)
 
-            except:
-                message = f"Failed to generate chart data for ${symbol}."
-                await ctx.send(message)
-    return
+fundamentalsTask.loaded = False
+
+@bot.command()
+async def top(ctx, *args):
+    """Rank the stock list by a fundamental: !top roic, !top peg asc sector:Energy, !top pe large 20"""
+    if not len(fundamentalsBoard):
+        await ctx.send("I don't have a list of stocks to rank.")
+        return
+    if not args or leaderboard.matchMetric(args[0]) is None:
+        await ctx.send("Rank by one of: " + ", ".join(leaderboard.METRICS) + ". For example !top peg asc sector:Energy")
+        return
+    name = leaderboard.matchMetric(args[0])
+    ascending = None
+    sectors = None
+    band = None
+    count = 10
+    for word in args[1:]:
+        lowered = word.lower()
+        if lowered in ("asc", "desc"):
+            ascending = lowered == "asc"
+        elif lowered.startswith("sector:"):
+            codes = stocks.matchSectors(word[len("sector:"):])
+            if not codes:
+                await ctx.send(f"No sector matches {word[len('sector:'):]}.")
+                return
+            sectors = [stocks.sectors[code] for code in codes]
+        elif symboltable.SymbolTable.matchBand(lowered) is not None:
+            band = symboltable.BANDS[symboltable.SymbolTable.matchBand(lowered)]
+        elif lowered.isdigit():
+            count = max(1, min(int(lowered), 25))
+        else:
+            await ctx.send(f"Unknown option {word}, use asc, desc, sector:<name>, a market cap band or a count.")
+            return
+    ranked = fundamentalsBoard.top(name, count, ascending, sectors, band)
+    if not ranked:
+        await ctx.send(f"No {leaderboard.LABELS[name]} values yet, the leaderboard fills in as fundamentals are fetched.")
+        return
+    lines = [f"{place}. **${symbol}** {leaderboard.formatMetric(name, value)}"
+             + (f" · {fundamentalsBoard.sectors[fundamentalsBoard.rows[symbol]]}" if fundamentalsBoard.sectors[fundamentalsBoard.rows[symbol]] else "")
+             for place, (symbol, value) in enumerate(ranked, 1)]
+    message = discord.Embed(title=f"Top {leaderboard.LABELS[name]}: {' '.join(args[1:])}".rstrip(": "),
+                            description="\n".join(lines), color=0xFF5733)
+    message.set_footer(text=f"{fundamentalsBoard.count(name)} of {len(fundamentalsBoard)} symbols have a value.")
+    await ctx.send(embed=message)
+
+stockScreener = None
+
+def screenStocks(query):
+    """ (rows, total) of !screen over the stock list, indexes built on the first query """
+    global stockScreener
+    loadChartStack()
+    if stockScreener is None:
+        stockScreener = screener.Screener(stocks)
+    return stockScreener.screen(query)
 
 @bot.command()
-async def rand(ctx):
-    """Get a random stock ticker."""
+async def screen(ctx, *, query: str = ""):
+    """Filter the stock list: !screen sector=Technology mcap>10B volume>1M sort=-pctchange limit=20"""
+    if not stockListLen:
+        await ctx.send("I don't have a list of stocks to screen.")
+        return
+    if not query.strip():
+        await ctx.send("Give me some conditions, e.g. !screen sector=Technology mcap>10B volume>1M sort=-pctchange limit=20. "
+                       "Fields: mcap, price, change, pctchange, volume, ipo, sector, industry, country, band.")
+        return
+    # the whole rest of the message, quotes included, is parsed by the screener
+    try:
+        rows, total = await asyncio.get_running_loop().run_in_executor(None, screenStocks, query)
+    except ValueError as e:
+        await ctx.send(str(e))
+        return
+    if not rows:
+        await ctx.send("No stocks in my list match that.")
+        return
+    lines = []
+    length = 0
+    for row in rows:
+        line = stockScreener.describe(row)
+        if length + len(line) > 4000:
+            break
+        lines.append(line)
+        length += len(line) + 1
+    message = discord.Embed(title=f"Screen: {query}"[:256], description="\n".join(lines), color=0xFF5733)
+    message.set_footer(text=f"{len(lines)} of {total} matches. Prices and volume as of the screener csv.")
+    await ctx.send(embed=message)
+
+@bot.command()
+async def rand(ctx, *filters):
+    """Get a random stock ticker. Optionally filter by sector and/or market cap band, e.g. !rand tech large"""
     if not stockListLen:
         message = f"I don't have a list of stocks to pick at random.  Make sure I have a .csv from available to read from: https://www.nasdaq.com/market-activity/stocks/screener"
+        await ctx.send(message)
         return
-    try:   
-        while True:
-            randomPick = random.randint(0, stockListLen-1)
-            symbol = stocks.iloc[randomPick].name
-            if '^' in symbol:
-                continue
-            else:
-                break
-    except:
-        message = f"I had a problem getting a random stock from the list."
-        return  
-    try: 
-        symbol = stocks.iloc[randomPick].name
-        for reply in price_reply([symbol]).items():
-            if isinstance(reply[1],str):
-                await ctx.send(reply[1])
-            else:
-                embed = reply[1]
-                embed.set_footer(text="Random stock picked for: {}. Chosen from a list of {} symbols.".format(ctx.author.display_name,stockListLen))
-                await ctx.send(embed = embed)
+    sectors = None
+    band = None
+    sectorWords = []
+    for word in filters:
+        word = word.lower()
+        if word.startswith("sector:"):
+            word = word[len("sector:"):]
+        elif stocks.matchBand(word) is not None:
+            band = stocks.matchBand(word)
+            continue
+        sectorWords.append(word)
+    if sectorWords:
+        sectors = stocks.matchSectors(" ".join(sectorWords))
+        if not sectors:
+            message = "I don't know that sector. Try one of: " + ", ".join(name for name in stocks.sectors if name)
+            await ctx.send(message)
+            return
+    symbol = stocks.randomSymbol(sectors, band)
+    if symbol is None:
+        message = "No stocks in my list match that filter. Market cap bands are: " + ", ".join(symboltable.BANDS[1:])
+        await ctx.send(message)
+        return
+    choices = stocks.count(sectors, band)
+    deadline = commandDeadline("rand")
+    try:
+        replies = await lookupReplies([symbol], deadline)
+        with deadline.stage("send"), tracing.span("discord send"):
+            for reply in replies.items():
+                if isinstance(reply[1],str):
+                    await ctx.send(reply[1])
+                else:
+                    embed = reply[1]
+                    embed.set_footer(text="Random stock picked for: {}. Chosen from a list of {} symbols.".format(ctx.author.display_name,choices))
+                    await ctx.send(embed = embed)
     except:
         message = f"I wasn't able to get a symbol name from my list."
         return
 
 
 
+watchRegistry = watchboards.WatchRegistry()
+WATCHSYMBOL_REGEX = re.compile(r"^[A-Z0-9.=-]{1,9}$")
+
+def watchEmbed(board, content):
+    message = discord.Embed(title="Watch Board", description=content, color=0xFF5733)
+    changed = datetime.datetime.fromtimestamp(board.lastChange or time.time()).strftime("%H:%M:%S")
+    message.set_footer(text=f"Updates every {POLLINTERVAL}s. Last change {changed}. !unwatch to stop.")
+    return message
+
+@bot.command()
+async def watch(ctx, *syms):
+    """Pin a live quote board that is edited in place, e.g. !watch AAPL MSFT NVDA"""
+    symbols = []
+    for sym in syms:
+        symbol = sym.lstrip('$').upper()
+        if WATCHSYMBOL_REGEX.match(symbol) and symbol not in symbols:
+            symbols.append(symbol)
+    if not symbols:
+        await ctx.send("Give me some symbols to watch, e.g. !watch AAPL MSFT NVDA")
+        return
+    if len(symbols) > watchboards.MAX_SYMBOLS_PER_BOARD:
+        await ctx.send(f"A watch board can show at most {watchboards.MAX_SYMBOLS_PER_BOARD} symbols.")
+        return
+    if len(watchRegistry.channelBoards(ctx.channel.id)) >= watchboards.MAX_BOARDS_PER_CHANNEL:
+        await ctx.send(f"This channel already has {watchboards.MAX_BOARDS_PER_CHANNEL} watch boards. Use !unwatch to remove yours.")
+        return
+    board = watchboards.WatchBoard(ctx.channel.id, ctx.author.id, symbols)
+    ticks = await asyncio.get_running_loop().run_in_executor(None, refreshQuotes, symbols, POLLINTERVAL)
+    content = watchboards.renderBoard(symbols, ticks)
+    board.lastChange = time.time()
+    board.message = await ctx.send(embed=watchEmbed(board, content))
+    board.lastContent = content
+    watchRegistry.add(board)
+    if not quotePollTask.is_running():
+        quotePollTask.start()
+
+@bot.command()
+async def unwatch(ctx):
+    """Stop your live quote boards in this channel."""
+    removed = watchRegistry.removeOwned(ctx.channel.id, ctx.author.id)
+    if removed:
+        await ctx.send(f"Stopped {len(removed)} watch board(s).")
+    else:
+        await ctx.send("You don't have any watch boards in this channel.")
+
+alertEngine = alerts.AlertEngine()
+# alert notifications go out through a rate limited queue so a big move can't flood discord
+sendQueue = ratelimit.SendQueue(rate=4, burst=8)
+
+def loadAlerts():
+    """ restore persisted alerts, they are stored per symbol under alerts:<symbol> """
+    try:
+        keys = core.cacheBackend.keys("alerts:")
+    except Exception as e:
+        print(f"Could not load alerts from the cache: {e}")
+        return
+    alertEngine.load(cacheGetMany(keys).values())
+
+def saveAlerts():
+    """ persist the symbols whose alerts changed since the last save """
+    for symbol in alertEngine.takeDirty():
+        state = alertEngine.symbolState(symbol)
+        if state:
+            cachePut(f"alerts:{symbol}", state, ttl=None)
+        else:
+            try:
+                core.cacheBackend.delete(f"alerts:{symbol}")
+            except Exception as e:
+                print(f"Cache delete failed for alerts:{symbol}: {e}")
+
+def notifyAlerts(fired, prices):
+    """ one message per channel listing every alert that fired there, queued for sending """
+    byChannel = {}
+    for alert in fired:
+        byChannel.setdefault(alert.channelId, []).append(alert)
+    for channelId, channelAlerts in byChannel.items():
+        channel = bot.get_channel(channelId)
+        if channel is None:
+            continue
+        text = ""
+        for alert in channelAlerts:
+            line = f"<@{alert.userId}> :bell: ${alert.symbol} is {alert.direction} {alert.threshold:,.2f} (last {prices[alert.symbol]:,.2f})\n"
+            if len(text) + len(line) > 1900:
+                sendQueue.put(lambda channel=channel, text=text: channel.send(text.rstrip()))
+                text = ""
+            text += line
+        if text:
+            sendQueue.put(lambda channel=channel, text=text: channel.send(text.rstrip()))
+
+loadAlerts()
+if len(alertEngine):
+    print(f"Restored {len(alertEngine)} price alerts on {len(alertEngine.symbols())} symbols.")
+
+@bot.command()
+async def alert(ctx, *args):
+    """Price alerts: !alert $TSLA above 300, !alert list, !alert remove <id>"""
+    usage = "Usage: !alert $TSLA above 300, !alert $TSLA below 250, !alert list, !alert remove <id>"
+    if not args:
+        await ctx.send(usage)
+        return
+    if args[0].lower() == "list":
+        userAlerts = alertEngine.userAlerts(ctx.author.id)
+        if not userAlerts:
+            await ctx.send("You don't have any price alerts.")
+            return
+        lines = [f"#{alert.id}: ${alert.symbol} {alert.direction} {alert.threshold:,.2f}" for alert in userAlerts]
+        await ctx.send("Your price alerts:\n" + "\n".join(lines))
+        return
+    if args[0].lower() == "remove" and len(args) == 2:
+        try:
+            alertId = int(args[1].lstrip('#'))
+        except ValueError:
+            await ctx.send(usage)
+            return
+        removed = alertEngine.alerts.get(alertId)
+        if removed is None or removed.userId != ctx.author.id:
+            await ctx.send(f"You don't have an alert #{alertId}.")
+            return
+        alertEngine.remove(alertId)
+        saveAlerts()
+        await ctx.send(f"Removed alert #{alertId} for ${removed.symbol}.")
+        return
+    if len(args) != 3:
+        await ctx.send(usage)
+        return
+    symbol = args[0].lstrip('$').upper()
+    direction = args[1].lower()
+    try:
+        threshold = float(args[2].lstrip('$').replace(',', ''))
+    except ValueError:
+        await ctx.send(usage)
+        return
+    if not WATCHSYMBOL_REGEX.match(symbol) or direction not in (alerts.ABOVE, alerts.BELOW) or threshold <= 0:
+        await ctx.send(usage)
+        return
+    try:
+        newAlert = alertEngine.add(symbol, direction, threshold, ctx.author.id, ctx.channel.id)
+    except ValueError as e:
+        await ctx.send(f"Could not add the alert: {e}.")
+        return
+    saveAlerts()
+    await ctx.send(f"Alert #{newAlert.id} set: ${symbol} {direction} {threshold:,.2f}. I'll check every {POLLINTERVAL}s.")
+    if not quotePollTask.is_running():
+        quotePollTask.start()
+
+@tasks.loop(seconds=POLLINTERVAL)
+async def quotePollTask():
+    """ one batched quote poll for every watched or alerted symbol, then fire alerts and edit changed boards """
+    watchRegistry.expire()
+    symbols = sorted(set(watchRegistry.symbols()) | set(alertEngine.symbols()))
+    if not symbols:
+        return
+    ticks = await asyncio.get_running_loop().run_in_executor(None, refreshQuotes, symbols, POLLINTERVAL)
+    prices = {symbol: tick["price"] for symbol, tick in ticks.items() if tick.get("price") is not None}
+    fired = alertEngine.tick(prices)
+    if fired:
+        notifyAlerts(fired, prices)
+        saveAlerts()
+    for board, content in watchRegistry.changedBoards(ticks):
+        board.lastChange = time.time()
+        try:
+            await board.message.edit(embed=watchEmbed(board, content))
+            board.lastContent = content
+        except discord.NotFound:
+            # the board message was deleted, stop updating it
+            watchRegistry.remove(board)
+        except discord.HTTPException as e:
+            print(f"Failed to update watch board in channel {board.channelId}: {e}")
+
 @bot.command()
 async def whalealert(ctx,cmd:str,val=None):
     """Set whale alert minimum trigger value."""
@@ -1467,18 +1670,15 @@ async def whalealert(ctx,cmd:str,val=None):
     await ctx.send(message)
 
 
-def getWhaleAlertTransactions(startTime, endTime, minValue):
+def getWhaleAlertTransactions(startTime, endTime, minValue, deadline=None):
     """Get whale alert transactions between startTime and endTIme with specified min value."""
-    conn = http.client.HTTPSConnection("api.whale-alert.io")
     url = f"/v1/transactions?start={startTime}&end={endTime}&min_value={minValue}"
     try:
-        conn.request("GET", url, headers=waHeaders)
-        res = conn.getresponse()
+        status, reason, ret = upstreamGet("whalealert", "api.whale-alert.io", url, waHeaders, deadline)
     except:
         message = f"An error occured trying to retrive whale alert data. Could not connect to the remote server."
         return message
-    if(res.code == 200):
-        ret = res.read()
+    if(status == 200):
         ret = json.loads(ret.decode())
         return ret
     else:
@@ -1575,5 +1775,4 @@ def DoWhaleAlertReply(jsonData):
             return messages
         
         return messages
-        
-bot.run(TOKEN)
+
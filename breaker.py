@@ -0,0 +1,158 @@
+# breaker.py
+""" Circuit breaker around one upstream endpoint.
+
+Closed, calls go through and their outcome and latency land in a rolling window (the last
+WINDOW calls of the last HORIZON seconds). Once the window holds MIN_CALLS calls and too many of
+them failed or were slow, the breaker opens: calls are refused straight away with BreakerOpen
+instead of tying up a thread on a dead connection. After OPEN_SECONDS it goes half-open and lets
+PROBES calls through; a fast success closes it again, anything else opens it for another period.
+Every state change starts a new generation and before() hands out the one a call was let through
+in; an outcome from an earlier generation (a slow call let through while the breaker was still
+closed) is ignored, so only the probe decides a half-open breaker.
+"""
+import collections
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+WINDOW = 20
+HORIZON = 60
+MIN_CALLS = 5
+FAILURE_RATE = 0.5
+# a call slower than SLOW_CALL seconds counts against the endpoint even when it succeeds
+SLOW_CALL = 5.0
+SLOW_RATE = 0.8
+OPEN_SECONDS = 30
+PROBES = 1
+
+
+class BreakerOpen(Exception):
+    """ the breaker refused the call, retryAfter is how many seconds until it lets one through """
+
+    def __init__(self, name, retryAfter):
+        super().__init__(f"{name} circuit is open, retry in {retryAfter:.0f}s")
+        self.name = name
+        self.retryAfter = retryAfter
+
+
+class CircuitBreaker:
+    """ closed/open/half-open state of one endpoint, safe to share between threads """
+
+    def __init__(self, name, window=WINDOW, horizon=HORIZON, minCalls=MIN_CALLS, failureRate=FAILURE_RATE,
+                 slowCall=SLOW_CALL, slowRate=SLOW_RATE, openSeconds=OPEN_SECONDS, probes=PROBES, log=print):
+        self.name = name
+        self.horizon = horizon
+        self.minCalls = minCalls
+        self.failureRate = failureRate
+        self.slowCall = slowCall
+        self.slowRate = slowRate
+        self.openSeconds = openSeconds
+        self.probes = probes
+        self.log = log
+        # (when, failed, seconds) of recent calls
+        self.calls = collections.deque(maxlen=window)
+        self.state = CLOSED
+        self.changed = time.time()
+        self.openedAt = 0.0
+        self.generation = 0
+        self.probing = 0
+        self.rejected = 0
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    def transition(self, state, reason):
+        previous = self.state
+        self.state = state
+        self.generation += 1
+        self.changed = time.time()
+        if state == OPEN:
+            self.openedAt = time.monotonic()
+            self.opened += 1
+        self.log(f"Upstream {self.name}: circuit {previous} -> {state} ({reason})")
+
+    def prune(self, now):
+        while self.calls and now - self.calls[0][0] > self.horizon:
+            self.calls.popleft()
+
+    def rates(self, now):
+        """ (failure rate, slow rate, calls) over the window """
+        self.prune(now)
+        count = len(self.calls)
+        if not count:
+            return 0.0, 0.0, 0
+        failed = sum(1 for when, failure, seconds in self.calls if failure)
+        slow = sum(1 for when, failure, seconds in self.calls if seconds >= self.slowCall)
+        return failed / count, slow / count, count
+
+    def retryAfter(self):
+        """ seconds until a call would be let through, 0 when one would be now """
+        with self.lock:
+            if self.state == OPEN:
+                return max(0.0, self.openSeconds - (time.monotonic() - self.openedAt))
+            if self.state == HALF_OPEN and self.probing >= self.probes:
+                # a probe is out, its answer decides
+                return 1.0
+            return 0.0
+
+    def before(self):
+        """ call before each request, raises BreakerOpen when the request must not be made; returns
+        the generation to hand to record() or release() """
+        with self.lock:
+            if self.state == OPEN:
+                waited = time.monotonic() - self.openedAt
+                if waited < self.openSeconds:
+                    self.rejected += 1
+                    raise BreakerOpen(self.name, self.openSeconds - waited)
+                self.transition(HALF_OPEN, f"probing after {self.openSeconds}s")
+            if self.state == HALF_OPEN:
+                if self.probing >= self.probes:
+                    self.rejected += 1
+                    raise BreakerOpen(self.name, 1.0)
+                self.probing += 1
+            return self.generation
+
+    def record(self, ok, seconds, generation=None):
+        """ the outcome of a request before() let through, ignored when the breaker changed state since """
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            if self.state == HALF_OPEN:
+                self.probing = max(0, self.probing - 1)
+                if ok and seconds < self.slowCall:
+                    self.calls.clear()
+                    self.transition(CLOSED, f"probe answered in {seconds:.1f}s")
+                else:
+                    self.transition(OPEN, "probe failed" if not ok else f"probe took {seconds:.1f}s")
+                return
+            now = time.monotonic()
+            self.calls.append((now, not ok, seconds))
+            if self.state != CLOSED:
+                return
+            failureRate, slowRate, count = self.rates(now)
+            if count < self.minCalls:
+                return
+            if failureRate >= self.failureRate:
+                self.transition(OPEN, f"{failureRate:.0%} of the last {count} calls failed")
+            elif slowRate >= self.slowRate:
+                self.transition(OPEN, f"{slowRate:.0%} of the last {count} calls took over {self.slowCall:.0f}s")
+
+    def release(self, generation=None):
+        """ a request before() let through ended without an outcome that says anything about the
+        endpoint, e.g. the caller's own short timeout; frees its probe slot and records nothing """
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            if self.state == HALF_OPEN:
+                self.probing = max(0, self.probing - 1)
+
+    def stats(self):
+        with self.lock:
+            failureRate, slowRate, count = self.rates(time.monotonic())
+            latencies = sorted(seconds for when, failure, seconds in self.calls)
+            return {"name": self.name, "state": self.state, "since": self.changed, "calls": count,
+                    "failureRate": failureRate, "slowRate": slowRate,
+                    "p50": latencies[len(latencies) // 2] if latencies else None,
+                    "rejected": self.rejected, "opened": self.opened}
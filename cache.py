@@ -0,0 +1,318 @@
+# cache.py
+""" Pluggable key/value cache shared by everything the bot wants to remember.
+
+Values are bytes with an optional time to live. Three backends share one interface:
+
+    MemoryCache   process local, what you get when nothing is configured
+    SQLiteCache   a WAL mode database file, shared by every bot process on the host
+    RedisCache    any server speaking the redis protocol, shared across hosts
+
+Pick one in stockbot.cfg:
+
+    [cache]
+    backend = sqlite
+    path = cache.db
+    # backend = redis
+    # url = redis://127.0.0.1:6379/0
+"""
+import collections
+import json
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+
+class CacheBackend:
+    """ interface every backend implements """
+
+    def get(self, key):
+        """ bytes stored under key, or None when missing or expired """
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        """ store bytes under key, expiring after ttl seconds when given """
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def keys(self, prefix=""):
+        """ live keys starting with prefix """
+        raise NotImplementedError
+
+    def getMany(self, keys):
+        """ dict of key -> bytes for the keys that are present """
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def deletePrefix(self, prefix):
+        keys = self.keys(prefix)
+        for key in keys:
+            self.delete(key)
+        return len(keys)
+
+    def getJson(self, key):
+        value = self.get(key)
+        if value is None:
+            return None
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+
+    def setJson(self, key, value, ttl=None):
+        self.set(key, json.dumps(value, separators=(",", ":")).encode(), ttl)
+
+    def close(self):
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """ in-process LRU dictionary """
+
+    def __init__(self, maxEntries=20000):
+        self.maxEntries = maxEntries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (bytes(value), time.time() + ttl if ttl else None)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def keys(self, prefix=""):
+        now = time.time()
+        with self.lock:
+            return [key for key, (value, expires) in self.entries.items()
+                    if key.startswith(prefix) and (expires is None or expires > now)]
+
+
+class SQLiteCache(CacheBackend):
+    """ single file cache in WAL mode so several processes on one host can read and write it at once """
+
+    PURGE_EVERY = 1000
+
+    def __init__(self, path="cache.db", timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+        self.writes = 0
+        connection = self.connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL) WITHOUT ROWID")
+
+    def connection(self):
+        # sqlite connections can't be shared between threads, keep one per thread
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = self.connection().execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return bytes(row[0])
+
+    def getMany(self, keys):
+        keys = list(keys)
+        values = {}
+        now = time.time()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self.connection().execute(
+                f"SELECT key, value, expires FROM cache WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+            for key, value, expires in rows:
+                if expires is None or expires > now:
+                    values[key] = bytes(value)
+        return values
+
+    def set(self, key, value, ttl=None):
+        self.connection().execute("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                                  (key, bytes(value), time.time() + ttl if ttl else None))
+        self.writes += 1
+        if self.writes % self.PURGE_EVERY == 0:
+            self.purge()
+
+    def delete(self, key):
+        self.connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def keys(self, prefix=""):
+        # range scan on the primary key instead of LIKE so the index is used
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1) if prefix else "\U0010ffff"
+        rows = self.connection().execute(
+            "SELECT key FROM cache WHERE key >= ? AND key < ? AND (expires IS NULL OR expires > ?)",
+            (prefix, upper, time.time()))
+        return [row[0] for row in rows]
+
+    def purge(self):
+        """ drop expired rows """
+        self.connection().execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+
+    def close(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisCache(CacheBackend):
+    """ minimal redis protocol (RESP2) client, enough for a cache, without a dependency on redis-py """
+
+    def __init__(self, url="redis://127.0.0.1:6379/0", timeout=2.0, namespace="stockbot:"):
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.strip("/") or 0)
+        self.timeout = timeout
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.sock = None
+        self.reader = None
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+        if self.password:
+            self.roundTrip("AUTH", self.password)
+        if self.db:
+            self.roundTrip("SELECT", self.db)
+
+    def disconnect(self):
+        if self.sock is not None:
+            try:
+                self.reader.close()
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.reader = None
+
+    @staticmethod
+    def encode(args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, (bytes, bytearray)):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def readReply(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            if count < 0:
+                return None
+            return [self.readReply() for _ in range(count)]
+        raise RedisError(f"unexpected reply {line!r}")
+
+    def roundTrip(self, *args):
+        self.sock.sendall(self.encode(args))
+        return self.readReply()
+
+    def command(self, *args):
+        with self.lock:
+            for attempt in (1, 2):
+                try:
+                    if self.sock is None:
+                        self.connect()
+                    return self.roundTrip(*args)
+                except (OSError, ConnectionError):
+                    # one reconnect for a dropped idle connection, then give up
+                    self.disconnect()
+                    if attempt == 2:
+                        raise
+
+    def get(self, key):
+        return self.command("GET", self.namespace + key)
+
+    def getMany(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self.command("MGET", *(self.namespace + key for key in keys))
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    def set(self, key, value, ttl=None):
+        if ttl:
+            self.command("SET", self.namespace + key, bytes(value), "PX", int(ttl * 1000))
+        else:
+            self.command("SET", self.namespace + key, bytes(value))
+
+    def delete(self, key):
+        self.command("DEL", self.namespace + key)
+
+    def keys(self, prefix=""):
+        pattern = self.namespace + prefix
+        for special in "\\*?[]":
+            pattern = pattern.replace(special, "\\" + special)
+        keys = []
+        cursor = b"0"
+        while True:
+            cursor, batch = self.command("SCAN", cursor, "MATCH", pattern + "*", "COUNT", 500)
+            keys.extend(key.decode()[len(self.namespace):] for key in batch)
+            if cursor in (b"0", 0, "0"):
+                return keys
+
+    def close(self):
+        with self.lock:
+            self.disconnect()
+
+
+def openCache(backend="memory", path="cache.db", url="redis://127.0.0.1:6379/0"):
+    """ build the configured backend """
+    backend = (backend or "memory").lower()
+    if backend == "sqlite":
+        return SQLiteCache(path)
+    if backend == "redis":
+        return RedisCache(url)
+    if backend == "memory":
+        return MemoryCache()
+    raise ValueError(f"unknown cache backend {backend}")
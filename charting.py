@@ -0,0 +1,498 @@
+# charting.py
+""" Technical indicator charts for !chart.
+
+Indicators and buy/sell signals are always computed on every bar that was fetched. Only the
+drawing is reduced: when there are more bars than fit the plot at a readable candle width the
+candles and indicator lines are downsampled (see downsample.py) before they are drawn, so
+render time stays bounded however long the range is.
+
+The same indicators also exist as streaming state (see indicators.py); indicatorState() seeds
+that state from the batch results and updateIndicatorState() advances a saved one. The chart
+path doesn't use them, only benchmarks/check_indicators.py does.
+
+Charts are drawn on a per thread figure template (see charttemplate.py); the older one figure
+per chart mplfinance path is kept as engine="mplfinance" for comparison.
+
+Imports numpy, pandas and mplfinance, so the bot only imports this from loadChartStack().
+"""
+import matplotlib
+# charts are only ever saved to files, never shown
+matplotlib.use("Agg")
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter, MaxNLocator
+import mplfinance as mpf
+import numpy as np
+import pandas as pd
+
+import charttemplate
+import downsample
+import indicators
+import tracing
+
+MA_PERIOD = 10
+# the order generateChartBuySellMessage takes the crossing markers in
+MARKER_NAMES = ("macdSigBuy", "macdSigSell", "stochSigBuy", "stochSigSell", "movavgSigBuy", "movavgSigSell")
+MACD_PERIODS = (8, 17, 9)
+STOCHASTIC_PERIODS = (14, 3, 3)
+
+DPI = 400
+FIGSCALE = 1.1
+FIGRATIO = (8, 5)
+# the price panel spans about 7.3 of the 10.1 inches mplfinance makes for this figratio/figscale
+PLOT_WIDTH_INCHES = 7.3
+# narrower candles blur into a solid band once discord scales the image down
+MIN_PIXELS_PER_BAR = 8
+# discord rejects messages over 2000 characters
+MAX_MESSAGE_LENGTH = 1900
+
+
+def maxPlotBars(dpi=DPI):
+    """ most bars drawn before downsampling kicks in """
+    return int(PLOT_WIDTH_INCHES * dpi / MIN_PIXELS_PER_BAR)
+
+
+def exchangeTimes(epochs, meta):
+    """ exchange wall clock times of epoch seconds, from meta.exchangeTimezoneName (or the fixed gmtoffset)
+
+    The times come back naive: matplotlib would draw tz-aware times in UTC, and every consumer of
+    the frame wants the exchange's own session times (09:30 is the open wherever the bot runs).
+    """
+    times = pd.to_datetime(np.asarray(epochs, dtype=np.int64), unit="s", utc=True)
+    zone = meta.get("exchangeTimezoneName")
+    try:
+        return pd.DatetimeIndex(times).tz_convert(zone).tz_localize(None)
+    except Exception:
+        # no zone name or no tz database for it, the current utc offset is close enough
+        return pd.DatetimeIndex(times).tz_localize(None) + pd.Timedelta(seconds=meta.get("gmtoffset") or 0)
+
+
+def chartFrame(chartData):
+    """ OHLCV DataFrame indexed by exchange bar time from a decoded get-chart response
+
+    Each quote array goes to numpy in one call, with json nulls (bars without trades) becoming NaN.
+    """
+    result = chartData["chart"]["result"][0]
+    quote = result["indicators"]["quote"][0]
+    timestamps = result.get("timestamp") or []
+    columns = {name.capitalize(): np.array(quote.get(name) or [None] * len(timestamps), dtype=float)
+               for name in ("open", "high", "low", "close", "volume")}
+    # intraday responses come without adjusted closes
+    adjclose = result["indicators"].get("adjclose")
+    columns["Adj Close"] = np.array(adjclose[0]["adjclose"], dtype=float) if adjclose else columns["Close"].copy()
+    index = exchangeTimes(timestamps, result.get("meta") or {})
+    index.name = "Datetime"
+    return pd.DataFrame(columns, index=index)
+
+
+def macdBuySellMarkers(histogram):
+    """ marker where the histogram crosses zero, NaN elsewhere """
+    values = histogram.to_numpy(dtype=float)
+    sigBuy = np.full(len(values), np.nan)
+    sigSell = np.full(len(values), np.nan)
+    previous, value = values[:-1], values[1:]
+    buy = (previous < 0) & (value > 0)
+    sell = (previous > 0) & (value < 0)
+    sigBuy[1:][buy] = value[buy] * 0.99
+    sigSell[1:][sell] = value[sell] * 1.01
+    return sigBuy, sigSell
+
+
+def movavgBuySellMarkers(priceline, ma):
+    """ marker where the price crosses its moving average """
+    price = priceline.to_numpy(dtype=float)
+    average = ma.to_numpy(dtype=float)
+    sigBuy = np.full(len(average), np.nan)
+    sigSell = np.full(len(average), np.nan)
+    previousPrice, previousma = price[:-1], average[:-1]
+    buy = (previousPrice <= previousma) & (price[1:] > average[1:])
+    sell = (previousPrice >= previousma) & (price[1:] < average[1:])
+    sigBuy[1:][buy] = average[1:][buy] * .99
+    sigSell[1:][sell] = average[1:][sell] * 1.01
+    return sigBuy, sigSell
+
+
+def calcStochastics(df, period, kavg, davg):
+    """ %K over the last period + 1 bars, valid once period bars are in, smoothed by kavg then davg bar means """
+    lowest = df['Low'].rolling(period + 1, min_periods=period).min()
+    highest = df['High'].rolling(period + 1, min_periods=period).max()
+    df['KLine'] = 100 * ((df['Close'] - lowest) / (highest - lowest))
+    stochasticKLine = df['KLine'].rolling(kavg).mean()
+    stochasticDLine = stochasticKLine.rolling(davg).mean()
+    return stochasticKLine, stochasticDLine
+
+
+def calcStochasticDLine(df):
+    dLine = []
+    l3 = []
+    h3 = []
+    lows = df['Low'].to_numpy(dtype=float)
+    highs = df['High'].to_numpy(dtype=float)
+    for index, value in enumerate(df['Close'].to_numpy(dtype=float)):
+        if len(l3) < 3:
+            l3.append(lows[index])
+            h3.append(highs[index])
+        if len(l3) == 3:
+            l3.append(lows[index])
+            h3.append(highs[index])
+            kValue = 100 * ((value - min(l3)) / (max(h3) - min(l3)))
+            dLine.append(kValue)
+            l3.pop(0)
+            h3.pop(0)
+        elif len(l3) < 3:
+            dLine.append(np.nan)
+    return dLine
+
+
+def stochBuySellMarkers(stochasticKLine, stochasticDLine):
+    """ marker where %K crosses %D """
+    k = stochasticKLine.to_numpy(dtype=float)
+    d = stochasticDLine.to_numpy(dtype=float)
+    stochSigBuy = np.full(len(k), np.nan)
+    stochSigSell = np.full(len(k), np.nan)
+    kPrev, dPrev = k[:-1], d[:-1]
+    buy = (k[1:] > d[1:]) & (kPrev <= dPrev)
+    sell = (k[1:] < d[1:]) & (kPrev >= dPrev)
+    stochSigBuy[1:][buy] = k[1:][buy] - 5
+    stochSigSell[1:][sell] = k[1:][sell] + 5
+    return stochSigBuy, stochSigSell
+
+
+def calcMACD(closeData, fastMAPeriod, slowMAPeriod, signalPeriod):
+    expFast = closeData.ewm(span=fastMAPeriod, adjust=False).mean()
+    expSlow = closeData.ewm(span=slowMAPeriod, adjust=False).mean()
+    macd = expFast - expSlow
+    signal = macd.ewm(span=signalPeriod, adjust=False).mean()
+    histogram = macd - signal
+    return macd, signal, histogram
+
+
+def calcRSI(closeData):
+    delta = closeData.diff()
+    up = delta.clip(lower=0)
+    down = -1 * delta.clip(upper=0)
+    ema_up = up.ewm(com=13, adjust=False).mean()
+    ema_down = down.ewm(com=13, adjust=False).mean()
+    rs = ema_up / ema_down
+    rsi = (100 - (100 / (1 + rs)))
+    rsi.iloc[:12] = np.nan
+    return rsi
+
+
+BUY = 1
+SELL = -1
+
+
+def markerDirections(sigBuy, sigSell):
+    """ BUY where a buy marker is set, SELL for a sell marker (buy wins if both are), 0 elsewhere """
+    return np.where(~np.isnan(sigBuy), BUY, np.where(~np.isnan(sigSell), SELL, 0)).astype(np.int8)
+
+
+def lastEvents(directions):
+    """ per bar, the index of the latest marker at or before it (-1 before the first) and its direction """
+    positions = np.where(directions != 0, np.arange(len(directions)), -1)
+    last = np.maximum.accumulate(positions) if len(positions) else positions
+    return last, np.where(last >= 0, directions[np.maximum(last, 0)], 0)
+
+
+def buySellSignals(macdSigBuy, macdSigSell, stochSigBuy, stochSigSell, movavgSigBuy, movavgSigSell):
+    """ (bar index, BUY or SELL) of every combined call, oldest first
+
+    A call needs the latest MACD, stochastic and moving average crossings to agree and must differ
+    from the previous call. Every call clears the MACD and stochastic states, so the next one also
+    needs a fresh crossing of both after it. The index of the latest crossing only ever grows, so
+    instead of walking every bar the next call is found with two binary searches.
+    """
+    macdLast, macdDirection = lastEvents(markerDirections(macdSigBuy, macdSigSell))
+    stochLast, stochDirection = lastEvents(markerDirections(stochSigBuy, stochSigSell))
+    maLast, maDirection = lastEvents(markerDirections(movavgSigBuy, movavgSigSell))
+    # the bar of the older of the two latest MACD and stochastic crossings, nondecreasing
+    bothSince = np.minimum(macdLast, stochLast)
+    agree = {direction: np.flatnonzero((macdDirection == direction) & (stochDirection == direction) & (maDirection == direction))
+             for direction in (BUY, SELL)}
+    signals = []
+    previous = -1
+    direction = None
+    while True:
+        # first bar where both states were set again after the previous call
+        start = max(previous + 1, int(np.searchsorted(bothSince, previous, side="right")))
+        best = None
+        for option in ((BUY, SELL) if direction is None else (-direction,)):
+            position = np.searchsorted(agree[option], start)
+            if position < len(agree[option]) and (best is None or agree[option][position] < best[0]):
+                best = (int(agree[option][position]), option)
+        if best is None:
+            return signals
+        previous, direction = best
+        signals.append(best)
+
+
+def generateChartBuySellMessage(priceData, macdSigBuy, macdSigSell, stochSigBuy, stochSigSell, movavgSigBuy, movavgSigSell, rsi, stochasticLine, chartMsgPath, dateFormat="%m-%d"):
+    retMsg = ""
+    prices = priceData.to_numpy(dtype=float)
+    buySellSignal = [(":green_circle::chart_with_upwards_trend:Buy" if direction == BUY else ":red_circle::chart_with_downwards_trend:Sell", index, prices[index])
+                     for index, direction in buySellSignals(macdSigBuy, macdSigSell, stochSigBuy, stochSigSell, movavgSigBuy, movavgSigSell)]
+
+    for buySellstring, index, value in buySellSignal:
+        overBoughtSoldStr = ""
+        rsiStr = ""
+        stochStr = ""
+        rsiVal = rsi.iloc[index]
+        stochasticVal = stochasticLine.iloc[index]
+        if rsiVal >= 70 or stochasticVal >= 80:
+            if rsiVal >= 70:
+                rsiStr = "*rsi*"
+            if stochasticVal >= 80:
+                if len(rsiStr):
+                    stochStr = " *+ stoch*"
+                else:
+                    stochStr = "*stoch*"
+            overBoughtSoldStr = rsiStr + stochStr + " *overbought*"
+        elif rsiVal <= 30 or stochasticVal <= 20:
+            if rsiVal <= 30:
+                rsiStr = "*rsi*"
+            if stochasticVal <= 20:
+                if len(rsiStr):
+                    stochStr = " *+ stoch*"
+                else:
+                    stochStr = "*stoch*"
+            overBoughtSoldStr = rsiStr + stochStr + " *oversold*"
+        date = priceData.index[index].strftime(dateFormat)
+        price = "${:.2f}".format(value)
+        retMsg += f"{buySellstring} on {date} @ {price} {overBoughtSoldStr}\n"
+    if len(retMsg) > MAX_MESSAGE_LENGTH:
+        # long ranges produce more signals than fit in a message, keep the most recent ones
+        lines = retMsg.splitlines(keepends=True)
+        kept = []
+        length = 0
+        while lines and length + len(lines[-1]) <= MAX_MESSAGE_LENGTH - 40:
+            length += len(lines[-1])
+            kept.insert(0, lines.pop())
+        retMsg = f"*{len(lines)} earlier signals not shown*\n" + "".join(kept)
+    if chartMsgPath:
+        try:
+            F = open(chartMsgPath, "w")
+            F.write(retMsg)
+            F.close()
+        except:
+            pass
+    return retMsg
+
+
+def downsampleChart(df, series, bars):
+    """ reduce the candles and every plotted series to bars points over shared buckets
+
+    series maps a name to (values, how) with how either "line" or "bar".
+    """
+    starts = downsample.bucketStarts(len(df), bars)
+    opens, highs, lows, closes, volumes = downsample.ohlc(df['Open'], df['High'], df['Low'], df['Close'], df['Volume'], starts)
+    plotFrame = pd.DataFrame({"Open": opens, "High": highs, "Low": lows, "Close": closes, "Volume": volumes},
+                             index=df.index[starts])
+    reducers = {"line": downsample.lttb, "bar": downsample.extremes}
+    reduced = {name: reducers[how](np.asarray(values, dtype=float), starts) for name, (values, how) in series.items()}
+    return plotFrame, reduced
+
+
+def chartIndicators(df):
+    """ every indicator series and crossing marker !chart uses, computed over all bars of df """
+    closeData = df['Close']
+    # 10 bar moving average for price chart
+    ma = closeData.rolling(MA_PERIOD).mean()
+    # generate MACD chart data
+    macd, signal, histogram = calcMACD(closeData, *MACD_PERIODS)
+    macdSigBuy, macdSigSell = macdBuySellMarkers(histogram)
+    movavgSigBuy, movavgSigSell = movavgBuySellMarkers(closeData, ma)
+    # generate stochastics chart data
+    stochasticKLine, stochasticDLine = calcStochastics(df, *STOCHASTIC_PERIODS)
+    stochSigBuy, stochSigSell = stochBuySellMarkers(stochasticKLine, stochasticDLine)
+    # generate RSI chart
+    rsi = calcRSI(closeData)
+    return {"close": closeData, "ma": ma, "macd": macd, "signal": signal, "histogram": histogram,
+            "stochasticKLine": stochasticKLine, "stochasticDLine": stochasticDLine, "rsi": rsi,
+            "macdSigBuy": macdSigBuy, "macdSigSell": macdSigSell, "movavgSigBuy": movavgSigBuy,
+            "movavgSigSell": movavgSigSell, "stochSigBuy": stochSigBuy, "stochSigSell": stochSigSell}
+
+
+def renderChart(df, title, chartImgPath, chartMsgPath=None, intraday=False, dpi=DPI, maxBars=None, engine="template"):
+    """ compute indicators on every bar of df, draw the chart to chartImgPath and return the buy/sell message """
+    with tracing.span("indicators", bars=len(df)):
+        values = chartIndicators(df)
+        chartBuySellMessage = generateChartBuySellMessage(values["ma"], *(values[name] for name in MARKER_NAMES),
+                                                          values["rsi"], values["stochasticKLine"], chartMsgPath, "%m-%d %H:%M" if intraday else "%m-%d")
+
+    series = {name: (values[name], "bar" if name == "histogram" else "line")
+              for name in ("histogram", "macd", "signal", "ma", "close", "stochasticKLine", "stochasticDLine", "rsi")}
+    markers = {name: values[name] for name in MARKER_NAMES}
+    maxBars = maxBars or maxPlotBars(dpi)
+    if len(df) > maxBars:
+        plotFrame, plot = downsampleChart(df, series, maxBars)
+        # crossing markers belong to single bars, once bars are merged nearly every candle holds
+        # some crossing and the markers turn into noise, the message still lists the signals
+        markers = {}
+    else:
+        plotFrame = df
+        plot = {name: np.asarray(values, dtype=float) for name, (values, how) in series.items()}
+    with tracing.span("draw", bars=len(plotFrame), engine=engine):
+        if engine == "mplfinance":
+            plotWithMplfinance(plotFrame, plot, markers, title, chartImgPath, dpi)
+        else:
+            chart = charttemplate.template()
+            chart.draw(plotFrame, plot, markers, title, intraday)
+            chart.save(chartImgPath, dpi)
+    return chartBuySellMessage
+
+
+def plotWithMplfinance(plotFrame, plot, markers, title, chartImgPath, dpi):
+    """ build a new figure for the chart with mpf.plot """
+    overboughtLines = {level: [level] * len(plotFrame) for level in (20, 30, 70, 80)}
+
+    addPlots = [mpf.make_addplot(plot["histogram"], type='bar', width=0.7, panel=1, color='dimgray', alpha=1, secondary_y=False, ylabel='MACD'),
+                mpf.make_addplot(plot["macd"], panel=1, color='fuchsia', secondary_y=True, width=0.5),
+                mpf.make_addplot(plot["signal"], panel=1, color='b', secondary_y=True, width=0.5),
+                mpf.make_addplot(plot["ma"], panel=0, color='c', width=0.5),
+                mpf.make_addplot(plot["close"], panel=0, color='black', width=0.2),
+                mpf.make_addplot(plot["stochasticKLine"], panel=2, color='black', width=0.5, ylabel='Stoch'),
+                mpf.make_addplot(plot["stochasticDLine"], panel=2, color='red', width=0.5, secondary_y=False),
+                mpf.make_addplot(overboughtLines[80], panel=2, secondary_y=False, color='grey', width=0.4),
+                mpf.make_addplot(overboughtLines[20], panel=2, secondary_y=False, color='grey', width=0.4),
+                mpf.make_addplot(plot["rsi"], panel=3, color='red', width=0.5, secondary_y=False, ylabel='RSI'),
+                mpf.make_addplot(overboughtLines[70], panel=3, secondary_y=False, color='grey', width=0.4),
+                mpf.make_addplot(overboughtLines[30], panel=3, secondary_y=False, color='grey', width=0.4),
+                ]
+    # mplfinance refuses scatter plots without a single point, so only add markers that exist
+    for name, panel, color, marker in (("macdSigBuy", 1, 'g', '^'), ("macdSigSell", 1, 'r', 'v'),
+                                       ("movavgSigBuy", 0, 'g', '^'), ("movavgSigSell", 0, 'r', 'v'),
+                                       ("stochSigBuy", 2, 'g', '^'), ("stochSigSell", 2, 'r', 'v')):
+        if name in markers and not np.isnan(markers[name]).all():
+            addPlots.append(mpf.make_addplot(markers[name], panel=panel, color=color, type='scatter', markersize=50, marker=marker, secondary_y=False))
+
+    mpf.plot(
+        plotFrame,
+        type="candle",
+        addplot=addPlots,
+        title=title,
+        volume=True,
+        volume_panel=4,
+        panel_ratios=(4, 2, 2, 2, 1),
+        style="default",
+        figscale=FIGSCALE,
+        figratio=FIGRATIO,
+        savefig=dict(fname=chartImgPath, dpi=dpi, bbox_inches="tight")
+    )
+
+
+def seedEMA(ema, inputs, outputs):
+    """ put a streaming EMA in the state it has after inputs, from the batch ewm outputs """
+    inputs = np.asarray(inputs, dtype=float)
+    observed = np.flatnonzero(~np.isnan(inputs))
+    ema.started = len(inputs) > 0
+    ema.observations = len(observed)
+    if not len(observed):
+        ema.weighted = np.nan
+        return ema
+    ema.weighted = float(outputs.iloc[-1])
+    # every missing value after the last observation aged the mean once
+    for _ in range(len(inputs) - 1 - int(observed[-1])):
+        ema.oldWeight *= 1.0 - ema.alpha
+    return ema
+
+
+def indicatorState(df, timestamps):
+    """ streaming indicators positioned after the last bar of df, seeded from the batch
+    results in O(window) instead of replaying every bar """
+    state = indicators.IndicatorSet(MA_PERIOD, MACD_PERIODS, STOCHASTIC_PERIODS)
+    if not len(df):
+        return state
+    state.firstTimestamp = int(timestamps[0])
+    state.lastTimestamp = int(timestamps[len(df) - 1])
+    state.bars = len(df)
+    closes = df['Close']
+    closeValues = closes.to_numpy(dtype=float)
+    state.ma.window.extend(closeValues[-MA_PERIOD:].tolist())
+
+    fast, slow, signal = MACD_PERIODS
+    fastLine = closes.ewm(span=fast, adjust=False).mean()
+    slowLine = closes.ewm(span=slow, adjust=False).mean()
+    macd = fastLine - slowLine
+    seedEMA(state.macd.fast, closeValues, fastLine)
+    seedEMA(state.macd.slow, closeValues, slowLine)
+    seedEMA(state.macd.signal, macd, macd.ewm(span=signal, adjust=False).mean())
+
+    delta = closes.diff()
+    up = delta.clip(lower=0)
+    down = -1 * delta.clip(upper=0)
+    seedEMA(state.rsi.up, up, up.ewm(com=state.rsi.com, adjust=False).mean())
+    seedEMA(state.rsi.down, down, down.ewm(com=state.rsi.com, adjust=False).mean())
+    state.rsi.previousClose = float(closeValues[-1])
+    state.rsi.bars = len(df)
+    state.rsi.last = float(calcRSI(closes).iloc[-1])
+
+    # the rolling extremes only need the bars still inside their window
+    stochastic = state.stochastic
+    period, kavg, davg = STOCHASTIC_PERIODS
+    highs = df['High'].to_numpy(dtype=float)
+    lows = df['Low'].to_numpy(dtype=float)
+    for high, low in zip(highs[-(period + 1):].tolist(), lows[-(period + 1):].tolist()):
+        stochastic.lows.update(low)
+        stochastic.highs.update(high)
+        stochastic.present.append((low == low, high == high))
+    tail = df.iloc[-(period + kavg + davg):].copy()
+    smoothed, dLine = calcStochastics(tail, period, kavg, davg)
+    stochastic.kLine.window.extend(tail['KLine'].to_numpy(dtype=float)[-kavg:].tolist())
+    stochastic.dLine.window.extend(smoothed.to_numpy(dtype=float)[-davg:].tolist())
+    return state
+
+
+def completeBars(timestamps, now):
+    """ how many leading bars have closed by now, the last bar is still forming during the session """
+    if len(timestamps) < 2:
+        return len(timestamps)
+    step = float(np.median(np.diff(np.asarray(timestamps, dtype=float))))
+    return int(np.searchsorted(np.asarray(timestamps, dtype=float) + step, now, side="right"))
+
+
+def updateIndicatorState(saved, df, timestamps, now):
+    """ the saved state (an IndicatorSet.toDict()) advanced by the closed bars of df it has not
+    seen, or a new state seeded from df when the saved one can't be continued with these bars """
+    complete = completeBars(timestamps, now)
+    state = indicators.IndicatorSet.fromDict(saved)
+    if state is not None and state.lastTimestamp is not None and complete and \
+            state.firstTimestamp <= timestamps[0] and timestamps[0] <= state.lastTimestamp <= timestamps[complete - 1]:
+        start = int(np.searchsorted(np.asarray(timestamps[:complete]), state.lastTimestamp, side="right"))
+        if timestamps[start - 1] == state.lastTimestamp:
+            highs = df['High'].to_numpy(dtype=float)
+            lows = df['Low'].to_numpy(dtype=float)
+            closes = df['Close'].to_numpy(dtype=float)
+            for index in range(start, complete):
+                state.update(int(timestamps[index]), float(highs[index]), float(lows[index]), float(closes[index]))
+            return state
+    return indicatorState(df.iloc[:complete], timestamps)
+
+
+# dpi of the degraded chart drawn when a command's deadline leaves no time for the full one
+LIGHT_DPI = 150
+
+
+def renderPriceChart(df, title, chartImgPath, intraday=False, dpi=LIGHT_DPI):
+    """ closes and volume only, no indicators: the chart !chart falls back to when it is short of time """
+    figure = Figure(figsize=(charttemplate.FIGSIZE[0], charttemplate.FIGSIZE[1] * 0.6), facecolor="white")
+    FigureCanvasAgg(figure)
+    grid = figure.add_gridspec(2, 1, height_ratios=(4, 1), hspace=0, left=0.18, right=0.9, bottom=0.15, top=0.85)
+    price = figure.add_subplot(grid[0])
+    volume = figure.add_subplot(grid[1], sharex=price)
+    positions = np.arange(len(df), dtype=float)
+    for ax, label in ((price, "Price"), (volume, "Volume")):
+        charttemplate.ChartTemplate.styleAxes(ax)
+        ax.set_ylabel(label, fontsize="large", fontweight="semibold")
+    price.tick_params(labelbottom=False)
+    price.plot(positions, df["Close"].to_numpy(dtype=float), color="black", linewidth=0.8)
+    volumes = np.nan_to_num(df["Volume"].to_numpy(dtype=float))
+    volume.bar(positions, volumes, width=charttemplate.BAR_WIDTH, color=charttemplate.VOLUMECOLOR)
+    dates = df.index
+    dateFormat = charttemplate.dateFormat(dates, intraday)
+    volume.xaxis.set_major_locator(MaxNLocator(nbins=8, integer=True))
+    volume.xaxis.set_major_formatter(FuncFormatter(
+        lambda value, position: dates[int(round(value))].strftime(dateFormat) if 0 <= int(round(value)) < len(dates) else ""))
+    volume.set_xlim(-1, len(df))
+    figure.suptitle(title, fontsize="x-large", fontweight="semibold")
+    figure.savefig(chartImgPath, dpi=dpi, bbox_inches="tight", pil_kwargs={"compress_level": charttemplate.PNG_COMPRESS_LEVEL})
@@ -0,0 +1,1364 @@
+#!/usr/bin/env python3
+# core.py
+""" The bot's data and render core, importable without Discord.
+
+Cache helpers, upstream requests behind their circuit breakers, the get-summary replies
+(price_reply and the Do_*_Reply builders), market movers and the chart pipeline live here.
+bot.py imports them and adds the Discord side; stockbot.py drives them from the command line.
+Nothing here reads stockbot.cfg or opens the cache on import: call readConfig() with a parsed
+config and then openCache(), or leave the defaults (an in-memory cache, the real upstream apis).
+
+The bot hangs its bookkeeping on hooks: every callable in hooks["lookup"] is called with
+(symbol, cached) for each symbol price_reply looks up, every one in hooks["summary"] with
+(symbol, get-summary response) for each response cached and every one in hooks["reject"] with
+the symbol of each dollar amount like $1000 price_reply throws out.
+"""
+import concurrent.futures
+import datetime
+import http.client
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+from typing import List,Dict
+
+import discord
+
+import breaker
+import cache
+import deadline as deadlines
+import leaderboard
+import profiling
+import tracing
+import watch as watchboards
+
+# charting pulls in pandas, numpy and matplotlib, it is imported by loadCharting() when a chart is first built
+charting = None
+chartingLock = threading.Lock()
+
+RAPIDAPIKEY = None
+# optional stand-in server (see fakeupstream.py) that replaces every remote api, used for load testing
+UPSTREAMURL = None
+# seconds before an upstream connect or read gives up
+UPSTREAMTIMEOUT = 10
+CACHEBACKEND = "sqlite"
+CACHEPATH = "cache.db"
+CACHEURL = "redis://127.0.0.1:6379/0"
+chartsFolder = r'charts'
+
+# headers used for all rapid api yahoo finance connection requests
+headers = {
+    'x-rapidapi-key': RAPIDAPIKEY,
+    'x-rapidapi-host': "apidojo-yahoo-finance-v1.p.rapidapi.com"
+}
+
+hooks = {"lookup": [], "summary": [], "reject": []}
+
+# cProfile of the next calls of price_reply or buildChart, armed by the bot's !profile
+profiler = profiling.CallProfiler()
+
+def readConfig(configParser):
+    """ take the rapid api key, upstream and cache settings from a parsed stockbot.cfg """
+    global RAPIDAPIKEY, UPSTREAMURL, UPSTREAMTIMEOUT, CACHEBACKEND, CACHEPATH, CACHEURL
+    if configParser.has_option('rapid-api', 'key'):
+        RAPIDAPIKEY = configParser.get('rapid-api', 'key')
+        headers['x-rapidapi-key'] = RAPIDAPIKEY
+    if configParser.has_option('upstream', 'url'):
+        UPSTREAMURL = configParser.get('upstream', 'url')
+    if configParser.has_option('upstream', 'timeout'):
+        UPSTREAMTIMEOUT = float(configParser.get('upstream', 'timeout'))
+    if configParser.has_option('cache', 'backend'):
+        CACHEBACKEND = configParser.get('cache', 'backend')
+    if configParser.has_option('cache', 'path'):
+        CACHEPATH = configParser.get('cache', 'path')
+    if configParser.has_option('cache', 'url'):
+        CACHEURL = configParser.get('cache', 'url')
+
+def notify(event, *args):
+    for hook in hooks[event]:
+        try:
+            hook(*args)
+        except Exception as e:
+            print(f"{event} hook failed: {e}")
+
+def makeChartsFolder():
+    if not os.path.exists(chartsFolder):
+        os.makedirs(chartsFolder)
+
+def loadCharting():
+    """ import the charting module (and with it pandas, numpy and matplotlib) the first time it is needed """
+    global charting
+    if charting is not None:
+        return charting
+    with chartingLock:
+        if charting is None:
+            import charting as chartingModule
+            charting = chartingModule
+    return charting
+
+# quotes, fundamentals, chart metadata and checkpoints live in a cache shared by restarts and sibling processes
+QUOTEMAXAGE = 60
+FUNDAMENTALSMAXAGE = 6 * 60 * 60
+CACHERETENTION = 7 * 24 * 60 * 60
+# an in-memory cache until openCache() opens the configured one
+cacheBackend = cache.MemoryCache()
+
+def openCache():
+    """ open the cache configured by readConfig(), falling back to an in-memory one """
+    global cacheBackend
+    try:
+        cacheBackend = cache.openCache(CACHEBACKEND, CACHEPATH, CACHEURL)
+    except Exception as e:
+        print(f"Could not open {CACHEBACKEND} cache ({e}), using an in-memory cache instead.")
+        cacheBackend = cache.MemoryCache()
+    return cacheBackend
+
+def cacheGet(key, maxAge=None):
+    """ data cached under key, None when it is missing, older than maxAge seconds or the cache is unreachable """
+    try:
+        with tracing.span("cache get", key=key):
+            entry = cacheBackend.getJson(key)
+    except Exception as e:
+        print(f"Cache read failed for {key}: {e}")
+        return None
+    if not entry:
+        return None
+    if maxAge is not None and time.time() - entry["time"] > maxAge:
+        return None
+    return entry["data"]
+
+def cacheGetMany(keys, maxAge=None, stamped=False):
+    """ like cacheGet for several keys in one round trip, returns a dict of the keys found
+    (with stamped, of (time stored, data) pairs) """
+    try:
+        with tracing.span("cache get", keys=len(keys)):
+            values = cacheBackend.getMany(keys)
+    except Exception as e:
+        print(f"Cache read failed for {len(keys)} keys: {e}")
+        return {}
+    found = {}
+    now = time.time()
+    for key, value in values.items():
+        try:
+            entry = json.loads(value)
+        except ValueError:
+            continue
+        if maxAge is None or now - entry["time"] <= maxAge:
+            found[key] = (entry["time"], entry["data"]) if stamped else entry["data"]
+    return found
+
+def cachePut(key, data, ttl=CACHERETENTION):
+    """ store data under key along with when it was stored, ttl=None keeps it until deleted """
+    try:
+        cacheBackend.setJson(key, {"time": time.time(), "data": data}, ttl)
+    except Exception as e:
+        print(f"Cache write failed for {key}: {e}")
+
+# modules of a get-summary response that change with every trade, the rest are fundamentals
+QUOTEMODULES = ("price", "quoteType")
+
+def cacheSummary(symbol, jsonData):
+    """ split a get-summary response into a short lived quote and longer lived fundamentals """
+    symbol = symbol.upper()
+    cachePut(f"quote:{symbol}", {key: jsonData[key] for key in QUOTEMODULES if key in jsonData})
+    try:
+        cachePut(f"tick:{symbol}", tickFromPrice(symbol, jsonData["price"]))
+    except:
+        pass
+    cachePut(f"fundamentals:{symbol}", {key: value for key, value in jsonData.items() if key not in QUOTEMODULES})
+    notify("summary", symbol, jsonData)
+
+def cachedSummary(symbol):
+    """ rebuild a get-summary response from the cache when both halves are fresh enough """
+    symbol = symbol.upper()
+    quote = cacheGet(f"quote:{symbol}", QUOTEMAXAGE)
+    if quote is None:
+        return None
+    fundamentals = cacheGet(f"fundamentals:{symbol}", FUNDAMENTALSMAXAGE)
+    if fundamentals is None:
+        return None
+    fundamentals.update(quote)
+    return fundamentals
+
+def staleSummary(symbol):
+    """ (get-summary response, when its quote was stored) from the cache however old, (None, None) without one """
+    symbol = symbol.upper()
+    found = cacheGetMany([f"quote:{symbol}", f"fundamentals:{symbol}"], stamped=True)
+    if len(found) < 2:
+        return None, None
+    stored, quote = found[f"quote:{symbol}"]
+    fundamentals = found[f"fundamentals:{symbol}"][1]
+    fundamentals.update(quote)
+    return fundamentals, stored
+
+def upstreamConnection(host, timeout=None):
+    """ open a connection to a remote api host, or to the stand-in upstream server when one is configured """
+    timeout = timeout or UPSTREAMTIMEOUT
+    if UPSTREAMURL:
+        upstream = urllib.parse.urlsplit(UPSTREAMURL)
+        return http.client.HTTPConnection(upstream.hostname, upstream.port or 80, timeout=timeout)
+    return http.client.HTTPSConnection(host, timeout=timeout)
+
+def noDeadline():
+    """ a budget that never runs out, for background work """
+    return deadlines.Deadline("background", float("inf"))
+
+# one circuit breaker per upstream endpoint, state changes are logged
+upstreamBreakers = {name: breaker.CircuitBreaker(name) for name in ("summary", "quotes", "chart", "movers", "whalealert")}
+
+def upstreamGet(endpoint, host, url, requestHeaders, deadline=None):
+    """ GET url through the endpoint's circuit breaker and return (status, reason, body); raises
+    breaker.BreakerOpen without making the request while the breaker is open, DeadlineExceeded when
+    the deadline has passed, and whatever the connection raised when the request failed """
+    timeout = deadline.timeout(UPSTREAMTIMEOUT) if deadline is not None else UPSTREAMTIMEOUT
+    circuit = upstreamBreakers[endpoint]
+    generation = circuit.before()
+    started = time.perf_counter()
+    conn = None
+    try:
+        with tracing.span("upstream", endpoint=endpoint) as attrs:
+            conn = upstreamConnection(host, timeout)
+            conn.request("GET", url, headers=requestHeaders)
+            res = conn.getresponse()
+            body = res.read()
+            attrs["status"] = res.status
+    except BaseException as e:
+        if isinstance(e, TimeoutError) and timeout < UPSTREAMTIMEOUT:
+            # timed out on a timeout the deadline cut short, that says nothing about the endpoint
+            circuit.release(generation)
+        else:
+            circuit.record(False, time.perf_counter() - started, generation)
+        if deadline is not None and deadline.expired():
+            # timed out on what was left of the budget rather than the full timeout
+            raise deadlines.DeadlineExceeded(deadline.command, "fetch")
+        raise
+    finally:
+        if conn is not None:
+            conn.close()
+    # a missing symbol is an answer, only server errors and throttling count against the endpoint
+    circuit.record(res.status < 500 and res.status != 429, time.perf_counter() - started, generation)
+    return res.status, res.reason, body
+
+def fetchSymbolData(symbol, deadline=None):
+    """ make a stock symbol query request to yahoo finance and return (error message, entire contents of message returned) """
+    url = f"/stock/v2/get-summary?symbol={symbol}&region=US"
+    message = None
+    try:
+        status, reason, body = upstreamGet("summary", "apidojo-yahoo-finance-v1.p.rapidapi.com", url, headers, deadline)
+    except deadlines.DeadlineExceeded:
+        return f"Looking up ${symbol} took too long, try again.", None
+    except breaker.BreakerOpen:
+        return f"Yahoo Finance is not answering right now, try ${symbol} again in a minute.", None
+    except:
+        message = f"An error occured trying to retrive information for ${symbol}. Could not get a response from the remote server."
+        return message, None
+  
+    if(status == 200):
+        return message,body
+    else:
+        message = f"An error occured trying to retrive information for ${symbol}. Error code:{status}. Reason:{reason}"
+        return message,None
+
+def refreshSummary(symbol):
+    """ fetch a get-summary response and cache it, returns it or None when the fetch failed """
+    message, data = fetchSymbolData(symbol)
+    try:
+        jsonData = json.loads(data.decode())
+        if jsonData["quoteType"]["quoteType"]:
+            cacheSummary(symbol, jsonData)
+            return jsonData
+    except:
+        pass
+    return None
+
+# stale entries being refreshed in the background, by key
+REVALIDATEMAXWAIT = 60
+revalidatePool = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+revalidating = set()
+revalidateLock = threading.Lock()
+
+def revalidate(key, endpoint, function, *args):
+    """ run function(*args) in the background to replace a stale entry, once the endpoint's breaker lets a call through """
+    with revalidateLock:
+        if key in revalidating:
+            return
+        revalidating.add(key)
+    def run():
+        try:
+            wait = upstreamBreakers[endpoint].retryAfter()
+            if wait:
+                time.sleep(min(wait, REVALIDATEMAXWAIT))
+            function(*args)
+        except Exception as e:
+            print(f"Background refresh of {key} failed: {e}")
+        finally:
+            with revalidateLock:
+                revalidating.discard(key)
+    revalidatePool.submit(run)
+
+def staleNote(stored):
+    return f"Yahoo Finance is not answering, this is from {datetime.datetime.fromtimestamp(stored).strftime('%H:%M')}. It is being refreshed."
+
+def tickFromPrice(symbol, price: dict) -> dict:
+    """ compact quote ("tick") from the price module of a get-summary response """
+    def raw(name):
+        try:
+            return price[name]["raw"]
+        except:
+            return None
+    return {"symbol": symbol, "name": price.get("shortName"), "price": raw("regularMarketPrice"),
+            "change": raw("regularMarketChange"), "changePercent": raw("regularMarketChangePercent"),
+            "marketState": price.get("marketState"), "currency": price.get("currency"),
+            "time": price.get("regularMarketTime"), "prePrice": raw("preMarketPrice"), "postPrice": raw("postMarketPrice")}
+
+def tickFromQuote(result: dict) -> dict:
+    """ compact quote ("tick") from one get-quotes result """
+    changePercent = result.get("regularMarketChangePercent")
+    return {"symbol": result["symbol"], "name": result.get("shortName"), "price": result.get("regularMarketPrice"),
+            "change": result.get("regularMarketChange"),
+            # get-quotes reports percent change in percent, get-summary as a fraction
+            "changePercent": changePercent / 100 if changePercent is not None else None,
+            "marketState": result.get("marketState"), "currency": result.get("currency"),
+            "time": result.get("regularMarketTime"), "prePrice": result.get("preMarketPrice"),
+            "postPrice": result.get("postMarketPrice")}
+
+QUOTEBATCHSIZE = 50
+
+def fetchQuoteResults(symbols, deadline=None):
+    """ one batched get-quotes request for up to QUOTEBATCHSIZE symbols, returns the raw results """
+    url = f"/market/v2/get-quotes?region=US&symbols={urllib.parse.quote(','.join(symbols))}"
+    try:
+        status, reason, body = upstreamGet("quotes", "apidojo-yahoo-finance-v1.p.rapidapi.com", url, headers, deadline)
+    except (breaker.BreakerOpen, deadlines.DeadlineExceeded):
+        return []
+    except:
+        print(f"An error occured trying to retrive quotes for {len(symbols)} symbols. Could not get a response from the remote server.")
+        return []
+    if status != 200:
+        print(f"An error occured trying to retrive quotes. Error code:{status}. Reason:{reason}")
+        return []
+    try:
+        return json.loads(body.decode())["quoteResponse"]["result"]
+    except:
+        print("Could not decode batched quote data.")
+        return []
+
+def fetchQuotes(symbols, deadline=None):
+    """ one batched get-quotes request for up to QUOTEBATCHSIZE symbols, returns ticks keyed by symbol """
+    ticks = {}
+    for result in fetchQuoteResults(symbols, deadline):
+        try:
+            tick = tickFromQuote(result)
+        except:
+            continue
+        ticks[tick["symbol"].upper()] = tick
+    return ticks
+
+# price module fields a get-quotes result carries too, percentages are in percent there and a fraction in get-summary
+PRICEQUOTEFIELDS = ("regularMarketPrice", "regularMarketChange", "regularMarketDayHigh", "regularMarketDayLow",
+                    "preMarketPrice", "preMarketChange", "postMarketPrice", "postMarketChange", "marketCap")
+PRICEPERCENTFIELDS = ("regularMarketChangePercent", "preMarketChangePercent", "postMarketChangePercent")
+
+def formatLarge(value):
+    for suffix, scale in (("T", 1e12), ("B", 1e9), ("M", 1e6), ("K", 1e3)):
+        if abs(value) >= scale:
+            return f"{value / scale:.2f}{suffix}"
+    return f"{value:.2f}"
+
+def priceFromQuote(price: dict, result: dict) -> dict:
+    """ bring the price module of a cached get-summary response up to date from a get-quotes result """
+    price = dict(price)
+    for name in PRICEQUOTEFIELDS + PRICEPERCENTFIELDS:
+        value = result.get(name)
+        if value is None:
+            # a stale pre/post market or day range figure is worse than none
+            if name.startswith(("pre", "post", "regularMarketDay")):
+                price.pop(name, None)
+        elif name in PRICEPERCENTFIELDS:
+            price[name] = {"raw": value / 100, "fmt": f"{value:.2f}%"}
+        else:
+            price[name] = {"raw": value, "fmt": formatLarge(value) if name == "marketCap" else f"{value:.2f}"}
+    for name in ("marketState", "regularMarketTime"):
+        if result.get(name) is not None:
+            price[name] = result[name]
+    return price
+
+def refreshQuotes(symbols, maxAge=QUOTEMAXAGE):
+    """ ticks for symbols, from the cache when fresh enough and batched upstream requests for the rest """
+    cached = cacheGetMany([f"tick:{symbol}" for symbol in symbols], maxAge)
+    ticks = {key[len("tick:"):]: tick for key, tick in cached.items()}
+    missing = [symbol for symbol in symbols if symbol not in ticks]
+    for start in range(0, len(missing), QUOTEBATCHSIZE):
+        fetched = fetchQuotes(missing[start:start + QUOTEBATCHSIZE])
+        for symbol, tick in fetched.items():
+            cachePut(f"tick:{symbol}", tick)
+        ticks.update(fetched)
+    return ticks
+
+# anything that just has numerics like $1000 is a dollar amount, not a ticker
+DOLLAR_REGEX = r"^[1-9]\d*(?:\.[a-zA-Z\d]+)?[kmbtKMBT]?"
+
+def find_symbols(text: str) -> List[str]:
+    """ find all potential stock symbols starting with $ as a list."""
+    SYMBOL_REGEX = "[$]([a-zA-Z0-9.=-]{1,9})"
+    return list(set(re.findall(SYMBOL_REGEX, text)))
+
+def Do_Fund_Reply(jsonData: dict):
+    """ formulate a reply specifically for an Mutual Fund quote type """
+    return Do_ETF_Reply(jsonData)
+
+def Do_Equity_Reply(jsonData):
+    """ formulate a reply specifically for an equity quote type """
+    try:
+        quoteType = jsonData["quoteType"]["quoteType"]
+        symbol = jsonData["quoteType"]["symbol"]
+        marketState = jsonData["price"]["marketState"]
+        price = jsonData["price"]["regularMarketPrice"]["fmt"]
+        currency = jsonData["price"]["currency"]
+        currencySymbol = jsonData["price"]["currencySymbol"]
+        exchange = jsonData["price"]["exchangeName"]
+        quoteSourceName = jsonData["price"]["quoteSourceName"]
+        try:
+            shortName = jsonData["quoteType"]["shortName"]
+        except:
+            shortName = symbol
+        try:
+            longName = jsonData["quoteType"]["longName"]
+        except:
+            longName = shortName
+        print("Equity Reply: ",longName, price)
+        try:
+            preMarketPrice = jsonData["price"]["preMarketPrice"]["fmt"]
+            preMarketChangeRaw = jsonData["price"]["preMarketChange"]["raw"]
+            preMarketChange = jsonData["price"]["preMarketChange"]["fmt"]
+            preMarketChangePct = jsonData["price"]["preMarketChangePercent"]["fmt"]
+            preMarketGain = False
+            if preMarketChangeRaw >= 0:
+                preMarketChange = "+" + preMarketChange
+                preMarketChangePct = "+" + preMarketChangePct
+                preMarketGain = True
+        except:
+            preMarketPrice = price
+            preMarketChange = "N/A"
+            preMarketChangePct = "N/A"
+        try:
+            postMarketPrice = jsonData["price"]["postMarketPrice"]["fmt"]
+            postMarketChangeRaw = jsonData["price"]["postMarketChange"]["raw"]
+            postMarketChange = jsonData["price"]["postMarketChange"]["fmt"]
+            postMarketChangePct = jsonData["price"]["postMarketChangePercent"]["fmt"]
+            postMarketGain = False
+            if postMarketChangeRaw >= 0:
+                postMarketChange = "+" + postMarketChange
+                postMarketChangePct = "+" + postMarketChangePct
+                postMarketGain = True
+
+        except:
+            postMarketPrice = price
+            postMarketChange = "N/A"
+            postMarketChangePct = "N/A"
+        try:
+            industry = jsonData["summaryProfile"]["industry"]
+            sector = jsonData["summaryProfile"]["sector"]
+        except:
+            industry = "N/A"
+            sector = "N/A"
+        try:
+            regularMarketDayLow = jsonData["price"]["regularMarketDayLow"]["fmt"]
+            regularMarketDayHigh = jsonData["price"]["regularMarketDayHigh"]["fmt"]
+            regMktDayRng = str(regularMarketDayLow) + \
+                                " - " + str(regularMarketDayHigh)
+            regularMarketDayChange = jsonData["price"]["regularMarketChange"]["fmt"]
+            regularMarketDayChangeRaw = jsonData["price"]["regularMarketChange"]["raw"]
+            regularMarketDayChangePct = jsonData["price"]["regularMarketChangePercent"]["fmt"]
+            regularMarketDayChangePctRaw = jsonData["price"]["regularMarketChangePercent"]["raw"]
+            regularMarketDayGain = False
+            if regularMarketDayChangeRaw >= 0:
+                regularMarketDayChange = "+" + regularMarketDayChange
+                regularMarketDayChangePct = "+" + regularMarketDayChangePct
+                regularMarketDayGain = True
+        except:
+            regMktDayRng = "N/A"
+            regularMarketDayChange = "N/A"
+            regularMarketDayChangePct = "N/A"
+
+        try:
+            fiftyTwoWeekLow = jsonData["summaryDetail"]["fiftyTwoWeekLow"]["fmt"]
+            fiftyTwoWeekHigh = jsonData["summaryDetail"]["fiftyTwoWeekHigh"]["fmt"]
+            fiftyTwoWeekRange = str(
+                fiftyTwoWeekLow) + " - " + str(fiftyTwoWeekHigh)
+        except:
+            fiftyTwoWeekRange = "N/A"
+        try:
+            twoHundredDayAvg = jsonData["summaryDetail"]["twoHundredDayAverage"]["fmt"]
+            fiftyDayAvg = jsonData["summaryDetail"]["fiftyDayAverage"]["fmt"]
+        except:
+            twoHundredDayAvg = "N/A"
+            fiftyDayAvg = "N/A"
+        try:
+            enterpriseToEbitda = jsonData["defaultKeyStatistics"]["enterpriseToEbitda"]["fmt"]
+        except:
+            enterpriseToEbitda = "N/A"
+        try:
+            marketCap = jsonData["price"]["marketCap"]["fmt"]
+        except:
+            marketCap = "N/A"
+        try:
+            trailingPERaw = jsonData["summaryDetail"]["trailingPE"]["raw"]
+            trailingPEFmt = jsonData["summaryDetail"]["trailingPE"]["fmt"]
+            if 0 <= trailingPERaw <= 15:
+                peColor = ':green_circle:'
+            elif trailingPERaw < 0 or trailingPERaw > 50:
+                peColor = ':red_circle:'
+            else:
+                peColor = ':yellow_circle:'
+            trailingPE = trailingPEFmt + peColor
+        except:
+            trailingPE = "N/A"
+        #adding FwdPE
+        try:
+            FwdPERaw = jsonData["defaultKeyStatistics"]["forwardPE"]['raw']
+            FwdPEFmt = jsonData["defaultKeyStatistics"]["forwardPE"]['fmt']
+            if 0 <= FwdPERaw <= 15:
+                peColor = ':green_circle:'
+            elif FwdPERaw < 0 or FwdPERaw > 50:
+                peColor = ':red_circle:'
+            else:
+                peColor = ':yellow_circle:'
+            FwdPE = FwdPEFmt + peColor
+        except:
+            FwdPE = "N/A"
+        try:
+            pegRatioRaw = jsonData["defaultKeyStatistics"]["pegRatio"]["raw"]
+            pegRatioFmt = jsonData["defaultKeyStatistics"]["pegRatio"]["fmt"]
+            if 0 <= pegRatioRaw <= 1:
+                pegColor = ':green_circle:'
+            elif pegRatioRaw < 0 or pegRatioRaw > 2:
+                    pegColor = ':red_circle:'
+            else:
+                pegColor = ':yellow_circle:'
+            pegRatio = pegRatioFmt + pegColor
+        except:
+            pegRatio = "N/A"
+        try:
+            priceToBookRaw = jsonData["defaultKeyStatistics"]["priceToBook"]["raw"]
+            priceToBookFmt = jsonData["defaultKeyStatistics"]["priceToBook"]["fmt"]
+            if 0 <= priceToBookRaw <= 2:
+                priceToBookColor = ':green_circle:'
+            elif priceToBookRaw < 0 or priceToBookRaw > 5:
+                priceToBookColor = ':red_circle:'
+            else:
+                priceToBookColor = ':yellow_circle:'
+            priceToBook = priceToBookFmt + priceToBookColor
+        except:
+            priceToBook = "N/A"
+        try:
+            priceToSalesRaw = jsonData["summaryDetail"]["priceToSalesTrailing12Months"]["raw"]
+            priceToSalesFmt = jsonData["summaryDetail"]["priceToSalesTrailing12Months"]["fmt"]
+            if 0 <= priceToSalesRaw <= 2:
+                priceToSalesColor = ':green_circle:'
+            elif priceToSalesRaw < 0 or priceToSalesRaw > 10:
+                priceToSalesColor = ':red_circle:'
+            else:
+                priceToSalesColor = ':yellow_circle:'
+            priceToSales = priceToSalesFmt + priceToSalesColor
+        except:
+            priceToSales = "N/A"
+        try:
+            dividendRate = jsonData["summaryDetail"]["dividendRate"]["fmt"]
+            dividendYield = jsonData["summaryDetail"]["dividendYield"]["fmt"]
+        except:
+            dividendRate = "N/A"
+            dividendYield = "N/A"
+        try:
+            beta = jsonData["summaryDetail"]["beta"]["fmt"]
+        except:
+            beta = "N/A"
+
+        insiderPurchases = "N/A"
+        try:
+            buyInfoShares = jsonData["netSharePurchaseActivity"]["buyInfoShares"]["fmt"]
+        except:
+            buyInfoShares = "N/A"
+        try:
+            buyInfoCount = jsonData["netSharePurchaseActivity"]["buyInfoCount"]["fmt"]
+        except:
+            buyInfoCount = "N/A"
+        try:
+            sellInfoShares = jsonData["netSharePurchaseActivity"]["sellInfoShares"]["fmt"]
+        except:
+            sellInfoShares = "N/A"
+        try:
+            sellInfoCount = jsonData["netSharePurchaseActivity"]["sellInfoCount"]["fmt"]
+        except:
+            sellInfoCount = "N/A"
+        try:
+            insiderPercentHeld = jsonData["majorHoldersBreakdown"]["insidersPercentHeld"]["fmt"]
+        except:
+            insiderPercentHeld = "N/A"
+        try:
+            institutionPercentHeld = jsonData["majorHoldersBreakdown"]["institutionsPercentHeld"]["fmt"]
+        except:
+            institutionPercentHeld = "N/A"
+        try:
+            shortPercentOfFloat = jsonData["defaultKeyStatistics"]["shortPercentOfFloat"]["fmt"]
+        except:
+            shortPercentOfFloat = "N/A"
+
+        try:
+            returnOnAssetsFmt = jsonData["financialData"]["returnOnAssets"]["fmt"]
+            returnOnAssetsRaw = jsonData["financialData"]["returnOnAssets"]["raw"]
+            if returnOnAssetsRaw >= 0.15:
+                returnOnAssetsColor = ':green_circle:'
+            elif returnOnAssetsRaw < 0:
+                returnOnAssetsColor = ':red_circle:'
+            else:
+                returnOnAssetsColor = ':yellow_circle:'
+            returnOnAssets = returnOnAssetsFmt + returnOnAssetsColor
+        except:
+            returnOnAssets = "N/A"
+        try:
+            returnOnEquityFmt = jsonData["financialData"]["returnOnEquity"]["fmt"]
+            returnOnEquityRaw = jsonData["financialData"]["returnOnEquity"]["raw"]
+            if returnOnEquityRaw >= 0.30:
+                returnOnEquityColor = ':green_circle:'
+            elif returnOnEquityRaw < 0:
+                returnOnEquityColor = ':red_circle:'
+            else:
+                returnOnEquityColor = ':yellow_circle:'
+            returnOnEquity = returnOnEquityFmt + returnOnEquityColor
+        except:
+            returnOnEquity = "N/A"
+        
+        #adding 3 yr Avg ROIC
+        try:
+            returnOnInvestedCapital_by_year = leaderboard.roic_per_year(jsonData)
+            avg_roic_value = leaderboard.avg_roic(returnOnInvestedCapital_by_year)
+            if avg_roic_value >= 0.10:
+                returnOnInvestedCapitalColor = ':green_circle:'
+            elif avg_roic_value < 0:
+                returnOnInvestedCapitalColor = ':red_circle:'
+            else:
+                returnOnInvestedCapitalColor = ':yellow_circle:'
+            avg_roic_str = "{:.2%}".format(avg_roic_value) + returnOnInvestedCapitalColor
+        except:
+            avg_roic_str = "N/A"
+            
+        try:
+            revenueGrowthFmt = jsonData["financialData"]["revenueGrowth"]["fmt"]
+            revenueGrowthRaw = jsonData["financialData"]["revenueGrowth"]["raw"]   
+            revenueGrowth = revenueGrowthFmt
+        except:
+            revenueGrowth = "N/A"
+        
+        try:
+            freeCashFlowFmt = jsonData["financialData"]["freeCashflow"]["fmt"]
+            freeCashFlowRaw = jsonData["financialData"]["freeCashflow"]["raw"]
+            freeCashFlow = freeCashFlowFmt
+        except:
+            freeCashFlow = "N/A"
+
+        insiderPurchases = (f"Purchases: {buyInfoShares} shares in {buyInfoCount} transactions.\r\n" +
+                            f"Sales: {sellInfoShares} shares in {sellInfoCount} transactions.")
+                        
+        insiderSymbol = symbol.replace('-','')
+        insiderHolding = (f"% Held by Insiders: {insiderPercentHeld}.\r\n" +
+                            f"% Held by Institutions: {institutionPercentHeld}.\r\n" +
+                            f"Short % of Float: {shortPercentOfFloat}.\r\n"
+                            f"http://www.openinsider.com/{insiderSymbol}")
+
+        emojiIndicator = ""
+        try:
+            if regularMarketDayChangePctRaw > 0.05:
+                emojiIndicator = ":rocket:"
+            if regularMarketDayChangePctRaw > 0.25:
+                emojiIndicator += ":full_moon:"
+            if regularMarketDayChangePctRaw < -0.05:
+                emojiIndicator = ":skull:"
+            if regularMarketDayChangePctRaw < -0.25:
+                emojiIndicator += ":skull:"
+        except:
+            emojiIndicator = ""
+
+        description = f"**{currencySymbol}{price}** ({regularMarketDayChange},{regularMarketDayChangePct}) {emojiIndicator}"
+        if marketState == "POST":
+            description += f"\n*Post-market: {currencySymbol}{postMarketPrice} ({postMarketChange},{postMarketChangePct})*"
+        elif marketState == "PRE":
+            description += f"\n*Pre-market: {currencySymbol}{preMarketPrice} ({preMarketChange},{preMarketChangePct})*"
+        description += f"\nExchange: {exchange}\nCurrency: {currency}\nQuote Source: {quoteSourceName}"
+
+        message = discord.Embed(title=str(longName).upper() + f" ({symbol})", url=f"https://finance.yahoo.com/quote/{symbol}",
+                                description=description,
+                                color=0xFF5733)
+        message.add_field(name="Quote Type",
+                            value=quoteType, inline=True)
+        if industry != "N/A":
+            message.add_field(name="Industry", value=industry, inline=True)
+        if sector != "N/A":
+            message.add_field(name="Sector", value=sector, inline=True)
+        if marketCap != "N/A":
+            message.add_field(name="Market Cap", value=marketCap, inline=True)
+        if regMktDayRng != "N/A":
+            message.add_field(name="Regular Market Day Range", value=regMktDayRng, inline=True)
+        if fiftyTwoWeekRange != "N/A":
+            message.add_field(name="Last 52 Week Range", value=fiftyTwoWeekRange, inline=True)
+        if trailingPE != "N/A":
+            message.add_field(name="PE Ratio (ttm)", value=trailingPE, inline=True)
+        #add FwdPEfield
+        if FwdPE != "N/A":
+            message.add_field(name="PE Ratio (Fwd)", value=FwdPE, inline=True)
+        if pegRatio != "N/A":
+            message.add_field(name="PEG Ratio", value=pegRatio, inline=True)
+        if priceToBook != "N/A":
+            message.add_field(name="Price to Book", value=priceToBook, inline=True)
+        if priceToSales != "N/A":
+            message.add_field(name="Price to Sales", value=priceToSales, inline=True)
+        if enterpriseToEbitda != "N/A":
+            message.add_field(name="EV/EBITDA", value=enterpriseToEbitda, inline=True)
+        if returnOnAssets != "N/A":
+            message.add_field(name="Return on Assets (ttm)", value=returnOnAssets, inline=True)
+        if returnOnEquity != "N/A":
+            message.add_field(name="Return on Equity (ttm)", value=returnOnEquity, inline=True)
+        if avg_roic_str != "N/A":
+            message.add_field(name="Return on Invested Captial (3 YR AVG.)", value=avg_roic_str, inline=True)
+        if revenueGrowth != "N/A":
+            message.add_field(name="Quarterly Revenue Growth (yoy)", value=revenueGrowth, inline=True)
+        if freeCashFlow != "N/A":
+            message.add_field(name="Levered Free Cash Flow (ttm)", value=f"{currencySymbol}{freeCashFlow}", inline=True)
+        if beta != "N/A":
+            message.add_field(name="beta", value=beta, inline=True)
+        if twoHundredDayAvg != "N/A":
+            message.add_field(name="200 Day Avg.", value=f"{currencySymbol}{twoHundredDayAvg}", inline=True)
+        if fiftyDayAvg != "N/A":
+            message.add_field(name="50 Day Avg.", value=f"{currencySymbol}{fiftyDayAvg}", inline=True)
+
+        if quoteType != "CURRENCY" and quoteType != "CRYPTOCURRENCY":
+            rateAndYield = str(dividendRate) + \
+                                " (" + str(dividendYield) + ")"
+            message.add_field(name="Dividend Rate and Yield",
+                                value=rateAndYield, inline=True)
+
+            message.add_field(name="Share Statistics",
+                                value=insiderHolding, inline=False)
+            linkSymbol = symbol.replace('-','.')
+            message.add_field(name="ROIC.AI Summary and Financials.",
+                                value=f"https://roic.ai/company/{linkSymbol}", inline=False)
+    except:
+        message = f"Could not find information for ${symbol}. Perhaps it is not an EQUITY or maybe I'm parsing the data poorly...."
+    
+    return message
+
+def Do_ETF_Reply(jsonData: dict):
+    """ formulate a reply specifically for an ETF quote type """
+    try:
+        quoteType = jsonData["quoteType"]["quoteType"]
+        symbol = jsonData["quoteType"]["symbol"]
+        marketState = jsonData["price"]["marketState"]
+        price = jsonData["price"]["regularMarketPrice"]["fmt"]
+        currency = jsonData["price"]["currency"]
+        currencySymbol = jsonData["price"]["currencySymbol"]
+        exchange = jsonData["price"]["exchangeName"]
+        quoteSourceName = jsonData["price"]["quoteSourceName"]
+
+        try:
+            shortName = jsonData["quoteType"]["shortName"]
+        except:
+            shortName = symbol
+        try:
+            longName = jsonData["quoteType"]["longName"]
+        except:
+            longName = shortName
+        print("ETF Reply: ",longName, price)
+        try:
+            preMarketPrice = jsonData["price"]["preMarketPrice"]["fmt"]
+            preMarketChangeRaw = jsonData["price"]["preMarketChange"]["raw"]
+            preMarketChange = jsonData["price"]["preMarketChange"]["fmt"]
+            preMarketChangePct = jsonData["price"]["preMarketChangePercent"]["fmt"]
+            preMarketGain = False
+            if preMarketChangeRaw >= 0:
+                preMarketChange = "+" + preMarketChange
+                preMarketChangePct = "+" + preMarketChangePct
+                preMarketGain = True
+        except:
+            preMarketPrice = price
+            preMarketChange = "N/A"
+            preMarketChangePct = "N/A"
+        try:
+            postMarketPrice = jsonData["price"]["postMarketPrice"]["fmt"]
+            postMarketChangeRaw = jsonData["price"]["postMarketChange"]["raw"]
+            postMarketChange = jsonData["price"]["postMarketChange"]["fmt"]
+            postMarketChangePct = jsonData["price"]["postMarketChangePercent"]["fmt"]
+            postMarketGain = False
+            if postMarketChangeRaw >= 0:
+                postMarketChange = "+" + postMarketChange
+                postMarketChangePct = "+" + postMarketChangePct
+                postMarketGain = True
+        except:
+            postMarketPrice = price
+            postMarketChange = "N/A"
+            postMarketChangePct = "N/A"
+
+        try:
+            regularMarketDayLow = jsonData["price"]["regularMarketDayLow"]["fmt"]
+            regularMarketDayHigh = jsonData["price"]["regularMarketDayHigh"]["fmt"]
+            regMktDayRng = str(regularMarketDayLow) + \
+                                " - " + str(regularMarketDayHigh)
+            regularMarketDayChange = jsonData["price"]["regularMarketChange"]["fmt"]
+            regularMarketDayChangeRaw = jsonData["price"]["regularMarketChange"]["raw"]
+            regularMarketDayChangePct = jsonData["price"]["regularMarketChangePercent"]["fmt"]
+            regularMarketDayChangePctRaw = jsonData["price"]["regularMarketChangePercent"]["raw"]
+            regularMarketDayGain = False
+            if regularMarketDayChangeRaw >= 0:
+                regularMarketDayChange = "+" + regularMarketDayChange
+                regularMarketDayChangePct = "+" + regularMarketDayChangePct
+                regularMarketDayGain = True
+        except:
+            regMktDayRng = "N/A"
+            regularMarketDayChange = "N/A"
+            regularMarketDayChangePct = "N/A"
+
+        try:
+            fiftyTwoWeekLow = jsonData["summaryDetail"]["fiftyTwoWeekLow"]["fmt"]
+            fiftyTwoWeekHigh = jsonData["summaryDetail"]["fiftyTwoWeekHigh"]["fmt"]
+            fiftyTwoWeekRange = str(
+                fiftyTwoWeekLow) + " - " + str(fiftyTwoWeekHigh)
+        except:
+            fiftyTwoWeekRange = "N/A"
+        try:
+            twoHundredDayAvg = jsonData["summaryDetail"]["twoHundredDayAverage"]["fmt"]
+            fiftyDayAvg = jsonData["summaryDetail"]["fiftyDayAverage"]["fmt"]
+        except:
+            twoHundredDayAvg = "N/A"
+            fiftyDayAvg = "N/A"
+
+        try:
+            marketCap = jsonData["price"]["marketCap"]["fmt"]
+        except:
+            marketCap = "N/A"
+
+        try:
+            beta = jsonData["defaultKeyStatistics"]["beta3Year"]["fmt"]
+        except:
+            beta = "N/A"
+        try:
+            fundInceptionDate = jsonData["defaultKeyStatistics"]["fundInceptionDate"]["fmt"]
+        except:
+            fundInceptionDate = "N/A"
+        try:
+            fundFamily = jsonData["fundProfile"]["family"]
+        except:
+            fundFamily = "N/A"
+        try:
+            totalAssets = jsonData["defaultKeyStatistics"]["totalAssets"]["fmt"]
+        except:
+            totalAssets = "N/A"
+        try:
+            fundYield = jsonData["summaryDetail"]["yield"]["fmt"]
+        except:
+            fundYield = "N/A"
+        try:
+            ytdReturn = "N/A"
+            if jsonData["fundPerformance"]["trailingReturns"]["ytd"]["raw"]:
+                ytdReturn = jsonData["fundPerformance"]["trailingReturns"]["ytd"]["fmt"]
+        except:
+            ytdReturn = "N/A"
+        try:
+            oneYearAverageReturn = "N/A"
+            if jsonData["fundPerformance"]["trailingReturns"]["oneYear"]["raw"]:
+                oneYearAverageReturn = jsonData["fundPerformance"]["trailingReturns"]["oneYear"]["fmt"]
+        except:
+            oneYearAverageReturn = "N/A"
+        try:
+            threeYearAverageReturn = "N/A"
+            if jsonData["fundPerformance"]["trailingReturns"]["threeYear"]["raw"]:
+                threeYearAverageReturn = jsonData["fundPerformance"]["trailingReturns"]["threeYear"]["fmt"]
+        except:
+            threeYearAverageReturn = "N/A"
+        try:
+            fiveYearAverageReturn = "N/A"
+            if jsonData["fundPerformance"]["trailingReturns"]["fiveYear"]["raw"]:
+                fiveYearAverageReturn = jsonData["fundPerformance"]["trailingReturns"]["fiveYear"]["fmt"]
+        except:
+            fiveYearAverageReturn = "N/A"
+        try:
+            tenYearAverageReturn = "N/A"
+            if jsonData["fundPerformance"]["trailingReturns"]["tenYear"]["raw"]:
+                tenYearAverageReturn = jsonData["fundPerformance"]["trailingReturns"]["tenYear"]["fmt"]
+        except:
+            tenYearAverageReturn = "N/A"
+        try:
+            styleBox = jsonData["fundProfile"]["styleBoxUrl"]
+        except:
+            styleBox = ""
+        try:
+            expenses = jsonData["fundProfile"]["feesExpensesInvestment"]["annualReportExpenseRatio"]["fmt"]
+        except:
+            expenses = "N/A"
+
+        compositionString = "N/A" 
+        try:
+            stockPosition = jsonData["topHoldings"]["stockPosition"]["fmt"]
+            if jsonData["topHoldings"]["stockPosition"]["raw"]:
+                compositionString = "Stocks: " + stockPosition
+        except:
+            stockPosition = "N/A"
+        try:
+            bondPosition = jsonData["topHoldings"]["bondPosition"]["fmt"]
+            if jsonData["topHoldings"]["bondPosition"]["raw"]:
+                compositionString += "\r\nBonds: " + bondPosition
+        except:
+            bondPosition = "N/A"
+
+        try:
+            preferredPosition = jsonData["topHoldings"]["preferredPosition"]["fmt"]
+            if jsonData["topHoldings"]["preferredPosition"]["raw"]:
+                compositionString += "\r\nPreferred: " + preferredPosition
+        except:
+            preferredPosition = "N/A"
+        try:
+            convertiblePosition = jsonData["topHoldings"]["convertiblePosition"]["fmt"]
+            if jsonData["topHoldings"]["convertiblePosition"]["raw"]:
+                compositionString += "\r\nConvertible: " + convertiblePosition
+        except:
+            convertiblePosition = "N/A"
+        try:
+            cashPosition = jsonData["topHoldings"]["cashPosition"]["fmt"]
+            if jsonData["topHoldings"]["cashPosition"]["raw"]:
+                compositionString += "\r\nCash: " + cashPosition
+        except:
+            cashPosition = "N/A"
+        try:
+            otherPosition = jsonData["topHoldings"]["otherPosition"]["fmt"]
+            if jsonData["topHoldings"]["otherPosition"]["raw"]:
+                compositionString += "\r\nOther: " + otherPosition
+        except:
+            otherPosition = "N/A"
+
+            
+        try:
+            sectorWeightings = jsonData["topHoldings"]["sectorWeightings"]
+            sectorWeightingsString = ""
+            for sector in sectorWeightings:
+                keys = sector.keys()
+                for key in keys:
+                    if sector[key]["raw"] == 0:
+                        continue
+                    else:
+                        sectorWeightingsString += key + ": " + sector[key]["fmt"] + "\r\n"
+            if sectorWeightingsString == "":
+                sectorWeightingsString = "N/A"
+        except:
+            sectorWeightingsString = "N/A"
+        try:
+            topHoldingTotalPct = 0
+            topHoldings = jsonData["topHoldings"]["holdings"]
+            topHoldingsString = ""
+            for holding in topHoldings:
+                symbolString = ""
+                if holding["symbol"]:
+                    symbolString = " (" + holding["symbol"] + ")"
+                topHoldingsString += holding["holdingName"] + symbolString + ": " + holding["holdingPercent"]["fmt"] + "\r\n"
+                topHoldingTotalPct += holding["holdingPercent"]["raw"]
+        except: 
+            topHoldingsString = "N/A"
+            topHoldingTotalPct = "N/A"
+
+        print(longName, price)
+        emojiIndicator = ""
+        try:
+            if regularMarketDayChangePctRaw > 0.05:
+                emojiIndicator = ":rocket:"
+            if regularMarketDayChangePctRaw > 0.25:
+                emojiIndicator += ":full_moon:"
+            if regularMarketDayChangePctRaw < -0.05:
+                emojiIndicator = ":skull:"
+            if regularMarketDayChangePctRaw < -0.25:
+                emojiIndicator += ":skull:"
+        except:
+            emojiIndicator = ""
+
+        description = f"**{currencySymbol}{price}** ({regularMarketDayChange},{regularMarketDayChangePct}) {emojiIndicator}"
+        if marketState == "POST":
+            description += f"\n*Post-market: {currencySymbol}{postMarketPrice} ({postMarketChange},{postMarketChangePct})*"
+        elif marketState == "PRE":
+            description += f"\n*Pre-market: {currencySymbol}{preMarketPrice} ({preMarketChange},{preMarketChangePct})*"
+        description += f"\nExchange: {exchange}\nCurrency: {currency}\nQuote Source: {quoteSourceName}"
+        message = discord.Embed(title=str(longName).upper() + f" ({symbol})", url=f"https://finance.yahoo.com/quote/{symbol}",
+                                description=description,
+                                color=0xFF5733)
+        message.add_field(name="Quote Type",
+                            value=quoteType, inline=True)
+        message.add_field(name="Fund Family",
+                            value=fundFamily, inline=True)
+        message.add_field(name="Market Cap",
+                            value=marketCap, inline=True)
+        message.add_field(name="Total Assets",
+                            value=totalAssets, inline=True)
+        message.add_field(name="Regular Market Day Range",
+                            value=regMktDayRng, inline=True)
+        message.add_field(name="Last 52 Week Range",
+                            value=fiftyTwoWeekRange, inline=True)
+        if twoHundredDayAvg != "N/A":
+            message.add_field(name="200 Day Avg.", value=f"{currencySymbol}{twoHundredDayAvg}", inline=True)
+        if fiftyDayAvg != "N/A":
+            message.add_field(name="50 Day Avg.", value=f"{currencySymbol}{fiftyDayAvg}", inline=True)
+        message.add_field(name="beta", value=beta, inline=True)
+
+        message.add_field(name="Fund Inception Date", value=fundInceptionDate, inline=True)
+        
+        message.add_field(name="Yield", value=fundYield, inline=True)
+        
+        message.add_field(name="Expense Ratio", value=expenses, inline=True)
+
+        message.add_field(name="Performance", value="ytd: " + ytdReturn + "\r\n1yr: " + oneYearAverageReturn + "\r\n3yr: " + threeYearAverageReturn 
+                                                   + "\r\n5yr: " + fiveYearAverageReturn+ "\r\n10yr: " + tenYearAverageReturn, inline=True)
+
+        message.add_field(name="Composition ", value=compositionString, inline=True)
+
+        message.add_field(name="Sector Weightings", value=sectorWeightingsString, inline=True)
+        if topHoldingsString != "N/A":
+            message.add_field(name="Top Holdings" + " ({:.2%})".format(topHoldingTotalPct), value=topHoldingsString, inline=True)
+        else:
+            message.add_field(name="Top Holdings", value="Unavailable", inline=True)
+
+
+        message.set_image(url = styleBox)
+        
+        morningstarSymbol = symbol.replace('-','.')
+        message.add_field(name="MorningStar ETF Performance",
+                            value=f"https://www.morningstar.com/etfs/arcx/{morningstarSymbol}/performance", inline=False)
+    except:
+        message = f"Could not find information for ${symbol}. Perhaps it is not an EQUITY or maybe I'm parsing the data poorly...."
+    
+    return message
+
+def Do_Fund_Reply(jsonData: dict):
+    """ formulate a reply specifically for an Mutual Fund quote type """
+    return Do_ETF_Reply(jsonData)
+
+rej_list = []
+
+def rememberRejected(symbol):
+    """ keep symbol in the last 10 rejected tickers and their checkpoint """
+    if symbol in rej_list:
+        return
+    rej_list.append(symbol)
+    if len(rej_list) > 10: # if rej_list is bigger than 10 removes index 0
+        rej_list.pop(0)
+    cachePut("checkpoint:rej_list", rej_list, ttl=None)
+
+# rough seconds a get-summary lookup takes, with less than this left a lookup answers with the price only
+SUMMARYSECONDS = 2.0
+
+def priceOnlyReply(symbol, deadline):
+    """ a small embed with just the price of symbol, from a cached tick or one get-quotes request """
+    tick = cacheGet(f"tick:{symbol}", QUOTEMAXAGE)
+    if tick is None and not deadline.expired():
+        tick = fetchQuotes([symbol], deadline).get(symbol)
+        if tick is not None:
+            cachePut(f"tick:{symbol}", tick)
+    if tick is None or tick.get("price") is None:
+        return f"Looking up ${symbol} took too long, try again."
+    deadline.degrade("price only")
+    message = discord.Embed(title=f"{tick.get('name') or symbol} ({symbol})", color=0xFF5733,
+                            description=f"**{tick['price']:,.2f}** {tick.get('currency') or ''}"
+                                        f" {watchboards.formatChange(tick.get('change'))}"
+                                        f" ({watchboards.formatChange(tick.get('changePercent'), True)})")
+    message.add_field(name="Price only", value="Yahoo Finance is slow right now, ask again for the full quote.", inline=False)
+    return message
+
+@profiler.profiled("price_reply")
+def price_reply(symbols: list, deadline=None) -> Dict[str, str]:
+    """ for all symbols in provided list query yahoo finance, parse the data and send an embed reponse or an error message in case of failure """
+    deadline = deadline or noDeadline()
+    dataMessages = {}
+    for symbol in symbols:
+        # throw away anything that just has numerics like $1000
+        match = re.findall(DOLLAR_REGEX, symbol)
+        if match:  # if match is found, then symbol is a reject
+            rememberRejected(symbol)
+            notify("reject", symbol)
+            print(f'Throwing out ${symbol}. Detected as dollar amount and not a stock ticker.')
+            continue
+        jsonData = cachedSummary(symbol)
+        notify("lookup", symbol, jsonData is not None)
+        staleSince = None
+        if jsonData is None:
+            if not deadline.allows(SUMMARYSECONDS):
+                # no time for the whole summary, the price alone still answers the question
+                with deadline.stage("fetch"):
+                    dataMessages[symbol] = priceOnlyReply(symbol, deadline)
+                continue
+            with deadline.stage("fetch"):
+                message,data = fetchSymbolData(symbol, deadline)
+            if (data is None) or (not len(data)):
+                # an old answer beats an error, serve it marked stale and refresh it in the background
+                jsonData, staleSince = staleSummary(symbol)
+                if jsonData is None:
+                    if (not message) or (message == ""):
+                        message = f"Could not find information for ${symbol}."
+                    dataMessages[symbol] = message
+                    continue
+                revalidate(f"summary:{symbol.upper()}", "summary", refreshSummary, symbol)
+            else:
+                with tracing.span("json decode", bytes=len(data)):
+                    jsonData = json.loads(data.decode())
+                try:
+                    if jsonData["quoteType"]["quoteType"]:
+                        cacheSummary(symbol, jsonData)
+                except:
+                    pass
+
+        with deadline.stage("parse"):
+            dataMessages[symbol] = summaryReply(symbol, jsonData, staleSince)
+
+    return dataMessages
+
+def summaryReply(symbol, jsonData, staleSince=None):
+    """ the reply embed for a get-summary response, marked delayed when its quote was stored at staleSince """
+    message = {}
+    with tracing.span("build reply", symbol=symbol):
+        try:
+            quoteType = jsonData["quoteType"]["quoteType"]
+            if quoteType == "EQUITY":
+                message = Do_Equity_Reply(jsonData)
+            elif quoteType == "ETF":
+                message = Do_ETF_Reply(jsonData)
+            elif quoteType == "MUTUALFUND":
+                message = Do_Fund_Reply(jsonData)
+            elif quoteType == "CRYPTOCURRENCY":
+                message = Do_Equity_Reply(jsonData)
+            elif quoteType == "CURRENCY":
+                message = Do_Equity_Reply(jsonData)
+            else:
+                message = Do_Equity_Reply(jsonData)
+        except:
+            message = f"Could not find quote type for ${symbol}."
+    if staleSince is not None and isinstance(message, discord.Embed):
+        message.add_field(name=":warning: Delayed quote", value=staleNote(staleSince), inline=False)
+    return message
+
+def cachedReply(symbol):
+    """ the reply embed rebuilt from what the cache holds, without asking upstream or counting a
+    lookup; None when the cache has nothing for symbol """
+    jsonData, staleSince = cachedSummary(symbol), None
+    if jsonData is None:
+        jsonData, staleSince = staleSummary(symbol)
+        if jsonData is None:
+            return None
+    return summaryReply(symbol, jsonData, staleSince)
+
+def fetchMovers(deadline=None):
+    """ make market movers request to yahoo finance and return (gainers, losers and most active lists, error message) """
+    url = f"/market/v2/get-movers?region=US&lang=en-US&start=0&count=25"
+    try:
+        status, reason, data = upstreamGet("movers", "apidojo-yahoo-finance-v1.p.rapidapi.com", url, headers, deadline)
+    except deadlines.DeadlineExceeded:
+        return None, f"Getting the market movers took too long, try again."
+    except breaker.BreakerOpen:
+        return None, f"Yahoo Finance is not answering right now, try again in a minute."
+    except:
+        return None, f"An error occured trying to retrive market movers data. Could not connect to the remote server."
+
+    try:
+        with tracing.span("json decode", bytes=len(data)):
+            jsonData = json.loads(data.decode())
+        return jsonData["finance"]["result"], None
+    except:
+        return None, f"An error occured trying to retrive market movers data."
+
+def moverSymbols(results):
+    """ every symbol of the movers lists, in list order without repeats """
+    symbols = []
+    for mover in results or []:
+        try:
+            for quote in mover["quotes"]:
+                if quote["symbol"] not in symbols:
+                    symbols.append(quote["symbol"])
+        except:
+            continue
+    return symbols
+
+def get_movers(results=None):
+    """ make market movers request to yahoo finance and rturns the result data"""
+    if results is None:
+        results, message = fetchMovers()
+        if results is None:
+            return message
+    
+    message=discord.Embed(title="Market Movers")
+    for mover in results:
+        try:
+            title = mover["title"]
+            if "gainers" in title.lower():
+                title = title + ":chart_with_upwards_trend::rocket:"
+            elif "losers" in title.lower():
+                title = title + ":chart_with_downwards_trend: "
+            description = mover["description"]
+            quotes = mover["quotes"]
+            symbolList = ""
+            for quote in quotes:
+                symbol = quote["symbol"]
+                symbolList += f"{symbol}, " 
+            
+            message.add_field(name=title, value=symbolList, inline=False)
+
+        except:
+            continue
+
+    return message
+
+def fetchChartData(symbol,intervalIn,rangeIn,wait=False,deadline=None):
+    """ makes yahoo finance chart query for provided symbol interval and range, with wait an open
+    breaker pauses the caller (a bulk job) instead of failing the request """
+    url = f"/stock/v2/get-chart?interval={intervalIn}&symbol={symbol}&range={rangeIn}&region=US"
+    while True:
+        try:
+            status, reason, body = upstreamGet("chart", "apidojo-yahoo-finance-v1.p.rapidapi.com", url, headers, deadline)
+            break
+        except breaker.BreakerOpen as e:
+            if not wait:
+                return None
+            time.sleep(e.retryAfter)
+        except:
+            message = f"An error occured trying to retrive chart information for ${symbol}. Could not get a response from the remote server."
+            return None
+  
+    if(status == 200):
+        return body
+    else:
+        return None
+
+
+# intervals and ranges the chart api understands
+CHARTINTERVALS = ("1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h", "1d", "5d", "1wk", "1mo")
+CHARTRANGEDAYS = {"1d": 1, "5d": 5, "1mo": 31, "3mo": 92, "6mo": 183, "ytd": 366, "1y": 366,
+                  "2y": 731, "5y": 1827, "10y": 3653, "max": None}
+# yahoo only keeps intraday bars this many days back
+CHARTINTERVALMAXDAYS = {"1m": 7, "2m": 60, "5m": 60, "15m": 60, "30m": 60, "90m": 60, "60m": 730, "1h": 730}
+# range used when only an interval is given, sized to a readable number of bars
+CHARTDEFAULTRANGE = {"1m": "1d", "2m": "1d", "5m": "5d", "15m": "5d", "30m": "1mo", "60m": "3mo", "90m": "3mo",
+                     "1h": "3mo", "1d": "3mo", "5d": "1y", "1wk": "2y", "1mo": "10y"}
+
+def parseChartArgs(intervalIn, rangeIn):
+    """ validated (interval, range, error) for !chart, error is None when the pair is usable """
+    intervalIn = intervalIn.lower()
+    if intervalIn not in CHARTINTERVALS:
+        return None, None, f"Unknown interval {intervalIn}, use one of {', '.join(CHARTINTERVALS)}."
+    rangeIn = (rangeIn or CHARTDEFAULTRANGE[intervalIn]).lower()
+    if rangeIn not in CHARTRANGEDAYS:
+        return None, None, f"Unknown range {rangeIn}, use one of {', '.join(CHARTRANGEDAYS)}."
+    maxDays = CHARTINTERVALMAXDAYS.get(intervalIn)
+    rangeDays = CHARTRANGEDAYS[rangeIn]
+    if maxDays is not None and (rangeDays is None or rangeDays > maxDays):
+        return None, None, f"{intervalIn} bars only go back {maxDays} days, pick a shorter range."
+    return intervalIn, rangeIn, None
+
+# rough seconds the full indicator chart takes to draw, with less than this left !chart draws closes and volume only
+CHARTRENDERSECONDS = 4.0
+
+@profiler.profiled("buildChart")
+def buildChart(symbol, intervalIn, rangeIn, deadline=None, canned=False):
+    """ fetch and render a chart, list it in the cache and return (chart metadata, error message);
+    with canned the 3 month daily chart comes from (and is saved to) chart.dat instead of upstream """
+    deadline = deadline or noDeadline()
+    loadCharting()
+    chartName = f"{symbol.lower()}_{intervalIn}_{rangeIn}"
+    chartImgPath = chartsFolder + '/' + chartName + ".png"
+    chartMsgPath = chartsFolder + '/' + chartName + ".txt"
+    chartData = None
+    # the canned chart.dat only stands in for the default 3 month daily chart
+    cannedChart = canned and (intervalIn, rangeIn) == ("1d", "3mo")
+    if cannedChart:
+        try:
+            F=open("chart.dat","rb")
+            chartData = F.read()
+            F.close()
+        except:
+           chartData = None 
+    #build the chart and save it
+    if chartData is None:
+        with deadline.stage("fetch"):
+            chartData = fetchChartData(symbol,intervalIn,rangeIn,deadline=deadline)
+        if chartData is None and deadline.expired():
+            return None, f"Getting the ${symbol} chart took too long, try again."
+        if cannedChart:
+            F=open("chart.dat","wb")
+            F.write(chartData)
+            F.close()
+    try:
+        if not len(chartData):
+            return None, f"Could not find chart information for ${symbol}."
+    except:
+        return None, f"Something went wrong retrieving chart data for ${symbol}."
+
+    with deadline.stage("parse"):
+        try:
+            with tracing.span("json decode", bytes=len(chartData)):
+                chartData = json.loads(chartData.decode())
+        except:
+            return None, f"Could not decode json chart data for ${symbol}."
+
+        if not chartData["chart"]["result"]:
+            return None, f"Could not find chart information for ${symbol}."
+
+        try:
+            regularMarketPrice = chartData["chart"]["result"][0]["meta"]["regularMarketPrice"]  
+            meta = chartData["chart"]["result"][0]["meta"]
+            regularMarketTime = charting.exchangeTimes([meta["regularMarketTime"]], meta)[0]
+            regularMarketTime = regularMarketTime.strftime("%y-%m-%d %H:%M:%S")
+            df = charting.chartFrame(chartData)
+        except:
+            return None, f"Failed to generate chart data for ${symbol}."
+
+    title = f"{symbol.upper()} {intervalIn} {rangeIn} (${regularMarketPrice} @ {regularMarketTime})"
+    if not deadline.allows(CHARTRENDERSECONDS):
+        # short of time, closes and volume only; not listed in the cache so the next ask gets the full chart
+        deadline.degrade("price chart")
+        with deadline.stage("render"):
+            try:
+                charting.renderPriceChart(df, title, chartsFolder + '/' + chartName + "_price.png",
+                                          intraday=intervalIn in CHARTINTERVALMAXDAYS)
+            except:
+                return None, f"Failed to generate chart data for ${symbol}."
+        return {"image": os.path.abspath(chartsFolder + '/' + chartName + "_price.png"),
+                "message": "Indicators were skipped to answer in time, ask again for the full chart.",
+                "price": regularMarketPrice, "marketTime": regularMarketTime}, None
+
+    with deadline.stage("render"):
+        try:
+            # indicators use every bar, long ranges are only downsampled for drawing, and the
+            # drawing happens on the worker thread's own figure template
+            chartBuySellMessage = charting.renderChart(
+                df,
+                title,
+                chartImgPath,
+                chartMsgPath,
+                intraday=intervalIn in CHARTINTERVALMAXDAYS
+            )
+        except:
+            return None, f"Failed to generate chart data for ${symbol}."
+    chartMeta = {"image": os.path.abspath(chartImgPath), "message": chartBuySellMessage,
+                 "price": regularMarketPrice, "marketTime": regularMarketTime}
+    # charts rendered today, by this process or a sibling, are listed in the cache
+    cachePut(f"chartmeta:{symbol.upper()}:{intervalIn}:{rangeIn}", chartMeta, ttl=24 * 60 * 60)
+    return chartMeta, None
+
+# a chart is redrawn once it is older than this, intraday bars move faster
+CHARTMAXAGE = 60 * 60
+CHARTINTRADAYMAXAGE = 15 * 60
+
+def cachedChart(symbol, intervalIn, rangeIn, stale=False):
+    """ metadata of a chart rendered recently (with stale, today) whose image is still on disk, or None;
+    the metadata carries when the chart was rendered as "rendered" """
+    key = f"chartmeta:{symbol.upper()}:{intervalIn}:{rangeIn}"
+    maxAge = None if stale else CHARTINTRADAYMAXAGE if intervalIn in CHARTINTERVALMAXDAYS else CHARTMAXAGE
+    found = cacheGetMany([key], maxAge, stamped=True)
+    if key not in found:
+        return None
+    stored, chartMeta = found[key]
+    if chartMeta and os.path.isfile(chartMeta["image"]):
+        chartMeta["rendered"] = stored
+        return chartMeta
+    return None
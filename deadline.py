@@ -0,0 +1,141 @@
+# deadline.py
+""" Latency budgets for commands.
+
+A Deadline starts when a command (or an inline $SYMBOL lookup) arrives and is handed down to
+every stage that works for it: fetch, parse, render and send. Network calls take their socket
+timeout from what is left, and before an expensive stage the caller asks whether enough is left
+for it and, when not, does something cheaper (a price only embed, a chart without indicator
+panels) or gives up with DeadlineExceeded. How long each stage took, which ones ran past the
+deadline and which answers were degraded is counted per command in StageStats.
+"""
+import collections
+import contextlib
+import threading
+import time
+
+import tracing
+
+# a socket timeout shorter than this fails more requests than it saves
+MIN_TIMEOUT = 0.5
+
+
+class DeadlineExceeded(Exception):
+    """ no time left for the named stage """
+
+    def __init__(self, command, stage):
+        super().__init__(f"{command} ran out of time before {stage}")
+        self.command = command
+        self.stage = stage
+
+    def __reduce__(self):
+        # raised in a worker process and pickled back to the gateway
+        return DeadlineExceeded, (self.command, self.stage)
+
+
+class StageStats:
+    """ per (command, stage) timings, overruns and degraded answers, safe to use from several threads """
+
+    def __init__(self):
+        # (command, stage) -> [count, total seconds, max seconds, overruns]
+        self.stages = collections.defaultdict(lambda: [0, 0.0, 0.0, 0])
+        self.degraded = collections.Counter()
+        self.cancelled = collections.Counter()
+        self.lock = threading.Lock()
+
+    def record(self, command, stage, seconds, overran):
+        with self.lock:
+            entry = self.stages[(command, stage)]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] += overran
+
+    def degrade(self, command, how):
+        with self.lock:
+            self.degraded[(command, how)] += 1
+
+    def cancel(self, command, stage):
+        with self.lock:
+            self.cancelled[(command, stage)] += 1
+            self.stages[(command, stage)][3] += 1
+
+    def counts(self):
+        """ everything counted so far as plain data, for sending from a worker process to merge() """
+        with self.lock:
+            return ({key: list(entry) for key, entry in self.stages.items()}, dict(self.degraded), dict(self.cancelled))
+
+    def merge(self, counts):
+        """ add what another StageStats counted, as returned by its counts() """
+        stages, degraded, cancelled = counts
+        with self.lock:
+            for key, (count, total, longest, overruns) in stages.items():
+                entry = self.stages[key]
+                entry[0] += count
+                entry[1] += total
+                entry[2] = max(entry[2], longest)
+                entry[3] += overruns
+            self.degraded.update(degraded)
+            self.cancelled.update(cancelled)
+
+    def lines(self):
+        """ one line per command and stage, then the degraded answers """
+        with self.lock:
+            lines = []
+            for (command, stage), (count, total, longest, overruns) in sorted(self.stages.items()):
+                lines.append(f"{command} {stage}: {count}x, avg {total / count * 1000 if count else 0:.0f} ms,"
+                             f" max {longest * 1000:.0f} ms, {overruns} over budget"
+                             + (f", {self.cancelled[(command, stage)]} cancelled" if self.cancelled[(command, stage)] else ""))
+            for (command, how), count in sorted(self.degraded.items()):
+                lines.append(f"{command} degraded to {how}: {count}x")
+            return lines
+
+
+class Deadline:
+    """ what is left of a command's latency budget """
+
+    def __init__(self, command, budget, stats=None):
+        self.command = command
+        self.budget = budget
+        self.started = time.monotonic()
+        self.stats = stats
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def remaining(self):
+        return self.budget - self.elapsed()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def allows(self, seconds):
+        """ whether a stage expected to take seconds still fits """
+        return self.remaining() >= seconds
+
+    def check(self, stage):
+        """ raise DeadlineExceeded (and count it) when there is no time left for stage """
+        if self.expired():
+            if self.stats is not None:
+                self.stats.cancel(self.command, stage)
+            raise DeadlineExceeded(self.command, stage)
+
+    def timeout(self, cap, stage="fetch"):
+        """ socket timeout for a network call: what is left, at most cap """
+        self.check(stage)
+        return max(MIN_TIMEOUT, min(cap, self.remaining()))
+
+    def degrade(self, how):
+        if self.stats is not None:
+            self.stats.degrade(self.command, how)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """ time a stage, it counts as over budget when the deadline passed before it finished; the
+        stage is also a span of the current trace """
+        started = time.monotonic()
+        try:
+            with tracing.span(name):
+                yield self
+        finally:
+            if self.stats is not None:
+                self.stats.record(self.command, name, time.monotonic() - started, self.expired())
@@ -0,0 +1,117 @@
+# downsample.py
+""" Shrink long bar series to a drawable number of points before plotting.
+
+The bars are split into consecutive buckets of (nearly) equal size, one bucket per plotted bar.
+Candles are merged OHLC style (first open, highest high, lowest low, last close, summed volume)
+so no price extreme disappears. Indicator lines keep one real point per bucket picked with
+largest-triangle-three-buckets (LTTB), which keeps the peaks and troughs a plain stride would
+skip. Every series is reduced over the same buckets so the panels stay aligned.
+
+Missing values (NaN) are skipped inside a bucket; a bucket with nothing but NaN stays NaN.
+"""
+import numpy as np
+
+
+def bucketStarts(length, buckets):
+    """ first index of each bucket when length bars are split into buckets groups """
+    if buckets >= length:
+        return np.arange(length)
+    return np.linspace(0, length, buckets + 1).astype(np.int64)[:-1]
+
+
+def bucketEnds(starts, length):
+    return np.append(starts[1:], length)
+
+
+def firstValid(values, starts):
+    """ first non-NaN value of every bucket """
+    values = np.asarray(values, dtype=float)
+    ends = bucketEnds(starts, len(values))
+    valid = np.flatnonzero(~np.isnan(values))
+    result = np.full(len(starts), np.nan)
+    if not len(valid):
+        return result
+    position = np.minimum(np.searchsorted(valid, starts), len(valid) - 1)
+    found = (valid[position] >= starts) & (valid[position] < ends)
+    result[found] = values[valid[position[found]]]
+    return result
+
+
+def lastValid(values, starts):
+    """ last non-NaN value of every bucket """
+    values = np.asarray(values, dtype=float)
+    ends = bucketEnds(starts, len(values))
+    valid = np.flatnonzero(~np.isnan(values))
+    result = np.full(len(starts), np.nan)
+    if not len(valid):
+        return result
+    position = np.maximum(np.searchsorted(valid, ends) - 1, 0)
+    found = (valid[position] >= starts) & (valid[position] < ends)
+    result[found] = values[valid[position[found]]]
+    return result
+
+
+def ohlc(opens, highs, lows, closes, volumes, starts):
+    """ merge bars into one candle per bucket, returns (open, high, low, close, volume) arrays """
+    highs = np.asarray(highs, dtype=float)
+    lows = np.asarray(lows, dtype=float)
+    volumes = np.asarray(volumes, dtype=float)
+    # fmax/fmin ignore NaN unless the whole bucket is NaN
+    return (firstValid(opens, starts),
+            np.fmax.reduceat(highs, starts),
+            np.fmin.reduceat(lows, starts),
+            lastValid(closes, starts),
+            np.add.reduceat(np.nan_to_num(volumes), starts))
+
+
+def extremes(values, starts):
+    """ the value furthest from zero in every bucket, for bar plots like a MACD histogram """
+    values = np.asarray(values, dtype=float)
+    highest = np.fmax.reduceat(values, starts)
+    lowest = np.fmin.reduceat(values, starts)
+    return np.where(np.abs(lowest) > np.abs(highest), lowest, highest)
+
+
+def lttb(values, starts):
+    """ pick one point per bucket with largest-triangle-three-buckets, returns the picked values
+
+    Each bucket keeps the point forming the largest triangle with the point picked in the
+    previous bucket and the average of the next bucket.
+    """
+    values = np.asarray(values, dtype=float)
+    length = len(values)
+    if len(starts) >= length:
+        return values.copy()
+    ends = bucketEnds(starts, length)
+    positions = np.arange(length, dtype=float)
+    # bucket averages (of the valid points) used as the third corner of the triangle
+    valid = ~np.isnan(values)
+    counts = np.add.reduceat(valid.astype(float), starts)
+    sums = np.add.reduceat(np.where(valid, values, 0.0), starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        averages = sums / counts
+    centers = (starts + ends - 1) / 2.0
+
+    picked = np.full(len(starts), np.nan)
+    previousX = 0.0
+    previousY = np.nan
+    for bucket in range(len(starts)):
+        start, end = starts[bucket], ends[bucket]
+        if not counts[bucket]:
+            continue
+        window = values[start:end]
+        if np.isnan(previousY):
+            # nothing picked yet, keep the first valid point like plain LTTB keeps the first point
+            choice = int(np.flatnonzero(~np.isnan(window))[0])
+        else:
+            if bucket + 1 < len(starts) and counts[bucket + 1]:
+                nextX, nextY = centers[bucket + 1], averages[bucket + 1]
+            else:
+                nextX, nextY = positions[end - 1], previousY
+            areas = np.abs((previousX - nextX) * (window - previousY) - (previousX - positions[start:end]) * (nextY - previousY))
+            areas[np.isnan(areas)] = -1.0
+            choice = int(np.argmax(areas))
+        picked[bucket] = window[choice]
+        previousX = positions[start + choice]
+        previousY = window[choice]
+    return picked
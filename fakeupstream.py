@@ -0,0 +1,612 @@
+#!/usr/bin/env python3
+# fakeupstream.py
+""" Local stand-in for the Yahoo Finance (RapidAPI) and Whale Alert endpoints used by bot.py.
+
+Serves synthetic but structurally faithful responses for get-summary, get-quotes, get-chart,
+get-movers and the whale alert transactions api, with configurable latency, error rate and 429 behavior.
+Point the bot at it with:
+
+    [upstream]
+    url = http://127.0.0.1:8800
+
+FakeRedis is a tiny in-memory server speaking enough of the redis protocol to exercise the
+redis cache backend without a real redis (--redis-port).
+"""
+import argparse
+import http.server
+import json
+import math
+import random
+import socketserver
+import threading
+import time
+import urllib.parse
+import zlib
+
+# symbols that answer as ETFs instead of equities
+ETF_SYMBOLS = {"SPY", "QQQ", "IWM", "DIA", "ARKK", "VTI", "VOO", "XLE", "XLF", "TQQQ", "SQQQ"}
+
+SECTORS = [("Technology", "Software—Infrastructure"), ("Consumer Cyclical", "Auto Manufacturers"),
+           ("Healthcare", "Biotechnology"), ("Financial Services", "Banks—Regional"),
+           ("Energy", "Oil & Gas E&P"), ("Communication Services", "Entertainment"),
+           ("Industrials", "Aerospace & Defense"), ("Consumer Defensive", "Discount Stores")]
+
+INTERVAL_SECONDS = {"1m": 60, "2m": 120, "5m": 300, "15m": 900, "30m": 1800, "60m": 3600, "90m": 5400,
+                    "1h": 3600, "1d": 86400, "5d": 5 * 86400, "1wk": 7 * 86400, "1mo": 30 * 86400, "3mo": 91 * 86400}
+
+RANGE_DAYS = {"1d": 1, "5d": 5, "1mo": 30, "3mo": 91, "6mo": 182, "1y": 365, "2y": 730, "5y": 1826,
+              "10y": 3652, "ytd": 300, "max": 365 * 30}
+
+# regular session of the exchange in UTC seconds after midnight (9:30 - 16:00 ET during EDT)
+SESSION_OPEN = 13 * 3600 + 30 * 60
+SESSION_CLOSE = 20 * 3600
+
+MAX_BARS = 50000
+
+
+def fmtNumber(value):
+    """ format a number the way yahoo does in its fmt fields (1.23B, 456.78M ...) """
+    for limit, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M"), (1e3, "k")):
+        if abs(value) >= limit:
+            return f"{value / limit:.2f}{suffix}"
+    return f"{value:.2f}"
+
+
+def rawFmt(value, fmt=None):
+    return {"raw": value, "fmt": fmt if fmt is not None else f"{value:.2f}"}
+
+
+def pctFmt(value):
+    return {"raw": value, "fmt": f"{value * 100:.2f}%"}
+
+
+def symbolRandom(symbol, salt=""):
+    """ deterministic random generator for a symbol so repeated lookups agree with each other """
+    return random.Random(zlib.crc32(f"{symbol}{salt}".encode()))
+
+
+def basePrice(symbol):
+    return round(symbolRandom(symbol).uniform(3, 900), 2)
+
+
+def livePrice(symbol, now=None):
+    """ slowly moving price so quotes change between polls """
+    now = time.time() if now is None else now
+    base = basePrice(symbol)
+    phase = zlib.crc32(symbol.encode()) % 1000
+    return round(base * (1 + 0.03 * math.sin((now / 600.0) + phase)), 2)
+
+
+def buildSummary(symbol, paddingKB=0):
+    """ synthetic /stock/v2/get-summary payload """
+    rnd = symbolRandom(symbol)
+    price = livePrice(symbol)
+    prevClose = basePrice(symbol)
+    change = round(price - prevClose, 2)
+    changePct = change / prevClose
+    shares = rnd.uniform(5e7, 5e9)
+    marketCap = price * shares
+    sector, industry = SECTORS[zlib.crc32(symbol.encode()) % len(SECTORS)]
+    quoteType = "ETF" if symbol in ETF_SYMBOLS else "EQUITY"
+    hour = time.gmtime().tm_hour
+    marketState = "PRE" if 8 <= hour < 13 else "REGULAR" if 13 <= hour < 20 else "POST"
+    data = {
+        "quoteType": {"quoteType": quoteType, "symbol": symbol, "shortName": f"{symbol} Corp",
+                      "longName": f"{symbol} Corporation"},
+        "price": {
+            "marketState": marketState,
+            "regularMarketPrice": rawFmt(price),
+            "regularMarketChange": rawFmt(change),
+            "regularMarketChangePercent": pctFmt(changePct),
+            "regularMarketDayLow": rawFmt(round(min(price, prevClose) * 0.98, 2)),
+            "regularMarketDayHigh": rawFmt(round(max(price, prevClose) * 1.02, 2)),
+            "regularMarketTime": int(time.time()),
+            "preMarketPrice": rawFmt(round(prevClose * 1.01, 2)),
+            "preMarketChange": rawFmt(round(prevClose * 0.01, 2)),
+            "preMarketChangePercent": pctFmt(0.01),
+            "postMarketPrice": rawFmt(round(price * 0.995, 2)),
+            "postMarketChange": rawFmt(round(-price * 0.005, 2)),
+            "postMarketChangePercent": pctFmt(-0.005),
+            "marketCap": rawFmt(marketCap, fmtNumber(marketCap)),
+            "currency": "USD",
+            "currencySymbol": "$",
+            "exchangeName": "NasdaqGS",
+            "quoteSourceName": "Nasdaq Real Time Price",
+        },
+        "summaryDetail": {
+            "fiftyTwoWeekLow": rawFmt(round(prevClose * 0.6, 2)),
+            "fiftyTwoWeekHigh": rawFmt(round(prevClose * 1.4, 2)),
+            "twoHundredDayAverage": rawFmt(round(prevClose * 0.95, 2)),
+            "fiftyDayAverage": rawFmt(round(prevClose * 1.02, 2)),
+            "trailingPE": rawFmt(round(rnd.uniform(-20, 80), 2)),
+            "priceToSalesTrailing12Months": rawFmt(round(rnd.uniform(0.3, 25), 2)),
+            "dividendRate": rawFmt(round(rnd.uniform(0, 4), 2)),
+            "dividendYield": pctFmt(round(rnd.uniform(0, 0.06), 4)),
+            "beta": rawFmt(round(rnd.uniform(0.2, 2.5), 2)),
+            "yield": pctFmt(round(rnd.uniform(0, 0.03), 4)),
+        },
+        "defaultKeyStatistics": {
+            "enterpriseToEbitda": rawFmt(round(rnd.uniform(2, 60), 2)),
+            "forwardPE": rawFmt(round(rnd.uniform(-10, 60), 2)),
+            "pegRatio": rawFmt(round(rnd.uniform(-1, 4), 2)),
+            "priceToBook": rawFmt(round(rnd.uniform(0.2, 30), 2)),
+            "shortPercentOfFloat": pctFmt(round(rnd.uniform(0, 0.4), 4)),
+            "beta3Year": rawFmt(round(rnd.uniform(0.5, 1.5), 2)),
+            "totalAssets": rawFmt(marketCap, fmtNumber(marketCap)),
+            "fundInceptionDate": {"raw": 725846400, "fmt": "1993-01-22"},
+        },
+        "financialData": {
+            "returnOnAssets": pctFmt(round(rnd.uniform(-0.2, 0.3), 4)),
+            "returnOnEquity": pctFmt(round(rnd.uniform(-0.5, 0.8), 4)),
+            "revenueGrowth": pctFmt(round(rnd.uniform(-0.3, 0.6), 4)),
+            "freeCashflow": rawFmt(marketCap * 0.03, fmtNumber(marketCap * 0.03)),
+        },
+        "summaryProfile": {"sector": sector, "industry": industry},
+        "netSharePurchaseActivity": {key: {"raw": count, "fmt": str(count)} for key, count in (
+            ("buyInfoShares", rnd.randint(1000, 900000)), ("buyInfoCount", rnd.randint(1, 40)),
+            ("sellInfoShares", rnd.randint(1000, 900000)), ("sellInfoCount", rnd.randint(1, 40)))},
+        "majorHoldersBreakdown": {
+            "insidersPercentHeld": pctFmt(round(rnd.uniform(0, 0.3), 4)),
+            "institutionsPercentHeld": pctFmt(round(rnd.uniform(0.2, 0.9), 4)),
+        },
+        "incomeStatementHistory": {"incomeStatementHistory": []},
+        "balanceSheetHistory": {"balanceSheetStatements": []},
+    }
+    for year in range(4):
+        endDate = f"{2022 - year}-12-31"
+        ebit = marketCap * rnd.uniform(0.01, 0.1)
+        data["incomeStatementHistory"]["incomeStatementHistory"].append({
+            "endDate": {"raw": 0, "fmt": endDate},
+            "ebit": rawFmt(ebit),
+            "incomeTaxExpense": rawFmt(ebit * 0.2),
+            "incomeBeforeTax": rawFmt(ebit * 0.9),
+        })
+        totalLiab = marketCap * rnd.uniform(0.1, 0.6)
+        data["balanceSheetHistory"]["balanceSheetStatements"].append({
+            "endDate": {"raw": 0, "fmt": endDate},
+            "totalLiab": rawFmt(totalLiab),
+            "totalStockholderEquity": rawFmt(marketCap * rnd.uniform(0.1, 0.5)),
+            "totalCurrentLiabilities": rawFmt(totalLiab * 0.4),
+        })
+    if quoteType == "ETF":
+        data["fundProfile"] = {"family": "Synthetic Funds", "styleBoxUrl": "",
+                               "feesExpensesInvestment": {"annualReportExpenseRatio": pctFmt(0.0009)}}
+        data["fundPerformance"] = {"trailingReturns": {key: pctFmt(rnd.uniform(-0.1, 0.3))
+                                                       for key in ("ytd", "oneYear", "threeYear", "fiveYear", "tenYear")}}
+        data["topHoldings"] = {
+            "stockPosition": pctFmt(0.99), "bondPosition": pctFmt(0), "preferredPosition": pctFmt(0),
+            "convertiblePosition": pctFmt(0), "cashPosition": pctFmt(0.01), "otherPosition": pctFmt(0),
+            "sectorWeightings": [{"technology": pctFmt(0.4)}, {"healthcare": pctFmt(0.2)}],
+            "holdings": [{"symbol": s, "holdingName": f"{s} Corporation", "holdingPercent": pctFmt(0.05)}
+                         for s in ("AAPL", "MSFT", "NVDA", "AMZN")],
+        }
+    # the real payload carries a lot of modules the bot never reads, pad to a realistic size
+    if paddingKB:
+        data["earnings"] = {"history": [{"quarter": rawFmt(i), "estimate": rawFmt(rnd.random())}
+                                        for i in range(paddingKB * 12)]}
+    return data
+
+
+def buildQuotes(symbols):
+    """ synthetic /market/v2/get-quotes payload for a comma separated list of symbols """
+    results = []
+    hour = time.gmtime().tm_hour
+    marketState = "PRE" if 8 <= hour < 13 else "REGULAR" if 13 <= hour < 20 else "POST"
+    for symbol in symbols:
+        price = livePrice(symbol)
+        prevClose = basePrice(symbol)
+        change = round(price - prevClose, 2)
+        results.append({
+            "symbol": symbol, "shortName": f"{symbol} Corp", "quoteType": "ETF" if symbol in ETF_SYMBOLS else "EQUITY",
+            "currency": "USD", "marketState": marketState, "regularMarketPrice": price,
+            "regularMarketChange": change, "regularMarketChangePercent": change / prevClose * 100,
+            "regularMarketTime": int(time.time()), "regularMarketPreviousClose": prevClose,
+            "preMarketPrice": round(prevClose * 1.01, 2), "preMarketChangePercent": 1.0,
+            "postMarketPrice": round(price * 0.995, 2), "postMarketChangePercent": -0.5,
+        })
+    return {"quoteResponse": {"result": results, "error": None}}
+
+
+def barTimestamps(intervalIn, rangeIn, now=None):
+    """ bar open times for a range, weekdays only and inside the regular session for intraday intervals """
+    now = int(time.time()) if now is None else int(now)
+    step = INTERVAL_SECONDS.get(intervalIn, 86400)
+    days = RANGE_DAYS.get(rangeIn, 91)
+    start = now - days * 86400
+    timestamps = []
+    if step >= 86400:
+        day = start - start % 86400 + SESSION_OPEN
+        while day <= now and len(timestamps) < MAX_BARS:
+            if time.gmtime(day).tm_wday < 5:
+                timestamps.append(day)
+            day += step
+        return timestamps
+    day = start - start % 86400
+    while day <= now and len(timestamps) < MAX_BARS:
+        if time.gmtime(day).tm_wday < 5:
+            ts = day + SESSION_OPEN
+            while ts < day + SESSION_CLOSE and ts <= now and len(timestamps) < MAX_BARS:
+                timestamps.append(ts)
+                ts += step
+        day += 86400
+    return timestamps
+
+
+def buildChart(symbol, intervalIn, rangeIn, nullBarRate=0.002):
+    """ synthetic /stock/v2/get-chart payload: random walk OHLCV with the occasional null bar """
+    rnd = symbolRandom(symbol, intervalIn + rangeIn)
+    timestamps = barTimestamps(intervalIn, rangeIn)
+    price = basePrice(symbol)
+    opens, highs, lows, closes, volumes = [], [], [], [], []
+    vol = 0.02 if INTERVAL_SECONDS.get(intervalIn, 86400) >= 86400 else 0.003
+    for _ in timestamps:
+        if rnd.random() < nullBarRate:
+            for column in (opens, highs, lows, closes, volumes):
+                column.append(None)
+            continue
+        openPrice = price
+        price = max(0.5, price * (1 + rnd.gauss(0, vol)))
+        opens.append(round(openPrice, 4))
+        closes.append(round(price, 4))
+        highs.append(round(max(openPrice, price) * (1 + abs(rnd.gauss(0, vol / 2))), 4))
+        lows.append(round(min(openPrice, price) * (1 - abs(rnd.gauss(0, vol / 2))), 4))
+        volumes.append(int(rnd.uniform(1e5, 5e7)))
+    lastClose = next((c for c in reversed(closes) if c is not None), price)
+    return {"chart": {"result": [{
+        "meta": {"currency": "USD", "symbol": symbol, "exchangeName": "NMS", "instrumentType": "EQUITY",
+                 "regularMarketPrice": round(lastClose, 2), "regularMarketTime": int(time.time()),
+                 "gmtoffset": -14400, "timezone": "EDT", "exchangeTimezoneName": "America/New_York",
+                 "dataGranularity": intervalIn, "range": rangeIn},
+        "timestamp": timestamps,
+        "indicators": {"quote": [{"open": opens, "high": highs, "low": lows, "close": closes, "volume": volumes}],
+                       "adjclose": [{"adjclose": list(closes)}]},
+    }], "error": None}}
+
+
+def buildMovers(universe):
+    rnd = random.Random(int(time.time() // 3600))
+    picks = rnd.sample(universe, min(len(universe), 75))
+    groups = [("Day Gainers", "Stocks ordered in descending order by price percent change"),
+              ("Day Losers", "Stocks ordered in ascending order by price percent change"),
+              ("Most Actives", "Stocks ordered in descending order by intraday trade volume")]
+    result = []
+    for i, (title, description) in enumerate(groups):
+        quotes = [{"symbol": s} for s in picks[i * 25:(i + 1) * 25]]
+        result.append({"title": title, "description": description, "quotes": quotes})
+    return {"finance": {"result": result, "error": None}}
+
+
+def buildWhaleTransactions(startTime, endTime, minValue, rnd):
+    transactions = []
+    for _ in range(rnd.randint(0, 3)):
+        amountUsd = rnd.uniform(max(minValue, 500000), max(minValue, 500000) * 20)
+        transactions.append({
+            "blockchain": rnd.choice(["bitcoin", "ethereum", "tron"]),
+            "symbol": rnd.choice(["btc", "eth", "usdt"]),
+            "id": str(rnd.getrandbits(40)),
+            "transaction_type": rnd.choice(["transfer", "mint", "burn"]),
+            "hash": "%064x" % rnd.getrandbits(256),
+            "from": {"address": "%040x" % rnd.getrandbits(160), "owner_type": "unknown"},
+            "to": {"address": "%040x" % rnd.getrandbits(160), "owner": "binance", "owner_type": "exchange"},
+            "timestamp": rnd.randint(int(startTime), max(int(startTime), int(endTime))),
+            "amount": amountUsd / 30000,
+            "amount_usd": amountUsd,
+            "transaction_count": 1,
+        })
+    return {"result": "success", "cursor": "0-0-0", "count": len(transactions), "transactions": transactions}
+
+
+class UpstreamBehavior:
+    """ knobs for how the stand-in misbehaves """
+
+    def __init__(self, latency=0.0, jitter=0.0, errorRate=0.0, throttleRate=0.0, rateLimit=0.0,
+                 burst=None, paddingKB=16, seed=None):
+        self.latency = latency          # mean response delay in seconds
+        self.jitter = jitter            # standard deviation of the delay in seconds
+        self.errorRate = errorRate      # fraction of requests answered with a 500
+        self.throttleRate = throttleRate  # fraction of requests answered with a 429 regardless of load
+        self.rateLimit = rateLimit      # requests per second before 429s kick in, 0 for unlimited
+        self.burst = burst if burst is not None else max(1.0, rateLimit)
+        self.paddingKB = paddingKB      # approximate extra size of get-summary payloads
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tokens = self.burst
+        self.tokenTime = time.monotonic()
+
+    def takeToken(self):
+        """ token bucket shared by all endpoints, returns False when the caller should get a 429 """
+        if not self.rateLimit:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.tokenTime) * self.rateLimit)
+            self.tokenTime = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def delay(self):
+        with self.lock:
+            return max(0.0, self.random.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+
+    def roll(self, rate):
+        with self.lock:
+            return self.random.random() < rate
+
+
+class UpstreamHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def sendJson(self, code, payload, extraHeaders=None):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (extraHeaders or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        parsed = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        endpoint = parsed.path
+        if endpoint == "/__stats":
+            self.sendJson(200, server.stats())
+            return
+        behavior = server.behavior
+        started = time.monotonic()
+        if not behavior.takeToken() or behavior.roll(behavior.throttleRate):
+            server.count(endpoint, 429)
+            self.sendJson(429, {"message": "Too many requests"}, {"Retry-After": "1"})
+            return
+        time.sleep(behavior.delay())
+        if behavior.roll(behavior.errorRate):
+            server.count(endpoint, 500, time.monotonic() - started)
+            self.sendJson(500, {"message": "Internal Server Error"})
+            return
+        symbol = query.get("symbol", "").upper()
+        if endpoint == "/stock/v2/get-summary":
+            payload = buildSummary(symbol, behavior.paddingKB)
+        elif endpoint == "/stock/v2/get-chart":
+            payload = buildChart(symbol, query.get("interval", "1d"), query.get("range", "3mo"))
+        elif endpoint == "/market/v2/get-quotes":
+            symbols = [s.upper() for s in query.get("symbols", "").split(",") if s]
+            payload = buildQuotes(symbols)
+        elif endpoint == "/market/v2/get-movers":
+            payload = buildMovers(server.universe)
+        elif endpoint == "/v1/transactions":
+            payload = buildWhaleTransactions(query.get("start", 0), query.get("end", 0),
+                                             float(query.get("min_value", 500000)), behavior.random)
+        else:
+            server.count(endpoint, 404)
+            self.sendJson(404, {"message": f"Unknown endpoint {endpoint}"})
+            return
+        server.count(endpoint, 200, time.monotonic() - started)
+        self.sendJson(200, payload)
+
+
+class FakeUpstreamServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, behavior, universe):
+        super().__init__(address, UpstreamHandler)
+        self.behavior = behavior
+        self.universe = universe
+        self.counters = {}
+        self.counterLock = threading.Lock()
+
+    def count(self, endpoint, code, seconds=0.0):
+        with self.counterLock:
+            counter = self.counters.setdefault(endpoint, {"requests": 0, "seconds": 0.0, "codes": {}})
+            counter["requests"] += 1
+            counter["seconds"] += seconds
+            counter["codes"][str(code)] = counter["codes"].get(str(code), 0) + 1
+
+    def stats(self):
+        with self.counterLock:
+            return json.loads(json.dumps(self.counters))
+
+
+DEFAULT_UNIVERSE = ["AAPL", "MSFT", "NVDA", "TSLA", "AMZN", "GOOG", "META", "AMD", "GME", "AMC", "PLTR", "BB",
+                    "NIO", "SOFI", "INTC", "NFLX", "DIS", "BA", "F", "T", "KO", "PFE", "XOM", "JPM", "BAC",
+                    "COIN", "HOOD", "RIVN", "LCID", "MARA", "RIOT", "SNAP", "UBER", "SHOP", "SQ", "PYPL",
+                    "SPY", "QQQ", "IWM", "ARKK", "TQQQ", "SQQQ", "BTC-USD", "ETH-USD", "DOGE-USD"]
+
+
+class FakeUpstream:
+    """ runs the stand-in server on a background thread """
+
+    def __init__(self, host="127.0.0.1", port=0, behavior=None, universe=None):
+        self.behavior = behavior or UpstreamBehavior()
+        self.server = FakeUpstreamServer((host, port), self.behavior, universe or DEFAULT_UNIVERSE)
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fakeupstream", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        return self.server.stats()
+
+
+class RedisHandler(socketserver.StreamRequestHandler):
+    """ one client connection speaking RESP2 """
+
+    def readCommand(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.strip().split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def reply(self, value):
+        if value is None:
+            data = b"$-1\r\n"
+        elif isinstance(value, bool):
+            data = b"+OK\r\n"
+        elif isinstance(value, int):
+            data = b":%d\r\n" % value
+        elif isinstance(value, bytes):
+            data = b"$%d\r\n%s\r\n" % (len(value), value)
+        elif isinstance(value, list):
+            self.wfile.write(b"*%d\r\n" % len(value))
+            for item in value:
+                self.reply(item)
+            return
+        else:
+            data = b"-ERR %s\r\n" % str(value).encode()
+        self.wfile.write(data)
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            args = self.readCommand()
+            if args is None:
+                return
+            if not args:
+                continue
+            name = args[0].upper()
+            with self.server.lock:
+                self.server.commands += 1
+                if name == b"QUIT":
+                    self.reply(True)
+                    return
+                self.reply(store.execute(name, args[1:]))
+
+
+class FakeRedisStore:
+    """ dict with expiry implementing the handful of commands the cache backend uses """
+
+    def __init__(self):
+        self.data = {}
+
+    def live(self, key):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= time.time():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, name, args):
+        if name in (b"PING", b"AUTH", b"SELECT"):
+            return True
+        if name == b"GET":
+            return self.live(args[0])
+        if name == b"MGET":
+            return [self.live(key) for key in args]
+        if name == b"SET":
+            expires = None
+            options = [arg.upper() for arg in args[2:]]
+            if b"EX" in options:
+                expires = time.time() + float(args[2 + options.index(b"EX") + 1])
+            if b"PX" in options:
+                expires = time.time() + float(args[2 + options.index(b"PX") + 1]) / 1000.0
+            self.data[args[0]] = (args[1], expires)
+            return True
+        if name == b"DEL":
+            return sum(1 for key in args if self.data.pop(key, None) is not None)
+        if name == b"EXISTS":
+            return sum(1 for key in args if self.live(key) is not None)
+        if name == b"SCAN":
+            pattern = b"*"
+            if b"MATCH" in [arg.upper() for arg in args]:
+                pattern = args[[arg.upper() for arg in args].index(b"MATCH") + 1]
+            prefix = pattern.rstrip(b"*").replace(b"\\", b"")
+            return [b"0", [key for key in list(self.data) if key.startswith(prefix) and self.live(key) is not None]]
+        if name == b"FLUSHDB":
+            self.data.clear()
+            return True
+        return f"unknown command {name.decode()}"
+
+
+class FakeRedis(socketserver.ThreadingTCPServer):
+    """ runs the redis stand-in on a background thread, url points the cache at it """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), RedisHandler)
+        self.store = FakeRedisStore()
+        self.lock = threading.Lock()
+        self.commands = 0
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name="fakeredis", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def behaviorArguments(parser):
+    """ command line options shared with loadtest.py """
+    parser.add_argument("--latency", type=float, default=0.15, help="mean upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="latency standard deviation in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered with a 429")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requests/sec allowed before 429s, 0 for no limit")
+    parser.add_argument("--burst", type=float, default=None, help="token bucket size for --rate-limit")
+    parser.add_argument("--padding-kb", type=int, default=16, help="extra get-summary payload size")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def behaviorFromArguments(args):
+    return UpstreamBehavior(latency=args.latency, jitter=args.jitter, errorRate=args.error_rate,
+                            throttleRate=args.throttle_rate, rateLimit=args.rate_limit, burst=args.burst,
+                            paddingKB=args.padding_kb, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in Yahoo Finance / Whale Alert server for load testing the bot.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--redis-port", type=int, default=None, help="also serve a redis protocol stand-in on this port")
+    behaviorArguments(parser)
+    args = parser.parse_args()
+    upstream = FakeUpstream(args.host, args.port, behaviorFromArguments(args))
+    print(f"Fake upstream listening on {upstream.url}")
+    if args.redis_port is not None:
+        redis = FakeRedis(args.host, args.redis_port).start()
+        print(f"Fake redis listening on {redis.url}")
+    try:
+        upstream.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(upstream.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+# indicators.py
+""" Streaming versions of the chart indicators.
+
+The batch functions in charting.py recompute every EWM and rolling window over the whole
+history. The classes here keep just enough state to take one new bar at a time in O(1):
+
+    EMA         pandas ewm(adjust=False).mean(), including how it treats missing values
+    SMA         rolling(n).mean()
+    MACD        fast/slow EMA of the close and an EMA of their difference
+    RSI         Wilder smoothing (EMA with com=13) of gains and losses
+    Stochastic  %K from monotonic deques of the rolling low and high, smoothed into %K and %D
+    IndicatorSet  the bundle a chart uses, per symbol and interval
+
+Every class serializes to a JSON friendly dict with toDict() and back with fromDict(), so the
+state can be stored in the cache next to the last bar it has seen. Only the standard library is
+used so the bot can advance indicators without loading the chart stack.
+"""
+import collections
+
+NAN = float("nan")
+
+
+def divide(numerator, denominator):
+    """ float division the way numpy does it, inf or NaN instead of ZeroDivisionError """
+    if denominator == 0:
+        if numerator != numerator or numerator == 0:
+            return NAN
+        return float("inf") if numerator > 0 else float("-inf")
+    return numerator / denominator
+
+
+class EMA:
+    """ exponentially weighted mean, same values as pandas ewm(adjust=False).mean() """
+
+    def __init__(self, alpha, weighted=NAN, oldWeight=1.0, observations=0, started=False):
+        self.alpha = alpha
+        self.weighted = weighted
+        self.oldWeight = oldWeight
+        self.observations = observations
+        self.started = started
+
+    @classmethod
+    def fromSpan(cls, span):
+        # pandas turns span into a center of mass first, do the same so alpha is bit for bit equal
+        return cls.fromCom((span - 1) / 2.0)
+
+    @classmethod
+    def fromCom(cls, com):
+        return cls(1.0 / (1.0 + com))
+
+    def update(self, value):
+        observed = value == value
+        if not self.started:
+            self.started = True
+            self.weighted = value
+            self.observations = int(observed)
+        else:
+            self.observations += observed
+            if self.weighted == self.weighted:
+                # a missing value still ages the old mean (ignore_na=False)
+                self.oldWeight *= 1.0 - self.alpha
+                if observed:
+                    if self.weighted != value:
+                        self.weighted = (self.oldWeight * self.weighted + self.alpha * value) / (self.oldWeight + self.alpha)
+                    self.oldWeight = 1.0
+            elif observed:
+                self.weighted = value
+        return self.value
+
+    @property
+    def value(self):
+        return self.weighted if self.observations else NAN
+
+    def toDict(self):
+        return {"alpha": self.alpha, "weighted": self.weighted, "oldWeight": self.oldWeight,
+                "observations": self.observations, "started": self.started}
+
+    @classmethod
+    def fromDict(cls, data):
+        return cls(**data)
+
+
+class SMA:
+    """ simple moving average over the last period values, NaN unless all of them are present """
+
+    def __init__(self, period, window=()):
+        self.period = period
+        self.window = collections.deque(window, maxlen=period)
+
+    def update(self, value):
+        self.window.append(value)
+        return self.value
+
+    @property
+    def value(self):
+        if len(self.window) < self.period:
+            return NAN
+        # a fixed size window, summing it is O(period) which is O(1) per bar
+        return sum(self.window) / self.period
+
+    def toDict(self):
+        return {"period": self.period, "window": list(self.window)}
+
+    @classmethod
+    def fromDict(cls, data):
+        return cls(data["period"], data["window"])
+
+
+class MACD:
+    """ (macd, signal, histogram) like charting.calcMACD """
+
+    def __init__(self, fast=8, slow=17, signal=9):
+        self.fast = EMA.fromSpan(fast)
+        self.slow = EMA.fromSpan(slow)
+        self.signal = EMA.fromSpan(signal)
+        self.periods = (fast, slow, signal)
+
+    def update(self, close):
+        macd = self.fast.update(close) - self.slow.update(close)
+        signal = self.signal.update(macd)
+        return macd, signal, macd - signal
+
+    @property
+    def value(self):
+        macd = self.fast.value - self.slow.value
+        return macd, self.signal.value, macd - self.signal.value
+
+    def toDict(self):
+        return {"periods": list(self.periods), "fast": self.fast.toDict(), "slow": self.slow.toDict(), "signal": self.signal.toDict()}
+
+    @classmethod
+    def fromDict(cls, data):
+        macd = cls(*data["periods"])
+        macd.fast = EMA.fromDict(data["fast"])
+        macd.slow = EMA.fromDict(data["slow"])
+        macd.signal = EMA.fromDict(data["signal"])
+        return macd
+
+
+class RSI:
+    """ relative strength index with Wilder smoothing, like charting.calcRSI (NaN for the first 12 bars) """
+
+    WARMUP = 12
+
+    def __init__(self, com=13):
+        self.com = com
+        self.up = EMA.fromCom(com)
+        self.down = EMA.fromCom(com)
+        self.previousClose = NAN
+        self.bars = 0
+        self.last = NAN
+
+    def update(self, close):
+        # the first bar has no previous close, its change is missing like diff() makes it
+        delta = close - self.previousClose if self.bars else NAN
+        self.previousClose = close
+        self.bars += 1
+        if delta != delta:
+            up = down = NAN
+        else:
+            up = delta if delta > 0 else 0.0
+            down = -delta if delta < 0 else 0.0
+        rs = divide(self.up.update(up), self.down.update(down))
+        self.last = NAN if self.bars <= self.WARMUP else 100 - divide(100, 1 + rs)
+        return self.last
+
+    @property
+    def value(self):
+        return self.last
+
+    def toDict(self):
+        return {"com": self.com, "up": self.up.toDict(), "down": self.down.toDict(),
+                "previousClose": self.previousClose, "bars": self.bars, "last": self.last}
+
+    @classmethod
+    def fromDict(cls, data):
+        rsi = cls(data["com"])
+        rsi.up = EMA.fromDict(data["up"])
+        rsi.down = EMA.fromDict(data["down"])
+        rsi.previousClose = data["previousClose"]
+        rsi.bars = data["bars"]
+        rsi.last = data["last"]
+        return rsi
+
+
+class RollingExtreme:
+    """ lowest (or highest) value of the last window bars with a monotonic deque, missing values skipped """
+
+    def __init__(self, window, highest=False, entries=(), bars=0):
+        self.window = window
+        self.highest = highest
+        # (bar number, value) with values increasing (decreasing for highest) from the front
+        self.entries = collections.deque(tuple(entry) for entry in entries)
+        self.bars = bars
+
+    def update(self, value):
+        self.bars += 1
+        entries = self.entries
+        if value == value:
+            if self.highest:
+                while entries and entries[-1][1] <= value:
+                    entries.pop()
+            else:
+                while entries and entries[-1][1] >= value:
+                    entries.pop()
+            entries.append((self.bars, value))
+        while entries and entries[0][0] <= self.bars - self.window:
+            entries.popleft()
+        return entries[0][1] if entries else NAN
+
+    def toDict(self):
+        return {"window": self.window, "highest": self.highest, "entries": [list(entry) for entry in self.entries], "bars": self.bars}
+
+    @classmethod
+    def fromDict(cls, data):
+        return cls(**data)
+
+
+class Stochastic:
+    """ stochastic oscillator like charting.calcStochastics: %K over the last period + 1 bars, valid once
+    period bars with a low and high are in, then smoothed by kavg and davg bar means """
+
+    def __init__(self, period=14, kavg=3, davg=3):
+        self.period = period
+        self.lows = RollingExtreme(period + 1)
+        self.highs = RollingExtreme(period + 1, highest=True)
+        # which of the last period + 1 bars had both a low and a high
+        self.present = collections.deque(maxlen=period + 1)
+        self.kLine = SMA(kavg)
+        self.dLine = SMA(davg)
+
+    def update(self, high, low, close):
+        lowest = self.lows.update(low)
+        highest = self.highs.update(high)
+        # rolling min and max count their own observations, a bar counts when both are there
+        self.present.append((low == low, high == high))
+        lowCount = sum(1 for hasLow, hasHigh in self.present if hasLow)
+        highCount = sum(1 for hasLow, hasHigh in self.present if hasHigh)
+        if lowCount < self.period or highCount < self.period:
+            k = NAN
+        else:
+            k = 100 * divide(close - lowest, highest - lowest)
+        smoothed = self.kLine.update(k)
+        return smoothed, self.dLine.update(smoothed)
+
+    @property
+    def value(self):
+        return self.kLine.value, self.dLine.value
+
+    def toDict(self):
+        return {"period": self.period, "lows": self.lows.toDict(), "highs": self.highs.toDict(),
+                "present": [list(flags) for flags in self.present], "kLine": self.kLine.toDict(), "dLine": self.dLine.toDict()}
+
+    @classmethod
+    def fromDict(cls, data):
+        stochastic = cls(data["period"], data["kLine"]["period"], data["dLine"]["period"])
+        stochastic.lows = RollingExtreme.fromDict(data["lows"])
+        stochastic.highs = RollingExtreme.fromDict(data["highs"])
+        stochastic.present.extend(tuple(flags) for flags in data["present"])
+        stochastic.kLine = SMA.fromDict(data["kLine"])
+        stochastic.dLine = SMA.fromDict(data["dLine"])
+        return stochastic
+
+
+class IndicatorSet:
+    """ every indicator !chart draws, for one symbol and interval, advanced one bar at a time """
+
+    VERSION = 1
+
+    def __init__(self, maPeriod=10, macdPeriods=(8, 17, 9), stochasticPeriods=(14, 3, 3)):
+        self.ma = SMA(maPeriod)
+        self.macd = MACD(*macdPeriods)
+        self.stochastic = Stochastic(*stochasticPeriods)
+        self.rsi = RSI()
+        self.firstTimestamp = None
+        self.lastTimestamp = None
+        self.bars = 0
+
+    def update(self, timestamp, high, low, close):
+        """ add the bar that opened at timestamp, returns the indicator values after it """
+        if self.lastTimestamp is not None and timestamp <= self.lastTimestamp:
+            raise ValueError(f"bar at {timestamp} is not after the last bar at {self.lastTimestamp}")
+        if self.firstTimestamp is None:
+            self.firstTimestamp = timestamp
+        self.lastTimestamp = timestamp
+        self.bars += 1
+        self.ma.update(close)
+        self.macd.update(close)
+        self.stochastic.update(high, low, close)
+        self.rsi.update(close)
+        return self.values()
+
+    def values(self):
+        macd, signal, histogram = self.macd.value
+        k, d = self.stochastic.value
+        return {"ma": self.ma.value, "macd": macd, "signal": signal, "histogram": histogram,
+                "stochasticK": k, "stochasticD": d, "rsi": self.rsi.value}
+
+    def toDict(self):
+        return {"version": self.VERSION, "firstTimestamp": self.firstTimestamp, "lastTimestamp": self.lastTimestamp,
+                "bars": self.bars, "ma": self.ma.toDict(), "macd": self.macd.toDict(),
+                "stochastic": self.stochastic.toDict(), "rsi": self.rsi.toDict()}
+
+    @classmethod
+    def fromDict(cls, data):
+        """ rebuild a saved set, None when it was saved by an incompatible version """
+        if not data or data.get("version") != cls.VERSION:
+            return None
+        indicatorSet = cls()
+        indicatorSet.firstTimestamp = data["firstTimestamp"]
+        indicatorSet.lastTimestamp = data["lastTimestamp"]
+        indicatorSet.bars = data["bars"]
+        indicatorSet.ma = SMA.fromDict(data["ma"])
+        indicatorSet.macd = MACD.fromDict(data["macd"])
+        indicatorSet.stochastic = Stochastic.fromDict(data["stochastic"])
+        indicatorSet.rsi = RSI.fromDict(data["rsi"])
+        return indicatorSet
@@ -0,0 +1,184 @@
+# leaderboard.py
+""" Fundamentals leaderboard for !top.
+
+The ratios the $SYMBOL reply shows (PE, forward PE, PEG, P/B, P/S, EV/EBITDA, ROA, ROE and the
+3 year average ROIC) are kept for every symbol of the stock list in one float column per metric,
+NaN where a symbol has no value. Next to each column there is a sorted index of (value, row) per
+sector and one over all rows, kept up to date with bisect as symbols refresh, so a top-k query is
+a slice off one end of a list (or a k-way merge when a sector filter names several sectors).
+"""
+import array
+import bisect
+import heapq
+import itertools
+import math
+import threading
+
+NAN = float("nan")
+
+# name: (where the value is in a get-summary response, best first when ascending, only positive values rank)
+# valuation ratios with a negative value mean losses, not a bargain, so they stay out of the ranking
+METRICS = {
+    "roic": (None, False, False),
+    "roa": (("financialData", "returnOnAssets"), False, False),
+    "roe": (("financialData", "returnOnEquity"), False, False),
+    "pe": (("summaryDetail", "trailingPE"), True, True),
+    "fpe": (("defaultKeyStatistics", "forwardPE"), True, True),
+    "peg": (("defaultKeyStatistics", "pegRatio"), True, True),
+    "pb": (("defaultKeyStatistics", "priceToBook"), True, True),
+    "ps": (("summaryDetail", "priceToSalesTrailing12Months"), True, True),
+    "evebitda": (("defaultKeyStatistics", "enterpriseToEbitda"), True, True),
+}
+ALIASES = {"forwardpe": "fpe", "trailingpe": "pe", "p/e": "pe", "p/b": "pb", "p/s": "ps", "pricetobook": "pb",
+           "pricetosales": "ps", "ev/ebitda": "evebitda", "ev": "evebitda"}
+PERCENT_METRICS = ("roic", "roa", "roe")
+LABELS = {"roic": "ROIC (3 yr avg.)", "roa": "Return on Assets", "roe": "Return on Equity", "pe": "PE Ratio (ttm)",
+          "fpe": "PE Ratio (Fwd)", "peg": "PEG Ratio", "pb": "Price to Book", "ps": "Price to Sales", "evebitda": "EV/EBITDA"}
+
+
+#return ROIC for ticker as long as there is a date
+def roic_per_year(jsonData):
+    income_statement = jsonData["incomeStatementHistory"]["incomeStatementHistory"]
+    balance_sheet = jsonData["balanceSheetHistory"]["balanceSheetStatements"]
+
+    financial_data = {}
+    roic_per_year = []
+
+    for item in income_statement:
+        date = item["endDate"]["fmt"]
+        if not date:
+            continue
+        ebit = item["ebit"]["raw"]
+        effective_tax_rate = item["incomeTaxExpense"]["raw"] / item["incomeBeforeTax"]["raw"]
+        no_pat = ebit * (1 - effective_tax_rate)
+        financial_data[date] = {"no_pat": no_pat}
+
+    for item in balance_sheet:
+        date = item["endDate"]["fmt"]
+        if not date:
+            continue
+        invested_capital = (item["totalLiab"]["raw"] + item["totalStockholderEquity"]["raw"]) - item["totalCurrentLiabilities"]["raw"]
+        financial_data[date].update({"invested_capital": invested_capital})
+
+    for date, values in financial_data.items():
+            roic_percent = (values["no_pat"] / values["invested_capital"])
+            roic_per_year.append(roic_percent)
+
+    return roic_per_year
+
+#calc last 3 year avg ROIC, None without 3 years of data
+def avg_roic(roic_list):
+    if len(roic_list) >= 3:
+        last_3_years_roic = roic_list[-3:]
+        avg_roic_3_years = sum(last_3_years_roic) / len(last_3_years_roic)
+        return avg_roic_3_years
+    return None
+
+
+def metricValue(jsonData, name):
+    """ one metric from a get-summary response (or just its fundamentals), NaN when it is missing """
+    path = METRICS[name][0]
+    try:
+        if path is None:
+            value = avg_roic(roic_per_year(jsonData))
+        else:
+            value = jsonData[path[0]][path[1]]["raw"]
+        value = float(value)
+    except Exception:
+        return NAN
+    return value if math.isfinite(value) else NAN
+
+
+def summaryMetrics(jsonData):
+    """ every leaderboard metric of a get-summary response """
+    return {name: metricValue(jsonData, name) for name in METRICS}
+
+
+def matchMetric(text):
+    text = text.strip().lower()
+    text = ALIASES.get(text, text)
+    return text if text in METRICS else None
+
+
+def formatMetric(name, value):
+    return f"{value:.2%}" if name in PERCENT_METRICS else f"{value:.2f}"
+
+
+class Leaderboard:
+    """ metric columns and sorted indexes over a fixed list of (symbol, sector, band) rows """
+
+    def __init__(self, rows):
+        self.symbols = [row[0] for row in rows]
+        self.sectors = [row[1] for row in rows]
+        self.bands = [row[2] for row in rows]
+        self.rows = {symbol: index for index, symbol in enumerate(self.symbols)}
+        count = len(self.symbols)
+        self.columns = {name: array.array("d", itertools.repeat(NAN, count)) for name in METRICS}
+        # when each row was last refreshed, 0 for never
+        self.updated = array.array("d", itertools.repeat(0.0, count))
+        # metric -> sector ("" is every sector) -> sorted list of (value, row)
+        self.indexes = {name: {"": []} for name in METRICS}
+        # replies and the refresh job update rows from worker threads while !top reads on the event loop
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol.upper() in self.rows
+
+    def ranked(self, name, value):
+        positiveOnly = METRICS[name][2]
+        return value == value and (value > 0 or not positiveOnly)
+
+    def update(self, symbol, metrics, when):
+        """ replace a symbol's metrics, refreshed at when; symbols not in the list are ignored """
+        row = self.rows.get(symbol.upper())
+        if row is None:
+            return False
+        keys = ("", self.sectors[row]) if self.sectors[row] else ("",)
+        with self.lock:
+            for name, column in self.columns.items():
+                old = column[row]
+                new = metrics.get(name, NAN)
+                if old == new or (old != old and new != new):
+                    continue
+                for key in keys:
+                    index = self.indexes[name].setdefault(key, [])
+                    if self.ranked(name, old):
+                        del index[bisect.bisect_left(index, (old, row))]
+                    if self.ranked(name, new):
+                        bisect.insort(index, (new, row))
+                column[row] = new
+            self.updated[row] = when
+        return True
+
+    def touch(self, symbol, when):
+        """ mark a symbol refreshed without changing its metrics, after a failed fetch """
+        row = self.rows.get(symbol.upper())
+        if row is not None:
+            self.updated[row] = when
+
+    def stale(self, maxAge, now, limit):
+        """ up to limit symbols whose metrics are older than maxAge seconds, least recently refreshed first """
+        cutoff = now - maxAge
+        rows = [row for row in range(len(self.symbols)) if self.updated[row] < cutoff]
+        return [self.symbols[row] for row in heapq.nsmallest(limit, rows, key=self.updated.__getitem__)]
+
+    def top(self, name, k=10, ascending=None, sectors=None, band=None):
+        """ up to k (symbol, value) of a metric, best first unless ascending says otherwise """
+        if ascending is None:
+            ascending = METRICS[name][1]
+        indexes = self.indexes[name]
+        lists = [indexes.get(sector, []) for sector in sectors] if sectors else [indexes[""]]
+        if ascending:
+            merged = heapq.merge(*lists)
+        else:
+            merged = heapq.merge(*(reversed(index) for index in lists), reverse=True)
+        if band is not None:
+            merged = (entry for entry in merged if self.bands[entry[1]] == band)
+        with self.lock:
+            return [(self.symbols[row], value) for value, row in itertools.islice(merged, k)]
+
+    def count(self, name):
+        return len(self.indexes[name][""])
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+# loadtest.py
+""" Drive synthetic chat traffic through the bot's on_message handler and report how it copes.
+
+The bot module is imported with a throwaway stockbot.cfg that points every remote api at the
+stand-in server in fakeupstream.py, and the discord side is replaced with fake messages,
+contexts and channels so no token or network connection is needed. Example:
+
+    python loadtest.py --rate 20 --duration 60 --latency 0.2 --rate-limit 10
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import fakeupstream
+
+repoFolder = os.path.dirname(os.path.abspath(__file__))
+
+# hot symbols first, traffic is zipf distributed over this list
+DEFAULT_SYMBOLS = ["GME", "TSLA", "AMC", "SPY", "AAPL", "NVDA", "PLTR", "AMD", "BB", "MSFT", "QQQ", "COIN",
+                   "AMZN", "SOFI", "NIO", "META", "HOOD", "RIVN", "MARA", "BTC-USD", "DOGE-USD", "F", "INTC", "BA"]
+
+CHAT_LINES = ["anyone holding through earnings?", "this market is wild today", "gm", "to the moon",
+              "buy the dip", "what do you think about covid stocks", "diamond hands only"]
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class FakeUser:
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+        self.display_name = name
+        self.bot = False
+
+
+class FakeChannel:
+    def __init__(self, id, name, guild):
+        self.id = id
+        self.name = name
+        self.guild = guild
+        self.sent = 0
+
+    def __str__(self):
+        return self.name
+
+
+class FakeGuild:
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+class FakeMessage:
+    """ the parts of discord.Message that the bot reads """
+
+    def __init__(self, id, content, author, channel, arrival):
+        self.id = id
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.arrival = arrival
+        self.jump_url = f"https://discord.com/channels/{channel.guild.id}/{channel.id}/{id}"
+        self.edits = 0
+
+    async def edit(self, **kwargs):
+        await asyncio.sleep(0)
+        self.edits += 1
+        return self
+
+
+class FakeTyping:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeContext:
+    """ stands in for commands.Context: records every send with a timestamp """
+
+    def __init__(self, message, recorder):
+        self.message = message
+        self.author = message.author
+        self.channel = message.channel
+        self.guild = message.guild
+        self.recorder = recorder
+
+    def typing(self):
+        return FakeTyping()
+
+    async def send(self, content=None, embed=None, file=None, **kwargs):
+        # a real send is a network round trip, yield so other handlers can interleave
+        await asyncio.sleep(0)
+        if file is not None:
+            file.close()
+        self.channel.sent += 1
+        self.recorder.reply(self.message, content, embed, file)
+        return self.message
+
+    async def reply(self, content=None, **kwargs):
+        return await self.send(content, **kwargs)
+
+
+class FakeBot:
+    """ replaces the module level bot object so on_message runs without a gateway connection """
+
+    def __init__(self, realBot, recorder):
+        self.realBot = realBot
+        self.recorder = recorder
+        self.user = FakeUser(1, "stockbot")
+
+    async def get_context(self, message):
+        ctx = FakeContext(message, self.recorder)
+        parts = message.content[1:].split() if message.content.startswith("!") else []
+        ctx.command = self.realBot.get_command(parts[0].lower()) if parts else None
+        return ctx
+
+    async def process_commands(self, message):
+        parts = message.content[1:].split()
+        if not parts:
+            return
+        command = self.realBot.get_command(parts[0].lower())
+        if command is None:
+            return
+        ctx = await self.get_context(message)
+        try:
+            await command.callback(ctx, *parts[1:])
+        except TypeError:
+            # wrong number of arguments, discord.py would have answered with a usage error
+            self.recorder.errors += 1
+
+    def __getattr__(self, name):
+        return getattr(self.realBot, name)
+
+
+class Recorder:
+    """ collects per message timings """
+
+    def __init__(self):
+        self.firstReply = {}
+        self.replies = 0
+        self.errorReplies = 0
+        self.errors = 0
+        self.completed = []
+        self.kinds = {}
+
+    def reply(self, message, content, embed, file):
+        now = time.perf_counter()
+        self.replies += 1
+        if content and ("error" in content.lower() or "could not" in content.lower() or "failed" in content.lower()):
+            self.errorReplies += 1
+        self.firstReply.setdefault(message.id, now - message.arrival)
+
+    def done(self, message, kind):
+        self.completed.append((kind, time.perf_counter() - message.arrival, self.firstReply.get(message.id)))
+        self.kinds[kind] = self.kinds.get(kind, 0) + 1
+
+
+class TrafficGenerator:
+    """ builds a realistic mix of inline lookups, chat noise, dollar amounts and !chart bursts """
+
+    def __init__(self, symbols, channels, users, seed=None):
+        self.random = random.Random(seed)
+        self.symbols = symbols
+        self.weights = [1.0 / (rank + 1) for rank in range(len(symbols))]
+        self.channels = channels
+        self.users = users
+
+    def symbol(self):
+        return self.random.choices(self.symbols, self.weights)[0]
+
+    def message(self):
+        roll = self.random.random()
+        if roll < 0.60:
+            return "lookup", f"what is ${self.symbol()} doing today"
+        if roll < 0.72:
+            return "lookup", f"${self.symbol()} vs ${self.symbol()}"
+        if roll < 0.77:
+            return "reject", f"just made ${self.random.randint(1, 9)}{self.random.randint(0, 999)} on that trade"
+        if roll < 0.80:
+            return "chart", f"!chart ${self.symbol()}"
+        return "chat", self.random.choice(CHAT_LINES)
+
+    def chartBurst(self, size):
+        # everyone piles onto the same couple of hot tickers
+        hot = [self.symbol() for _ in range(2)]
+        return [("chart", f"!chart ${self.random.choice(hot)}") for _ in range(size)]
+
+
+def loadBotModule(upstreamUrl, workFolder, processes=0):
+    """ import bot.py with a generated config inside a scratch folder, with processes lookups and
+    charts run in that many worker processes behind the fake gateway """
+    with open(os.path.join(workFolder, "stockbot.cfg"), "w") as configFile:
+        configFile.write("[discord]\ntoken = loadtest\n\n[rapid-api]\nkey = loadtest\n\n"
+                         f"[upstream]\nurl = {upstreamUrl}\n\n[workers]\nprocesses = {processes}\n")
+    screener = os.path.join(repoFolder, "nasdaq_screener.csv")
+    if os.path.isfile(screener):
+        shutil.copy(screener, workFolder)
+    os.chdir(workFolder)
+    if repoFolder not in sys.path:
+        sys.path.insert(0, repoFolder)
+    module = importlib.import_module("bot")
+    # real channels are used, not the #testing channel with its canned chart.dat
+    module.testing = False
+    return module
+
+
+async def loopLagMonitor(samples, interval, stop):
+    """ measure how late the event loop wakes us up, a direct read of handler blocking """
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - expected))
+
+
+async def runLoad(botModule, args):
+    recorder = Recorder()
+    fakeBot = FakeBot(botModule.bot, recorder)
+    botModule.bot = fakeBot
+    guilds = [FakeGuild(100 + i, f"guild{i}") for i in range(args.guilds)]
+    channels = [FakeChannel(1000 + i, f"general{i}", guilds[i % len(guilds)]) for i in range(args.channels)]
+    users = [FakeUser(10000 + i, f"user{i}") for i in range(args.users)]
+    traffic = TrafficGenerator(args.symbols, channels, users, args.seed)
+
+    lagSamples = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(loopLagMonitor(lagSamples, args.lag_interval, stop))
+    # on_message only queues $SYMBOL lookups, the bot's workers answer them (on_ready starts them for real)
+    botModule.startLookupWorkers()
+    pending = set()
+    messageId = 0
+
+    async def handle(message, kind):
+        try:
+            await botModule.on_message(message)
+        except Exception as e:
+            recorder.errors += 1
+            if args.verbose:
+                print(f"handler error for {message.content!r}: {e!r}")
+        recorder.done(message, kind)
+
+    def dispatch(kind, content, arrival):
+        nonlocal messageId
+        messageId += 1
+        channel = traffic.random.choice(channels)
+        message = FakeMessage(messageId, content, traffic.random.choice(users), channel, arrival)
+        task = asyncio.create_task(handle(message, kind))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    start = time.perf_counter()
+    nextBurst = start + args.burst_every if args.burst_every else None
+    interval = 1.0 / args.rate
+    scheduled = start
+    while scheduled - start < args.duration:
+        now = time.perf_counter()
+        if scheduled > now:
+            await asyncio.sleep(scheduled - now)
+        # arrival is the intended send time, so a blocked loop shows up as reply latency
+        kind, content = traffic.message()
+        dispatch(kind, content, scheduled)
+        if nextBurst and scheduled >= nextBurst:
+            for kind, content in traffic.chartBurst(args.burst_size):
+                dispatch(kind, content, scheduled)
+            nextBurst += args.burst_every
+        scheduled += interval
+    sent = messageId
+    if pending:
+        await asyncio.wait(pending, timeout=args.drain)
+    drainUntil = time.perf_counter() + args.drain
+    while botModule.lookupQueue.pending and time.perf_counter() < drainUntil:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    for worker in botModule.lookupWorkers:
+        worker.cancel()
+    stop.set()
+    await monitor
+    return recorder, lagSamples, sent, elapsed
+
+
+def buildReport(recorder, lagSamples, sent, elapsed, upstreamStats, workerLines=None):
+    latencies = [first for kind, total, first in recorder.completed if first is not None]
+    totals = [total for kind, total, first in recorder.completed]
+    byKind = {}
+    for kind, total, first in recorder.completed:
+        byKind.setdefault(kind, []).append(total)
+    report = {
+        "messages_sent": sent,
+        "messages_completed": len(recorder.completed),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_msgs_per_sec": round(len(recorder.completed) / elapsed, 2) if elapsed else 0,
+        "replies": recorder.replies,
+        "error_replies": recorder.errorReplies,
+        "handler_exceptions": recorder.errors,
+        "first_reply_latency_ms": {f"p{p}": round(percentile(latencies, p) * 1000, 1) for p in (50, 90, 99)},
+        "handler_latency_ms": {f"p{p}": round(percentile(totals, p) * 1000, 1) for p in (50, 90, 99)},
+        "handler_latency_by_kind_p90_ms": {kind: round(percentile(values, 90) * 1000, 1) for kind, values in byKind.items()},
+        "event_loop_lag_ms": {"p50": round(percentile(lagSamples, 50) * 1000, 1),
+                              "p99": round(percentile(lagSamples, 99) * 1000, 1),
+                              "max": round(max(lagSamples, default=0) * 1000, 1)},
+        "upstream": upstreamStats,
+        "workers": workerLines or [],
+    }
+    if latencies:
+        report["first_reply_latency_ms"]["max"] = round(max(latencies) * 1000, 1)
+    return report
+
+
+def printReport(report):
+    print(f"Sent {report['messages_sent']} messages, completed {report['messages_completed']} "
+          f"in {report['elapsed_seconds']}s ({report['throughput_msgs_per_sec']} msg/s)")
+    print(f"Replies: {report['replies']} ({report['error_replies']} errors), handler exceptions: {report['handler_exceptions']}")
+    print("First reply latency (ms): " + ", ".join(f"{k}={v}" for k, v in report["first_reply_latency_ms"].items()))
+    print("Handler latency (ms):     " + ", ".join(f"{k}={v}" for k, v in report["handler_latency_ms"].items()))
+    print("Handler p90 by kind (ms): " + ", ".join(f"{k}={v}" for k, v in report["handler_latency_by_kind_p90_ms"].items()))
+    print("Event loop lag (ms):      " + ", ".join(f"{k}={v}" for k, v in report["event_loop_lag_ms"].items()))
+    for endpoint, counter in sorted(report["upstream"].items()):
+        codes = ", ".join(f"{code}:{count}" for code, count in sorted(counter["codes"].items()))
+        print(f"Upstream {endpoint}: {counter['requests']} requests ({codes})")
+    for line in report["workers"]:
+        print(f"Workers: {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test bot.py against the stand-in upstream server.")
+    parser.add_argument("--rate", type=float, default=10.0, help="messages per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of traffic to generate")
+    parser.add_argument("--burst-every", type=float, default=10.0, help="seconds between !chart bursts, 0 to disable")
+    parser.add_argument("--burst-size", type=int, default=8, help="!chart messages per burst")
+    parser.add_argument("--symbols", type=lambda s: s.upper().split(","), default=DEFAULT_SYMBOLS)
+    parser.add_argument("--guilds", type=int, default=3)
+    parser.add_argument("--channels", type=int, default=6)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--lag-interval", type=float, default=0.01, help="event loop lag sampling period")
+    parser.add_argument("--drain", type=float, default=60.0, help="seconds to wait for in-flight handlers")
+    parser.add_argument("--upstream-url", default=None, help="use an already running fakeupstream.py instead of starting one")
+    parser.add_argument("--json", action="store_true", help="print the report as json")
+    parser.add_argument("--processes", type=int, default=0, help="worker processes for lookups and charts, 0 runs them in the bot's process")
+    parser.add_argument("--verbose", action="store_true")
+    fakeupstream.behaviorArguments(parser)
+    args = parser.parse_args()
+
+    upstream = None
+    upstreamUrl = args.upstream_url
+    if not upstreamUrl:
+        upstream = fakeupstream.FakeUpstream(behavior=fakeupstream.behaviorFromArguments(args),
+                                             universe=args.symbols).start()
+        upstreamUrl = upstream.url
+    workFolder = tempfile.mkdtemp(prefix="stockbot-loadtest-")
+    try:
+        botModule = loadBotModule(upstreamUrl, workFolder, args.processes)
+        recorder, lagSamples, sent, elapsed = asyncio.run(runLoad(botModule, args))
+        upstreamStats = upstream.stats() if upstream else {}
+        workerLines = None
+        if botModule.workerPool is not None:
+            workerLines = botModule.workerPool.lines()
+            botModule.workerPool.shutdown()
+        report = buildReport(recorder, lagSamples, sent, elapsed, upstreamStats, workerLines)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            printReport(report)
+    finally:
+        os.chdir(repoFolder)
+        shutil.rmtree(workFolder, ignore_errors=True)
+        if upstream:
+            upstream.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+# main.py
+""" Starts the bot: python main.py
+
+bot.py sets the bot up when it is imported: config, cache, stock list, warm start, alerts. The
+worker processes (see workerpool.py) are started with a fork server or spawn, and multiprocessing
+runs the main script again in each of them before their first job. This script only imports the
+bot when it is the one being run, so a worker starts with nothing but the modules its jobs come
+from. Running bot.py directly restarts through here.
+"""
+
+
+def main():
+    import bot
+    bot.bot.run(bot.TOKEN)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+# profiling.py
+""" On-demand profiling of the running bot.
+
+CallProfiler runs cProfile over the next N calls of a named target (a command, or a function
+like price_reply wrapped with profiled()) and, once they are done, writes the combined stats to
+a .prof file plus a readable .txt next to it. Only one call is profiled at a time; a call that
+starts while another is being profiled runs normally and doesn't count. MemoryTracker diffs
+tracemalloc snapshots and the sizes of a few watched objects (caches, lists, live figures)
+between one snapshot and the next. LoopWatchdog is a task that wakes up every interval and
+records how late it was, a direct measure of how long the event loop was blocked.
+"""
+import asyncio
+import collections
+import contextlib
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+TOP = 10
+FOLDER = "profiles"
+# frames kept per allocation, more finds the real caller behind helpers but costs memory
+TRACE_FRAMES = 10
+STDLIB = os.path.dirname(os.__file__) + os.sep
+
+
+def stamp():
+    return time.strftime("%Y%m%d-%H%M%S")
+
+
+class ProfileSession:
+    """ the calls of one target profiled so far and the stats they add up to """
+
+    def __init__(self, name, count, onDone=None):
+        self.name = name
+        self.count = count
+        self.remaining = count
+        self.onDone = onDone
+        self.stats = None
+        self.seconds = 0.0
+        self.path = None
+
+
+class CallProfiler:
+    """ cProfile over the next N calls of named targets, one call at a time """
+
+    def __init__(self, folder=FOLDER, log=print):
+        self.folder = folder
+        self.log = log
+        self.sessions = {}
+        self.finished = collections.OrderedDict()
+        self.busy = threading.Lock()
+        self.lock = threading.Lock()
+
+    def arm(self, name, count, onDone=None):
+        """ profile the next count calls of name, onDone(session) is called from the thread of the last one """
+        with self.lock:
+            self.sessions[name] = ProfileSession(name, count, onDone)
+
+    def disarm(self, name):
+        with self.lock:
+            return self.sessions.pop(name, None) is not None
+
+    def begin(self, name):
+        """ start profiling a call of name when one is wanted, returns a handle for end() or None """
+        if name not in self.sessions or not self.busy.acquire(blocking=False):
+            return None
+        session = self.sessions.get(name)
+        if session is None:
+            self.busy.release()
+            return None
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profile.enable()
+        except ValueError:
+            # some other profiler holds the interpreter's hook
+            self.busy.release()
+            return None
+        return session, profile, started
+
+    def end(self, handle):
+        if handle is None:
+            return
+        session, profile, started = handle
+        profile.disable()
+        self.busy.release()
+        with self.lock:
+            session.seconds += time.perf_counter() - started
+            if session.stats is None:
+                session.stats = pstats.Stats(profile)
+            else:
+                session.stats.add(profile)
+            session.remaining -= 1
+            if session.remaining > 0 or self.sessions.get(session.name) is not session:
+                return
+            del self.sessions[session.name]
+        self.save(session)
+        if session.onDone is not None:
+            session.onDone(session)
+
+    @contextlib.contextmanager
+    def profile(self, name):
+        handle = self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(handle)
+
+    def profiled(self, name):
+        """ decorator, calls of the function are profiled under name while it is armed """
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if name not in self.sessions:
+                    return function(*args, **kwargs)
+                with self.profile(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def save(self, session):
+        """ write the session's stats as .prof (for snakeviz or pstats) and as text sorted by cumulative time """
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            session.path = os.path.join(self.folder, f"{session.name}-{stamp()}")
+            session.stats.dump_stats(session.path + ".prof")
+            text = io.StringIO()
+            pstats.Stats(session.path + ".prof", stream=text).sort_stats("cumulative").print_stats(100)
+            with open(session.path + ".txt", "w") as f:
+                f.write(text.getvalue())
+        except Exception as e:
+            self.log(f"Could not save the {session.name} profile: {e}")
+        with self.lock:
+            self.finished[session.name] = session
+            while len(self.finished) > 20:
+                self.finished.popitem(last=False)
+
+    def summary(self, session, top=TOP):
+        """ the session's top functions by cumulative time, one line each """
+        rows = []
+        for (filename, line, function), (primitive, calls, total, cumulative, callers) in session.stats.stats.items():
+            where = f"{os.path.basename(filename)}:{line}" if line else filename
+            rows.append((cumulative, total, calls, f"{function} ({where})"))
+        rows.sort(reverse=True)
+        lines = [f"{session.name}: {session.count} calls, {session.seconds * 1000:.0f} ms profiled",
+                 f"{'cum ms':>9}{'own ms':>9}{'calls':>8}  function"]
+        for cumulative, total, calls, function in rows[:top]:
+            lines.append(f"{cumulative * 1000:>9.1f}{total * 1000:>9.1f}{calls:>8}  {function[:70]}")
+        return lines
+
+    def status(self):
+        with self.lock:
+            return ([f"{name}: {session.count - session.remaining}/{session.count} calls profiled"
+                     for name, session in self.sessions.items()],
+                    [f"{name}: {session.path}.txt" for name, session in self.finished.items()])
+
+
+class MemoryTracker:
+    """ tracemalloc snapshots and watched object sizes, each snapshot diffed against the one before """
+
+    def __init__(self, folder=FOLDER, log=print):
+        self.folder = folder
+        self.log = log
+        self.watched = {}
+        self.previous = None
+        self.previousSizes = {}
+
+    def watch(self, name, size):
+        """ size() is reported with every snapshot, e.g. the length of a cache """
+        self.watched[name] = size
+
+    def sizes(self):
+        sizes = {}
+        for name, size in self.watched.items():
+            try:
+                sizes[name] = size()
+            except Exception as e:
+                sizes[name] = None
+                self.log(f"Could not size {name}: {e}")
+        return sizes
+
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start(self, frames=TRACE_FRAMES):
+        """ start tracing allocations and take the baseline snapshot """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.previous = self.take()
+        self.previousSizes = self.sizes()
+
+    def stop(self):
+        tracemalloc.stop()
+        self.previous = None
+
+    def take(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def snapshot(self, top=TOP):
+        """ diff a new snapshot against the previous one, write the diff to a file and return
+        (summary lines, path); the new snapshot becomes the baseline for the next """
+        current = self.take()
+        sizes = self.sizes()
+        byLine = current.compare_to(self.previous, "lineno")
+        byFile = current.compare_to(self.previous, "filename")
+        traced, peak = tracemalloc.get_traced_memory()
+        lines = [f"traced {traced / 1e6:.1f} MB (peak {peak / 1e6:.1f} MB)"]
+        for name, size in sizes.items():
+            before = self.previousSizes.get(name)
+            change = f" ({size - before:+})" if size is not None and before is not None else ""
+            lines.append(f"{name}: {size}{change}")
+        lines.append("growth by file:")
+        for stat in byFile[:top]:
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size_diff / 1024:+9.1f} KiB {stat.count_diff:+7} blocks  {shortPath(frame.filename)}")
+        lines.append("growth by line:")
+        for stat in byLine[:top]:
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size_diff / 1024:+9.1f} KiB {stat.count_diff:+7} blocks  {shortPath(frame.filename)}:{frame.lineno}")
+        path = None
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            path = os.path.join(self.folder, f"memory-{stamp()}.txt")
+            with open(path, "w") as f:
+                f.write("\n".join(lines[:len(sizes) + 1]) + "\n\n")
+                for stat in current.compare_to(self.previous, "traceback")[:50]:
+                    f.write(f"{stat.size_diff / 1024:+.1f} KiB {stat.count_diff:+} blocks, now {stat.size / 1024:.1f} KiB\n")
+                    f.write("\n".join(stat.traceback.format()) + "\n\n")
+        except Exception as e:
+            self.log(f"Could not save the memory diff: {e}")
+        self.previous = current
+        self.previousSizes = sizes
+        return lines, path
+
+
+def shortPath(filename):
+    """ site-packages/matplotlib/figure.py -> matplotlib/figure.py, the bot's own files by name """
+    for marker in ("site-packages" + os.sep, "dist-packages" + os.sep):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    if filename.startswith(STDLIB):
+        return filename[len(STDLIB):]
+    return os.path.basename(filename)
+
+
+class LoopWatchdog:
+    """ samples event loop lag: how late a task sleeping interval seconds wakes up """
+
+    def __init__(self, interval=0.1, stall=0.25, window=10 * 60, log=print):
+        self.interval = interval
+        self.stall = stall
+        self.log = log
+        self.samples = collections.deque(maxlen=int(window / interval))
+        self.stalls = collections.deque(maxlen=100)
+        self.task = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            self.samples.append(lag)
+            if lag >= self.stall:
+                self.stalls.append((time.time(), lag))
+
+    def stats(self):
+        """ lag percentiles in seconds over the window, None before any sample """
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        def at(fraction):
+            return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+        return {"samples": len(ordered), "p50": at(0.5), "p95": at(0.95), "p99": at(0.99), "max": ordered[-1],
+                "stalls": len(self.stalls)}
+
+    def worstStalls(self, top=TOP):
+        return sorted(self.stalls, key=lambda stall: -stall[1])[:top]
+
+    def save(self, folder=FOLDER):
+        """ every stall in the window with when it happened, returns the path """
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"lag-{stamp()}.txt")
+        with open(path, "w") as f:
+            stats = self.stats() or {}
+            f.write(" ".join(f"{key}={value:.4f}" if isinstance(value, float) else f"{key}={value}"
+                             for key, value in stats.items()) + "\n")
+            for when, lag in self.stalls:
+                f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(when))} {lag * 1000:.0f} ms\n")
+        return path
@@ -0,0 +1,87 @@
+# ratelimit.py
+""" Token bucket and a rate limited send queue for outgoing discord messages. """
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """ classic token bucket, rate tokens per second up to burst, safe to share between threads """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def tryTake(self, tokens=1.0):
+        """ take tokens if available, returns how long to wait before retrying (0 when taken) """
+        with self.lock:
+            self.refill(time.monotonic())
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    def take(self, tokens=1.0):
+        """ block the calling thread until tokens are available """
+        while True:
+            wait = self.tryTake(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def wait(self, tokens=1.0):
+        """ await until tokens are available """
+        while True:
+            wait = self.tryTake(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+class SendQueue:
+    """ bounded queue of send jobs drained at a fixed rate by a single worker task
+
+    Jobs are zero argument callables returning an awaitable, so nothing is sent (or even built)
+    until the bucket allows it.
+    """
+
+    def __init__(self, rate=4.0, burst=8, maxSize=1000):
+        self.bucket = TokenBucket(rate, burst)
+        self.queue = asyncio.Queue(maxSize)
+        self.worker = None
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self):
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.get_running_loop().create_task(self.run())
+
+    def put(self, job):
+        """ queue a job, returns False when the queue is full and the job was dropped """
+        try:
+            self.queue.put_nowait(job)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def run(self):
+        while True:
+            job = await self.queue.get()
+            await self.bucket.wait()
+            try:
+                await job()
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Queued send failed: {e}")
+            finally:
+                self.queue.task_done()
@@ -0,0 +1,63 @@
+# recentreplies.py
+""" Recent $SYMBOL replies per channel, so a repeat lookup can point at the embed that is already there.
+
+Only used from the event loop, so there is no locking. Each channel keeps its last few replies
+by symbol; entries older than the window are ignored and dropped as new replies come in.
+"""
+import collections
+import time
+
+WINDOW = 30
+MAX_PER_CHANNEL = 50
+MAX_CHANNELS = 1000
+
+
+class Reply:
+    """ a sent reply embed and who asked for it """
+
+    def __init__(self, message, requester, now):
+        self.message = message
+        self.requesters = [requester]
+        self.sent = now
+        self.refreshed = now
+
+
+class RecentReplies:
+    """ channel -> symbol -> Reply, newest last """
+
+    def __init__(self, window=WINDOW, maxPerChannel=MAX_PER_CHANNEL, maxChannels=MAX_CHANNELS):
+        self.window = window
+        self.maxPerChannel = maxPerChannel
+        self.maxChannels = maxChannels
+        self.channels = collections.OrderedDict()
+        self.reused = 0
+
+    def get(self, channel, symbol, now=None):
+        """ the reply to symbol sent in channel within the window, or None """
+        now = time.time() if now is None else now
+        replies = self.channels.get(channel)
+        reply = replies.get(symbol) if replies else None
+        if reply is None or now - reply.sent > self.window:
+            return None
+        return reply
+
+    def put(self, channel, symbol, message, requester, now=None):
+        now = time.time() if now is None else now
+        replies = self.channels.get(channel)
+        if replies is None:
+            replies = collections.OrderedDict()
+            self.channels[channel] = replies
+            if len(self.channels) > self.maxChannels:
+                self.channels.popitem(last=False)
+        self.channels.move_to_end(channel)
+        replies.pop(symbol, None)
+        replies[symbol] = Reply(message, requester, now)
+        # the oldest replies go first, stale or not
+        while len(replies) > self.maxPerChannel or (replies and now - next(iter(replies.values())).sent > self.window):
+            replies.popitem(last=False)
+
+    def reuse(self, reply, requester):
+        """ count a repeat lookup answered by reply """
+        if requester not in reply.requesters:
+            reply.requesters.append(requester)
+        self.reused += 1
@@ -0,0 +1,276 @@
+# scanner.py
+""" Nightly scan of the !chart signals over the whole stock list.
+
+Every symbol of the symbol table gets the same daily chart !chart draws by default. The fetches
+go through a thread pool sharing one token bucket so the api rate limit holds however many
+threads there are, and the indicator math goes to a process pool. For each symbol the latest
+combined buy/sell call and the RSI/stochastic overbought or oversold state of the last bar are
+written to a small SQLite database with indexes on the columns !signals filters by, so a query
+never touches the api or the chart stack.
+
+A scan is a row in the runs table. Symbols are written as they finish, committed in batches,
+and a restarted scan skips the symbols scanned since its run started, so an interrupted scan
+resumes where it stopped.
+"""
+import concurrent.futures
+import json
+import sqlite3
+import threading
+import time
+
+import ratelimit
+
+# a call made within this many bars of the last bar counts as current for !signals buy/sell
+RECENT_BARS = 5
+COMMIT_EVERY = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signals (
+    symbol TEXT PRIMARY KEY,
+    sector TEXT NOT NULL,
+    band TEXT NOT NULL,
+    marketCap REAL NOT NULL,
+    scanned REAL NOT NULL,
+    lastBar TEXT NOT NULL,
+    close REAL,
+    direction INTEGER NOT NULL,
+    age INTEGER,
+    callDate TEXT,
+    callPrice REAL,
+    rsi REAL,
+    stochastic REAL,
+    state TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS signalsCall ON signals (direction, age);
+CREATE INDEX IF NOT EXISTS signalsState ON signals (state, age);
+CREATE INDEX IF NOT EXISTS signalsSector ON signals (sector, direction, age);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    finished REAL,
+    symbols INTEGER NOT NULL,
+    scanned INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    seconds REAL NOT NULL DEFAULT 0
+);
+"""
+
+
+def barState(rsi, stochastic):
+    """ "overbought", "oversold" or "" with the thresholds the chart message uses """
+    if rsi >= 70 or stochastic >= 80:
+        return "overbought"
+    if rsi <= 30 or stochastic <= 20:
+        return "oversold"
+    return ""
+
+
+def chartSignals(chartBytes):
+    """ worker entry point: raw get-chart json in, the symbol's signal row out (None without usable bars) """
+    # imported here so the bot can use the store without loading the chart stack
+    import charting
+    chartData = json.loads(chartBytes)
+    if not chartData["chart"]["result"]:
+        return None
+    df = charting.chartFrame(chartData)
+    valid = df['Close'].notna().to_numpy()
+    if valid.sum() <= charting.STOCHASTIC_PERIODS[0]:
+        return None
+    values = charting.chartIndicators(df)
+    signals = charting.buySellSignals(*(values[name] for name in charting.MARKER_NAMES))
+    last = int(valid.nonzero()[0][-1])
+    rsi = float(values["rsi"].iloc[last])
+    stochastic = float(values["stochasticKLine"].iloc[last])
+    row = {"lastBar": df.index[last].strftime("%Y-%m-%d"), "close": float(df['Close'].iloc[last]),
+           "direction": 0, "age": None, "callDate": None, "callPrice": None,
+           "rsi": rsi if rsi == rsi else None, "stochastic": stochastic if stochastic == stochastic else None,
+           "state": barState(rsi, stochastic)}
+    if signals:
+        index, direction = signals[-1]
+        # the chart message quotes the moving average at the call, keep the same price
+        row.update(direction=direction, age=last - index, callDate=df.index[index].strftime("%Y-%m-%d"),
+                   callPrice=float(values["ma"].iloc[index]))
+    return row
+
+
+class SignalStore:
+    """ the scan results and scan runs in SQLite, one connection per thread """
+
+    def __init__(self, path="signals.db", timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+        with self.connection() as db:
+            db.executescript(SCHEMA)
+
+    def connection(self):
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return db
+
+    def startRun(self, symbols):
+        """ the unfinished run to resume, or a new one, as (run id, started) """
+        with self.connection() as db:
+            run = db.execute("SELECT id, started FROM runs WHERE finished IS NULL ORDER BY id DESC LIMIT 1").fetchone()
+            if run:
+                db.execute("UPDATE runs SET symbols = ? WHERE id = ?", (symbols, run["id"]))
+                return run["id"], run["started"]
+            started = time.time()
+            cursor = db.execute("INSERT INTO runs (started, symbols) VALUES (?, ?)", (started, symbols))
+            return cursor.lastrowid, started
+
+    def unfinishedRun(self):
+        return self.connection().execute("SELECT * FROM runs WHERE finished IS NULL ORDER BY id DESC LIMIT 1").fetchone()
+
+    def lastRun(self):
+        return self.connection().execute("SELECT * FROM runs ORDER BY id DESC LIMIT 1").fetchone()
+
+    def scannedSince(self, started):
+        return {row[0] for row in self.connection().execute("SELECT symbol FROM signals WHERE scanned >= ?", (started,))}
+
+    def save(self, rows, runId, failed, seconds):
+        """ write finished symbols and the run counters in one transaction """
+        with self.connection() as db:
+            db.executemany("INSERT OR REPLACE INTO signals VALUES (:symbol, :sector, :band, :marketCap, :scanned, :lastBar,"
+                           " :close, :direction, :age, :callDate, :callPrice, :rsi, :stochastic, :state)", rows)
+            db.execute("UPDATE runs SET scanned = scanned + ?, failed = failed + ?, seconds = seconds + ? WHERE id = ?",
+                       (len(rows), failed, seconds, runId))
+
+    def finishRun(self, runId):
+        with self.connection() as db:
+            db.execute("UPDATE runs SET finished = ? WHERE id = ?", (time.time(), runId))
+
+    def query(self, direction=None, state=None, sectors=None, band=None, maxAge=RECENT_BARS, limit=25):
+        """ (rows, total) of symbols matching every given filter, most recent calls and biggest companies first """
+        clauses = []
+        params = []
+        if direction:
+            clauses.append("direction = ? AND age <= ?")
+            params += [direction, maxAge]
+        if state:
+            clauses.append("state = ?")
+            params.append(state)
+        if sectors:
+            clauses.append(f"sector IN ({', '.join('?' * len(sectors))})")
+            params += list(sectors)
+        if band:
+            clauses.append("band = ?")
+            params.append(band)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        db = self.connection()
+        total = db.execute("SELECT COUNT(*) FROM signals" + where, params).fetchone()[0]
+        rows = db.execute("SELECT * FROM signals" + where + " ORDER BY age IS NULL, age, marketCap DESC LIMIT ?",
+                          params + [limit]).fetchall()
+        return rows, total
+
+    def close(self):
+        db = getattr(self.local, "db", None)
+        if db is not None:
+            db.close()
+            self.local.db = None
+
+
+def tableRows(table):
+    """ (symbol, sector, band, market cap) of every row of a symboltable.SymbolTable """
+    return [(table.symbol(row), table.sector(row), table.band(row), table.marketCap(row)) for row in range(len(table))]
+
+
+def runScan(store, universe, fetch, executor, rate=5.0, fetchWorkers=8, log=print):
+    """ scan every (symbol, sector, band, market cap) of universe, resuming an unfinished run
+
+    fetch(symbol) returns raw get-chart json or None, executor runs chartSignals (a process pool).
+    Returns the run id and counters.
+    """
+    runId, started = store.startRun(len(universe))
+    done = store.scannedSince(started)
+    pending = [entry for entry in universe if entry[0] not in done]
+    if done:
+        log(f"Signal scan {runId}: resuming, {len(done)} of {len(universe)} symbols already scanned")
+    bucket = ratelimit.TokenBucket(rate, burst=max(1.0, rate))
+    details = {entry[0]: entry for entry in universe}
+
+    def fetchOne(symbol):
+        bucket.take()
+        return fetch(symbol)
+
+    rows = []
+    failed = 0
+    scanned = 0
+    clock = time.perf_counter()
+    batchStart = clock
+
+    def flush():
+        nonlocal rows, failed, batchStart
+        now = time.perf_counter()
+        store.save(rows, runId, failed, now - batchStart)
+        rows = []
+        failed = 0
+        batchStart = now
+
+    def finish(symbol, row):
+        nonlocal failed, scanned
+        if row is None:
+            failed += 1
+            return
+        symbol, sector, band, marketCap = details[symbol]
+        row.update(symbol=symbol, sector=sector, band=band, marketCap=marketCap, scanned=time.time())
+        rows.append(row)
+        scanned += 1
+        if len(rows) >= COMMIT_EVERY:
+            flush()
+            elapsed = time.perf_counter() - clock
+            log(f"Signal scan {runId}: {len(done) + scanned}/{len(universe)} symbols, {scanned / elapsed:.1f} symbols/s")
+
+    fetchers = concurrent.futures.ThreadPoolExecutor(max_workers=fetchWorkers)
+    try:
+        fetches = {fetchers.submit(fetchOne, entry[0]): entry[0] for entry in pending}
+        computing = {}
+        waiting = set(fetches)
+        # chart json goes to the process pool as soon as it arrives, so the math overlaps the
+        # remaining fetches, and finished symbols are committed as they come in
+        while waiting:
+            finished, waiting = concurrent.futures.wait(waiting, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                if future in fetches:
+                    symbol = fetches.pop(future)
+                    try:
+                        chartBytes = future.result()
+                    except Exception:
+                        chartBytes = None
+                    if not chartBytes:
+                        finish(symbol, None)
+                        continue
+                    job = executor.submit(chartSignals, chartBytes)
+                    computing[job] = symbol
+                    waiting.add(job)
+                else:
+                    symbol = computing.pop(future)
+                    try:
+                        row = future.result()
+                    except concurrent.futures.process.BrokenProcessPool:
+                        raise
+                    except Exception:
+                        row = None
+                    finish(symbol, row)
+    except BaseException:
+        # keep what is done as the resume point, the rest is fetched by the next run
+        try:
+            flush()
+        except Exception as e:
+            log(f"Signal scan {runId}: could not save the last {len(rows)} symbols: {e}")
+        raise
+    finally:
+        # fetches still queued would spend rate limited calls on results nobody reads
+        fetchers.shutdown(wait=False, cancel_futures=True)
+    flush()
+    store.finishRun(runId)
+    run = store.lastRun()
+    elapsed = time.perf_counter() - clock
+    log(f"Signal scan {runId} finished: {run['scanned']} scanned, {run['failed']} failed in {run['seconds']:.0f}s,"
+        f" {scanned / elapsed if elapsed else 0:.1f} symbols/s")
+    return dict(run)
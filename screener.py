@@ -0,0 +1,195 @@
+# screener.py
+""" !screen filter language evaluated over the symbol table columns.
+
+    sector=Technology mcap>10B volume>1M sort=-pctchange limit=20
+    country="United States" industry=semiconductors,software price<=20 ipo>=2020
+
+Numeric columns are numpy views straight onto the memory mapped symbol table (no copy), each
+with its argsort computed once, so a range condition is two binary searches and a sort is the
+precomputed order filtered by the mask. Text columns are small integer codes; the boolean mask
+for each code is built on first use and kept, so sector=, industry= and country= OR a handful of
+cached masks. Nothing loops over rows in python.
+"""
+import shlex
+
+import numpy as np
+
+import symboltable
+
+# name in the filter language: (symbol table column, text column)
+FIELDS = {
+    "mcap": ("marketCap", False),
+    "price": ("lastSale", False),
+    "change": ("netChange", False),
+    "pctchange": ("pctChange", False),
+    "volume": ("volume", False),
+    "ipo": ("ipoYear", False),
+    "sector": ("sector", True),
+    "industry": ("industry", True),
+    "country": ("country", True),
+    "band": ("band", True),
+}
+ALIASES = {"marketcap": "mcap", "cap": "mcap", "lastsale": "price", "last": "price", "pct": "pctchange",
+           "%change": "pctchange", "vol": "volume", "ipoyear": "ipo"}
+OPERATORS = (">=", "<=", "!=", ">", "<", "=")
+SUFFIXES = {"k": 1e3, "m": 1e6, "b": 1e9, "t": 1e12}
+MAX_LIMIT = 50
+
+
+class ScreenError(ValueError):
+    """ a filter the language doesn't understand, the message is meant for the user """
+
+
+def fieldName(text):
+    text = text.strip().lower()
+    text = ALIASES.get(text, text)
+    if text not in FIELDS:
+        raise ScreenError(f"Unknown field {text}, use one of {', '.join(FIELDS)}.")
+    return text
+
+
+def parseNumber(text):
+    """ 10B, 1.5m, 250k, 3% or a plain number """
+    value = text.strip().lower().replace(",", "").replace("$", "").rstrip("%")
+    scale = 1.0
+    if value and value[-1] in SUFFIXES:
+        scale = SUFFIXES[value[-1]]
+        value = value[:-1]
+    try:
+        return float(value) * scale
+    except ValueError:
+        raise ScreenError(f"{text} is not a number.")
+
+
+def shortNumber(value):
+    """ 12.3B style """
+    for suffix, scale in (("T", 1e12), ("B", 1e9), ("M", 1e6), ("K", 1e3)):
+        if abs(value) >= scale:
+            return f"{value / scale:.1f}{suffix}"
+    return f"{value:.0f}"
+
+
+class Screener:
+    """ columns and indexes over a symboltable.SymbolTable """
+
+    def __init__(self, table):
+        self.table = table
+        self.rows = len(table)
+        self.columns = {}
+        self.orders = {}
+        self.sortedValues = {}
+        for name, (column, text) in FIELDS.items():
+            # a view onto the mapped file, the buffer protocol carries the item type over
+            values = np.asarray(table.columns[column])
+            self.columns[name] = values
+            if not text:
+                order = np.argsort(values, kind="stable")
+                self.orders[name] = order
+                self.sortedValues[name] = values[order]
+        self.names = {"sector": table.sectors, "industry": table.industries, "country": table.countries,
+                      "band": symboltable.BANDS}
+        self.codeMasks = {}
+
+    def codeMask(self, name, code):
+        key = (name, code)
+        mask = self.codeMasks.get(key)
+        if mask is None:
+            mask = self.columns[name] == code
+            self.codeMasks[key] = mask
+        return mask
+
+    def matchCodes(self, name, text):
+        """ codes of a text column matching text, exact (case insensitive) first then partial """
+        text = text.replace("_", " ").strip().lower()
+        names = self.names[name]
+        exact = [code for code, value in enumerate(names) if value and value.lower() == text]
+        if exact:
+            return exact
+        return [code for code, value in enumerate(names) if value and text in value.lower()]
+
+    def textMask(self, name, operator, value):
+        if operator not in ("=", "!="):
+            raise ScreenError(f"{name} only supports = and !=.")
+        mask = np.zeros(self.rows, dtype=bool)
+        for part in value.split(","):
+            codes = self.matchCodes(name, part)
+            if not codes:
+                raise ScreenError(f"No {name} matches {part}.")
+            for code in codes:
+                mask |= self.codeMask(name, code)
+        return ~mask if operator == "!=" else mask
+
+    def rangeMask(self, name, operator, value):
+        """ rows where column operator value, from two binary searches over the sorted column """
+        values = self.sortedValues[name]
+        order = self.orders[name]
+        if operator == "!=":
+            return self.columns[name] != value
+        left = int(np.searchsorted(values, value, "left"))
+        right = int(np.searchsorted(values, value, "right"))
+        start, stop = {">": (right, self.rows), ">=": (left, self.rows), "<": (0, left),
+                       "<=": (0, right), "=": (left, right)}[operator]
+        mask = np.zeros(self.rows, dtype=bool)
+        mask[order[start:stop]] = True
+        return mask
+
+    def parse(self, query):
+        """ (conditions, sort field, descending, limit) of a query string """
+        try:
+            words = shlex.split(query)
+        except ValueError as e:
+            raise ScreenError(f"Could not read the filter: {e}.")
+        conditions = []
+        sortField = None
+        descending = False
+        limit = 20
+        for word in words:
+            for operator in OPERATORS:
+                if operator in word:
+                    name, value = word.split(operator, 1)
+                    break
+            else:
+                raise ScreenError(f"{word} is not a condition, write it like mcap>10B or sector=Technology.")
+            key = name.strip().lower()
+            if key == "sort" and operator == "=":
+                descending = value.startswith("-")
+                sortField = fieldName(value.lstrip("+-"))
+                if FIELDS[sortField][1]:
+                    raise ScreenError(f"Can't sort by {sortField}.")
+                continue
+            if key == "limit" and operator == "=":
+                if not value.isdigit():
+                    raise ScreenError("limit needs a whole number.")
+                limit = max(1, min(int(value), MAX_LIMIT))
+                continue
+            name = fieldName(key)
+            if not value:
+                raise ScreenError(f"{word} is missing a value.")
+            conditions.append((name, operator, value if FIELDS[name][1] else parseNumber(value)))
+        return conditions, sortField, descending, limit
+
+    def screen(self, query):
+        """ (rows, total) matching the query, rows in the requested order (largest market cap first by default) """
+        conditions, sortField, descending, limit = self.parse(query)
+        mask = np.ones(self.rows, dtype=bool)
+        for name, operator, value in conditions:
+            if FIELDS[name][1]:
+                mask &= self.textMask(name, operator, value)
+            else:
+                mask &= self.rangeMask(name, operator, value)
+        if sortField is None:
+            sortField, descending = "mcap", True
+        order = self.orders[sortField]
+        if descending:
+            order = order[::-1]
+        matched = order[mask[order]]
+        return matched[:limit].tolist(), int(len(matched))
+
+    def describe(self, row):
+        """ one !screen result line """
+        table = self.table
+        line = (f"**${table.symbol(row)}** ${table.columns['lastSale'][row]:.2f} ({table.columns['pctChange'][row]:+.2f}%)"
+                f" · mcap {shortNumber(table.marketCap(row))} · vol {shortNumber(table.columns['volume'][row])}")
+        if table.sector(row):
+            line += f" · {table.sector(row)}"
+        return line
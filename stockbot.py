@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# stockbot.py
+""" The bot's quotes and charts from the command line, no Discord token or connection needed.
+
+Reads the [rapid-api], [upstream] and [cache] sections of stockbot.cfg (or --config) and runs
+the same core.py code the bot does. Examples:
+
+    python stockbot.py quote AAPL MSFT --json
+    python stockbot.py chart --symbols-file watch.txt --out charts --workers 8
+    python stockbot.py chart TSLA --interval 1h --range 1mo
+"""
+import argparse
+import concurrent.futures
+import configparser
+import contextlib
+import json
+import os
+import sys
+import time
+
+import discord
+
+import core
+
+
+def readConfig(path):
+    """ the parsed config, exits like the bot does when it has no rapid api key """
+    configParser = configparser.RawConfigParser(inline_comment_prefixes=("#",))
+    if path and not configParser.read(path):
+        print(f"Could not read {path}.", file=sys.stderr)
+    if not configParser.has_option('rapid-api', 'key'):
+        print(f"No [rapid-api] key in {path}, every upstream request needs one.", file=sys.stderr)
+        sys.exit(2)
+    return configParser
+
+
+def loadConfig(path, chartsFolder=None):
+    """ point core at the configured upstream and cache, and charts at chartsFolder """
+    core.readConfig(readConfig(path))
+    core.openCache()
+    if chartsFolder is not None:
+        core.chartsFolder = chartsFolder
+        core.makeChartsFolder()
+
+
+def readSymbols(symbols, symbolsFile):
+    """ symbols from the command line then the file, one or more per line, # starts a comment """
+    found = [symbol.upper().lstrip("$") for symbol in symbols]
+    if symbolsFile:
+        with open(symbolsFile) as f:
+            for line in f:
+                found.extend(symbol.upper().lstrip("$") for symbol in line.split("#", 1)[0].replace(",", " ").split())
+    # keep the order, drop repeats
+    return list(dict.fromkeys(symbol for symbol in found if symbol))
+
+
+def embedText(embed):
+    """ an embed as plain lines, title first """
+    lines = [embed.title or ""]
+    if embed.description:
+        lines.append(embed.description)
+    for field in embed.fields:
+        lines.append(f"{field.name}: {field.value}")
+    return "\n".join(lines)
+
+
+def quoteOne(symbol):
+    """ (symbol, embed as a dict, error), both None for a dollar amount like $1000 that isn't looked up """
+    message = core.price_reply([symbol]).get(symbol)
+    if message is None:
+        return symbol, None, None
+    if isinstance(message, discord.Embed):
+        return symbol, message.to_dict(), None
+    return symbol, None, message or f"Could not find information for ${symbol}."
+
+
+def quote(args):
+    loadConfig(args.config)
+    symbols = readSymbols(args.symbols, args.symbols_file)
+    if not symbols:
+        print("No symbols given.", file=sys.stderr)
+        return 2
+    results = {}
+    failed = 0
+    out = sys.stdout
+    # core logs with print(), that goes to stderr so stdout is only the answer
+    with contextlib.redirect_stdout(sys.stderr):
+        # lookups are network bound, threads are enough
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as executor:
+            for symbol, embed, error in executor.map(quoteOne, symbols):
+                if embed is None and error is None:
+                    continue
+                results[symbol] = {"embed": embed} if embed is not None else {"error": error}
+                failed += error is not None
+                if not args.json:
+                    print(embedText(discord.Embed.from_dict(embed)) if embed is not None else error, end="\n\n", file=out)
+    if args.json:
+        print(json.dumps(results, indent=2, default=str))
+    return 1 if failed and failed == len(results) else 0
+
+
+def chartWorker(config, chartsFolder):
+    """ process pool initializer, every worker opens its own cache connection and logs to stderr """
+    sys.stdout = sys.stderr
+    loadConfig(config, chartsFolder)
+
+
+def chartOne(symbol, intervalIn, rangeIn):
+    started = time.perf_counter()
+    chartMeta, error = core.buildChart(symbol, intervalIn, rangeIn)
+    return symbol, chartMeta, error, time.perf_counter() - started
+
+
+def chart(args):
+    symbols = readSymbols(args.symbols, args.symbols_file)
+    if not symbols:
+        print("No symbols given.", file=sys.stderr)
+        return 2
+    intervalIn, rangeIn, error = core.parseChartArgs(args.interval, args.range)
+    if error:
+        print(error, file=sys.stderr)
+        return 2
+    # the workers read it again, a missing key should stop us before starting them
+    readConfig(args.config)
+    started = time.perf_counter()
+    results = {}
+    failed = 0
+    # rendering is cpu bound and matplotlib isn't thread safe, one process per worker
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers, initializer=chartWorker,
+                                                initargs=(args.config, os.path.abspath(args.out))) as executor:
+        futures = [executor.submit(chartOne, symbol, intervalIn, rangeIn) for symbol in symbols]
+        for future in concurrent.futures.as_completed(futures):
+            symbol, chartMeta, error, seconds = future.result()
+            results[symbol] = {"chart": chartMeta, "seconds": round(seconds, 3)} if chartMeta else {"error": error}
+            failed += chartMeta is None
+            if not args.json:
+                print(f"{symbol}: {chartMeta['image'] if chartMeta else error} ({seconds:.1f}s)")
+    if args.json:
+        print(json.dumps(results, indent=2, default=str))
+    else:
+        print(f"{len(symbols) - failed}/{len(symbols)} charts in {time.perf_counter() - started:.1f}s")
+    return 1 if failed == len(symbols) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stock quotes and charts from the bot's core, without Discord.")
+    parser.add_argument("--config", default="stockbot.cfg", help="config with the [rapid-api], [upstream] and [cache] sections")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    quoteParser = commands.add_parser("quote", help="the $SYMBOL reply for each symbol")
+    quoteParser.add_argument("symbols", nargs="*")
+    quoteParser.add_argument("--symbols-file", default=None, help="file of symbols, one or more per line")
+    quoteParser.add_argument("--workers", type=int, default=4, help="lookups run at once")
+    quoteParser.add_argument("--json", action="store_true", help="print the embeds as json")
+    quoteParser.set_defaults(run=quote)
+
+    chartParser = commands.add_parser("chart", help="render the !chart image for each symbol")
+    chartParser.add_argument("symbols", nargs="*")
+    chartParser.add_argument("--symbols-file", default=None, help="file of symbols, one or more per line")
+    chartParser.add_argument("--interval", default="1d")
+    chartParser.add_argument("--range", default=None, help="defaults to a range that suits the interval")
+    chartParser.add_argument("--out", default="charts", help="folder the images are written to")
+    chartParser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="render processes")
+    chartParser.add_argument("--json", action="store_true", help="print the chart metadata as json")
+    chartParser.set_defaults(run=chart)
+
+    args = parser.parse_args()
+    sys.exit(args.run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# symboltable.py
+""" Compact, memory-mapped symbol table built from the nasdaq screener csv.
+
+The csv is parsed once and written next to it as a small binary file of fixed width symbol
+strings and numeric columns (sector, industry, country, market cap, last sale, change, volume ...).
+Later starts just mmap that file, which takes microseconds and keeps almost nothing on the python
+heap. Rows are sorted by (sector, market cap band, symbol) and a group table records where each
+(sector, band) run starts, so picking a random symbol, filtered or not, never scans the table.
+"""
+import bisect
+import csv
+import json
+import mmap
+import os
+import random
+import struct
+
+MAGIC = b"SYMTAB\x00\x00"
+VERSION = 2
+HEADER = struct.Struct("<8sIIQqI")           # magic, version, rows, csv size, csv mtime (ns), columns
+COLUMN = struct.Struct("<16s2sHQQ")          # name, typecode, item size, offset, length in bytes
+GROUP = struct.Struct("<BBxxII")             # sector code, band code, first row, row count
+
+SYMBOL_WIDTH = 12
+
+# market cap bands, upper bounds in dollars, band 0 is for rows without a market cap
+BANDS = ["unknown", "nano", "micro", "small", "mid", "large", "mega"]
+BAND_LIMITS = [0, 50e6, 300e6, 2e9, 10e9, 200e9, float("inf")]
+
+
+def marketCapBand(marketCap):
+    """ band code for a market cap in dollars """
+    if not marketCap or marketCap <= 0:
+        return 0
+    for code in range(1, len(BAND_LIMITS)):
+        if marketCap < BAND_LIMITS[code]:
+            return code
+    return len(BANDS) - 1
+
+
+def parseNumber(text):
+    try:
+        return float(str(text).replace(',', '').replace('$', '').replace('%', '').strip() or 0)
+    except ValueError:
+        return 0.0
+
+
+def readScreenerCsv(csvPath):
+    """ rows of the screener csv we want in the table, filtered once here instead of on every pick """
+    rows = []
+    seen = set()
+    with open(csvPath, newline='') as csvFile:
+        reader = csv.DictReader(csvFile)
+        for row in reader:
+            symbol = (row.get("Symbol") or "").strip().upper()
+            # ^ marks preferred/warrant style listings the quote api doesn't understand
+            if not symbol or '^' in symbol or symbol in seen or len(symbol.encode()) > SYMBOL_WIDTH:
+                continue
+            seen.add(symbol)
+            rows.append({
+                "symbol": symbol,
+                "sector": (row.get("Sector") or "").strip(),
+                "industry": (row.get("Industry") or "").strip(),
+                "country": (row.get("Country") or "").strip(),
+                "marketCap": parseNumber(row.get("Market Cap")),
+                "lastSale": parseNumber(row.get("Last Sale")),
+                "netChange": parseNumber(row.get("Net Change")),
+                "pctChange": parseNumber(row.get("% Change")),
+                "volume": parseNumber(row.get("Volume")),
+                "ipoYear": int(parseNumber(row.get("IPO Year"))),
+            })
+    return rows
+
+
+def align(offset, boundary=8):
+    return (offset + boundary - 1) // boundary * boundary
+
+
+def buildTable(rows, csvSize=0, csvMtime=0):
+    """ serialize rows into the binary table format and return the bytes """
+    sectors = sorted({row["sector"] for row in rows} - {""})
+    sectors.insert(0, "")
+    industries = sorted({row["industry"] for row in rows} - {""})
+    industries.insert(0, "")
+    sectorCodes = {name: code for code, name in enumerate(sectors)}
+    industryCodes = {name: code for code, name in enumerate(industries)}
+    countries = sorted({row.get("country", "") for row in rows} - {""})
+    countries.insert(0, "")
+    countryCodes = {name: code for code, name in enumerate(countries)}
+    for row in rows:
+        row["band"] = marketCapBand(row["marketCap"])
+    rows = sorted(rows, key=lambda row: (sectorCodes[row["sector"]], row["band"], row["symbol"]))
+
+    groups = []
+    for index, row in enumerate(rows):
+        key = (sectorCodes[row["sector"]], row["band"])
+        if groups and (groups[-1][0], groups[-1][1]) == key:
+            groups[-1][3] += 1
+        else:
+            groups.append([key[0], key[1], index, 1])
+    bySymbol = sorted(range(len(rows)), key=lambda index: rows[index]["symbol"])
+
+    names = json.dumps({"sectors": sectors, "industries": industries, "countries": countries, "bands": BANDS}).encode()
+    numbers = lambda name: struct.pack(f"<{len(rows)}d", *(row.get(name, 0.0) for row in rows))
+    columns = [
+        ("names", "B", 1, names),
+        ("groups", "B", 1, b"".join(GROUP.pack(*group) for group in groups)),
+        ("symbol", "s", SYMBOL_WIDTH, b"".join(row["symbol"].encode().ljust(SYMBOL_WIDTH, b"\0") for row in rows)),
+        ("bySymbol", "I", 4, struct.pack(f"<{len(rows)}I", *bySymbol)),
+        ("marketCap", "d", 8, struct.pack(f"<{len(rows)}d", *(row["marketCap"] for row in rows))),
+        ("sector", "B", 1, bytes(sectorCodes[row["sector"]] for row in rows)),
+        ("industry", "H", 2, struct.pack(f"<{len(rows)}H", *(industryCodes[row["industry"]] for row in rows))),
+        ("band", "B", 1, bytes(row["band"] for row in rows)),
+        ("country", "H", 2, struct.pack(f"<{len(rows)}H", *(countryCodes[row.get("country", "")] for row in rows))),
+        ("lastSale", "d", 8, numbers("lastSale")),
+        ("netChange", "d", 8, numbers("netChange")),
+        ("pctChange", "d", 8, numbers("pctChange")),
+        ("volume", "d", 8, numbers("volume")),
+        ("ipoYear", "H", 2, struct.pack(f"<{len(rows)}H", *(min(max(row.get("ipoYear", 0), 0), 65535) for row in rows))),
+    ]
+    offset = align(HEADER.size + COLUMN.size * len(columns))
+    directory = []
+    for name, typecode, itemSize, data in columns:
+        directory.append(COLUMN.pack(name.encode(), typecode.encode(), itemSize, offset, len(data)))
+        offset = align(offset + len(data))
+    out = bytearray(offset)
+    out[:HEADER.size] = HEADER.pack(MAGIC, VERSION, len(rows), csvSize, csvMtime, len(columns))
+    position = HEADER.size
+    for entry in directory:
+        out[position:position + COLUMN.size] = entry
+        position += COLUMN.size
+    for entry, (name, typecode, itemSize, data) in zip(directory, columns):
+        start = COLUMN.unpack(entry)[3]
+        out[start:start + len(data)] = data
+    return bytes(out)
+
+
+class SymbolTable:
+    """ read-only view over a memory-mapped table file """
+
+    def __init__(self, buffer, source=None):
+        self.buffer = buffer
+        self.source = source
+        view = memoryview(buffer)
+        magic, version, self.rows, self.csvSize, self.csvMtime, columnCount = HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a symbol table file or an old version of one")
+        self.columns = {}
+        for index in range(columnCount):
+            name, typecode, itemSize, offset, length = COLUMN.unpack_from(view, HEADER.size + index * COLUMN.size)
+            data = view[offset:offset + length]
+            typecode = typecode.rstrip(b"\0").decode()
+            self.columns[name.rstrip(b"\0").decode()] = data if typecode in ("s", "B") else data.cast(typecode)
+        names = json.loads(bytes(self.columns["names"]))
+        self.sectors = names["sectors"]
+        self.industries = names["industries"]
+        self.countries = names["countries"]
+        groupData = self.columns["groups"]
+        self.groups = [GROUP.unpack_from(groupData, offset) for offset in range(0, len(groupData), GROUP.size)]
+        self.symbols = self.columns["symbol"]
+
+    def __len__(self):
+        return self.rows
+
+    def __contains__(self, symbol):
+        return self.find(symbol) >= 0
+
+    def symbol(self, row):
+        start = row * SYMBOL_WIDTH
+        return bytes(self.symbols[start:start + SYMBOL_WIDTH]).rstrip(b"\0").decode()
+
+    def sector(self, row):
+        return self.sectors[self.columns["sector"][row]]
+
+    def industry(self, row):
+        return self.industries[self.columns["industry"][row]]
+
+    def marketCap(self, row):
+        return self.columns["marketCap"][row]
+
+    def country(self, row):
+        return self.countries[self.columns["country"][row]]
+
+    def band(self, row):
+        return BANDS[self.columns["band"][row]]
+
+    def find(self, symbol):
+        """ row of a symbol or -1, binary search over the symbol ordered index """
+        symbol = symbol.upper()
+        order = self.columns["bySymbol"]
+        position = bisect.bisect_left(range(self.rows), symbol, key=lambda index: self.symbol(order[index]))
+        if position < self.rows and self.symbol(order[position]) == symbol:
+            return order[position]
+        return -1
+
+    def matchSectors(self, text):
+        """ sector codes matching a user supplied name, exact first then partial ("tech" -> Technology) """
+        text = text.strip().lower()
+        if not text:
+            return set()
+        exact = {code for code, name in enumerate(self.sectors) if name and name.lower() == text}
+        if exact:
+            return exact
+        return {code for code, name in enumerate(self.sectors) if name and text in name.lower()}
+
+    @staticmethod
+    def matchBand(text):
+        """ band code for a band name, or None """
+        text = text.strip().lower()
+        for suffix in ("-cap", "cap"):
+            if text.endswith(suffix):
+                text = text[:-len(suffix)]
+        return BANDS.index(text) if text in BANDS else None
+
+    def matchingGroups(self, sectors=None, band=None):
+        return [group for group in self.groups
+                if (sectors is None or group[0] in sectors) and (band is None or group[1] == band)]
+
+    def count(self, sectors=None, band=None):
+        return sum(group[3] for group in self.matchingGroups(sectors, band))
+
+    def randomSymbol(self, sectors=None, band=None, rnd=random):
+        """ uniformly random symbol among the rows matching the filters, None if nothing matches """
+        groups = self.matchingGroups(sectors, band)
+        total = sum(group[3] for group in groups)
+        if not total:
+            return None
+        pick = rnd.randrange(total)
+        for sector, bandCode, start, rows in groups:
+            if pick < rows:
+                return self.symbol(start + pick)
+            pick -= rows
+        return None
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.columns.clear()
+            self.symbols = None
+            try:
+                self.buffer.close()
+            except BufferError:
+                pass
+
+
+def tablePath(csvPath):
+    return os.path.splitext(csvPath)[0] + ".symtab"
+
+
+def openTable(path):
+    with open(path, "rb") as tableFile:
+        buffer = mmap.mmap(tableFile.fileno(), 0, access=mmap.ACCESS_READ)
+    return SymbolTable(buffer, path)
+
+
+def load(csvPath, cachePath=None):
+    """ memory map the cached table for csvPath, rebuilding it first when the csv changed """
+    cachePath = cachePath or tablePath(csvPath)
+    try:
+        csvStat = os.stat(csvPath)
+    except OSError:
+        csvStat = None
+    if os.path.isfile(cachePath):
+        try:
+            table = openTable(cachePath)
+            if csvStat is None or (table.csvSize == csvStat.st_size and table.csvMtime == csvStat.st_mtime_ns):
+                return table
+            table.close()
+        except (ValueError, struct.error, OSError):
+            pass
+    if csvStat is None:
+        raise FileNotFoundError(csvPath)
+    data = buildTable(readScreenerCsv(csvPath), csvStat.st_size, csvStat.st_mtime_ns)
+    temporaryPath = f"{cachePath}.{os.getpid()}.tmp"
+    with open(temporaryPath, "wb") as tableFile:
+        tableFile.write(data)
+    os.replace(temporaryPath, cachePath)
+    return openTable(cachePath)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# tracing.py
+""" Per-request traces: a trace ID per inbound message or command and nested, timed spans under it.
+
+The trace and the innermost open span live in context variables, so span() works anywhere
+below the code that started a trace without anything being passed down: across awaits in the
+same task, and in executor threads when the function is wrapped with bind(). Outside a trace
+span() does nothing. When a trace finishes it is written as one JSON line to a rotating file if
+it was sampled, or whatever the sampling, if it took longer than the slow threshold.
+
+Run as a script to read those files back:
+
+    python tracing.py traces.jsonl traces.jsonl.1 --top 10
+"""
+import argparse
+import collections
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import random
+import threading
+import time
+
+SAMPLE = 0.05
+SLOW = 5.0
+MAX_BYTES = 5 * 1024 * 1024
+BACKUPS = 3
+# spans kept per trace, a runaway loop shouldn't grow one without bound
+MAX_SPANS = 500
+
+currentTrace = contextvars.ContextVar("currentTrace", default=None)
+currentSpan = contextvars.ContextVar("currentSpan", default=None)
+
+
+class Trace:
+    """ spans recorded for one request, appended to from the event loop and executor threads """
+
+    def __init__(self, tracer, name, attrs, sampled):
+        self.tracer = tracer
+        self.id = os.urandom(8).hex()
+        self.name = name
+        self.attrs = attrs
+        self.sampled = sampled
+        self.started = time.time()
+        self.clock = time.perf_counter()
+        self.spans = []
+        self.dropped = 0
+        self.nextId = 0
+        self.finished = False
+        self.lock = threading.Lock()
+
+    def newSpanId(self):
+        with self.lock:
+            self.nextId += 1
+            return self.nextId
+
+    def add(self, span):
+        with self.lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+    def record(self, name, seconds, **attrs):
+        """ a span that just ended after seconds, for time spent outside any code, like waiting in a queue """
+        record = {"id": self.newSpanId(), "parent": currentSpan.get() if currentTrace.get() is self else None,
+                  "name": name, "start": round(time.perf_counter() - seconds - self.clock, 6), "duration": round(seconds, 6)}
+        if attrs:
+            record["attrs"] = attrs
+        self.add(record)
+
+    @contextlib.contextmanager
+    def activate(self):
+        """ make this the current trace for the code in the block """
+        traceToken = currentTrace.set(self)
+        spanToken = currentSpan.set(None)
+        try:
+            yield self
+        finally:
+            currentSpan.reset(spanToken)
+            currentTrace.reset(traceToken)
+
+    def finish(self, **attrs):
+        """ end the trace and hand it to the tracer, only the first call counts """
+        if self.finished:
+            return
+        self.finished = True
+        self.attrs.update(attrs)
+        self.tracer.finish(self, time.perf_counter() - self.clock)
+
+    def toDict(self, duration):
+        with self.lock:
+            spans = sorted(self.spans, key=lambda span: span["start"])
+        return {"trace": self.id, "name": self.name, "time": self.started, "duration": round(duration, 6),
+                "attrs": self.attrs, "spans": spans, "dropped": self.dropped}
+
+
+class Tracer:
+    """ starts traces and writes the sampled and slow ones to a rotating jsonl file """
+
+    def __init__(self, path, sample=SAMPLE, slow=SLOW, maxBytes=MAX_BYTES, backups=BACKUPS, log=print):
+        self.path = path
+        self.sample = sample
+        self.slow = slow
+        self.log = log
+        self.random = random.Random()
+        self.started = 0
+        self.written = 0
+        self.writer = None
+        if path:
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=maxBytes, backupCount=backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.writer = logging.getLogger(f"tracing.{os.path.abspath(path)}")
+            self.writer.propagate = False
+            self.writer.setLevel(logging.INFO)
+            self.writer.handlers[:] = [handler]
+
+    def start(self, name, **attrs):
+        """ a new trace, call activate() on it to record spans and finish() when the request is answered """
+        self.started += 1
+        return Trace(self, name, attrs, self.random.random() < self.sample)
+
+    @contextlib.contextmanager
+    def trace(self, name, **attrs):
+        """ start, activate and finish a trace around a block """
+        trace = self.start(name, **attrs)
+        try:
+            with trace.activate():
+                yield trace
+        finally:
+            trace.finish()
+
+    def finish(self, trace, duration):
+        slow = duration >= self.slow
+        if slow:
+            self.log(f"Slow {trace.name}: {duration:.1f}s, trace {trace.id}")
+        if self.writer is None or not (trace.sampled or slow):
+            return
+        self.written += 1
+        try:
+            self.writer.info(json.dumps(trace.toDict(duration), default=str))
+        except Exception as e:
+            self.log(f"Could not write trace {trace.id}: {e}")
+
+
+def span(name, **attrs):
+    """ time a block as a span of the current trace, a no-op outside of one (the block still gets
+    an attrs dict to fill in) """
+    trace = currentTrace.get()
+    if trace is None:
+        return contextlib.nullcontext(attrs)
+    return openSpan(trace, name, attrs)
+
+
+@contextlib.contextmanager
+def openSpan(trace, name, attrs):
+    spanId = trace.newSpanId()
+    parent = currentSpan.get()
+    token = currentSpan.set(spanId)
+    started = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        currentSpan.reset(token)
+        record = {"id": spanId, "parent": parent, "name": name, "start": round(started - trace.clock, 6),
+                  "duration": round(time.perf_counter() - started, 6)}
+        if attrs:
+            record["attrs"] = attrs
+        if error:
+            record["error"] = error
+        trace.add(record)
+
+
+def bind(function):
+    """ function run in a copy of the current context, for run_in_executor which doesn't carry it over """
+    context = contextvars.copy_context()
+    return functools.partial(context.run, function)
+
+
+def traceId():
+    """ id of the current trace, or None """
+    trace = currentTrace.get()
+    return trace.id if trace is not None else None
+
+
+# offline analysis of the written traces
+
+def readTraces(paths, name=None):
+    traces = []
+    for path in paths:
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        trace = json.loads(line)
+                    except ValueError:
+                        continue
+                    if name is None or trace["name"] == name:
+                        traces.append(trace)
+        except OSError as e:
+            print(f"Could not read {path}: {e}")
+    return traces
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def spanTree(trace):
+    """ lines of the trace's spans, indented under their parents """
+    children = collections.defaultdict(list)
+    for record in trace["spans"]:
+        children[record["parent"]].append(record)
+    lines = []
+
+    def walk(parent, depth):
+        for record in children.get(parent, []):
+            attrs = " ".join(f"{key}={value}" for key, value in record.get("attrs", {}).items())
+            error = f" !{record['error']}" if record.get("error") else ""
+            lines.append(f"{'  ' * depth}{record['start'] * 1000:8.1f} ms +{record['duration'] * 1000:8.1f} ms"
+                         f"  {record['name']} {attrs}{error}".rstrip())
+            walk(record["id"], depth + 1)
+    walk(None, 1)
+    return lines
+
+
+def breakdown(traces):
+    """ (name, count, p50, p95, max, total) per span name, largest total first """
+    durations = collections.defaultdict(list)
+    for trace in traces:
+        for record in trace["spans"]:
+            durations[record["name"]].append(record["duration"])
+    rows = []
+    for name, values in durations.items():
+        values.sort()
+        rows.append((name, len(values), percentile(values, 0.5), percentile(values, 0.95), values[-1], sum(values)))
+    return sorted(rows, key=lambda row: -row[5])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Slowest traces and per span latency from the bot's trace files.")
+    parser.add_argument("paths", nargs="+", help="trace files, e.g. traces.jsonl traces.jsonl.1")
+    parser.add_argument("--top", type=int, default=5, help="slowest traces to print in full")
+    parser.add_argument("--name", default=None, help="only traces of this kind (lookup, command, message)")
+    args = parser.parse_args()
+
+    traces = readTraces(args.paths, args.name)
+    if not traces:
+        print("No traces.")
+        return
+    durations = sorted(trace["duration"] for trace in traces)
+    print(f"{len(traces)} traces, p50 {percentile(durations, 0.5) * 1000:.0f} ms,"
+          f" p95 {percentile(durations, 0.95) * 1000:.0f} ms, max {durations[-1] * 1000:.0f} ms\n")
+
+    print(f"Slowest {min(args.top, len(traces))}:")
+    for trace in sorted(traces, key=lambda trace: -trace["duration"])[:args.top]:
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(trace["time"]))
+        attrs = " ".join(f"{key}={value}" for key, value in trace["attrs"].items())
+        print(f"{trace['trace']} {when} {trace['name']} {trace['duration'] * 1000:.0f} ms {attrs}")
+        print("\n".join(spanTree(trace)))
+        if trace.get("dropped"):
+            print(f"  ... {trace['dropped']} more spans dropped")
+    print()
+
+    print(f"{'span':<20}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'total s':>10}")
+    for name, count, p50, p95, longest, total in breakdown(traces):
+        print(f"{name:<20}{count:>8}{p50 * 1000:>10.1f}{p95 * 1000:>10.1f}{longest * 1000:>10.1f}{total:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
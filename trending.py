@@ -0,0 +1,141 @@
+# trending.py
+""" Trending $SYMBOL mentions per guild in fixed memory.
+
+Mentions are counted in time buckets (an hour by default) kept in a ring, so a window is just the
+last few buckets and old counts fall off by themselves. Each bucket holds a Count-Min sketch,
+a depth x width table of counters that never underestimates a symbol's count. It is updated
+conservatively: a mention only raises the symbol's counters that sit at its current estimate, so
+the flood of one-off tickers barely inflates the busy symbols !trending shows (within a mention
+or two in benchmarks/bench_trending.py, a rarely mentioned one can still read well high). With it
+goes a small table of the heaviest symbols seen in that bucket (space saving: a newcomer only gets in
+by beating the lightest entry). Neither grows with the number of distinct tickers people type,
+so a guild's memory is fixed at BUCKETS x (DEPTH x WIDTH counters + CANDIDATES entries).
+"""
+import array
+import collections
+import hashlib
+import threading
+import time
+
+WIDTH = 512
+DEPTH = 4
+CANDIDATES = 32
+BUCKET_SECONDS = 60 * 60
+BUCKETS = 24
+# guilds tracked at once, the least recently active one is dropped beyond this
+MAX_GUILDS = 256
+# window names accepted by !trending, in buckets
+WINDOWS = {"1h": 1, "3h": 3, "6h": 6, "12h": 12, "24h": 24, "1d": 24}
+
+
+class CountMinSketch:
+    """ depth rows of width counters with conservative update, estimates are never below the true count """
+
+    def __init__(self, width=WIDTH, depth=DEPTH):
+        self.width = width
+        self.depth = depth
+        self.counts = array.array("I", bytes(4 * width * depth))
+
+    def positions(self, key):
+        # one 4 byte slice of a blake2b digest per row, stable across processes unlike hash(), and
+        # independent between rows (crc32 with different seeds only differ by a constant xor)
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        return [row * self.width + int.from_bytes(digest[4 * row:4 * row + 4], "little") % self.width for row in range(self.depth)]
+
+    def add(self, key, count=1):
+        """ count key and return its new estimate, counters already above it are left alone """
+        positions = self.positions(key)
+        estimate = min(self.counts[position] for position in positions) + count
+        for position in positions:
+            if self.counts[position] < estimate:
+                self.counts[position] = estimate
+        return estimate
+
+    def estimate(self, key):
+        return min(self.counts[position] for position in self.positions(key))
+
+
+class Bucket:
+    """ one time bucket: a sketch and the heaviest symbols in it """
+
+    def __init__(self, start):
+        self.start = start
+        self.sketch = CountMinSketch()
+        self.candidates = {}
+
+    def add(self, symbol):
+        estimate = self.sketch.add(symbol)
+        if symbol in self.candidates or len(self.candidates) < CANDIDATES:
+            self.candidates[symbol] = estimate
+            return
+        lightest = min(self.candidates, key=self.candidates.get)
+        if estimate > self.candidates[lightest]:
+            del self.candidates[lightest]
+            self.candidates[symbol] = estimate
+
+
+class MentionCounter:
+    """ ring of buckets for one guild """
+
+    def __init__(self):
+        self.buckets = collections.deque(maxlen=BUCKETS)
+
+    def bucket(self, now):
+        start = int(now // BUCKET_SECONDS) * BUCKET_SECONDS
+        if not self.buckets or self.buckets[-1].start != start:
+            self.buckets.append(Bucket(start))
+        return self.buckets[-1]
+
+    def window(self, buckets, now):
+        oldest = (int(now // BUCKET_SECONDS) - buckets + 1) * BUCKET_SECONDS
+        return [bucket for bucket in self.buckets if bucket.start >= oldest]
+
+    def top(self, count, buckets, now):
+        """ up to count (symbol, estimated mentions) over the last buckets buckets, most mentioned first """
+        window = self.window(buckets, now)
+        candidates = set()
+        for bucket in window:
+            candidates.update(bucket.candidates)
+        # summing per bucket estimates is tighter than the estimate of summed sketches
+        totals = {symbol: sum(bucket.sketch.estimate(symbol) for bucket in window) for symbol in candidates}
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        return [(symbol, total) for symbol, total in ranked[:count] if total]
+
+
+class TrendingTracker:
+    """ mention counters per guild plus one over every guild ("" ), safe to use from several threads """
+
+    def __init__(self):
+        self.guilds = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def counter(self, guildId):
+        counter = self.guilds.get(guildId)
+        if counter is None:
+            counter = MentionCounter()
+            self.guilds[guildId] = counter
+            if len(self.guilds) > MAX_GUILDS + 1:
+                # never drop the all guilds counter
+                for key in self.guilds:
+                    if key != "":
+                        del self.guilds[key]
+                        break
+        self.guilds.move_to_end(guildId)
+        return counter
+
+    def add(self, guildId, symbols, now=None):
+        """ count one mention of each symbol in guild """
+        now = time.time() if now is None else now
+        with self.lock:
+            for key in (str(guildId), ""):
+                bucket = self.counter(key).bucket(now)
+                for symbol in symbols:
+                    bucket.add(symbol.upper())
+
+    def top(self, guildId=None, count=10, buckets=1, now=None):
+        """ most mentioned symbols in a guild (every guild when guildId is None) over the last buckets hours """
+        now = time.time() if now is None else now
+        key = "" if guildId is None else str(guildId)
+        with self.lock:
+            counter = self.guilds.get(key)
+            return counter.top(count, buckets, now) if counter is not None else []
@@ -0,0 +1,165 @@
+# warmer.py
+""" What to keep warm ahead of demand, how much upstream budget warming may spend, and whether it pays.
+
+Every $SYMBOL reply and !chart counts towards its symbol's popularity, an exponentially decayed
+request count, so the tickers a server asks about every day stay on top while a one day spike
+fades within a few days. Before the open the bot prefetches the most popular symbols and the
+day's movers, bounded by a daily quota of upstream calls, and WarmStats counts how many
+interactive requests were then answered from the cache (warm) versus upstream (cold).
+"""
+import collections
+import datetime
+import heapq
+import math
+import threading
+import time
+
+try:
+    import zoneinfo
+    MARKET_ZONE = zoneinfo.ZoneInfo("America/New_York")
+except Exception:
+    # no tz database (windows without tzdata), fall back to local time
+    MARKET_ZONE = None
+
+HALF_LIFE = 3 * 24 * 60 * 60
+MAX_SYMBOLS = 2000
+MARKET_OPEN = datetime.time(9, 30)
+
+
+def marketNow(now=None):
+    """ wall clock time at the exchange """
+    return datetime.datetime.fromtimestamp(time.time() if now is None else now, MARKET_ZONE)
+
+
+def minutesToOpen(now=None):
+    """ minutes until today's open, negative once it has passed, None on weekends """
+    clock = marketNow(now)
+    if clock.weekday() >= 5:
+        return None
+    opening = clock.replace(hour=MARKET_OPEN.hour, minute=MARKET_OPEN.minute, second=0, microsecond=0)
+    return (opening - clock).total_seconds() / 60
+
+
+class Popularity:
+    """ decayed request counts per symbol, safe to use from several threads """
+
+    def __init__(self, halfLife=HALF_LIFE, maxSymbols=MAX_SYMBOLS):
+        self.decay = math.log(2) / halfLife
+        self.maxSymbols = maxSymbols
+        # symbol -> (score, when the score was last brought up to date)
+        self.scores = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.scores)
+
+    def decayed(self, entry, now):
+        score, when = entry
+        return score * math.exp(-self.decay * max(0.0, now - when))
+
+    def add(self, symbol, weight=1.0, now=None):
+        now = time.time() if now is None else now
+        symbol = symbol.upper()
+        with self.lock:
+            entry = self.scores.get(symbol)
+            self.scores[symbol] = ((self.decayed(entry, now) if entry else 0.0) + weight, now)
+            # prune in batches so the cost is spread over many adds
+            if len(self.scores) > self.maxSymbols * 5 // 4:
+                keep = heapq.nlargest(self.maxSymbols, self.scores.items(), key=lambda item: self.decayed(item[1], now))
+                self.scores = dict(keep)
+
+    def score(self, symbol, now=None):
+        entry = self.scores.get(symbol.upper())
+        return self.decayed(entry, time.time() if now is None else now) if entry else 0.0
+
+    def top(self, count, now=None):
+        """ up to count (symbol, score), most popular first """
+        now = time.time() if now is None else now
+        with self.lock:
+            ranked = heapq.nlargest(count, self.scores.items(), key=lambda item: self.decayed(item[1], now))
+            return [(symbol, self.decayed(entry, now)) for symbol, entry in ranked]
+
+    def toDict(self):
+        with self.lock:
+            return {symbol: list(entry) for symbol, entry in self.scores.items()}
+
+    def load(self, data):
+        with self.lock:
+            for symbol, (score, when) in data.items():
+                self.scores[symbol] = (float(score), float(when))
+
+
+class WarmQuota:
+    """ upstream calls warming may make per market day """
+
+    def __init__(self, daily):
+        self.daily = daily
+        self.day = None
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def rollover(self, now):
+        day = marketNow(now).date()
+        if day != self.day:
+            self.day = day
+            self.used = 0
+
+    def take(self, calls=1, now=None):
+        """ spend calls from today's budget, False (and nothing spent) when there isn't enough left """
+        with self.lock:
+            self.rollover(time.time() if now is None else now)
+            if self.used + calls > self.daily:
+                return False
+            self.used += calls
+            return True
+
+    def remaining(self, now=None):
+        with self.lock:
+            self.rollover(time.time() if now is None else now)
+            return self.daily - self.used
+
+
+class WarmStats:
+    """ interactive requests answered warm or cold per kind ("quote", "chart") """
+
+    def __init__(self):
+        self.warm = collections.Counter()
+        self.cold = collections.Counter()
+        # prefetched entries a request was then answered from
+        self.prefetchHits = collections.Counter()
+        self.prefetches = collections.Counter()
+        self.warmed = set()
+        self.since = time.time()
+        self.lock = threading.Lock()
+
+    def record(self, kind, symbol, warm):
+        with self.lock:
+            if warm:
+                self.warm[kind] += 1
+                key = (kind, symbol.upper())
+                if key in self.warmed:
+                    self.prefetchHits[kind] += 1
+                    self.warmed.discard(key)
+            else:
+                self.cold[kind] += 1
+
+    def prefetched(self, kind, symbol):
+        with self.lock:
+            self.prefetches[kind] += 1
+            self.warmed.add((kind, symbol.upper()))
+
+    def hitRate(self, kind):
+        total = self.warm[kind] + self.cold[kind]
+        return self.warm[kind] / total if total else None
+
+    def lines(self):
+        """ one summary line per kind """
+        with self.lock:
+            kinds = sorted(set(self.warm) | set(self.cold) | set(self.prefetches))
+            lines = []
+            for kind in kinds:
+                rate = self.hitRate(kind)
+                lines.append(f"{kind}: {self.warm[kind]} warm / {self.cold[kind]} cold"
+                             + (f" ({rate:.0%} warm)" if rate is not None else "")
+                             + f", {self.prefetches[kind]} prefetched, {self.prefetchHits[kind]} of them used")
+            return lines
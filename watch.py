@@ -0,0 +1,102 @@
+# watch.py
+""" Live quote boards for !watch.
+
+A board is one discord message that gets edited in place with fresh quotes. Every board in
+every channel is refreshed from one shared poll: the registry hands out the deduplicated set of
+watched symbols, the bot fetches those in batches, and the registry then says which boards
+actually changed so unchanged boards are never edited.
+"""
+import time
+
+MAX_SYMBOLS_PER_BOARD = 10
+MAX_BOARDS_PER_CHANNEL = 3
+# boards stop updating after a trading day so forgotten ones don't poll forever
+BOARD_LIFETIME = 8 * 60 * 60
+
+
+class WatchBoard:
+    """ one live message and the symbols it shows """
+
+    def __init__(self, channelId, ownerId, symbols, message=None):
+        self.channelId = channelId
+        self.ownerId = ownerId
+        self.symbols = symbols
+        self.message = message
+        self.created = time.time()
+        self.lastContent = None
+        self.lastChange = None
+
+    def expired(self, now=None):
+        return (now or time.time()) - self.created > BOARD_LIFETIME
+
+
+def formatChange(value, percent=False):
+    if value is None:
+        return "-"
+    if percent:
+        return f"{value * 100:+.2f}%"
+    return f"{value:+.2f}"
+
+
+def renderBoard(symbols, quotes):
+    """ fixed width table for a board, the same quotes always render the same text """
+    lines = [f"{'SYMBOL':<10}{'PRICE':>11}{'CHG':>9}{'CHG%':>9}"]
+    for symbol in symbols:
+        quote = quotes.get(symbol)
+        if not quote or quote.get("price") is None:
+            lines.append(f"{symbol:<10}{'n/a':>11}")
+            continue
+        line = f"{symbol:<10}{quote['price']:>11,.2f}{formatChange(quote.get('change')):>9}{formatChange(quote.get('changePercent'), True):>9}"
+        extended = quote.get("prePrice") if quote.get("marketState") == "PRE" else \
+            quote.get("postPrice") if quote.get("marketState") in ("POST", "POSTPOST", "CLOSED") else None
+        if extended is not None:
+            line += f"  ({quote['marketState'].lower()} {extended:,.2f})"
+        lines.append(line)
+    return "```\n" + "\n".join(lines) + "\n```"
+
+
+class WatchRegistry:
+    """ all live boards, grouped so one poll can serve all of them """
+
+    def __init__(self):
+        self.boards = []
+
+    def add(self, board):
+        self.boards.append(board)
+        return board
+
+    def remove(self, board):
+        if board in self.boards:
+            self.boards.remove(board)
+
+    def channelBoards(self, channelId):
+        return [board for board in self.boards if board.channelId == channelId]
+
+    def removeOwned(self, channelId, ownerId):
+        """ drop a user's boards in a channel, returns the removed boards """
+        removed = [board for board in self.channelBoards(channelId) if board.ownerId == ownerId]
+        for board in removed:
+            self.remove(board)
+        return removed
+
+    def expire(self, now=None):
+        expired = [board for board in self.boards if board.expired(now)]
+        for board in expired:
+            self.remove(board)
+        return expired
+
+    def symbols(self):
+        """ every watched symbol exactly once, however many boards show it """
+        unique = set()
+        for board in self.boards:
+            unique.update(board.symbols)
+        return sorted(unique)
+
+    def changedBoards(self, quotes):
+        """ (board, content) for boards whose rendered table differs from what is on screen """
+        changed = []
+        for board in self.boards:
+            content = renderBoard(board.symbols, quotes)
+            if content != board.lastContent:
+                changed.append((board, content))
+        return changed
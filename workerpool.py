@@ -0,0 +1,192 @@
+# workerpool.py
+""" $SYMBOL lookups and charts in worker processes, so the process holding the Discord gateway only routes.
+
+With [workers] processes set, the bot hands price_reply and buildChart jobs to that many
+processes over multiprocessing queues (a ProcessPoolExecutor) instead of running them on its
+own executor threads, where JSON decoding, indicator math and drawing hold the GIL the event
+loop needs. A worker answers with a ready-to-send payload of plain data: embeds as dicts, a
+chart as the metadata of the image it wrote. With it come the hook events the job raised
+(lookups, fetched summaries) and its deadline stage timings, which the gateway replays into its
+own counters. Workers come from a fork server (spawned where there is none), never forked from
+the gateway: a fork of a process with threads running can start with a lock some other thread
+held and hang on it. Each worker sets up core alone, it reads the bot's config, opens its own
+cache connection and has its own circuit breakers.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import configparser
+import multiprocessing
+import os
+import threading
+import time
+
+import discord
+
+import core
+import deadline as deadlines
+import tracing
+
+# hook events raised by the job running in this worker process, sent back with its result
+events = []
+
+
+# the worker side, runs in the pool's processes
+
+def recorder(event):
+    def record(*args):
+        events.append((event,) + args)
+    return record
+
+
+def context():
+    """ multiprocessing context for the bot's process pools, a fork server that has core imported or spawn """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["workerpool"])
+    return context
+
+
+def startWorker(configPath, chartsFolder):
+    """ pool initializer: core configured from the bot's config with a cache connection of its own,
+    hooks that record events instead of counting them """
+    configParser = configparser.RawConfigParser(inline_comment_prefixes=("#",))
+    configParser.read(configPath)
+    core.readConfig(configParser)
+    core.chartsFolder = chartsFolder
+    core.makeChartsFolder()
+    core.openCache()
+    for event, hooks in core.hooks.items():
+        hooks[:] = [recorder(event)]
+
+
+def runJob(command, budget, submitted, function, *args):
+    """ function(*args, deadline) under what was left of the gateway's budget when it submitted the
+    job at submitted (wall clock) less the time it waited for a free worker, returns (result, hook
+    events, stage counts, seconds it took, this worker's pid and the stats of its circuit breakers) """
+    del events[:]
+    stats = deadlines.StageStats()
+    queued = max(0.0, time.time() - submitted)
+    stats.record(command, "worker queue", queued, queued >= budget)
+    started = time.perf_counter()
+    result = function(*args, deadlines.Deadline(command, budget - queued, stats))
+    breakers = [circuit.stats() for circuit in core.upstreamBreakers.values()]
+    return result, list(events), stats.counts(), time.perf_counter() - started, os.getpid(), breakers
+
+
+def lookupJob(symbols, deadline):
+    """ price_reply with the embeds as dicts """
+    return {symbol: reply.to_dict() if isinstance(reply, discord.Embed) else reply
+            for symbol, reply in core.price_reply(symbols, deadline).items()}
+
+
+def chartJob(symbol, intervalIn, rangeIn, canned, deadline):
+    return core.buildChart(symbol, intervalIn, rangeIn, deadline, canned)
+
+
+# the gateway side
+
+class WorkerPool:
+    """ a process pool started on first use and replaced when a worker dies, with per job kind timings """
+
+    def __init__(self, processes, configPath, chartsFolder, log=print):
+        self.processes = processes
+        self.configPath = os.path.abspath(configPath)
+        self.chartsFolder = os.path.abspath(chartsFolder)
+        self.log = log
+        self.pool = None
+        self.lock = threading.Lock()
+        # kind -> [jobs, seconds working, seconds queued and in transit, failures]
+        self.jobs = collections.defaultdict(lambda: [0, 0.0, 0.0, 0])
+        # worker pid -> its circuit breakers' stats as of the last job it ran
+        self.breakers = {}
+        self.restarts = 0
+
+    def executor(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.processes, mp_context=context(),
+                                                                   initializer=startWorker,
+                                                                   initargs=(self.configPath, self.chartsFolder))
+            return self.pool
+
+    def reset(self):
+        """ drop a pool whose worker died, the next job starts a fresh one """
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = None
+                self.breakers.clear()
+                self.restarts += 1
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(wait=True, cancel_futures=True)
+                self.pool = None
+
+    async def run(self, kind, deadline, function, *args):
+        """ run function in a worker, replay its hook events and stage timings here and return its result """
+        loop = asyncio.get_running_loop()
+        # the first call starts the workers, keep that off the event loop
+        executor = await loop.run_in_executor(None, self.executor)
+        submitted = time.perf_counter()
+        with tracing.span("worker", kind=kind) as attrs:
+            try:
+                result, raised, counts, seconds, pid, breakers = await loop.run_in_executor(
+                    executor, runJob, deadline.command, deadline.remaining(), time.time(), function, *args)
+            except concurrent.futures.process.BrokenProcessPool:
+                self.log(f"A worker process died running a {kind} job, restarting the pool")
+                self.jobs[kind][3] += 1
+                self.reset()
+                raise
+            except Exception:
+                self.jobs[kind][3] += 1
+                raise
+            overhead = max(0.0, time.perf_counter() - submitted - seconds)
+            attrs["work"] = round(seconds, 6)
+        self.breakers[pid] = breakers
+        entry = self.jobs[kind]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] += overhead
+        for event in raised:
+            core.notify(*event)
+        if deadline.stats is not None:
+            deadline.stats.merge(counts)
+        return result
+
+    async def lookup(self, symbols, deadline):
+        """ price_reply in a worker, the same symbol -> embed or error message """
+        replies = await self.run("lookup", deadline, lookupJob, symbols)
+        return {symbol: discord.Embed.from_dict(reply) if isinstance(reply, dict) else reply
+                for symbol, reply in replies.items()}
+
+    async def chart(self, symbol, intervalIn, rangeIn, deadline, canned=False):
+        """ buildChart in a worker, the same (chart metadata, error message) """
+        return await self.run("chart", deadline, chartJob, symbol, intervalIn, rangeIn, canned)
+
+    def breakerLines(self):
+        """ one line per upstream endpoint: its breaker's state in each worker that has run a job,
+        with the workers' calls, openings and refused calls added up """
+        byName = collections.defaultdict(list)
+        for breakers in list(self.breakers.values()):
+            for stats in breakers:
+                byName[stats["name"]].append(stats)
+        lines = []
+        for name, states in byName.items():
+            counted = collections.Counter(stats["state"] for stats in states)
+            lines.append(f"{name}: " + ", ".join(f"{count} {state}" for state, count in counted.most_common())
+                         + f" of {len(states)} workers, {sum(stats['calls'] for stats in states)} recent calls,"
+                         f" opened {sum(stats['opened'] for stats in states)}x,"
+                         f" {sum(stats['rejected'] for stats in states)} calls refused")
+        return lines
+
+    def lines(self):
+        lines = [f"{self.processes} worker processes, {'running' if self.pool is not None else 'not started'},"
+                 f" {self.restarts} restarts"]
+        for kind, (count, working, overhead, failures) in sorted(self.jobs.items()):
+            lines.append(f"{kind}: {count} jobs, avg {working / count * 1000 if count else 0:.0f} ms in the worker"
+                         f" + {overhead / count * 1000 if count else 0:.0f} ms queued and in transit, {failures} failed")
+        return lines
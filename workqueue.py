@@ -0,0 +1,167 @@
+# workqueue.py
+""" Bounded, fair queue of $SYMBOL lookups for a fixed pool of worker tasks.
+
+Lookups are queued per channel and channels take turns by deficit round robin: on its turn a
+channel earns a quantum of credit, and a lookup costs one credit per symbol, so a channel
+flooding the bot with long symbol lists gets the same share of the workers as a quiet one asking
+for a single ticker. Within a channel the users take turns the same way (one lookup each per
+turn). A symbol already waiting or being looked up in a channel is dropped from later lookups
+there, since the reply the first one gets is visible to everybody in it. When the queue (or one
+channel's share of it) is full the lookup is refused and the caller sheds the load.
+"""
+import asyncio
+import collections
+import time
+
+QUANTUM = 3
+MAX_SIZE = 200
+MAX_PER_FLOW = 20
+
+# put() results
+QUEUED = "queued"
+COLLAPSED = "collapsed"
+FULL = "full"
+
+
+class Job:
+    """ one lookup: the symbols to look up and whatever the worker needs to reply """
+
+    def __init__(self, flow, user, symbols, payload=None):
+        self.flow = flow
+        self.user = user
+        self.symbols = symbols
+        self.payload = payload
+        self.cost = max(1, len(symbols))
+        self.queued = time.monotonic()
+        self.wait = None
+
+
+class Flow:
+    """ one channel's lookups, a queue per user served round robin """
+
+    def __init__(self):
+        self.users = collections.OrderedDict()
+        self.size = 0
+        self.deficit = 0
+
+    def push(self, job):
+        self.users.setdefault(job.user, collections.deque()).append(job)
+        self.size += 1
+
+    def peek(self):
+        return self.users[next(iter(self.users))][0]
+
+    def pop(self):
+        user = next(iter(self.users))
+        jobs = self.users[user]
+        job = jobs.popleft()
+        # the user goes to the back of the line, or leaves it with nothing left queued
+        if jobs:
+            self.users.move_to_end(user)
+        else:
+            del self.users[user]
+        self.size -= 1
+        return job
+
+
+class FairQueue:
+    """ lookups by flow (channel) under deficit round robin, with pending symbol collapsing and wait metrics """
+
+    def __init__(self, maxSize=MAX_SIZE, maxPerFlow=MAX_PER_FLOW, quantum=QUANTUM):
+        self.maxSize = maxSize
+        self.maxPerFlow = maxPerFlow
+        self.quantum = quantum
+        self.flows = {}
+        self.active = collections.deque()
+        # whether the flow at the head of active already got its quantum this turn
+        self.turnStarted = False
+        self.size = 0
+        # flow -> symbol -> lookups waiting for or running it
+        self.pending = {}
+        self.available = asyncio.Semaphore(0)
+        self.waits = collections.deque(maxlen=1000)
+        self.queuedCount = 0
+        self.served = 0
+        self.collapsed = 0
+        self.shed = 0
+        self.maxDepth = 0
+
+    def __len__(self):
+        return self.size
+
+    def put(self, flow, user, symbols, payload=None):
+        """ queue a lookup, returns QUEUED, COLLAPSED (every symbol is already pending in the flow) or FULL """
+        # only a queued lookup gets the flow an entry, a shed one must not leave an empty one behind
+        pending = self.pending.get(flow)
+        symbols = [symbol for symbol in dict.fromkeys(symbols) if pending is None or not pending[symbol]]
+        if not symbols:
+            self.collapsed += 1
+            return COLLAPSED
+        queue = self.flows.get(flow)
+        if self.size >= self.maxSize or (queue is not None and queue.size >= self.maxPerFlow):
+            self.shed += 1
+            return FULL
+        if queue is None:
+            queue = Flow()
+            self.flows[flow] = queue
+            self.active.append(flow)
+        job = Job(flow, user, symbols, payload)
+        queue.push(job)
+        self.pending.setdefault(flow, collections.Counter()).update(symbols)
+        self.size += 1
+        self.queuedCount += 1
+        self.maxDepth = max(self.maxDepth, self.size)
+        self.available.release()
+        return QUEUED
+
+    def next(self):
+        """ the next job by deficit round robin, the queue must not be empty """
+        while True:
+            flow = self.active[0]
+            queue = self.flows[flow]
+            if not self.turnStarted:
+                queue.deficit += self.quantum
+                self.turnStarted = True
+            if queue.deficit >= queue.peek().cost:
+                job = queue.pop()
+                queue.deficit -= job.cost
+                if not queue.size:
+                    # an idle flow keeps no credit
+                    del self.flows[flow]
+                    self.active.popleft()
+                    self.turnStarted = False
+                return job
+            self.active.rotate(-1)
+            self.turnStarted = False
+
+    async def get(self):
+        """ wait for the next job """
+        await self.available.acquire()
+        job = self.next()
+        self.size -= 1
+        job.wait = time.monotonic() - job.queued
+        self.waits.append(job.wait)
+        return job
+
+    def done(self, job):
+        """ the job's reply is out, its symbols no longer collapse later lookups """
+        pending = self.pending[job.flow]
+        pending.subtract(job.symbols)
+        for symbol in job.symbols:
+            if pending[symbol] <= 0:
+                del pending[symbol]
+        if not pending:
+            del self.pending[job.flow]
+        self.served += 1
+
+    def waitPercentile(self, fraction):
+        """ wait in seconds of recently served jobs at a percentile, None before any """
+        if not self.waits:
+            return None
+        ordered = sorted(self.waits)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def stats(self):
+        return {"depth": self.size, "flows": len(self.flows), "maxDepth": self.maxDepth, "queued": self.queuedCount,
+                "served": self.served, "collapsed": self.collapsed, "shed": self.shed,
+                "waitP50": self.waitPercentile(0.5), "waitP95": self.waitPercentile(0.95)}